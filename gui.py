@@ -7,6 +7,7 @@ import sys
 import os
 import json
 import logging
+import multiprocessing
 
 # 配置日志
 logging.basicConfig(
@@ -149,5 +150,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # CPU多进程推理使用 spawn 方式启动子进程，打包后需要 freeze_support
+    multiprocessing.freeze_support()
     # 确保在主线程中运行
     sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,302 @@
+# system/autotune.py
+"""
+自动调优模块 - 在当前加载的模型上做一次简短的标定，
+测量不同 Batch Size 与预读深度下的吞吐 (图片/秒) 和内存/显存峰值，选出最合适的组合。
+
+结果按 (设备, 模型, 推理尺寸) 保存在 settings.json 的 autotune_profiles 中，
+处理过程中出现内存/显存不足时会以更小的上限重新调优。
+"""
+
+import os
+import time
+import logging
+import platform
+import threading
+import concurrent.futures
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+BATCH_CANDIDATES = [1, 2, 4, 8, 12, 16, 24, 32]
+PREFETCH_CANDIDATES = [0, 1, 2, 3]
+
+# 吞吐差距在该比例内时优先选择更小的配置 (占用更少内存，更不容易OOM)
+THROUGHPUT_TOLERANCE = 0.03
+# 显存/内存峰值超过总量的该比例即视为不安全
+VRAM_LIMIT_RATIO = 0.85
+RAM_LIMIT_RATIO = 0.80
+
+
+def is_oom_error(error: BaseException) -> bool:
+    """判断异常是否为内存/显存不足"""
+    if isinstance(error, MemoryError):
+        return True
+    try:
+        import torch
+        if isinstance(error, torch.cuda.OutOfMemoryError):
+            return True
+    except (ImportError, AttributeError):
+        pass
+    message = str(error).lower()
+    return "out of memory" in message or "not enough memory" in message
+
+
+def release_memory() -> None:
+    """OOM 之后回收 Python 对象并清空 PyTorch 显存缓存"""
+    import gc
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except Exception:
+        pass
+
+
+def device_key(use_fp16: bool = False) -> str:
+    """描述当前推理设备的字符串 (含精度)，用作调优结果的键"""
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return f"cuda:{torch.cuda.get_device_name(0)}|{'fp16' if use_fp16 else 'fp32'}"
+    except Exception:
+        pass
+    cpu_name = platform.processor() or platform.machine() or "cpu"
+    return f"cpu:{cpu_name}|{os.cpu_count() or 1}c"
+
+
+def profile_key(device: str, model_path: str, imgsz: int) -> str:
+    """调优结果在 settings.json 中的键"""
+    return f"{device}|{os.path.basename(model_path or '')}|{int(imgsz)}"
+
+
+def _total_ram_mb() -> Optional[float]:
+    try:
+        import psutil
+        return psutil.virtual_memory().total / 1024 / 1024
+    except Exception:
+        return None
+
+
+class _PeakSampler:
+    """在后台线程中周期性采样进程内存 (RSS) 与显存，记录峰值 (MB)"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_ram_mb = 0.0
+        self.peak_vram_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = None
+        self._cuda = False
+
+    def __enter__(self):
+        try:
+            import psutil
+            self._process = psutil.Process()
+        except Exception:
+            self._process = None
+        try:
+            import torch
+            self._cuda = torch.cuda.is_available()
+            if self._cuda:
+                torch.cuda.reset_peak_memory_stats()
+        except Exception:
+            self._cuda = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        if self._process is not None:
+            try:
+                self.peak_ram_mb = max(self.peak_ram_mb, self._process.memory_info().rss / 1024 / 1024)
+            except Exception:
+                pass
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self._sample()
+        if self._cuda:
+            try:
+                import torch
+                self.peak_vram_mb = torch.cuda.max_memory_reserved() / 1024 / 1024
+            except Exception:
+                pass
+        return False
+
+
+class AutoTuner:
+    """在已加载的 ImageProcessor 上标定 Batch Size 与预读深度"""
+
+    def __init__(self, processor, sample_paths: List[str], detect_params: Dict[str, Any],
+                 time_budget: float = 90.0, log_fn: Optional[Callable[[str], None]] = None,
+                 stop_fn: Optional[Callable[[], bool]] = None):
+        self.processor = processor
+        self.sample_paths = list(sample_paths)
+        self.detect_params = dict(detect_params)
+        self.time_budget = time_budget
+        self.log_fn = log_fn or (lambda msg: logger.info(msg))
+        self.stop_fn = stop_fn or (lambda: False)
+        self._deadline = 0.0
+        self._total_vram_mb = None
+        try:
+            import torch
+            if torch.cuda.is_available():
+                self._total_vram_mb = torch.cuda.get_device_properties(0).total_memory / 1024 / 1024
+        except Exception:
+            pass
+        self._total_ram_mb = _total_ram_mb()
+
+    def _paths_for(self, count: int, offset: int = 0) -> List[str]:
+        """循环取样本图片，保证每个候选都有足够的输入"""
+        n = len(self.sample_paths)
+        return [self.sample_paths[(offset + k) % n] for k in range(count)]
+
+    def _is_safe(self, peak_ram_mb: float, peak_vram_mb: float) -> bool:
+        if self._total_vram_mb and peak_vram_mb > self._total_vram_mb * VRAM_LIMIT_RATIO:
+            return False
+        if self._total_ram_mb and peak_ram_mb > self._total_ram_mb * RAM_LIMIT_RATIO:
+            return False
+        return True
+
+    def _out_of_time(self) -> bool:
+        return self.stop_fn() or time.monotonic() > self._deadline
+
+    def _measure_batch(self, batch_size: int) -> Optional[Dict[str, float]]:
+        """测量单个 Batch Size 的吞吐与峰值，OOM 时返回 None"""
+        paths = self._paths_for(batch_size)
+        try:
+            preloaded = self.processor.preload_batch_data(paths)
+            # 预热一次 (包含该尺寸下首次的内存分配)
+            self.processor.detect_batch_species(paths, preloaded_data=preloaded, **self.detect_params)
+            with _PeakSampler() as sampler:
+                start = time.perf_counter()
+                self.processor.detect_batch_species(paths, preloaded_data=preloaded, **self.detect_params)
+                elapsed = time.perf_counter() - start
+            del preloaded
+        except Exception as e:
+            if is_oom_error(e):
+                release_memory()
+                return None
+            raise
+        return {
+            'images_per_s': batch_size / elapsed if elapsed > 0 else 0.0,
+            'peak_ram_mb': sampler.peak_ram_mb,
+            'peak_vram_mb': sampler.peak_vram_mb,
+        }
+
+    def _measure_prefetch(self, batch_size: int, depth: int, num_batches: int) -> Optional[Dict[str, float]]:
+        """按实际流水线方式 (后台预读 depth 个批次) 处理 num_batches 个批次，测量端到端吞吐"""
+        batches = [self._paths_for(batch_size, offset=k * batch_size) for k in range(num_batches)]
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        futures = {}
+        try:
+            with _PeakSampler() as sampler:
+                start = time.perf_counter()
+                for idx, paths in enumerate(batches):
+                    for ahead in range(idx + 1, min(num_batches, idx + 1 + depth)):
+                        if ahead not in futures:
+                            futures[ahead] = executor.submit(self.processor.preload_batch_data, batches[ahead])
+                    future = futures.pop(idx, None)
+                    preloaded = future.result() if future else self.processor.preload_batch_data(paths)
+                    self.processor.detect_batch_species(paths, preloaded_data=preloaded, **self.detect_params)
+                    del preloaded
+                elapsed = time.perf_counter() - start
+        except Exception as e:
+            if is_oom_error(e):
+                release_memory()
+                return None
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return {
+            'images_per_s': batch_size * num_batches / elapsed if elapsed > 0 else 0.0,
+            'peak_ram_mb': sampler.peak_ram_mb,
+            'peak_vram_mb': sampler.peak_vram_mb,
+        }
+
+    @staticmethod
+    def _pick_smallest_within_tolerance(measurements: Dict[int, Dict[str, float]]) -> int:
+        best = max(m['images_per_s'] for m in measurements.values())
+        for key in sorted(measurements):
+            if measurements[key]['images_per_s'] >= best * (1 - THROUGHPUT_TOLERANCE):
+                return key
+        return max(measurements, key=lambda k: measurements[k]['images_per_s'])
+
+    def run(self, max_batch: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """执行标定，返回调优结果 (失败或无样本时返回 None)"""
+        if not self.sample_paths or not self.processor or not self.processor.model:
+            return None
+
+        self._deadline = time.monotonic() + self.time_budget
+        candidates = [b for b in BATCH_CANDIDATES if not max_batch or b <= max_batch] or [1]
+
+        # 1. Batch Size：从小到大测量，遇到OOM/超出安全阈值/吞吐明显下降即停止
+        batch_measurements: Dict[int, Dict[str, float]] = {}
+        best_speed = 0.0
+        for batch_size in candidates:
+            if batch_measurements and self._out_of_time():
+                break
+            result = self._measure_batch(batch_size)
+            if result is None:
+                self.log_fn(f"Batch Size {batch_size}: 内存不足，停止增大")
+                break
+            self.log_fn(f"Batch Size {batch_size}: {result['images_per_s']:.2f} 张/秒, "
+                        f"内存峰值 {result['peak_ram_mb']:.0f}MB, 显存峰值 {result['peak_vram_mb']:.0f}MB")
+            if not self._is_safe(result['peak_ram_mb'], result['peak_vram_mb']):
+                self.log_fn(f"Batch Size {batch_size}: 内存/显存占用超过安全阈值，停止增大")
+                break
+            batch_measurements[batch_size] = result
+            if result['images_per_s'] < best_speed * 0.9:
+                break
+            best_speed = max(best_speed, result['images_per_s'])
+
+        if not batch_measurements:
+            return None
+        batch_size = self._pick_smallest_within_tolerance(batch_measurements)
+
+        # 2. 预读深度：在选定的 Batch Size 下按流水线方式测量
+        num_batches = max(PREFETCH_CANDIDATES) + 2
+        prefetch_measurements: Dict[int, Dict[str, float]] = {}
+        for depth in PREFETCH_CANDIDATES:
+            if prefetch_measurements and self._out_of_time():
+                break
+            result = self._measure_prefetch(batch_size, depth, num_batches)
+            if result is None or not self._is_safe(result['peak_ram_mb'], result['peak_vram_mb']):
+                self.log_fn(f"预读深度 {depth}: 内存/显存不足，停止增大")
+                break
+            self.log_fn(f"预读深度 {depth}: {result['images_per_s']:.2f} 张/秒, 内存峰值 {result['peak_ram_mb']:.0f}MB")
+            prefetch_measurements[depth] = result
+
+        prefetch_depth = self._pick_smallest_within_tolerance(prefetch_measurements) if prefetch_measurements else 1
+        chosen = prefetch_measurements.get(prefetch_depth) or batch_measurements[batch_size]
+
+        return {
+            'batch_size': batch_size,
+            'prefetch_depth': prefetch_depth,
+            'images_per_s': round(chosen['images_per_s'], 3),
+            'peak_ram_mb': round(chosen['peak_ram_mb'], 1),
+            'peak_vram_mb': round(chosen['peak_vram_mb'], 1),
+            'max_batch': max_batch,
+            'tuned_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+
+
+def save_profile(settings_manager, key: str, profile: Dict[str, Any]) -> None:
+    """把单条调优结果合并写入 settings.json (不覆盖其他设置)"""
+    try:
+        settings = settings_manager.load_settings() or {}
+        profiles = settings.get("autotune_profiles") or {}
+        profiles[key] = profile
+        settings["autotune_profiles"] = profiles
+        settings_manager.save_settings(settings)
+    except Exception as e:
+        logger.error(f"保存自动调优结果失败: {e}")
@@ -0,0 +1,77 @@
+# system/batch_planner.py
+"""
+批次规划模块 - 按分辨率将图片分组后再切分批次。
+
+同一批次内的图片尺寸完全相同时，ultralytics 会使用按步长对齐的矩形推理尺寸 (rect)，
+不再把 16:9、4:3 与竖拍图片统一填充成正方形，减少在填充区域上的计算。
+批次按其第一张图片在原始顺序中的位置排序，结果仍可按原始顺序输出，等待重排的结果保持在一两个批次以内。
+"""
+
+import os
+import logging
+import concurrent.futures
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from system.metadata_extractor import ImageMetadataExtractor
+
+logger = logging.getLogger(__name__)
+
+
+def probe_image_shapes(folder: str, filenames: List[str], max_workers: int = 8) -> Dict[str, Optional[Tuple[int, int]]]:
+    """并行读取图片文件头，返回 {文件名: (高, 宽) 或 None}"""
+    if not filenames:
+        return {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(filenames))) as executor:
+        shapes = executor.map(ImageMetadataExtractor.get_image_shape,
+                              [os.path.join(folder, f) for f in filenames])
+        return dict(zip(filenames, shapes))
+
+
+def build_image_batches(filenames: List[str], batch_size: int,
+                        shapes: Optional[Dict[str, Optional[Tuple[int, int]]]] = None,
+                        order: Optional[Dict[str, int]] = None) -> List[List[str]]:
+    """按分辨率分组切分批次
+
+    每个分辨率内部按原始顺序切分；不足半个批次的尾部 (以及尺寸未知的图片) 合并为混合批次。
+    返回的批次按第一张图片的原始位置排序。
+    """
+    batch_size = max(1, int(batch_size))
+    if not shapes:
+        return [filenames[i:i + batch_size] for i in range(0, len(filenames), batch_size)]
+    order = order or {f: k for k, f in enumerate(filenames)}
+
+    buckets = OrderedDict()
+    for f in filenames:
+        buckets.setdefault(shapes.get(f), []).append(f)
+
+    batches = []
+    leftovers = []
+    for shape, files in buckets.items():
+        if shape is None:
+            leftovers.extend(files)
+            continue
+        for start in range(0, len(files), batch_size):
+            chunk = files[start:start + batch_size]
+            if len(chunk) == batch_size or len(chunk) * 2 >= batch_size:
+                batches.append(chunk)
+            else:
+                leftovers.extend(chunk)
+
+    leftovers.sort(key=lambda f: order.get(f, 0))
+    batches.extend(leftovers[i:i + batch_size] for i in range(0, len(leftovers), batch_size))
+    batches.sort(key=lambda chunk: order.get(chunk[0], 0))
+    return batches
+
+
+def describe_buckets(shapes: Dict[str, Optional[Tuple[int, int]]], limit: int = 4) -> str:
+    """分辨率分组的简要说明，例如 "1920x1080 x120, 2560x1440 x80" """
+    counts = {}
+    for shape in shapes.values():
+        if shape is not None:
+            counts[shape] = counts.get(shape, 0) + 1
+    top = sorted(counts.items(), key=lambda item: -item[1])[:limit]
+    text = ", ".join(f"{w}x{h} x{n}" for (h, w), n in top)
+    if len(counts) > limit:
+        text += f" 等 {len(counts)} 种"
+    return text
@@ -0,0 +1,949 @@
+# system/benchmark.py
+"""
+基准测试与一致性校验模块 - 用于验证推理/导出等优化路径与原实现的结果一致并测量收益。
+
+用法示例:
+    python -m system.benchmark parity --model res/model/xxx.pt --backend onnx --images D:/photos
+    python -m system.benchmark cls-int8 --cls-model res/model_cls/yyy.pt --images D:/photos --mode static
+    python -m system.benchmark crops --model res/model/xxx.pt --cls-model res/model_cls/yyy.pt --images D:/photos
+    python -m system.benchmark cls-gate --model res/model/xxx.pt --cls-model res/model_cls/yyy.pt --save
+    python -m system.benchmark preprocess --images D:/photos --with-gray
+    python -m system.benchmark export --rows 300000
+"""
+
+import os
+import sys
+import time
+import json
+import hashlib
+import argparse
+import logging
+from typing import List, Optional
+
+from system.config import SUPPORTED_IMAGE_EXTENSIONS, DETECT_IMGSZ, INDEPENDENT_DETECTION_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+def collect_images(paths: List[str], limit: int = 0) -> List[str]:
+    """收集图片路径，目录会被展开 (按文件名排序)"""
+    images = []
+    for path in paths:
+        if os.path.isdir(path):
+            images.extend(os.path.join(path, f) for f in sorted(os.listdir(path))
+                          if f.lower().endswith(SUPPORTED_IMAGE_EXTENSIONS))
+        elif os.path.isfile(path):
+            images.append(path)
+    return images[:limit] if limit > 0 else images
+
+
+def run_backend_parity(model_path: str, backend: str, image_paths: List[str], task: str = "detect",
+                       imgsz: Optional[int] = None) -> dict:
+    """校验导出后端与 PyTorch 的输出一致性"""
+    from system.inference_backend import verify_backend_parity, default_imgsz
+
+    if imgsz is None:
+        imgsz = DETECT_IMGSZ if task == "detect" else default_imgsz(model_path, 224)
+    sources = list(image_paths)
+    if not sources:
+        # 没有提供图片时使用固定随机种子的合成图像
+        import numpy as np
+        rng = np.random.default_rng(0)
+        sources = [rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8) for _ in range(4)]
+    return verify_backend_parity(model_path, backend, sources, imgsz, task=task)
+
+
+def default_temp_photo_dir(image_dir: str) -> str:
+    """与 GUI 相同的规则计算某个源文件夹对应的临时结果目录"""
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_dir, "temp", "photo", hashlib.md5(image_dir.encode()).hexdigest())
+
+
+def _scaled_topk(cls_results, k: int = 3):
+    """与 detect_batch_species 一致：温度缩放 (T=3) 后取 TopK，返回 [(indices, confs)]"""
+    import torch
+    from system.image_processor import ImageProcessor
+
+    outputs = []
+    for cls_res in cls_results:
+        probs = ImageProcessor._apply_temperature_scaling(cls_res.probs.data.float().cpu(), temperature=3.0)
+        confs, indices = torch.topk(probs, min(k, probs.numel()))
+        outputs.append((indices.tolist(), confs.tolist()))
+    return outputs
+
+
+def _time_classifier(model, crops, imgsz: int, batch: int, rounds: int = 3):
+    """测量分类吞吐 (crop/s)，返回 (最快一轮的吞吐, 最后一轮的输出)"""
+    model(crops[:batch], imgsz=imgsz, verbose=False)  # 预热
+    best = 0.0
+    outputs = []
+    for _ in range(rounds):
+        outputs = []
+        start = time.perf_counter()
+        for i in range(0, len(crops), batch):
+            outputs.extend(model(crops[i:i + batch], imgsz=imgsz, verbose=False))
+        elapsed = time.perf_counter() - start
+        best = max(best, len(crops) / elapsed if elapsed > 0 else 0.0)
+    return best, outputs
+
+
+def run_cls_int8_benchmark(cls_model_path: str, image_dir: str, temp_photo_dir: Optional[str] = None,
+                           mode: str = "static", limit: int = 512, batch: int = 32,
+                           rebuild: bool = False) -> dict:
+    """对比 FP32 与 INT8 分类模型的吞吐与 Top1/Top3 一致率
+
+    裁剪来自历史检测结果 (temp/photo 下的JSON)，偶数位用于校准、奇数位用于评估，避免在校准数据上评估。
+    """
+    from ultralytics import YOLO
+    from system.inference_backend import default_imgsz
+    from system.cls_quantization import collect_calibration_crops, quantize_classifier
+
+    temp_photo_dir = temp_photo_dir or default_temp_photo_dir(image_dir)
+    crops = collect_calibration_crops(image_dir, temp_photo_dir, limit)
+    if len(crops) < 2:
+        raise RuntimeError(f"未在 {temp_photo_dir} 找到足够的检测结果，请先用 Neri 处理该文件夹")
+
+    calibration, evaluation = crops[0::2], crops[1::2]
+    imgsz = default_imgsz(cls_model_path, 224)
+    quant_path = quantize_classifier(cls_model_path, imgsz, mode, calibration, rebuild=rebuild)
+
+    fp32_speed, fp32_out = _time_classifier(YOLO(cls_model_path), evaluation, imgsz, batch)
+    int8_speed, int8_out = _time_classifier(YOLO(quant_path, task="classify"), evaluation, imgsz, batch)
+
+    top1_agree = top3_agree = 0
+    max_conf_diff = 0.0
+    for (ref_idx, ref_conf), (q_idx, q_conf) in zip(_scaled_topk(fp32_out), _scaled_topk(int8_out)):
+        top1_agree += int(ref_idx[0] == q_idx[0])
+        top3_agree += int(set(ref_idx) == set(q_idx))
+        max_conf_diff = max(max_conf_diff, abs(ref_conf[0] - q_conf[0]))
+
+    total = len(evaluation)
+    return {
+        'quantized_model': os.path.basename(quant_path),
+        'calibration_crops': len(calibration),
+        'eval_crops': total,
+        'fp32_crops_per_s': round(fp32_speed, 2),
+        'int8_crops_per_s': round(int8_speed, 2),
+        'speedup': round(int8_speed / fp32_speed, 3) if fp32_speed else None,
+        'top1_agreement': round(top1_agree / total, 4),
+        'top3_agreement': round(top3_agree / total, 4),
+        'max_top1_conf_diff': round(max_conf_diff, 4),
+    }
+
+
+def run_crop_benchmark(model_path: str, cls_model_path: str, image_paths: List[str], batch: int = 8,
+                       use_fp16: bool = False) -> dict:
+    """对比设备端 ROI-Align 裁剪与 CPU 裁剪：端到端吞吐、分类 Top1 一致率与加权置信度差异"""
+    from system.image_processor import ImageProcessor
+
+    if not image_paths:
+        raise RuntimeError("没有可用的图片")
+
+    processor = ImageProcessor(model_path)
+    processor.load_cls_model(cls_model_path)
+    if not processor.model or not processor.cls_model:
+        raise RuntimeError("检测或分类模型加载失败")
+
+    batches = [image_paths[i:i + batch] for i in range(0, len(image_paths), batch)]
+    preloaded = [processor.preload_batch_data(paths) for paths in batches]
+
+    def run(device_crops: bool):
+        processor.device_crops = device_crops
+        processor.detect_batch_species(batches[0], use_fp16=use_fp16, preloaded_data=preloaded[0])  # 预热
+        candidates = []
+        start = time.perf_counter()
+        for paths, data in zip(batches, preloaded):
+            for info in processor.detect_batch_species(paths, use_fp16=use_fp16, preloaded_data=data):
+                for record in info.get('detect_results') or []:
+                    candidates.extend(record.candidates.get(i) or [] for i in range(len(record)))
+        elapsed = time.perf_counter() - start
+        return len(image_paths) / elapsed if elapsed > 0 else 0.0, candidates, processor.device_crops
+
+    cpu_speed, cpu_candidates, _ = run(False)
+    device_speed, device_candidates, device_ok = run(True)
+    if not device_ok:
+        raise RuntimeError("设备端裁剪不可用 (详见日志)，已回退到 CPU 裁剪")
+
+    top1_agree = compared = 0
+    max_conf_diff = 0.0
+    for ref, new in zip(cpu_candidates, device_candidates):
+        if not ref or not new:
+            continue
+        compared += 1
+        top1_agree += int(ref[0]['name'] == new[0]['name'])
+        max_conf_diff = max(max_conf_diff, abs(ref[0]['conf'] - new[0]['conf']))
+
+    return {
+        'images': len(image_paths),
+        'boxes': compared,
+        'cpu_crop_images_per_s': round(cpu_speed, 2),
+        'device_crop_images_per_s': round(device_speed, 2),
+        'speedup': round(device_speed / cpu_speed, 3) if cpu_speed else None,
+        'top1_agreement': round(top1_agree / compared, 4) if compared else None,
+        'max_top1_conf_diff': round(max_conf_diff, 4),
+    }
+
+
+def run_cls_gate_report(model_path: str, cls_model_path: str, photo_root: Optional[str] = None,
+                        target_agreement: float = 0.95, min_samples: int = 30, save: bool = False) -> dict:
+    """从历史检测结果学习分类门控阈值，报告跳过比例与一致率 (留出评估)"""
+    from system.classifier_gate import ClassifierGate, gate_file_path, iter_history_json
+
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    photo_root = photo_root or os.path.join(base_dir, "temp", "photo")
+    gate = ClassifierGate.learn(list(iter_history_json(photo_root)), model_path, cls_model_path,
+                                target_agreement, min_samples)
+    if save:
+        gate.save(gate_file_path(os.path.join(base_dir, "temp")))
+    return {**gate.report, 'thresholds': gate.thresholds}
+
+
+def run_preprocess_benchmark(image_paths: List[str], repeat: int = 3, with_gray: bool = False) -> dict:
+    """对比预处理新旧实现：逐帧一致性与每帧耗时 (彩色帧与红外灰度帧分别统计)"""
+    import cv2
+    import numpy as np
+    from system import preprocessing
+
+    frames = []
+    for path in image_paths:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        frames.append(img)
+        if with_gray and not preprocessing.is_pseudo_gray(img):
+            # 由彩色帧生成三通道灰度副本，模拟夜间红外帧
+            frames.append(cv2.cvtColor(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), cv2.COLOR_GRAY2BGR))
+    if not frames:
+        raise RuntimeError("没有可用的图片")
+
+    report = {'frames': len(frames), 'gray_lut_available': preprocessing.gray_luts() is not None,
+              'mismatched_frames': 0}
+    timings = {'color': [0.0, 0.0, 0], 'gray': [0.0, 0.0, 0]}  # [原实现耗时, 新实现耗时, 帧数]
+    for img in frames:
+        kind = 'gray' if preprocessing.is_pseudo_gray(img) else 'color'
+        ref = preprocessing.enhance_reference(img)
+        out = preprocessing.enhance(img)
+        if not np.array_equal(ref, out):
+            report['mismatched_frames'] += 1
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            preprocessing.enhance_reference(img)
+        middle = time.perf_counter()
+        for _ in range(repeat):
+            preprocessing.enhance(img)
+        end = time.perf_counter()
+        timings[kind][0] += middle - start
+        timings[kind][1] += end - middle
+        timings[kind][2] += repeat
+
+    for kind, (ref_time, new_time, count) in timings.items():
+        if not count:
+            continue
+        report[kind] = {
+            'frames': count // repeat,
+            'reference_ms': round(ref_time / count * 1000, 3),
+            'fast_ms': round(new_time / count * 1000, 3),
+            'speedup': round(ref_time / new_time, 3) if new_time else None,
+        }
+    report['passed'] = report['mismatched_frames'] == 0
+    return report
+
+
+def make_synthetic_records(rows: int, species: Optional[List[str]] = None, seed: int = 0) -> List[dict]:
+    """生成与临时JSON结构一致的合成检测记录：约六成空拍，含候选项的检测框、旧版记录、人工校验与视频记录"""
+    import random
+    from datetime import datetime, timedelta
+
+    rng = random.Random(seed)
+    species = species or [f"物种{i}" for i in range(60)]
+    names_map = {str(i): name for i, name in enumerate(species[:40])}
+    start = datetime(2025, 1, 1)
+    records = []
+    for i in range(rows):
+        taken = start + timedelta(seconds=i * 37)
+        info = {'文件名': f"IMG_{i:07d}.JPG", '格式': 'JPG', '拍摄日期': taken.strftime("%Y-%m-%d"),
+                '拍摄时间': taken.strftime("%H:%M:%S"), '拍摄日期对象': taken, '工作天数': (taken - start).days + 1}
+        roll = rng.random()
+        if roll < 0.6:
+            info.update({'检测框': [], 'all_confidences': [], 'all_classes': [], 'names_map': names_map})
+        elif roll < 0.93:
+            boxes = []
+            for _ in range(rng.randint(1, 5)):
+                picks = rng.sample(species, 3)
+                confs = sorted((rng.random() for _ in range(3)), reverse=True)
+                box = {'物种': picks[0], '置信度': round(rng.random(), 4), '边界框': [0, 0, 10, 10]}
+                if rng.random() < 0.8:
+                    box['候选项'] = [{'name': n, 'conf': round(c, 4)} for n, c in zip(picks, confs)]
+                boxes.append(box)
+            info['检测框'] = boxes
+        elif roll < 0.97:
+            classes = [rng.randrange(len(names_map)) for _ in range(rng.randint(1, 4))]
+            info.update({'all_classes': classes, 'all_confidences': [round(rng.random(), 4) for _ in classes],
+                         'names_map': names_map})
+        elif roll < 0.995:
+            picks = rng.sample(species + ["人"], rng.randint(0, 2))
+            info.update({'物种名称': ','.join(picks) if picks else '空', '物种数量': ','.join('1' for _ in picks) or '空',
+                         '最低置信度': '人工校验', '备注': '人工校验'})
+        else:
+            tracks = {}
+            for t in range(rng.randint(1, 3)):
+                tracks[str(t)] = [{'species': rng.choice(species[:5]), 'confidence': round(rng.random(), 4)}
+                                  for _ in range(rng.randint(1, 20))]
+            info.update({'tracks': tracks, 'total_frames_processed': 40, '格式': 'MP4'})
+        records.append(info)
+    return records
+
+
+def run_export_benchmark(rows: int = 300000, seed: int = 0, compare: bool = True,
+                         write_format: Optional[str] = None) -> dict:
+    """在合成数据上对比导出引擎的列式路径与逐条路径 (原实现)：耗时与结果是否完全一致"""
+    import random
+    from system.export_engine import DEFAULT_EXPORT_COLUMNS, _build_frame_columnar, _build_frame_rows
+    from system.data_processor import DataProcessor
+
+    species_info_map = DataProcessor.load_species_info_map()
+    names = list(species_info_map.keys())[:120]
+    records = make_synthetic_records(rows, names or None, seed)
+    rng = random.Random(seed + 1)
+    confidence_settings = {'global': 0.25}
+    confidence_settings.update({name: round(rng.uniform(0.2, 0.8), 2) for name in (names or [])[:60]})
+    min_frame_ratio = 0.1
+
+    report = {'rows': rows, 'catalog_species': len(species_info_map)}
+    columns = DEFAULT_EXPORT_COLUMNS
+    start = time.perf_counter()
+    df = _build_frame_columnar(records, confidence_settings, species_info_map, columns, min_frame_ratio)
+    report['columnar_s'] = round(time.perf_counter() - start, 3)
+
+    if compare:
+        start = time.perf_counter()
+        ref = _build_frame_rows(records, confidence_settings, species_info_map, columns, min_frame_ratio)
+        report['rows_s'] = round(time.perf_counter() - start, 3)
+        report['speedup'] = round(report['rows_s'] / report['columnar_s'], 2) if report['columnar_s'] else None
+        identical = ref.equals(df)
+        report['identical'] = bool(identical)
+        if not identical:
+            diff = (ref.astype(str) != df.astype(str)).any(axis=0)
+            report['mismatched_columns'] = [str(c) for c in diff[diff].index]
+
+    if write_format:
+        report.update(_run_export_write_benchmark(records, df, confidence_settings, species_info_map,
+                                                  min_frame_ratio, write_format, compare))
+    return report
+
+
+def _run_export_write_benchmark(records, df, confidence_settings, species_info_map, min_frame_ratio,
+                                write_format: str, compare: bool) -> dict:
+    """对比流式写入与一次性 DataFrame 写入的耗时与 Python 内存峰值，并校验读回的内容一致"""
+    import tempfile
+    import tracemalloc
+    import pandas as pd
+    from system.streaming_export import export_streaming
+
+    suffix = '.xlsx' if write_format == 'excel' else '.csv'
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        stream_path = os.path.join(tmp_dir, f"stream{suffix}")
+        tracemalloc.start()
+        start = time.perf_counter()
+        parts = export_streaming(records, stream_path, confidence_settings, species_info_map,
+                                 file_format=write_format, min_frame_ratio=min_frame_ratio)
+        report['stream_write_s'] = round(time.perf_counter() - start, 3)
+        report['stream_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+        report['stream_parts'] = len(parts)
+
+        if compare:
+            full_path = os.path.join(tmp_dir, f"full{suffix}")
+            tracemalloc.start()
+            start = time.perf_counter()
+            if write_format == 'excel':
+                df.to_excel(full_path, sheet_name="物种检测信息", index=False)
+            else:
+                df.to_csv(full_path, index=False, encoding='utf-8-sig')
+            report['full_write_s'] = round(time.perf_counter() - start, 3)
+            report['full_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+            tracemalloc.stop()
+
+            if write_format == 'excel':
+                full = pd.read_excel(full_path)
+                streamed = pd.concat(pd.read_excel(stream_path, sheet_name=None).values(), ignore_index=True)
+            else:
+                full = pd.read_csv(full_path)
+                streamed = pd.concat([pd.read_csv(p) for p in parts], ignore_index=True)
+            report['write_identical'] = bool(full.equals(streamed))
+    return report
+
+
+def process_independent_reference(image_info_list: List[dict], confidence_settings: dict,
+                                  min_frame_ratio: float = 0.0) -> List[dict]:
+    """独立探测的原实现 (整体排序后顺序遍历)，仅用于一致性校验"""
+    from collections import Counter
+    from system.independent_detection import INDEPENDENT_FLAG
+
+    sorted_images = sorted(
+        [img for img in image_info_list if img.get('拍摄日期对象')],
+        key=lambda x: x['拍摄日期对象']
+    )
+    species_last_detected = {}
+    for img_info in sorted_images:
+        species_names = []
+        if img_info.get('最低置信度') == '人工校验':
+            names_str = img_info.get('物种名称', '')
+            if names_str and names_str != '空':
+                species_names = [s.strip() for s in names_str.split(',')]
+        elif 'tracks' in img_info:
+            total_frames = img_info.get('total_frames_processed', 1)
+            threshold = total_frames * min_frame_ratio
+            track_species_list = []
+            for points in img_info.get('tracks', {}).values():
+                if len(points) < threshold:
+                    continue
+                votes = []
+                for p in points:
+                    sp = p.get('species', 'Unknown')
+                    if p.get('confidence', 0) >= confidence_settings.get(sp, confidence_settings.get("global", 0.25)):
+                        votes.append(sp)
+                if votes:
+                    track_species_list.append(Counter(votes).most_common(1)[0][0])
+            species_names = list(set(track_species_list)) if track_species_list else ['空']
+        else:
+            confidences = img_info.get('all_confidences', [])
+            classes = img_info.get('all_classes', [])
+            names_map = img_info.get('names_map', {})
+            if not confidences or not classes or not names_map:
+                img_info['独立探测首只'] = ''
+                continue
+            final_species_counts = Counter()
+            for cls, conf in zip(classes, confidences):
+                species_name = names_map.get(str(int(cls)))
+                if species_name:
+                    if conf >= confidence_settings.get(species_name, confidence_settings.get("global", 0.25)):
+                        final_species_counts[species_name] += 1
+            species_names = list(final_species_counts.keys()) if final_species_counts else ['空']
+
+        current_time = img_info.get('拍摄日期对象')
+        if not current_time or not species_names or species_names == [''] or species_names == ['空']:
+            img_info['独立探测首只'] = ''
+            continue
+
+        is_independent = False
+        for species in species_names:
+            if species in species_last_detected:
+                if (current_time - species_last_detected[species]).total_seconds() > INDEPENDENT_DETECTION_THRESHOLD:
+                    is_independent = True
+            else:
+                is_independent = True
+            species_last_detected[species] = current_time
+        img_info['独立探测首只'] = INDEPENDENT_FLAG if is_independent else ''
+    return image_info_list
+
+
+
+def run_independent_benchmark(rows: int = 200000, corrections: int = 1000, seed: int = 0) -> dict:
+    """独立探测：对比增量引擎与原实现的结果与耗时，并测量人工校验后的局部重算"""
+    import copy
+    import random
+    from system.independent_detection import IndependentDetectionEngine
+
+    rng = random.Random(seed)
+    records = make_synthetic_records(rows, seed=seed)
+    names_map = {str(i): f"物种{i}" for i in range(12)}
+    for info in records:
+        # 让检测框记录也带有原始检测结果，并制造拍摄时间相同的记录
+        if info.get('检测框'):
+            classes = [rng.randrange(len(names_map)) for _ in info['检测框']]
+            info.update({'all_classes': classes, 'all_confidences': [round(rng.random(), 4) for _ in classes],
+                         'names_map': names_map})
+        if rng.random() < 0.2:
+            info['拍摄日期对象'] = info['拍摄日期对象'].replace(second=0)
+    confidence_settings = {'global': 0.3, '物种1': 0.6}
+    flags = lambda items: [info.get('独立探测首只') for info in items]
+
+    reference = copy.deepcopy(records)
+    start = time.perf_counter()
+    process_independent_reference(reference, confidence_settings)
+    report = {'rows': rows, 'reference_s': round(time.perf_counter() - start, 3)}
+
+    incremental = copy.deepcopy(records)
+    engine = IndependentDetectionEngine(confidence_settings)
+    start = time.perf_counter()
+    for info in incremental:
+        engine.upsert(info)
+    report['incremental_s'] = round(time.perf_counter() - start, 3)
+    report['incremental_identical'] = flags(incremental) == flags(reference)
+
+    evaluations = engine.stats['evaluations']
+    start = time.perf_counter()
+    for i in rng.sample(range(rows), min(corrections, rows)):
+        engine.update_detection(incremental[i]['文件名'], {
+            '物种名称': rng.choice(['物种1', '空', '物种2,物种3']), '最低置信度': '人工校验'})
+    report['corrections'] = min(corrections, rows)
+    report['corrections_s'] = round(time.perf_counter() - start, 3)
+    report['evaluations_per_correction'] = round((engine.stats['evaluations'] - evaluations) / max(corrections, 1), 2)
+    corrected_reference = process_independent_reference(copy.deepcopy(incremental), confidence_settings)
+    report['corrections_identical'] = flags(incremental) == flags(corrected_reference)
+    return report
+
+
+def run_deployment_benchmark(rows: int = 200000, cameras: int = 20, seed: int = 0) -> dict:
+    """相机布设：单相机时校验向量化独立探测/工作天数与原实现一致，多相机时校验与增量引擎一致并计时"""
+    import copy
+    import random
+    from system.deployments import apply_deployments, camera_resolver, independent_flags
+    from system.independent_detection import IndependentDetectionEngine
+
+    rng = random.Random(seed)
+    records = make_synthetic_records(rows, seed=seed)
+    for info in records:
+        if rng.random() < 0.2:
+            info['拍摄日期对象'] = info['拍摄日期对象'].replace(second=0)
+    confidence_settings = {'global': 0.3, '物种1': 0.6}
+    report = {'rows': rows, 'cameras': cameras}
+
+    # 单相机：与原实现 (整体排序 + 按最早拍摄日期计算工作天数) 一致
+    reference = process_independent_reference(copy.deepcopy(records), confidence_settings)
+    earliest = min(info['拍摄日期对象'] for info in reference if info.get('拍摄日期对象')).date()
+    for info in reference:
+        if info.get('拍摄日期对象'):
+            info['工作天数'] = (info['拍摄日期对象'].date() - earliest).days + 1
+    single = copy.deepcopy(records)
+    start = time.perf_counter()
+    flags = independent_flags(single, confidence_settings, site='site')
+    report['vectorized_s'] = round(time.perf_counter() - start, 3)
+    for info, flag in zip(single, flags):
+        if flag is not None:
+            info['独立探测首只'] = flag
+    apply_deployments(single, 'site')
+    report['single_camera_identical'] = all(
+        a.get('独立探测首只') == b.get('独立探测首只') and a.get('工作天数') == b.get('工作天数')
+        for a, b in zip(single, reference))
+
+    # 多相机：按序列号分配相机，与增量引擎按相机分组的结果一致
+    multi = copy.deepcopy(records)
+    for info in multi:
+        info['相机型号'], info['相机序列号'] = 'CAM', f"{rng.randrange(cameras):04d}"
+    start = time.perf_counter()
+    flags = independent_flags(multi, confidence_settings, site='site')
+    report['multi_camera_vectorized_s'] = round(time.perf_counter() - start, 3)
+    incremental = copy.deepcopy(multi)
+    IndependentDetectionEngine(confidence_settings, camera_of=camera_resolver('site')).rebuild(incremental)
+    report['multi_camera_identical'] = all(
+        flag is None or flag == info.get('独立探测首只') for flag, info in zip(flags, incremental))
+    start = time.perf_counter()
+    table = apply_deployments(multi, 'site')
+    report['deployment_table_s'] = round(time.perf_counter() - start, 3)
+    report['trap_nights'] = int(table['相机工作日'].sum())
+    return report
+
+
+def run_analytics_benchmark(rows: int = 200000, cameras: int = 20, seed: int = 0) -> dict:
+    """分析表：在合成的多相机数据上计时，并与逐条循环的结果核对相对丰富度与占域矩阵"""
+    import random
+    from collections import Counter
+    import pandas as pd
+    from system.analytics import OCCUPANCY_SHEET_NAME, RAI_SHEET_NAME, ACTIVITY_SHEET_NAME, \
+        ALL_CAMERAS, build_analytics_tables
+    from system.config import OCCUPANCY_OCCASION_DAYS
+    from system.deployments import apply_deployments, independent_events, independent_flags
+
+    rng = random.Random(seed)
+    records = make_synthetic_records(rows, seed=seed)
+    for info in records:
+        info['相机型号'], info['相机序列号'] = 'CAM', f"{rng.randrange(cameras):04d}"
+    confidence_settings = {'global': 0.3, '物种1': 0.6}
+    for info, flag in zip(records, independent_flags(records, confidence_settings, site='site')):
+        if flag is not None:
+            info['独立探测首只'] = flag
+    deployments = apply_deployments(records, 'site')
+
+    start = time.perf_counter()
+    tables = build_analytics_tables(records, deployments, confidence_settings, site='site')
+    report = {'rows': rows, 'cameras': cameras, 'analytics_s': round(time.perf_counter() - start, 3),
+              'tables': {name: len(table) for name, table in tables.items()}}
+
+    # 逐条循环核对
+    events = independent_events(records, confidence_settings, site='site')
+    independent = events[events['independent']]
+    expected = Counter(zip(independent['camera'], independent['species']))
+    rai = tables[RAI_SHEET_NAME]
+    per_camera = rai[rai['相机编号'] != ALL_CAMERAS]
+    report['rai_identical'] = dict(zip(zip(per_camera['相机编号'], per_camera['物种名称']),
+                                       per_camera['独立探测数'])) == dict(expected)
+
+    origin = pd.to_datetime(deployments['开始日期']).min()
+    detected = {(sp, cam, (t.normalize() - origin).days // OCCUPANCY_OCCASION_DAYS + 1)
+                for cam, sp, t in zip(independent['camera'], independent['species'], independent['time'])}
+    occupancy = tables[OCCUPANCY_SHEET_NAME]
+    hits = occupancy[occupancy['是否探测到'] == 1]
+    report['occupancy_identical'] = set(zip(hits['物种名称'], hits['相机编号'], hits['调查周期'])) == detected
+
+    density_mass = tables[ACTIVITY_SHEET_NAME].groupby('物种名称')['核密度'].sum()
+    report['density_mass_max_error'] = float((density_mass - 1).abs().max()) if len(density_mass) else 0.0
+    return report
+
+
+def run_threshold_benchmark(rows: int = 100000, steps: int = 200, seed: int = 0) -> dict:
+    """阈值引擎：模拟拖动置信度滑块，对比增量归类与逐条重新归类的耗时与结果"""
+    import random
+    from system.threshold_engine import ThresholdEngine, classify
+
+    rng = random.Random(seed)
+    records = make_synthetic_records(rows, seed=seed)
+    settings = {'global': 0.25}
+
+    start = time.perf_counter()
+    engine = ThresholdEngine(settings)
+    engine.load((info['文件名'], info) for info in records)
+    report = {'rows': rows, 'steps': steps, 'load_s': round(time.perf_counter() - start, 3)}
+
+    start = time.perf_counter()
+    full_labels = [classify(info, settings) for info in records]
+    report['full_rescan_s'] = round(time.perf_counter() - start, 3)
+
+    # 拖动滑块：每步把全局或某个物种的阈值移动 0.01
+    species = engine.species_names()
+    step_times, changed = [], 0
+    for _ in range(steps):
+        key = 'global' if rng.random() < 0.3 else rng.choice(species)
+        current = settings.get(key, settings['global'])
+        settings[key] = round(min(0.95, max(0.05, current + rng.choice((-0.01, 0.01)))), 2)
+        start = time.perf_counter()
+        changed += len(engine.set_thresholds(settings))
+        engine.counts()
+        step_times.append(time.perf_counter() - start)
+
+    report['step_ms_mean'] = round(sum(step_times) / len(step_times) * 1000, 3)
+    report['step_ms_max'] = round(max(step_times) * 1000, 3)
+    report['changed_per_step'] = round(changed / steps, 1)
+    report['reclassified_per_step'] = round(engine.stats['reclassified'] / steps, 1)
+    full_labels = [classify(info, settings) for info in records]
+    report['identical'] = full_labels == [engine.label_of(info['文件名']) for info in records]
+    return report
+
+
+def run_incremental_benchmark(rows: int = 200000, edits: int = 500, parts: int = 10, seed: int = 0) -> dict:
+    """增量导出 (CSV)：修改/删除/新增部分记录后增量导出，与完整导出逐字节比较并对比耗时"""
+    import random
+    import tempfile
+    from system.data_processor import DataProcessor
+    from system.incremental_export import export_table_incremental
+    from system.streaming_export import export_streaming, part_path
+
+    rng = random.Random(seed)
+    species_info_map = DataProcessor.load_species_info_map()
+    records = make_synthetic_records(rows + edits, seed=seed)
+    records, extra = records[:rows], records[rows:]
+    settings = {'global': 0.25}
+    rows_per_part = max(1, rows // parts)
+    versions = {info['文件名']: '0' for info in records + extra}
+
+    report = {'rows': rows, 'edits': edits, 'rows_per_part': rows_per_part}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "incremental.csv")
+        start = time.perf_counter()
+        export_table_incremental(records, output_path, settings, species_info_map, file_format='csv',
+                                 rows_per_part=rows_per_part, source_versions=versions)
+        report['first_export_s'] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        unchanged = export_table_incremental(records, output_path, settings, species_info_map, file_format='csv',
+                                             rows_per_part=rows_per_part, source_versions=versions)
+        report['unchanged_s'] = round(time.perf_counter() - start, 3)
+        report['unchanged_mode'] = unchanged['mode']
+
+        # 人工校验部分记录，并新增记录 (追加在末尾)
+        for info in rng.sample(records[rows // 2:], edits):
+            info.update({'物种名称': '人', '物种数量': '1', '最低置信度': '人工校验', '备注': '人工校验'})
+            versions[info['文件名']] = '1'
+        records = records + extra
+        start = time.perf_counter()
+        stats = export_table_incremental(records, output_path, settings, species_info_map, file_format='csv',
+                                         rows_per_part=rows_per_part, source_versions=versions)
+        report['incremental_s'] = round(time.perf_counter() - start, 3)
+        report['changed_rows'] = stats['changed_rows']
+        report['rebuilt_rows'] = stats['rebuilt_rows']
+        report['rewritten_parts'] = len(stats['written_parts'])
+
+        full_path = os.path.join(tmp_dir, "full.csv")
+        start = time.perf_counter()
+        full_parts = export_streaming(records, full_path, settings, species_info_map, file_format='csv',
+                                      rows_per_part=rows_per_part)
+        report['full_export_s'] = round(time.perf_counter() - start, 3)
+
+        identical = True
+        for part in range(1, len(full_parts) + 1):
+            with open(part_path(output_path, part), 'rb') as a, open(part_path(full_path, part), 'rb') as b:
+                identical = identical and a.read() == b.read()
+        identical = identical and not os.path.exists(part_path(output_path, len(full_parts) + 1))
+        report['identical'] = identical
+    return report
+
+
+def run_merge_benchmark(projects: int = 8, files: int = 2000, duplicates: int = 100, seed: int = 0) -> dict:
+    """
+    多项目合并导出：在临时目录生成多个已处理文件夹 (源文件以视频扩展名保存，拍摄时间取修改时间，不依赖 EXIF)，
+    记录读取耗时，并校验合并结果与逐个文件夹计算后拼接的结果一致、重复照片只保留一条。
+    """
+    import random
+    import shutil
+    import tempfile
+    import pandas as pd
+    from system import merge_export
+    from system.data_processor import DataProcessor
+    from system.export_engine import DEFAULT_EXPORT_COLUMNS, build_export_frame
+
+    rng = random.Random(seed)
+    settings = {'global': 0.25}
+    metadata_keys = {'文件名', '格式', '拍摄日期', '拍摄时间', '拍摄日期对象', '工作天数'}
+    report = {'projects': projects, 'files_per_project': files, 'duplicates': duplicates}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        photo_root = os.path.join(tmp_dir, "temp", "photo")
+        sources = []
+        for p in range(projects):
+            source_dir = os.path.join(tmp_dir, f"site_{p:02d}")
+            temp_dir = merge_export.cache_dir_for(source_dir, photo_root)
+            os.makedirs(source_dir)
+            os.makedirs(temp_dir)
+            merge_export.write_source_marker(temp_dir, source_dir)
+            for i, info in enumerate(make_synthetic_records(files, seed=seed + p)):
+                stem = f"CAM{p:02d}_{i:06d}"
+                path = os.path.join(source_dir, f"{stem}.mp4")
+                with open(path, 'wb') as f:
+                    f.write(rng.randbytes(256))
+                taken = info['拍摄日期对象'].timestamp()
+                os.utime(path, (taken, taken))
+                with open(os.path.join(temp_dir, f"{stem}.json"), 'w', encoding='utf-8') as f:
+                    json.dump({k: v for k, v in info.items() if k not in metadata_keys}, f, ensure_ascii=False)
+            sources.append(source_dir)
+        # 把第一个文件夹的部分照片复制到第二个文件夹 (内容相同，文件名不同)
+        copied = set()
+        if projects > 1:
+            for i in rng.sample(range(files), min(duplicates, files)):
+                stem, copy_stem = f"CAM00_{i:06d}", f"COPY_{i:06d}"
+                for src_dir, ext in ((sources[0], '.mp4'), (merge_export.cache_dir_for(sources[0], photo_root), '.json')):
+                    dst_dir = sources[1] if ext == '.mp4' else merge_export.cache_dir_for(sources[1], photo_root)
+                    shutil.copy2(os.path.join(src_dir, stem + ext), os.path.join(dst_dir, copy_stem + ext))
+                copied.add(f"{copy_stem}.mp4")
+
+        found = merge_export.discover_projects(photo_root)
+        report['discovered'] = len(found)
+
+        start = time.perf_counter()
+        merge_export.load_projects(found)
+        report['load_s'] = round(time.perf_counter() - start, 3)
+
+        output_path = os.path.join(tmp_dir, "merged.csv")
+        start = time.perf_counter()
+        stats = merge_export.export_merged(found, output_path, dict(settings), file_format='csv')
+        report['merge_export_s'] = round(time.perf_counter() - start, 3)
+        report['records'] = stats['records']
+        report['duplicates_removed'] = stats['duplicates']
+
+        # 逐个文件夹计算后拼接 (去掉复制的照片)
+        columns = [merge_export.SITE_FIELD] + list(DEFAULT_EXPORT_COLUMNS)
+        species_info_map = DataProcessor.load_species_info_map()
+        frames = []
+        for project in found:
+            records = [info for info in merge_export.load_project_records(project) if info['文件名'] not in copied]
+            merge_export.prepare_site(records, project['site'], project['source_dir'], dict(settings))
+            frames.append(build_export_frame(records, settings, species_info_map, columns))
+        expected = pd.concat(frames, ignore_index=True).fillna('').astype(str)
+        merged = pd.read_csv(output_path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+        report['identical'] = bool(merged.equals(expected))
+    return report
+
+
+def run_catalog_benchmark(cache_dir: Optional[str] = None) -> dict:
+    """对比物种名录的编译耗时与从索引加载的耗时，并校验两者内容一致"""
+    import tempfile
+    from system.species_catalog import SpeciesCatalog
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        target_dir = cache_dir or tmp_dir
+        index_path = SpeciesCatalog(cache_dir=target_dir).index_path
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+        start = time.perf_counter()
+        compiled = SpeciesCatalog(cache_dir=target_dir)
+        compiled_map = compiled.info_map()
+        compile_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cached = SpeciesCatalog(cache_dir=target_dir)
+        cached_map = cached.info_map()
+        load_s = time.perf_counter() - start
+
+    return {
+        'species': len(compiled_map),
+        'compile_s': round(compile_s, 3),
+        'cached_load_ms': round(load_s * 1000, 1),
+        'identical': compiled_map == cached_map,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Neri 基准测试与一致性校验")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    parity = sub.add_parser("parity", help="校验 ONNX/OpenVINO 导出模型与 PyTorch 输出一致")
+    parity.add_argument("--model", required=True, help=".pt 模型路径")
+    parity.add_argument("--backend", choices=["onnx", "openvino"], default="onnx")
+    parity.add_argument("--task", choices=["detect", "classify"], default="detect")
+    parity.add_argument("--imgsz", type=int)
+    parity.add_argument("--images", nargs="*", default=[], help="图片文件或目录")
+    parity.add_argument("--limit", type=int, default=32)
+
+    cls_int8 = sub.add_parser("cls-int8", help="对比 FP32 与 INT8 分类模型的吞吐与 Top1/Top3 一致率")
+    cls_int8.add_argument("--cls-model", required=True, help="分类模型 .pt 路径")
+    cls_int8.add_argument("--images", required=True, help="已处理过的图片目录")
+    cls_int8.add_argument("--temp-dir", help="该目录对应的 temp/photo/<hash> 目录 (默认按 GUI 规则计算)")
+    cls_int8.add_argument("--mode", choices=["static", "dynamic"], default="static")
+    cls_int8.add_argument("--limit", type=int, default=512, help="最多使用的裁剪数量")
+    cls_int8.add_argument("--batch", type=int, default=32)
+    cls_int8.add_argument("--rebuild", action="store_true", help="忽略已有缓存重新量化")
+
+    crops = sub.add_parser("crops", help="对比设备端 ROI-Align 裁剪与 CPU 裁剪的吞吐与分类一致率")
+    crops.add_argument("--model", required=True, help="检测模型 .pt 路径")
+    crops.add_argument("--cls-model", required=True, help="分类模型 .pt 路径")
+    crops.add_argument("--images", nargs="+", required=True, help="图片文件或目录")
+    crops.add_argument("--limit", type=int, default=64)
+    crops.add_argument("--batch", type=int, default=8)
+    crops.add_argument("--fp16", action="store_true")
+
+    cls_gate = sub.add_parser("cls-gate", help="学习分类门控阈值并报告跳过比例与一致率")
+    cls_gate.add_argument("--model", required=True, help="检测模型文件名或路径 (与 GUI 中选择的一致)")
+    cls_gate.add_argument("--cls-model", required=True, help="分类模型文件名或路径")
+    cls_gate.add_argument("--photo-root", help="历史检测结果目录 (默认 temp/photo)")
+    cls_gate.add_argument("--target", type=float, default=0.95, help="一致率置信下限目标")
+    cls_gate.add_argument("--min-samples", type=int, default=30)
+    cls_gate.add_argument("--save", action="store_true", help="保存到 temp/cls_gate.json 供 GUI 使用")
+
+    prep = sub.add_parser("preprocess", help="校验预处理快速路径与原实现逐像素一致并对比耗时")
+    prep.add_argument("--images", nargs="+", required=True, help="图片文件或目录")
+    prep.add_argument("--limit", type=int, default=64)
+    prep.add_argument("--repeat", type=int, default=3)
+    prep.add_argument("--with-gray", action="store_true", help="同时测试由彩色帧生成的三通道灰度 (红外) 副本")
+
+    export = sub.add_parser("export", help="在合成数据上对比列式导出引擎与原实现的耗时与一致性")
+    export.add_argument("--rows", type=int, default=300000)
+    export.add_argument("--seed", type=int, default=0)
+    export.add_argument("--no-compare", action="store_true", help="只测量导出引擎，不运行原实现")
+    export.add_argument("--write", choices=["excel", "csv"], default=None,
+                        help="同时对比流式写入与一次性写入文件的耗时与内存峰值")
+
+    independent = sub.add_parser("independent", help="校验增量独立探测引擎与原实现一致并测量局部重算")
+    independent.add_argument("--rows", type=int, default=200000)
+    independent.add_argument("--corrections", type=int, default=1000)
+    independent.add_argument("--seed", type=int, default=0)
+
+    deployments = sub.add_parser("deployments", help="校验按相机分组的独立探测/工作天数并测量多相机耗时")
+    deployments.add_argument("--rows", type=int, default=200000)
+    deployments.add_argument("--cameras", type=int, default=20)
+    deployments.add_argument("--seed", type=int, default=0)
+
+    analytics = sub.add_parser("analytics", help="计时分析表计算并与逐条循环的结果核对")
+    analytics.add_argument("--rows", type=int, default=200000)
+    analytics.add_argument("--cameras", type=int, default=20)
+    analytics.add_argument("--seed", type=int, default=0)
+
+    threshold = sub.add_parser("threshold", help="模拟拖动置信度滑块，校验阈值引擎增量归类的结果与耗时")
+    threshold.add_argument("--rows", type=int, default=100000)
+    threshold.add_argument("--steps", type=int, default=200)
+    threshold.add_argument("--seed", type=int, default=0)
+
+    incremental = sub.add_parser("incremental", help="校验增量导出与完整导出逐字节一致并对比耗时")
+    incremental.add_argument("--rows", type=int, default=200000)
+    incremental.add_argument("--edits", type=int, default=500)
+    incremental.add_argument("--parts", type=int, default=10, help="输出拆分的文件数")
+    incremental.add_argument("--seed", type=int, default=0)
+
+    merge = sub.add_parser("merge", help="生成多个已处理文件夹，校验合并导出结果并对比串行/并行读取耗时")
+    merge.add_argument("--projects", type=int, default=8)
+    merge.add_argument("--files", type=int, default=2000, help="每个文件夹的文件数")
+    merge.add_argument("--duplicates", type=int, default=100, help="复制到第二个文件夹的重复照片数")
+    merge.add_argument("--seed", type=int, default=0)
+
+    catalog = sub.add_parser("catalog", help="对比物种名录编译与从索引加载的耗时")
+    catalog.add_argument("--cache-dir", default=None, help="索引目录 (默认使用临时目录)")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.command == "parity":
+        report = run_backend_parity(args.model, args.backend, collect_images(args.images, args.limit),
+                                    task=args.task, imgsz=args.imgsz)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report.get('passed') else 1
+
+    if args.command == "cls-int8":
+        report = run_cls_int8_benchmark(args.cls_model, args.images, args.temp_dir, mode=args.mode,
+                                        limit=args.limit, batch=args.batch, rebuild=args.rebuild)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    if args.command == "cls-gate":
+        report = run_cls_gate_report(args.model, args.cls_model, args.photo_root, args.target,
+                                     args.min_samples, save=args.save)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    if args.command == "crops":
+        report = run_crop_benchmark(args.model, args.cls_model, collect_images(args.images, args.limit),
+                                    batch=args.batch, use_fp16=args.fp16)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    if args.command == "preprocess":
+        report = run_preprocess_benchmark(collect_images(args.images, args.limit), repeat=args.repeat,
+                                          with_gray=args.with_gray)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report.get('passed') else 1
+
+    if args.command == "export":
+        report = run_export_benchmark(args.rows, args.seed, compare=not args.no_compare, write_format=args.write)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report.get('identical', True) and report.get('write_identical', True) else 1
+
+    if args.command == "independent":
+        report = run_independent_benchmark(args.rows, args.corrections, args.seed)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report['incremental_identical'] and report['corrections_identical'] else 1
+
+    if args.command == "deployments":
+        report = run_deployment_benchmark(args.rows, args.cameras, args.seed)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report['single_camera_identical'] and report['multi_camera_identical'] else 1
+
+    if args.command == "analytics":
+        report = run_analytics_benchmark(args.rows, args.cameras, args.seed)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report['rai_identical'] and report['occupancy_identical'] else 1
+
+    if args.command == "threshold":
+        report = run_threshold_benchmark(args.rows, args.steps, args.seed)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report['identical'] else 1
+
+    if args.command == "incremental":
+        report = run_incremental_benchmark(args.rows, args.edits, args.parts, args.seed)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report['identical'] and report['unchanged_mode'] == 'unchanged' else 1
+
+    if args.command == "merge":
+        report = run_merge_benchmark(args.projects, args.files, args.duplicates, args.seed)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report['identical'] and report['duplicates_removed'] == min(args.duplicates, args.files) else 1
+
+    if args.command == "catalog":
+        report = run_catalog_benchmark(args.cache_dir)
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0 if report.get('identical') else 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
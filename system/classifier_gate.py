@@ -0,0 +1,251 @@
+# system/classifier_gate.py
+"""
+分类门控模块 - 检测模型已经足够确定时跳过第二阶段分类。
+
+门控阈值按检测类别学习：读取历史临时JSON (temp/photo/<hash>/*.json) 中每个检测框的
+检测类别/检测置信度 (all_classes / all_confidences) 与分类模型 Top1 (候选项[0])，
+对每个类别找到最低的检测置信度阈值，使高于该阈值的检测框中分类模型与检测模型一致率的
+Wilson 95% 置信下限仍不低于目标值。样本不足或经常被分类模型改判的 (易混淆) 类别不设阈值，始终分类。
+启用门控时处理的记录带有 "分类门控" 标记 (被跳过的框带 "跳过分类")，其中恰好缺少高置信度的样本，
+重新学习时整条记录不计入，避免阈值随每次学习逐渐偏移。
+
+阈值与对应的检测/分类模型文件名一起保存在 temp/cls_gate.json，模型不匹配时不生效。
+"""
+
+import os
+import json
+import math
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GATE_FILE_NAME = "cls_gate.json"
+GATED_FIELD = "分类门控"  # 检测结果JSON中的记录级标记：处理时启用了门控
+DEFAULT_TARGET_AGREEMENT = 0.95
+DEFAULT_MIN_SAMPLES = 30
+# 阈值不低于该值，避免低置信度检测框跳过分类
+MIN_GATE_THRESHOLD = 0.5
+
+
+def gate_file_path(settings_dir: str) -> str:
+    return os.path.join(settings_dir, GATE_FILE_NAME)
+
+
+def _wilson_lower_bound(agree: int, total: int, z: float = 1.96) -> float:
+    if total <= 0:
+        return 0.0
+    p = agree / total
+    denominator = 1 + z * z / total
+    centre = p + z * z / (2 * total)
+    margin = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total))
+    return (centre - margin) / denominator
+
+
+def iter_history_json(photo_root: str) -> Iterable[str]:
+    """遍历 temp/photo 下所有文件夹的检测结果JSON (按路径排序)"""
+    if not photo_root or not os.path.isdir(photo_root):
+        return
+    for folder in sorted(os.listdir(photo_root)):
+        folder_path = os.path.join(photo_root, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for name in sorted(os.listdir(folder_path)):
+            if name.lower().endswith('.json'):
+                yield os.path.join(folder_path, name)
+
+
+def load_samples(json_path: str) -> List[Tuple[str, float, bool]]:
+    """
+    从单个JSON提取 (检测类别中文名, 检测置信度, 分类Top1是否与检测一致)，只保留经过分类的检测框；
+    启用门控时处理的记录返回空列表
+    """
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.warning(f"读取检测结果失败 {json_path}: {e}")
+        return []
+
+    if data.get(GATED_FIELD):
+        return []
+    boxes = data.get("检测框") or []
+    classes = data.get("all_classes") or []
+    confs = data.get("all_confidences") or []
+    names_map = data.get("names_map") or {}
+    if not boxes or len(boxes) != len(classes) or len(boxes) != len(confs):
+        return []
+
+    samples = []
+    for box, cls_id, det_conf in zip(boxes, classes, confs):
+        candidates = box.get("候选项") if isinstance(box, dict) else None
+        if not candidates:
+            continue
+        det_name = names_map.get(str(int(cls_id)))  # JSON 中字典的键均为字符串
+        if det_name is None:
+            continue
+        samples.append((det_name, float(det_conf), candidates[0].get('name') == det_name))
+    return samples
+
+
+def fit_thresholds(samples: List[Tuple[str, float, bool]], target_agreement: float = DEFAULT_TARGET_AGREEMENT,
+                   min_samples: int = DEFAULT_MIN_SAMPLES) -> Dict[str, float]:
+    """为每个检测类别求门控阈值 (检测置信度 >= 阈值时跳过分类)"""
+    by_class = defaultdict(list)
+    for name, det_conf, agree in samples:
+        by_class[name].append((det_conf, agree))
+
+    thresholds = {}
+    for name, items in by_class.items():
+        if len(items) < min_samples:
+            continue
+        confs = np.array([c for c, _ in items], dtype=np.float64)
+        agrees = np.array([a for _, a in items], dtype=np.int64)
+        order = np.argsort(-confs, kind='stable')
+        confs, agrees = confs[order], agrees[order]
+        cum_agree = np.cumsum(agrees)
+
+        best = None
+        # 从高置信度往低扫描，取仍满足一致率下限的最低阈值
+        for k in range(min_samples, len(confs) + 1):
+            if k < len(confs) and confs[k] == confs[k - 1]:
+                continue  # 同一置信度的样本必须一起纳入
+            if confs[k - 1] < MIN_GATE_THRESHOLD:
+                break
+            if _wilson_lower_bound(int(cum_agree[k - 1]), k) >= target_agreement:
+                best = float(confs[k - 1])
+        if best is not None:
+            thresholds[name] = round(best, 4)
+    return thresholds
+
+
+def evaluate_thresholds(samples: List[Tuple[str, float, bool]], thresholds: Dict[str, float]) -> Dict[str, float]:
+    """按阈值模拟门控：跳过比例，以及被跳过的检测框中检测结果与分类结果的一致率"""
+    total = len(samples)
+    skipped = agree = 0
+    for name, det_conf, same in samples:
+        threshold = thresholds.get(name)
+        if threshold is not None and det_conf >= threshold:
+            skipped += 1
+            agree += int(same)
+    return {
+        'boxes': total,
+        'skipped': skipped,
+        'skipped_fraction': round(skipped / total, 4) if total else 0.0,
+        'skipped_agreement': round(agree / skipped, 4) if skipped else None,
+        # 与全部分类相比，最终物种名称不变的比例
+        'overall_agreement': round(1 - (skipped - agree) / total, 4) if total else None,
+    }
+
+
+class ClassifierGate:
+    """按检测类别阈值决定哪些检测框需要送入分类模型"""
+
+    def __init__(self, thresholds: Optional[Dict[str, float]] = None, detector: str = "", classifier: str = "",
+                 report: Optional[dict] = None, learned_at: str = ""):
+        self.thresholds = dict(thresholds or {})
+        self.detector = detector
+        self.classifier = classifier
+        self.report = report or {}
+        self.learned_at = learned_at
+        self.stats = {'boxes': 0, 'skipped': 0}
+
+    def matches(self, model_path: Optional[str], cls_model_path: Optional[str]) -> bool:
+        """阈值只对学习时使用的检测/分类模型组合有效"""
+        return (bool(self.thresholds) and
+                os.path.basename(model_path or "") == self.detector and
+                os.path.basename(cls_model_path or "") == self.classifier)
+
+    def select(self, det_names: np.ndarray, det_confs: np.ndarray) -> np.ndarray:
+        """返回布尔数组：True 表示该检测框需要分类"""
+        thresholds = np.array([self.thresholds.get(name, np.inf) for name in det_names], dtype=np.float64)
+        need = det_confs.astype(np.float64) < thresholds
+        self.stats['boxes'] += int(need.size)
+        self.stats['skipped'] += int(need.size - need.sum())
+        return need
+
+    def reset_stats(self) -> None:
+        self.stats = {'boxes': 0, 'skipped': 0}
+
+    def describe_stats(self) -> str:
+        boxes, skipped = self.stats['boxes'], self.stats['skipped']
+        ratio = skipped / boxes if boxes else 0.0
+        return f"跳过 {skipped}/{boxes} 个检测框的分类 ({ratio:.1%})"
+
+    @classmethod
+    def learn(cls, json_paths: List[str], model_path: str, cls_model_path: str,
+              target_agreement: float = DEFAULT_TARGET_AGREEMENT,
+              min_samples: int = DEFAULT_MIN_SAMPLES) -> "ClassifierGate":
+        """从历史JSON学习阈值
+
+        报告中的跳过比例/一致率为留出评估：偶数位文件学习、奇数位文件评估；最终阈值使用全部数据学习。
+        """
+        per_file = [load_samples(path) for path in json_paths]
+        all_samples = [s for samples in per_file for s in samples]
+        if not all_samples:
+            raise RuntimeError("没有找到包含分类候选项的历史检测结果，请先在启用分类模型、未启用分类门控的情况下处理图片")
+
+        fit_part = [s for samples in per_file[0::2] for s in samples]
+        eval_part = [s for samples in per_file[1::2] for s in samples]
+        holdout = evaluate_thresholds(eval_part, fit_thresholds(fit_part, target_agreement, min_samples))
+
+        thresholds = fit_thresholds(all_samples, target_agreement, min_samples)
+        report = {
+            'samples': len(all_samples),
+            'classes': len({s[0] for s in all_samples}),
+            'gated_classes': len(thresholds),
+            'target_agreement': target_agreement,
+            'holdout': holdout,
+            'in_sample': evaluate_thresholds(all_samples, thresholds),
+        }
+        return cls(thresholds, os.path.basename(model_path or ""), os.path.basename(cls_model_path or ""),
+                   report, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    def describe_report(self) -> str:
+        """门控学习报告的简要文字 (留出评估)"""
+        holdout = self.report.get('holdout') or {}
+        if not self.report:
+            return "尚未学习门控阈值"
+        agreement = holdout.get('skipped_agreement')
+        agreement_text = f"{agreement:.1%}" if agreement is not None else "-"
+        return (f"{self.report.get('gated_classes', 0)}/{self.report.get('classes', 0)} 个类别可跳过分类；"
+                f"留出评估跳过 {holdout.get('skipped_fraction', 0):.1%} 的检测框，"
+                f"其中与分类结果一致 {agreement_text}")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ClassifierGate":
+        return cls(data.get('thresholds'), data.get('detector', ""), data.get('classifier', ""),
+                   data.get('report'), data.get('learned_at', ""))
+
+    def to_dict(self) -> dict:
+        return {
+            'detector': self.detector,
+            'classifier': self.classifier,
+            'thresholds': self.thresholds,
+            'report': self.report,
+            'learned_at': self.learned_at,
+        }
+
+    def save(self, path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"保存分类门控阈值失败: {e}")
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ClassifierGate"]:
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return cls.from_dict(data)
+        except Exception as e:
+            logger.error(f"读取分类门控阈值失败: {e}")
+            return None
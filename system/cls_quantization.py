@@ -0,0 +1,175 @@
+# system/cls_quantization.py
+"""
+分类模型INT8量化模块 - 将第二阶段分类模型导出为 ONNX 后用 ONNX Runtime 量化为 INT8，
+主要用于无CUDA设备上降低每个裁剪框的分类耗时。
+
+支持两种量化方式：
+    dynamic: 仅量化权重，无需校准数据；
+    static:  权重与激活均量化，使用历史检测结果 (temp/photo 下的JSON检测框) 裁剪出的图像进行校准。
+量化后的模型与导出缓存放在同一目录，文件名形如 <stem>.<hash>.<imgsz>.int8-static.onnx。
+"""
+
+import os
+import json
+import logging
+from typing import List, Optional
+
+import numpy as np
+
+from system.config import SUPPORTED_IMAGE_EXTENSIONS
+from system.inference_backend import (
+    BACKEND_ONNX, export_model, exported_model_path, default_imgsz, is_backend_available
+)
+
+logger = logging.getLogger(__name__)
+
+QUANT_MODE_DYNAMIC = "dynamic"
+QUANT_MODE_STATIC = "static"
+
+# 静态量化至少需要的校准裁剪数量，不足时退回动态量化
+MIN_CALIBRATION_CROPS = 16
+
+
+def quantized_cls_path(model_path: str, imgsz: int, mode: str) -> str:
+    """量化模型的缓存路径"""
+    return exported_model_path(model_path, BACKEND_ONNX, imgsz, suffix=f".int8-{mode}")
+
+
+def find_quantized_cls(model_path: str, imgsz: int) -> Optional[str]:
+    """查找已存在的量化模型，优先使用静态量化版本"""
+    for mode in (QUANT_MODE_STATIC, QUANT_MODE_DYNAMIC):
+        path = quantized_cls_path(model_path, imgsz, mode)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def collect_calibration_crops(image_dir: str, temp_photo_dir: str, limit: int = 256) -> List[np.ndarray]:
+    """根据临时JSON中保存的检测框，从源图片中裁剪出与推理时一致的分类输入
+
+    裁剪方式与 detect_batch_species 完全相同：LAB增强 -> RGB -> 外扩10% -> 灰色(114)补成正方形。
+    """
+    import cv2
+    from system.image_processor import ImageProcessor
+
+    crops = []
+    if not image_dir or not temp_photo_dir or not os.path.isdir(temp_photo_dir) or not os.path.isdir(image_dir):
+        return crops
+
+    for file_name in sorted(os.listdir(image_dir)):
+        if limit and len(crops) >= limit:
+            break
+        if not file_name.lower().endswith(SUPPORTED_IMAGE_EXTENSIONS):
+            continue
+        json_path = os.path.join(temp_photo_dir, f"{os.path.splitext(file_name)[0]}.json")
+        if not os.path.exists(json_path):
+            continue
+
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                boxes = [box.get("边界框") for box in json.load(f).get("检测框", []) if box.get("边界框")]
+            if not boxes:
+                continue
+
+            img = cv2.imread(os.path.join(image_dir, file_name))
+            if img is None:
+                continue
+            img_rgb = cv2.cvtColor(ImageProcessor._preprocess_image(img), cv2.COLOR_BGR2RGB)
+            for bbox in boxes:
+                crop = ImageProcessor._square_crop(img_rgb, bbox)
+                if crop is not None:
+                    crops.append(crop)
+                    if limit and len(crops) >= limit:
+                        break
+        except Exception as e:
+            logger.warning(f"读取校准数据失败 {file_name}: {e}")
+
+    return crops
+
+
+def _copy_metadata(src_path: str, dst_path: str) -> None:
+    """将导出模型中的元数据 (类别名称、输入尺寸等) 复制到量化模型，ultralytics 加载时依赖这些信息"""
+    import onnx
+
+    src = onnx.load(src_path, load_external_data=False)
+    dst = onnx.load(dst_path)
+    existing = {prop.key for prop in dst.metadata_props}
+    for prop in src.metadata_props:
+        if prop.key not in existing:
+            entry = dst.metadata_props.add()
+            entry.key, entry.value = prop.key, prop.value
+    onnx.save(dst, dst_path)
+
+
+def _preprocess_crops(model_path: str, crops: List[np.ndarray], imgsz: int, batch: int = 16) -> List[np.ndarray]:
+    """使用 FP32 模型自身的预处理流程生成校准输入，保证与推理时的输入分布一致"""
+    from ultralytics import YOLO
+
+    reference = YOLO(model_path)
+    reference(crops[:1], imgsz=imgsz, verbose=False)  # 初始化 predictor
+    inputs = []
+    for start in range(0, len(crops), batch):
+        tensor = reference.predictor.preprocess(crops[start:start + batch])
+        inputs.append(tensor.float().cpu().numpy())
+    return inputs
+
+
+def quantize_classifier(model_path: str, imgsz: Optional[int] = None, mode: str = QUANT_MODE_DYNAMIC,
+                        calibration_crops: Optional[List[np.ndarray]] = None, rebuild: bool = False) -> str:
+    """将分类模型量化为INT8 ONNX，返回量化模型路径 (已存在缓存时直接返回)"""
+    if not is_backend_available(BACKEND_ONNX):
+        raise RuntimeError("未安装 onnxruntime，无法使用INT8分类模型")
+
+    imgsz = imgsz or default_imgsz(model_path, 224)
+    if mode == QUANT_MODE_STATIC and (not calibration_crops or len(calibration_crops) < MIN_CALIBRATION_CROPS):
+        logger.warning("校准裁剪数量不足，改用动态量化")
+        mode = QUANT_MODE_DYNAMIC
+
+    target_path = quantized_cls_path(model_path, imgsz, mode)
+    if os.path.exists(target_path) and not rebuild:
+        return target_path
+
+    from onnxruntime.quantization import quantize_dynamic, quantize_static, QuantType, QuantFormat, \
+        CalibrationDataReader
+
+    fp32_onnx = export_model(model_path, BACKEND_ONNX, imgsz)
+    tmp_path = target_path + ".tmp"
+    logger.info(f"正在量化分类模型 ({mode}): {os.path.basename(model_path)}")
+
+    try:
+        if mode == QUANT_MODE_STATIC:
+            import onnx
+            input_name = onnx.load(fp32_onnx, load_external_data=False).graph.input[0].name
+            batches = _preprocess_crops(model_path, calibration_crops, imgsz)
+
+            class _CropCalibrationReader(CalibrationDataReader):
+                def __init__(self):
+                    self._iter = iter(batches)
+
+                def get_next(self):
+                    data = next(self._iter, None)
+                    return {input_name: data} if data is not None else None
+
+            quantize_static(fp32_onnx, tmp_path, _CropCalibrationReader(),
+                            quant_format=QuantFormat.QDQ, per_channel=True,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+        else:
+            quantize_dynamic(fp32_onnx, tmp_path, weight_type=QuantType.QUInt8)
+
+        _copy_metadata(fp32_onnx, tmp_path)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"分类模型量化完成: {target_path}")
+    return target_path
+
+
+def load_quantized_classifier(model_path: str, imgsz: Optional[int] = None):
+    """加载INT8分类模型：优先使用已有的量化缓存，否则即时生成动态量化版本"""
+    from ultralytics import YOLO
+
+    imgsz = imgsz or default_imgsz(model_path, 224)
+    quant_path = find_quantized_cls(model_path, imgsz) or quantize_classifier(model_path, imgsz)
+    return YOLO(quant_path, task="classify")
@@ -14,6 +14,39 @@ SUPPORTED_VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv', '.
 DATE_FORMATS = ['%Y:%m:%d %H:%M:%S', '%Y:%d:%m %H:%M:%S', '%Y-%m-%d %H:%M:%S']
 INDEPENDENT_DETECTION_THRESHOLD = 30 * 60  # 30分钟，单位：秒
 
+# 推理相关常量
+DETECT_IMGSZ = 1024  # 检测模型推理尺寸
+
+# 分类裁剪池：跨检测批次累积裁剪，凑满目标数量或超过等待时间后再运行分类模型
+CLS_POOL_TARGET_BATCH = 64  # 每次送入分类模型的裁剪数量
+CLS_POOL_MAX_LATENCY = 3.0  # 最早进入裁剪池的批次最多等待的时间，单位：秒
+
+# 预处理帧缓存 (可选)：保存检测分辨率的增强帧，换模型/参数重新处理时跳过解码与增强
+FRAME_CACHE_QUOTA_MB = 4096  # 缓存总大小上限，超出时淘汰最久未使用的帧
+
+# 表格导出：分块生成与写入，超过行数阈值时拆分为多个工作表 (Excel) 或多个文件 (CSV)
+EXPORT_CHUNK_ROWS = 20000  # 每次生成并写入的记录数
+EXPORT_MAX_ROWS_PER_PART = 1000000  # 每个工作表/文件的最大数据行数 (Excel 单表上限为 1048576 行)
+EXPORT_COLUMNAR_MIN_ROWS = 10000  # 单次生成的记录数达到该值才使用列式引擎，较少时逐条处理更快
+
+# 分析表 (相对丰富度、活动节律、占域矩阵、活动重叠)
+OCCUPANCY_OCCASION_DAYS = 7  # 占域检测矩阵每个调查周期的天数
+OVERLAP_MIN_EVENTS = 10  # 参与活动重叠计算的物种最少独立探测数
+
+# 多项目合并导出
+MERGE_FINGERPRINT_BYTES = 64 * 1024  # 内容指纹读取源文件开头与结尾的字节数
+
+# 内存管理水位线 (占总量的比例)
+MEMORY_RAM_HIGH_WATERMARK = 0.80  # 超过时执行 gc.collect()
+MEMORY_RAM_CRITICAL_WATERMARK = 0.90  # 回收后仍超过时缩小预读深度/Batch Size
+MEMORY_VRAM_HIGH_WATERMARK = 0.80  # 超过时释放 PyTorch 显存缓存
+MEMORY_VRAM_CRITICAL_WATERMARK = 0.92
+
+# 本地推理服务相关常量
+INFERENCE_SERVICE_HOST = "127.0.0.1"
+INFERENCE_SERVICE_PORT = 47321
+INFERENCE_SERVICE_MAX_WAIT = 0.05  # 合并请求时等待凑批的最长时间，单位：秒
+
 # 界面相关常量
 PADDING = 10
 BUTTON_WIDTH = 14
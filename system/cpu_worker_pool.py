@@ -0,0 +1,310 @@
+# system/cpu_worker_pool.py
+"""
+CPU多进程推理模块 - 面向无CUDA设备的笔记本/工作站。
+
+每个工作进程持有独立的模型副本，绑定固定数量的计算线程 (并尽量绑定CPU核心)，
+并只消费属于自己的任务分片。主进程解码+预处理后的图像通过共享内存传递，避免pickle大数组。
+"""
+
+import os
+import itertools
+import logging
+import threading
+import concurrent.futures
+import multiprocessing
+from multiprocessing import shared_memory
+from typing import Dict, Any, List, Optional, Tuple, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def _available_cpus() -> List[int]:
+    """获取当前进程可用的CPU编号列表"""
+    if hasattr(os, "sched_getaffinity"):
+        try:
+            return sorted(os.sched_getaffinity(0))
+        except Exception:
+            pass
+    return list(range(os.cpu_count() or 1))
+
+
+def auto_tune_workers(cpu_count: Optional[int] = None) -> Tuple[int, int]:
+    """根据核心数自动确定 (工作进程数, 每进程线程数)
+
+    小核心数机器上多进程的内存开销得不偿失，直接使用单进程多线程；
+    核心较多时每个进程使用 2~4 个线程，以进程数换取近线性的吞吐扩展。
+    """
+    cores = cpu_count if cpu_count else len(_available_cpus())
+    if cores <= 4:
+        return 1, max(1, cores)
+    threads_per_worker = 4 if cores >= 16 else 2
+    return max(1, cores // threads_per_worker), threads_per_worker
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """附加到主进程创建的共享内存 (子进程不参与其生命周期管理)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 不支持 track 参数
+        return shared_memory.SharedMemory(name=name)
+
+
+def _empty_result() -> Dict[str, Any]:
+    return {'物种名称': "", '物种数量': "", '最低置信度': None, 'detection_info': None}
+
+
+def _worker_main(worker_id: int, model_path: str, cls_model_path: Optional[str], backend: str,
+                 cls_int8: bool, cls_gate: Optional[dict], num_threads: int, cpu_ids: List[int],
+                 task_queue, result_queue) -> None:
+    """工作进程入口：加载模型后循环处理属于自己分片的任务
+
+    cls_gate 为主进程分类门控的 to_dict()，保证与单进程推理使用相同的门控阈值。
+    """
+    # 必须在导入 torch 之前限制线程数
+    for env_key in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[env_key] = str(num_threads)
+    if cpu_ids and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpu_ids)
+        except Exception:
+            pass
+
+    try:
+        import gc
+        import cv2
+        import numpy as np
+        import torch
+        torch.set_num_threads(num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass
+        cv2.setNumThreads(1)
+
+        from system.image_processor import ImageProcessor
+        from system.inference_service import serialize_batch_results
+        from system.classifier_gate import ClassifierGate
+        from system.memory_governor import MemoryGovernor
+
+        processor = ImageProcessor(model_path, backend=backend, cls_int8=cls_int8)
+        if not processor.model:
+            raise RuntimeError(f"加载检测模型失败: {model_path}")
+        if cls_model_path:
+            processor.load_cls_model(cls_model_path)
+        if cls_gate:
+            processor.cls_gate = ClassifierGate.from_dict(cls_gate)
+        governor = MemoryGovernor()
+    except Exception as e:
+        result_queue.put(('ready', worker_id, str(e)))
+        return
+
+    result_queue.put(('ready', worker_id, None))
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        task_id, shm_name, frames_meta, valid_indices, img_paths, params = task
+        if processor.cls_gate is not None:
+            processor.cls_gate.reset_stats()
+        try:
+            shm = _attach_shared_memory(shm_name)
+            try:
+                processed_imgs = [
+                    np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                    for offset, shape in frames_meta
+                ]
+                original_imgs_rgb = [cv2.cvtColor(img, cv2.COLOR_BGR2RGB) for img in processed_imgs]
+                batch_results = processor.detect_batch_species(
+                    img_paths, preloaded_data=(valid_indices, processed_imgs, original_imgs_rgb), **params
+                )
+                serialized = serialize_batch_results(processor, batch_results)
+                # 结果对象引用了共享内存视图，关闭共享内存前必须释放
+                del batch_results, processed_imgs, original_imgs_rgb
+            finally:
+                try:
+                    shm.close()
+                except BufferError:
+                    # 仍有循环引用持有共享内存视图时才需要完整回收
+                    gc.collect()
+                    shm.close()
+            gate_stats = dict(processor.cls_gate.stats) if processor.cls_gate is not None else None
+            result_queue.put(('result', task_id, serialized, None, gate_stats))
+        except Exception as e:
+            result_queue.put(('result', task_id, None, str(e), None))
+        # 只有超过内存水位线时才执行 gc.collect()
+        governor.relieve()
+
+
+class CPUWorkerPool:
+    """CPU多进程推理池"""
+
+    def __init__(self, model_path: str, cls_model_path: Optional[str] = None,
+                 preload_fn: Optional[Callable[[List[str]], Optional[Tuple]]] = None,
+                 num_workers: Optional[int] = None, threads_per_worker: Optional[int] = None,
+                 backend: str = "pytorch", cls_int8: bool = False, cls_gate=None):
+        auto_workers, auto_threads = auto_tune_workers()
+        self.model_path = model_path
+        self.cls_model_path = cls_model_path
+        self.backend = backend
+        self.cls_int8 = cls_int8
+        # 主进程的分类门控：阈值下发到各工作进程，各进程的跳过统计汇总回这里
+        self.cls_gate = cls_gate
+        self.preload_fn = preload_fn
+        self.num_workers = max(1, int(num_workers or auto_workers))
+        self.threads_per_worker = max(1, int(threads_per_worker or auto_threads))
+
+        self._ctx = multiprocessing.get_context("spawn")
+        self._processes = []
+        self._task_queues = []
+        self._result_queue = None
+        self._pending: Dict[int, Tuple[concurrent.futures.Future, shared_memory.SharedMemory]] = {}
+        self._pending_lock = threading.Lock()
+        self._task_ids = itertools.count()
+        self._shard_cycle = None
+        self._collector = None
+        self._closed = False
+        # 解码与写入共享内存在主进程的线程中进行，与推理重叠
+        self._submit_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+
+    def start(self, timeout: float = 300.0) -> None:
+        """启动所有工作进程并等待模型加载完成"""
+        cpus = _available_cpus()
+        self._result_queue = self._ctx.Queue()
+        gate_settings = self.cls_gate.to_dict() if self.cls_gate is not None else None
+        for worker_id in range(self.num_workers):
+            cpu_ids = cpus[worker_id * self.threads_per_worker:(worker_id + 1) * self.threads_per_worker]
+            task_queue = self._ctx.Queue()
+            process = self._ctx.Process(
+                target=_worker_main,
+                args=(worker_id, self.model_path, self.cls_model_path, self.backend, self.cls_int8,
+                      gate_settings, self.threads_per_worker, cpu_ids, task_queue, self._result_queue),
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+            self._task_queues.append(task_queue)
+
+        errors = []
+        for _ in range(self.num_workers):
+            kind, worker_id, error = self._result_queue.get(timeout=timeout)
+            if error:
+                errors.append(f"worker {worker_id}: {error}")
+        if errors:
+            self.close()
+            raise RuntimeError("CPU推理进程启动失败: " + "; ".join(errors))
+
+        self._shard_cycle = itertools.cycle(range(self.num_workers))
+        self._collector = threading.Thread(target=self._collect_results, name="CPUPoolCollector", daemon=True)
+        self._collector.start()
+        logger.info(f"CPU推理池已启动: {self.num_workers} 进程 x {self.threads_per_worker} 线程")
+
+    def submit(self, img_paths: List[str], params: Dict[str, Any]) -> concurrent.futures.Future:
+        """提交一个批次，返回在结果就绪时完成的 Future"""
+        future = concurrent.futures.Future()
+        self._submit_executor.submit(self._dispatch, future, list(img_paths), dict(params))
+        return future
+
+    def detect_batch(self, img_paths: List[str], **params) -> List[Dict[str, Any]]:
+        """同步批量检测"""
+        return self.submit(img_paths, params).result()
+
+    def _dispatch(self, future: concurrent.futures.Future, img_paths: List[str], params: Dict[str, Any]) -> None:
+        """解码预处理图像、写入共享内存并投递到下一个工作进程分片"""
+        try:
+            preloaded = self.preload_fn(img_paths) if self.preload_fn else None
+            if not preloaded:
+                future.set_result([_empty_result() for _ in img_paths])
+                return
+
+            valid_indices, processed_imgs, _ = preloaded
+            total_bytes = sum(img.nbytes for img in processed_imgs)
+            shm = shared_memory.SharedMemory(create=True, size=max(1, total_bytes))
+
+            frames_meta = []
+            offset = 0
+            view = None
+            import numpy as np
+            for img in processed_imgs:
+                view = np.ndarray(img.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+                view[...] = img
+                frames_meta.append((offset, img.shape))
+                offset += img.nbytes
+            del view, preloaded, processed_imgs
+
+            task_id = next(self._task_ids)
+            with self._pending_lock:
+                self._pending[task_id] = (future, shm)
+            worker_id = next(self._shard_cycle)
+            self._task_queues[worker_id].put((task_id, shm.name, frames_meta, valid_indices, img_paths, params))
+        except Exception as e:
+            logger.error(f"提交CPU推理任务失败: {e}")
+            if not future.done():
+                future.set_exception(e)
+
+    def _release(self, task_id: int) -> Optional[concurrent.futures.Future]:
+        with self._pending_lock:
+            entry = self._pending.pop(task_id, None)
+        if entry is None:
+            return None
+        future, shm = entry
+        try:
+            shm.close()
+            shm.unlink()
+        except Exception as e:
+            logger.warning(f"释放共享内存失败: {e}")
+        return future
+
+    def _collect_results(self) -> None:
+        import queue
+        while not self._closed:
+            try:
+                message = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                if any(not p.is_alive() for p in self._processes) and not self._closed:
+                    self._fail_pending("CPU推理进程意外退出")
+                continue
+            except (EOFError, OSError):
+                break
+
+            if message[0] != 'result':
+                continue
+            _, task_id, results, error, gate_stats = message
+            if gate_stats and self.cls_gate is not None:
+                for key, value in gate_stats.items():
+                    self.cls_gate.stats[key] = self.cls_gate.stats.get(key, 0) + value
+            future = self._release(task_id)
+            if future is None:
+                continue
+            if error:
+                future.set_exception(RuntimeError(error))
+            else:
+                future.set_result(results)
+
+    def _fail_pending(self, reason: str) -> None:
+        with self._pending_lock:
+            task_ids = list(self._pending.keys())
+        for task_id in task_ids:
+            future = self._release(task_id)
+            if future is not None and not future.done():
+                future.set_exception(RuntimeError(reason))
+
+    def close(self) -> None:
+        """停止所有工作进程并释放共享内存"""
+        if self._closed:
+            return
+        self._closed = True
+        self._submit_executor.shutdown(wait=False, cancel_futures=True)
+        for task_queue in self._task_queues:
+            try:
+                task_queue.put(None)
+            except Exception:
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self._fail_pending("CPU推理池已关闭")
+        logger.info("CPU推理池已关闭")
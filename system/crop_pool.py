@@ -0,0 +1,231 @@
+# system/crop_pool.py
+"""
+分类裁剪池模块 - 跨检测批次累积分类裁剪，凑满目标数量 (或最早的批次等待超时) 后再统一运行分类模型，
+使分类模型每次的输入数量稳定，不再随每批图片中的目标数量 (0 ~ 数十个) 大幅波动。
+
+分类结果按 (批次, 图片, 检测框) 映射回对应的检测记录；一个批次的全部裁剪都完成分类后才汇总并返回，
+调用方随后再写入JSON，返回顺序与提交顺序一致。
+"""
+
+import time
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from system.config import CLS_POOL_TARGET_BATCH, CLS_POOL_MAX_LATENCY
+from system.autotune import is_oom_error, release_memory
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingBatch:
+    """已完成检测、等待分类的批次"""
+
+    __slots__ = ('key', 'img_count', 'valid_indices', 'det_records', 'cls_inputs', 'crop_map_info',
+                 'probs', 'name_table', 'next_crop', 'classified', 'busy', 'created')
+
+    def __init__(self, key, img_count, valid_indices, det_records, cls_inputs, crop_map_info, busy):
+        self.key = key
+        self.img_count = img_count
+        self.valid_indices = valid_indices
+        self.det_records = det_records
+        self.cls_inputs = cls_inputs
+        self.crop_map_info = crop_map_info
+        self.probs = []  # 已分类部分的概率矩阵 (按裁剪顺序)
+        self.name_table = None
+        self.next_crop = 0  # 下一个尚未送入分类模型的裁剪
+        self.classified = 0
+        self.busy = busy  # 该批次占用的计算时间 (检测 + 按裁剪数分摊的分类耗时)，单位：秒
+        self.created = time.monotonic()
+
+    @property
+    def num_crops(self) -> int:
+        return len(self.crop_map_info)
+
+    @property
+    def done(self) -> bool:
+        return self.classified >= self.num_crops
+
+
+class CropPool:
+    """跨批次的分类裁剪池
+
+    用法：
+        pool = CropPool(processor, detect_params)
+        for paths in batches:
+            for key, batch_results, busy in pool.submit(key, paths, preloaded_data):
+                ...  # 与 detect_batch_species 的返回值相同
+        for key, batch_results, busy in pool.flush():
+            ...
+    """
+
+    def __init__(self, processor, detect_params: Dict[str, Any], target_batch: int = CLS_POOL_TARGET_BATCH,
+                 max_latency: float = CLS_POOL_MAX_LATENCY):
+        self.processor = processor
+        self.detect_params = dict(detect_params)
+        self.use_fp16 = processor._check_cuda(self.detect_params.get('use_fp16', False))
+        self.target_batch = max(1, int(target_batch))
+        self.max_latency = max_latency
+        self._pending = deque()
+        self._queued = 0  # 尚未分类的裁剪数量
+        self.stats = {'cls_calls': 0, 'crops': 0}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def submit(self, key: Any, img_paths: List[str],
+               preloaded_data: Optional[Tuple] = None) -> List[Tuple[Any, List[Dict[str, Any]], float]]:
+        """检测一批图片并把裁剪放入池中，返回已全部完成的批次 [(key, batch_results, busy_seconds)]
+
+        只有检测阶段的异常 (如内存/显存不足) 会抛出，此时该批次尚未进入池中，由调用方缩小批次后重试。
+        """
+        start = time.perf_counter()
+        try:
+            staged = self.processor.detect_stage(img_paths, preloaded_data=preloaded_data, **self.detect_params)
+        except Exception as e:
+            if is_oom_error(e):
+                raise
+            logger.error(f"批量检测失败: {e}")
+            staged = None
+        busy = time.perf_counter() - start
+        if staged is None:
+            # 读取或检测失败：与 detect_batch_species 一致返回空列表
+            self._pending.append(_PendingBatch(key, 0, [], [], None, [], busy))
+        else:
+            valid_indices, det_records, cls_inputs, crop_map_info = staged
+            self._pending.append(_PendingBatch(key, len(img_paths), valid_indices, det_records,
+                                               cls_inputs, crop_map_info, busy))
+            self._queued += len(crop_map_info)
+
+        while self._queued >= self.target_batch:
+            self._classify_next(self.target_batch)
+        if self._pending and time.monotonic() - self._pending[0].created >= self.max_latency:
+            self._classify_all()
+        return self._pop_completed()
+
+    def flush(self) -> List[Tuple[Any, List[Dict[str, Any]], float]]:
+        """对池中剩余的裁剪全部分类，返回所有批次"""
+        self._classify_all()
+        return self._pop_completed()
+
+    def _classify_all(self) -> None:
+        while self._queued > 0:
+            self._classify_next(min(self._queued, self.target_batch))
+
+    def _take_chunk(self, size: int) -> List[Tuple[_PendingBatch, int, int]]:
+        """按提交顺序取出最多 size 个待分类裁剪，返回 [(批次, 起始, 结束)]，不混合张量与数组两种输入"""
+        parts = []
+        taken = 0
+        is_tensor = None
+        for batch in self._pending:
+            remaining = batch.num_crops - batch.next_crop
+            if remaining <= 0:
+                continue
+            batch_is_tensor = isinstance(batch.cls_inputs, torch.Tensor)
+            if is_tensor is not None and batch_is_tensor != is_tensor:
+                break
+            is_tensor = batch_is_tensor
+            count = min(remaining, size - taken)
+            parts.append((batch, batch.next_crop, batch.next_crop + count))
+            taken += count
+            if taken >= size:
+                break
+        return parts
+
+    def _classify_next(self, size: int) -> None:
+        parts = self._take_chunk(size)
+        if not parts:
+            self._queued = 0
+            return
+        if isinstance(parts[0][0].cls_inputs, torch.Tensor):
+            inputs = torch.cat([batch.cls_inputs[lo:hi] for batch, lo, hi in parts])
+        else:
+            inputs = [crop for batch, lo, hi in parts for crop in batch.cls_inputs[lo:hi]]
+
+        start = time.perf_counter()
+        try:
+            prob_matrix, name_table = self._classify(inputs)
+        except Exception as e:
+            classified = self._classify_numpy_fallback(parts, inputs, e)
+            if classified is None:
+                # 分类失败 (含拆分到单个裁剪仍内存不足) 的批次只保留检测结果，避免同一组裁剪反复失败阻塞后续批次
+                for batch, _, _ in parts:
+                    self._queued -= batch.num_crops - batch.next_crop
+                    batch.crop_map_info, batch.probs, batch.cls_inputs = [], [], None
+                    batch.next_crop = batch.classified = 0
+                return
+            prob_matrix, name_table = classified
+        elapsed = time.perf_counter() - start
+        del inputs
+        self.stats['cls_calls'] += 1
+        self.stats['crops'] += prob_matrix.shape[0]
+
+        offset = 0
+        total = prob_matrix.shape[0]
+        for batch, lo, hi in parts:
+            count = hi - lo
+            batch.probs.append(prob_matrix[offset:offset + count])
+            batch.name_table = name_table
+            batch.next_crop = hi
+            batch.classified = hi
+            batch.busy += elapsed * count / total
+            offset += count
+            self._queued -= count
+            if batch.done:
+                batch.cls_inputs = None  # 裁剪已用完，尽早释放
+
+    def _classify_numpy_fallback(self, parts: List[Tuple[_PendingBatch, int, int]], inputs,
+                                 error: Exception) -> Optional[Tuple[torch.Tensor, Any]]:
+        """设备端裁剪的张量输入分类失败时，与 detect_batch_species 一样改用CPU裁剪 (NumPy 数组) 重试
+
+        池中只保留裁剪、不保留原图，因此把所有待分类批次的张量裁剪转换为CPU裁剪的格式，
+        此后的批次也由处理器直接提取CPU裁剪。重试仍失败时返回 None。
+        """
+        if not isinstance(inputs, torch.Tensor) or is_oom_error(error):
+            logger.error(f"裁剪池分类失败，相关批次仅使用检测结果: {error}")
+            return None
+        logger.warning(f"分类模型不支持设备端裁剪输入，改用CPU裁剪: {error}")
+        self.processor.device_crops = False
+        for batch in self._pending:
+            if isinstance(batch.cls_inputs, torch.Tensor):
+                batch.cls_inputs = self._tensor_crops_to_numpy(batch.cls_inputs)
+        try:
+            return self._classify([crop for batch, lo, hi in parts for crop in batch.cls_inputs[lo:hi]])
+        except Exception as e:
+            logger.error(f"裁剪池分类失败 (CPU裁剪)，相关批次仅使用检测结果: {e}")
+            return None
+
+    @staticmethod
+    def _tensor_crops_to_numpy(crops: torch.Tensor) -> List[np.ndarray]:
+        """把设备端裁剪 (N, 3, S, S，取值 0~1，BGR 通道) 转为 _extract_crops_numpy 的格式 (S, S, 3 的 uint8 RGB 数组)"""
+        arrays = crops.flip(1).mul(255).round_().clamp_(0, 255).byte().permute(0, 2, 3, 1).cpu().numpy()
+        return list(arrays)
+
+    def _classify(self, inputs) -> Tuple[torch.Tensor, Any]:
+        """运行分类模型；显存/内存不足时把这一组裁剪对半拆开重试"""
+        try:
+            return self.processor.classify_inputs(inputs, self.use_fp16)
+        except Exception as e:
+            if not is_oom_error(e) or len(inputs) <= 1:
+                raise
+            release_memory()
+            logger.warning(f"分类时内存不足 ({len(inputs)} 个裁剪)，拆分后重试")
+            half = len(inputs) // 2
+            first, name_table = self._classify(inputs[:half])
+            second, _ = self._classify(inputs[half:])
+            return torch.cat([first, second]), name_table
+
+    def _pop_completed(self) -> List[Tuple[Any, List[Dict[str, Any]], float]]:
+        """按提交顺序取出已完成分类的批次，并汇总为与 detect_batch_species 相同的结果"""
+        completed = []
+        while self._pending and self._pending[0].done:
+            batch = self._pending.popleft()
+            if batch.probs:
+                self.processor.apply_cls_probs(batch.det_records, batch.crop_map_info,
+                                               torch.cat(batch.probs), batch.name_table)
+            results = self.processor.summarize_batch(batch.img_count, batch.valid_indices, batch.det_records)
+            completed.append((batch.key, results, batch.busy))
+        return completed
@@ -0,0 +1,249 @@
+# system/deployments.py
+"""
+相机布设模块 - 按相机 (布设) 分组计算工作天数、独立探测与相机工作日 (trap-nights)，
+多台相机的数据可以一次处理，不必再按相机分别导出。
+
+    1. 相机编号优先取 EXIF 中的相机型号+序列号；没有序列号的记录 (如视频) 在样地内只有一台
+       有序列号的相机时归入该相机，否则使用样地 (源文件夹名)；
+    2. 布设表每台相机一行：开始/结束日期默认取该相机最早/最晚的拍摄日期，
+       源文件夹中存在 deployments.csv (列：相机编号, 开始日期, 结束日期) 时以其为准；
+    3. 工作天数、独立探测、相机工作日均按相机分组做向量化计算 (排序 + 组内差分)，
+       只有一台相机时结果与原先按整个文件夹计算的结果一致。
+"""
+
+import os
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from system.config import INDEPENDENT_DETECTION_THRESHOLD
+from system.independent_detection import INDEPENDENT_FLAG, capture_time, detected_species
+
+logger = logging.getLogger(__name__)
+
+CAMERA_FIELD = '相机编号'
+DEPLOYMENT_FILE_NAME = 'deployments.csv'
+DEPLOYMENT_SHEET_NAME = '相机布设'  # Excel 工作表名 / CSV 文件名后缀
+DEPLOYMENT_TABLE_NAME = 'deployments'  # Parquet 表名
+UNKNOWN_CAMERA = '未知相机'
+DEPLOYMENT_COLUMNS = ['相机编号', '样地', '相机型号', '开始日期', '结束日期', '相机工作日',
+                      '照片数', '有效照片数', '独立探测数']
+# Parquet 导出使用的英文列名
+DEPLOYMENT_PARQUET_COLUMNS = {
+    '相机编号': 'camera_id', '相机型号': 'camera_model', '开始日期': 'start_date', '结束日期': 'end_date',
+    '相机工作日': 'trap_nights', '照片数': 'photos', '有效照片数': 'valid_photos', '独立探测数': 'independent_detections',
+}
+
+
+def serial_camera(info: Dict[str, Any]) -> Optional[str]:
+    """EXIF 相机型号+序列号，没有序列号时为 None"""
+    serial = str(info.get('相机序列号') or '').strip()
+    if not serial:
+        return None
+    model = str(info.get('相机型号') or '').strip()
+    return f"{model}-{serial}" if model else serial
+
+
+def camera_id(info: Dict[str, Any], site: str = '', default: Optional[str] = None) -> str:
+    """记录所属相机：EXIF 相机型号+序列号，否则为 default (样地所属相机) 或样地名"""
+    return serial_camera(info) or default or site or UNKNOWN_CAMERA
+
+
+class CameraResolver:
+    """
+    info -> 相机编号 (已写入相机编号的记录直接使用)，供独立探测引擎与布设表按相机分组。
+    没有序列号的记录：样地内只有一台有序列号的相机时归入该相机 (同一台相机的照片与视频)，
+    否则归入样地。observe 随记录到达更新，归属改变时返回 True，调用方需重新分组。
+    """
+
+    def __init__(self, site: str = '', image_info_list: Iterable[Dict[str, Any]] = ()):
+        self.site = site
+        self._serials: Set[str] = set()
+        self.reset(image_info_list)
+
+    def reset(self, image_info_list: Iterable[Dict[str, Any]]) -> None:
+        self._serials = {camera for camera in map(serial_camera, image_info_list) if camera}
+
+    @property
+    def default(self) -> str:
+        """没有序列号的记录所属的相机"""
+        if len(self._serials) == 1:
+            return next(iter(self._serials))
+        return self.site or UNKNOWN_CAMERA
+
+    def observe(self, info: Dict[str, Any]) -> bool:
+        camera = serial_camera(info)
+        if camera is None or camera in self._serials:
+            return False
+        before = self.default
+        self._serials.add(camera)
+        return self.default != before
+
+    def __call__(self, info: Dict[str, Any]) -> str:
+        return info.get(CAMERA_FIELD) or camera_id(info, self.site, self.default)
+
+
+def camera_resolver(site: str = '', image_info_list: Iterable[Dict[str, Any]] = ()) -> CameraResolver:
+    """按样地 (及已有记录) 构造相机编号解析器"""
+    return CameraResolver(site, image_info_list)
+
+
+def assign_cameras(image_info_list: List[Dict[str, Any]], site: str = '') -> None:
+    """为记录写入相机编号 (已有编号的记录保持不变)"""
+    resolve = camera_resolver(site, image_info_list)
+    for info in image_info_list:
+        if not info.get(CAMERA_FIELD):
+            info[CAMERA_FIELD] = resolve(info)
+
+
+def load_deployment_overrides(source_dir: Optional[str]) -> Optional[pd.DataFrame]:
+    """读取源文件夹中的 deployments.csv，返回 相机编号/开始日期/结束日期 三列 (日期为 datetime64[D])"""
+    if not source_dir:
+        return None
+    path = os.path.join(source_dir, DEPLOYMENT_FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        table = pd.read_csv(path, encoding='utf-8-sig', dtype={CAMERA_FIELD: str})
+        if CAMERA_FIELD not in table.columns:
+            logger.warning(f"布设表 {path} 缺少 '{CAMERA_FIELD}' 列，已忽略")
+            return None
+        result = pd.DataFrame({CAMERA_FIELD: table[CAMERA_FIELD].astype(str).str.strip()})
+        for col in ('开始日期', '结束日期'):
+            values = table[col] if col in table.columns else pd.Series([None] * len(table))
+            result[col] = pd.to_datetime(values, errors='coerce').dt.normalize()
+        logger.info(f"已加载布设表: {path} ({len(result)} 台相机)")
+        return result.drop_duplicates(CAMERA_FIELD, keep='last')
+    except Exception as e:
+        logger.error(f"读取布设表失败: {e}")
+        return None
+
+
+def _record_frame(image_info_list: List[Dict[str, Any]], site: str) -> pd.DataFrame:
+    """每条记录一行：相机编号、拍摄时间 (datetime64)"""
+    resolve = camera_resolver(site, image_info_list)
+    cameras = [resolve(info) for info in image_info_list]
+    times = [capture_time(info) for info in image_info_list]
+    return pd.DataFrame({
+        'camera': pd.Series(cameras, dtype=object),
+        'time': pd.to_datetime(pd.Series(times, dtype=object), errors='coerce'),
+    })
+
+
+def independent_events(image_info_list: List[Dict[str, Any]], confidence_settings: Dict[str, float],
+                       min_frame_ratio: float = 0.0, threshold_seconds: float = INDEPENDENT_DETECTION_THRESHOLD,
+                       site: str = '') -> pd.DataFrame:
+    """
+    按 (相机, 物种) 分组向量化计算独立探测：组内按 (拍摄时间, 列表顺序) 排序，
+    组内第一条或与上一条间隔超过阈值即为独立探测。
+    返回 (记录, 物种) 一行的长表：rec, camera, species, time, independent (已按上述顺序排序)。
+    """
+    records = _record_frame(image_info_list, site)
+    timed = records['time'].notna().to_numpy()
+
+    rec_idx, species = [], []
+    for i in np.nonzero(timed)[0].tolist():
+        for name in detected_species(image_info_list[i], confidence_settings, min_frame_ratio):
+            rec_idx.append(i)
+            species.append(name)
+
+    rec_idx = np.asarray(rec_idx, dtype=np.int64)
+    long_df = pd.DataFrame({
+        'rec': rec_idx,
+        'camera': records['camera'].to_numpy()[rec_idx],
+        'species': pd.Series(species, dtype=object),
+        'time': records['time'].to_numpy()[rec_idx],
+    }).sort_values(['camera', 'species', 'time', 'rec'], kind='mergesort', ignore_index=True)
+
+    camera = long_df['camera'].to_numpy()
+    name = long_df['species'].to_numpy()
+    times = long_df['time'].to_numpy()
+    new_group = np.ones(len(long_df), dtype=bool)
+    new_group[1:] = (camera[1:] != camera[:-1]) | (name[1:] != name[:-1])
+    gap = np.zeros(len(long_df), dtype=np.float64)
+    gap[1:] = (times[1:] - times[:-1]) / np.timedelta64(1, 's')
+    long_df['independent'] = new_group | (gap > threshold_seconds)
+    return long_df
+
+
+def independent_flags(image_info_list: List[Dict[str, Any]], confidence_settings: Dict[str, float],
+                      min_frame_ratio: float = 0.0, threshold_seconds: float = INDEPENDENT_DETECTION_THRESHOLD,
+                      site: str = '') -> np.ndarray:
+    """每条记录的独立探测标记 (任一物种为独立探测即为 '是')，没有拍摄时间的记录为 None"""
+    events = independent_events(image_info_list, confidence_settings, min_frame_ratio, threshold_seconds, site)
+    timed = np.array([capture_time(info) is not None for info in image_info_list], dtype=bool)
+    flags = np.where(timed, '', None).astype(object)
+    independent_recs = np.unique(events['rec'].to_numpy()[events['independent'].to_numpy()])
+    flags[independent_recs] = INDEPENDENT_FLAG
+    return flags
+
+
+def build_deployment_table(image_info_list: List[Dict[str, Any]], site: str = '',
+                           overrides: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """按相机汇总布设信息 (开始/结束日期、相机工作日、照片数、独立探测数)"""
+    records = _record_frame(image_info_list, site)
+    records['date'] = records['time'].dt.normalize()
+    records['valid'] = [str(info.get('物种名称') or '') not in ('', '空') for info in image_info_list]
+    records['independent'] = [info.get('独立探测首只') == INDEPENDENT_FLAG for info in image_info_list]
+    records['model'] = [info.get('相机型号') or '' for info in image_info_list]
+
+    grouped = records.groupby('camera', sort=True)
+    table = pd.DataFrame({
+        '开始日期': grouped['date'].min(),
+        '结束日期': grouped['date'].max(),
+        '照片数': grouped.size(),
+        '有效照片数': grouped['valid'].sum(),
+        '独立探测数': grouped['independent'].sum(),
+        '相机型号': grouped['model'].max(),
+    })
+    table.index.name = CAMERA_FIELD
+    table = table.reset_index()
+
+    if overrides is not None and not overrides.empty:
+        merged = table.merge(overrides, on=CAMERA_FIELD, how='outer', suffixes=('', '_布设表'))
+        for col in ('开始日期', '结束日期'):
+            merged[col] = merged[f'{col}_布设表'].fillna(merged[col])
+        table = merged.drop(columns=['开始日期_布设表', '结束日期_布设表'])
+        for col in ('照片数', '有效照片数', '独立探测数'):
+            table[col] = table[col].fillna(0).astype(np.int64)
+        table['相机型号'] = table['相机型号'].fillna('')
+
+    table['样地'] = site
+    days = (table['结束日期'] - table['开始日期']).dt.days + 1
+    table['相机工作日'] = days.astype('Int64')
+    return table[DEPLOYMENT_COLUMNS]
+
+
+def apply_working_days(image_info_list: List[Dict[str, Any]], deployments: pd.DataFrame, site: str = '') -> None:
+    """按所属相机的布设开始日期写入每条记录的工作天数"""
+    if not image_info_list or deployments is None or deployments.empty:
+        return
+    records = _record_frame(image_info_list, site)
+    starts = deployments.set_index(CAMERA_FIELD)['开始日期']
+    start = records['camera'].map(starts)
+    days = (records['time'].dt.normalize() - pd.to_datetime(start)).dt.days + 1
+    valid = days.notna().to_numpy()
+    values = days.to_numpy()
+    for i in np.nonzero(valid)[0].tolist():
+        image_info_list[i]['工作天数'] = int(values[i])
+
+
+def apply_deployments(image_info_list: List[Dict[str, Any]], site: str = '',
+                      source_dir: Optional[str] = None) -> pd.DataFrame:
+    """写入相机编号与按相机计算的工作天数，返回布设表 (独立探测需在此之前计算完成)"""
+    assign_cameras(image_info_list, site)
+    table = build_deployment_table(image_info_list, site, load_deployment_overrides(source_dir))
+    apply_working_days(image_info_list, table, site)
+    for col in ('开始日期', '结束日期'):
+        table[col] = table[col].dt.strftime('%Y-%m-%d')
+    cameras = len(table)
+    if cameras > 1:
+        logger.info(f"检测到 {cameras} 台相机，工作天数与独立探测按相机分别计算")
+    return table
+
+
+def parquet_deployment_table(deployments: pd.DataFrame) -> pd.DataFrame:
+    """布设表转换为 Parquet 列名 (样地列由分区给出)"""
+    return deployments.drop(columns=['样地']).rename(columns=DEPLOYMENT_PARQUET_COLUMNS)
@@ -0,0 +1,74 @@
+# system/detection_record.py
+"""
+轻量检测结果模块 - 推理后立即把 ultralytics Results 转换为只包含检测框数组的记录，
+不再持有原图 (orig_img) 和 GPU/CPU 张量，批次结束后图像内存即可被释放。
+"""
+
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+
+class DetectionRecord:
+    """单张图片的检测结果
+
+    xyxy: (N, 4) float32 检测框；cls: (N,) float32 类别ID (与 Results.boxes.cls 保持一致)；
+    conf: (N,) float32 置信度；candidates: {框索引: 分类候选列表}；
+    gated: 启用分类门控时为 (N,) bool，True 表示该框被门控跳过分类；未启用门控时为 None；
+    names: 模型的类别名称字典 (直接引用模型的同一个字典对象，不做复制)；
+    source_shape: 检测输入是缩小后的缓存帧时为原图的 (高, 宽)，汇总前由 restore_source_coords 映射回原图坐标。
+    """
+
+    __slots__ = ('xyxy', 'cls', 'conf', 'candidates', 'names', 'orig_shape', 'source_shape', 'gated')
+
+    def __init__(self, xyxy: np.ndarray, cls: np.ndarray, conf: np.ndarray, names: Dict[int, str],
+                 orig_shape: Tuple[int, int] = (0, 0), candidates: Optional[Dict[int, List[Dict[str, Any]]]] = None):
+        self.xyxy = xyxy
+        self.cls = cls
+        self.conf = conf
+        self.names = names
+        self.orig_shape = orig_shape
+        self.candidates = candidates if candidates is not None else {}
+        self.source_shape = None
+        self.gated = None
+
+    @classmethod
+    def from_result(cls, result) -> "DetectionRecord":
+        """从 ultralytics Results 提取检测框数据 (每个数组只做一次设备到主机的拷贝)"""
+        boxes = result.boxes
+        orig_shape = tuple(result.orig_shape) if getattr(result, 'orig_shape', None) is not None else (0, 0)
+        if boxes is None or len(boxes) == 0:
+            return cls(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32),
+                       np.zeros(0, dtype=np.float32), result.names, orig_shape)
+        return cls(
+            boxes.xyxy.cpu().numpy().astype(np.float32, copy=False),
+            boxes.cls.cpu().numpy().astype(np.float32, copy=False),
+            boxes.conf.cpu().numpy().astype(np.float32, copy=False),
+            result.names,
+            orig_shape,
+        )
+
+    def restore_source_coords(self) -> None:
+        """把缓存帧坐标系下的检测框映射回原图坐标 (只执行一次)"""
+        if self.source_shape is None:
+            return
+        src_h, src_w = self.source_shape
+        frame_h, frame_w = self.orig_shape
+        if frame_h and frame_w and (src_h, src_w) != (frame_h, frame_w):
+            scale = np.array([src_w / frame_w, src_h / frame_h] * 2, dtype=np.float32)
+            self.xyxy = self.xyxy * scale
+        self.orig_shape = (src_h, src_w)
+        self.source_shape = None
+
+    def __len__(self) -> int:
+        return int(self.conf.shape[0])
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def class_id(self, index: int) -> int:
+        return int(self.cls[index])
+
+    def class_name(self, index: int) -> str:
+        """检测模型给出的原始 (英文) 类别名"""
+        return self.names.get(self.class_id(index), 'Unknown')
@@ -0,0 +1,224 @@
+# system/frame_cache.py
+"""
+预处理帧缓存模块 - 把增强 (LAB CLAHE) 并缩放到检测分辨率后的帧保存为 .npy，
+同一文件夹换检测模型或调整 NMS/置信度参数重新处理时直接内存映射读取，跳过解码与增强。
+
+    1. 缓存键由文件身份 (绝对路径、大小、修改时间) 与预处理参数 (CLAHE 参数、检测尺寸) 计算，
+       原图被修改或预处理参数变化时自动失效；
+    2. 帧按 ultralytics LetterBox 相同的方式 (同样的目标尺寸与 INTER_LINEAR 插值) 缩小，
+       检测模型看到的输入与不使用缓存时一致；原图尺寸保存在文件名中，检测框在汇总前映射回原图坐标；
+    3. 缓存总大小受配额限制，超出时按最近使用时间 (文件修改时间) 淘汰最旧的条目。
+
+缓存帧只用于检测。分类裁剪仍取自原分辨率的增强图 (检测框先映射回原图坐标)：写入缓存的运行直接使用
+刚增强的原图，命中缓存时只为包含检测框的帧重新读取原图，没有检测框的帧 (通常占大多数) 完全跳过解码与增强。
+"""
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from system.config import DETECT_IMGSZ, FRAME_CACHE_QUOTA_MB
+from system import preprocessing
+
+logger = logging.getLogger(__name__)
+
+FRAME_CACHE_DIR_NAME = "frame_cache"
+# 缓存格式版本，预处理实现变化时递增使旧缓存失效
+FRAME_CACHE_VERSION = 1
+
+
+def frame_cache_dir(settings_dir: str) -> str:
+    return os.path.join(settings_dir, FRAME_CACHE_DIR_NAME)
+
+
+class CachedFrame(np.ndarray):
+    """检测分辨率的帧
+
+    source_shape 为原图的 (高, 宽)，source_path 为原图路径；
+    source_frame 为刚增强的原分辨率帧 (仅写入缓存时保留在内存中，命中缓存时为 None)，用于提取分类裁剪。
+    """
+
+    def __array_finalize__(self, obj):
+        self.source_shape = getattr(obj, 'source_shape', None)
+        self.source_path = getattr(obj, 'source_path', None)
+        self.source_frame = getattr(obj, 'source_frame', None)
+
+
+def _as_cached_frame(frame: np.ndarray, source_shape: Tuple[int, int], source_path: Optional[str] = None,
+                     source_frame: Optional[np.ndarray] = None) -> CachedFrame:
+    view = frame.view(CachedFrame)
+    view.source_shape = (int(source_shape[0]), int(source_shape[1]))
+    view.source_path = source_path
+    view.source_frame = source_frame
+    return view
+
+
+def letterbox_size(h: int, w: int, imgsz: int = DETECT_IMGSZ) -> Tuple[int, int]:
+    """与 ultralytics LetterBox 相同的缩放后尺寸 (宽, 高)；只缩小，不放大"""
+    r = min(imgsz / h, imgsz / w)
+    if r >= 1.0:
+        return w, h
+    return int(round(w * r)), int(round(h * r))
+
+
+class FrameCache:
+    """带配额与 LRU 淘汰的预处理帧磁盘缓存 (线程安全)"""
+
+    def __init__(self, cache_dir: str, quota_mb: int = FRAME_CACHE_QUOTA_MB, imgsz: int = DETECT_IMGSZ):
+        self.cache_dir = cache_dir
+        self.quota_bytes = max(0, int(quota_mb)) * 1024 * 1024
+        self.imgsz = imgsz
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # 缓存键 -> (文件路径, 字节数)，按最近使用排序
+        self._total_bytes = 0
+        self._params = (f"v{FRAME_CACHE_VERSION}|clahe{preprocessing.CLAHE_CLIP_LIMIT}"
+                        f"x{preprocessing.CLAHE_TILE_GRID}|imgsz{imgsz}")
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self) -> None:
+        """启动时按文件修改时间重建索引"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name.split('_', 1)[0], path, st.st_size))
+        for _, key, path, size in sorted(entries):
+            self._index[key] = (path, size)
+            self._total_bytes += size
+
+    def _key(self, img_path: str) -> Optional[str]:
+        try:
+            st = os.stat(img_path)
+        except OSError:
+            return None
+        identity = f"{os.path.abspath(img_path)}|{st.st_size}|{st.st_mtime_ns}|{self._params}"
+        return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _source_shape_from_name(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            h, w = os.path.splitext(os.path.basename(path))[0].split('_', 1)[1].split('x')
+            return int(h), int(w)
+        except (IndexError, ValueError):
+            return None
+
+    def get(self, img_path: str) -> Optional[CachedFrame]:
+        """命中时返回内存映射的帧 (写时复制)，否则返回 None"""
+        key = self._key(img_path)
+        with self._lock:
+            entry = self._index.get(key) if key else None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._index.move_to_end(key)
+        path = entry[0]
+        try:
+            frame = np.load(path, mmap_mode='c')
+            source_shape = self._source_shape_from_name(path)
+            if source_shape is None or frame.ndim != 3:
+                raise ValueError("缓存文件格式不正确")
+            os.utime(path)  # 持久化最近使用时间
+        except Exception as e:
+            logger.warning(f"读取预处理缓存失败 {path}: {e}")
+            self._discard(key)
+            with self._lock:
+                self.stats['misses'] += 1
+            return None
+        with self._lock:
+            self.stats['hits'] += 1
+        return _as_cached_frame(frame, source_shape, img_path)
+
+    def put(self, img_path: str, processed: np.ndarray) -> CachedFrame:
+        """缩放到检测分辨率并写入缓存；写入失败时仍返回缩放后的帧 (附带原分辨率的 processed 供分类裁剪)"""
+        h, w = processed.shape[:2]
+        new_w, new_h = letterbox_size(h, w, self.imgsz)
+        frame = processed if (new_w, new_h) == (w, h) else cv2.resize(
+            processed, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        frame = np.ascontiguousarray(frame)
+
+        key = self._key(img_path)
+        if key and self.quota_bytes > 0:
+            path = os.path.join(self.cache_dir, f"{key}_{h}x{w}.npy")
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, frame)
+                os.replace(tmp_path, path)
+                size = os.path.getsize(path)
+                with self._lock:
+                    old = self._index.pop(key, None)
+                    if old is not None:
+                        self._total_bytes -= old[1]
+                    self._index[key] = (path, size)
+                    self._total_bytes += size
+                self._evict()
+            except Exception as e:
+                logger.warning(f"写入预处理缓存失败 {img_path}: {e}")
+                try:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                except OSError:
+                    pass
+        return _as_cached_frame(frame, (h, w), img_path, processed if frame is not processed else None)
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry is None:
+                return
+            self._total_bytes -= entry[1]
+        try:
+            os.remove(entry[0])
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        """超过配额时淘汰最久未使用的条目"""
+        removed = []
+        with self._lock:
+            while self._total_bytes > self.quota_bytes and len(self._index) > 1:
+                _, (path, size) = self._index.popitem(last=False)
+                self._total_bytes -= size
+                self.stats['evictions'] += 1
+                removed.append(path)
+        for path in removed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            paths = [path for path, _ in self._index.values()]
+            self._index.clear()
+            self._total_bytes = 0
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def size_mb(self) -> float:
+        return self._total_bytes / 1024 / 1024
+
+    def describe_stats(self) -> str:
+        hits, misses = self.stats['hits'], self.stats['misses']
+        total = hits + misses
+        ratio = hits / total if total else 0.0
+        return (f"命中 {hits}/{total} ({ratio:.1%})，淘汰 {self.stats['evictions']} 个，"
+                f"占用 {self.size_mb():.0f}/{self.quota_bytes / 1024 / 1024:.0f}MB")
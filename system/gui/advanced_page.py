@@ -23,32 +23,126 @@ from system.gui.ui_components import (
 )
 from system.utils import resource_path
 from system.config import APP_VERSION, NORMAL_FONT
+from system.inference_backend import BACKEND_LABELS, BACKEND_PYTORCH, backend_label
 
 logger = logging.getLogger(__name__)
 
 class ModelLoadWorker(QObject):
     finished = Signal(str, str)  # model_name, error_string
 
-    def __init__(self, controller, model_path, model_name):
+    def __init__(self, controller, model_path, model_name, prepare_kwargs=None):
         super().__init__()
         self.controller = controller
         self.model_path = model_path
         self.model_name = model_name
+        self.prepare_kwargs = prepare_kwargs  # 不为 None 时加载后预热模型 (model_path 为空时只预热)
 
     def run(self):
-        """加载模型并更新控制器属性。"""
+        """加载模型并更新控制器属性，然后按处理参数预热模型。"""
         try:
-            self.controller.image_processor.load_model(self.model_path)
-            self.controller.image_processor.model_path = self.model_path
-            if hasattr(self.controller, 'model_var'):
-                self.controller.model_var = self.model_name
-            else:
-                setattr(self.controller, 'model_var', self.model_name)
-            self.finished.emit(self.model_name, None)
+            if self.model_path:
+                self.controller.image_processor.load_model(self.model_path)
+                self.controller.image_processor.model_path = self.model_path
+                if hasattr(self.controller, 'model_var'):
+                    self.controller.model_var = self.model_name
+                else:
+                    setattr(self.controller, 'model_var', self.model_name)
         except Exception as e:
             logger.error(f"自动加载模型失败: {e}")
             self.finished.emit(self.model_name, str(e))
+            return
+
+        if self.prepare_kwargs is not None:
+            try:
+                self.controller.image_processor.prepare_models(**self.prepare_kwargs)
+            except Exception as e:
+                logger.warning(f"模型预热失败 (不影响处理): {e}")
+        self.finished.emit(self.model_name, None)
+
+
+class BackendSwitchWorker(QObject):
+    finished = Signal(str, str)  # backend, error_string
+
+    def __init__(self, controller, backend):
+        super().__init__()
+        self.controller = controller
+        self.backend = backend
+
+    def run(self):
+        """切换推理后端 (首次使用时导出模型，可能耗时较长)。"""
+        try:
+            self.controller.image_processor.set_backend(self.backend)
+            self.finished.emit(self.backend, None)
+        except Exception as e:
+            logger.error(f"切换推理后端失败: {e}")
+            self.finished.emit(self.backend, str(e))
+
+
+class ClsInt8Worker(QObject):
+    finished = Signal(bool, str)  # enabled, error_string
 
+    def __init__(self, controller, enabled):
+        super().__init__()
+        self.controller = controller
+        self.enabled = enabled
+
+    def run(self):
+        """启用时先尝试用当前文件夹的历史检测结果做静态量化校准，再重新加载分类模型。"""
+        try:
+            processor = self.controller.image_processor
+            if self.enabled and processor.cls_model_path:
+                from system.cls_quantization import (
+                    collect_calibration_crops, find_quantized_cls, quantize_classifier, QUANT_MODE_STATIC
+                )
+                from system.inference_backend import default_imgsz
+                imgsz = default_imgsz(processor.cls_model_path, 224)
+                if not find_quantized_cls(processor.cls_model_path, imgsz):
+                    source_dir = self.controller.start_page.get_file_path() \
+                        if hasattr(self.controller, 'start_page') else None
+                    temp_dir = self.controller.get_temp_photo_dir() \
+                        if hasattr(self.controller, 'get_temp_photo_dir') else None
+                    crops = collect_calibration_crops(source_dir, temp_dir)
+                    quantize_classifier(processor.cls_model_path, imgsz, QUANT_MODE_STATIC, crops)
+            processor.set_cls_int8(self.enabled)
+            self.finished.emit(self.enabled, None)
+        except Exception as e:
+            logger.error(f"切换INT8分类模型失败: {e}")
+            self.finished.emit(self.enabled, str(e))
+
+
+class ClsGateWorker(QObject):
+    finished = Signal(bool, str, str)  # enabled, report, error_string
+
+    def __init__(self, controller, enabled, relearn=False):
+        super().__init__()
+        self.controller = controller
+        self.enabled = enabled
+        self.relearn = relearn
+
+    def run(self):
+        """启用时加载已保存的门控阈值；与当前模型不匹配或要求重新学习时从历史检测结果学习。"""
+        try:
+            processor = self.controller.image_processor
+            if not self.enabled:
+                processor.cls_gate = None
+                self.finished.emit(False, "", None)
+                return
+
+            from system.classifier_gate import ClassifierGate, gate_file_path, iter_history_json
+            settings_dir = self.controller.settings_manager.settings_dir
+            gate_path = gate_file_path(settings_dir)
+            gate = None if self.relearn else ClassifierGate.load(gate_path)
+            if gate is None or not gate.matches(processor.model_path, processor.cls_model_path):
+                if not processor.cls_model_path:
+                    raise RuntimeError("未选择分类模型")
+                json_paths = list(iter_history_json(os.path.join(settings_dir, "photo")))
+                gate = ClassifierGate.learn(json_paths, processor.model_path, processor.cls_model_path)
+                gate.save(gate_path)
+            processor.cls_gate = gate
+            self.finished.emit(True, gate.describe_report(), None)
+        except Exception as e:
+            logger.error(f"切换分类门控失败: {e}")
+            self.finished.emit(self.enabled, "", str(e))
 
 
 class AdvancedPage(QWidget):
@@ -78,6 +172,15 @@ class AdvancedPage(QWidget):
         self.batch_size_var = 16
         self.use_augment_var = True
         self.use_agnostic_nms_var = True
+        self.use_inference_service_var = False
+        self.use_cpu_workers_var = False
+        self.inference_backend_var = BACKEND_PYTORCH
+        self.use_int8_cls_var = False
+        self.use_cls_gate_var = False
+        self.use_frame_cache_var = False
+        self.compile_models_var = False
+        self.auto_tune_var = False
+        self.autotune_profiles = {}  # {"设备|模型|尺寸": 调优结果}
         self.vid_stride_var = 1  # 默认值为1 (处理每一帧)
         self.min_frame_ratio_var = 0.0  # 默认 0%
         self.theme_var = "自动"
@@ -91,6 +194,8 @@ class AdvancedPage(QWidget):
         self.model_status_var = ""
         self.package_status_var = ""
         self.auto_sort_var = False
+        self.export_analytics_var = False
+        self.incremental_export_var = False
 
         # 存储引用以便主题更新
         self.components_to_update = []
@@ -361,6 +466,25 @@ class AdvancedPage(QWidget):
 
         accel_layout.addWidget(batch_frame)
 
+        # 自动调优开关
+        self.auto_tune_switch_row = SwitchRow("自动调优 Batch Size 与预读深度", checked=self.auto_tune_var)
+        self.auto_tune_switch_row.toggled.connect(self._on_auto_tune_changed)
+        self.components_to_update.append(self.auto_tune_switch_row)
+        accel_layout.addWidget(self.auto_tune_switch_row)
+
+        auto_tune_frame = QFrame()
+        auto_tune_layout = QHBoxLayout(auto_tune_frame)
+        auto_tune_layout.setContentsMargins(0, 0, 0, 0)
+        self.auto_tune_status_label = QLabel()
+        self.auto_tune_status_label.setStyleSheet("color: #888888; font-size: 12px;")
+        self.auto_tune_status_label.setWordWrap(True)
+        auto_tune_layout.addWidget(self.auto_tune_status_label, 1)
+        clear_tune_button = RoundedButton("清除调优结果")
+        clear_tune_button.clicked.connect(self._clear_autotune_profiles)
+        auto_tune_layout.addWidget(clear_tune_button)
+        accel_layout.addWidget(auto_tune_frame)
+        self._update_auto_tune_status()
+
         # 2. FP16 开关
         # 替换为开关行
         self.fp16_switch_row = SwitchRow("使用FP16加速 (需要支持CUDA)", checked=self.use_fp16_var)
@@ -375,6 +499,94 @@ class AdvancedPage(QWidget):
             cuda_warning.setStyleSheet("color: #e74c3c; font-size: 12px;")
             accel_layout.addWidget(cuda_warning)
 
+        # 3. 本地推理服务开关
+        self.inference_service_switch_row = SwitchRow("使用本地推理服务 (常驻模型)",
+                                                      checked=self.use_inference_service_var)
+        self.inference_service_switch_row.toggled.connect(self._on_inference_service_changed)
+        self.components_to_update.append(self.inference_service_switch_row)
+        accel_layout.addWidget(self.inference_service_switch_row)
+
+        service_explain = QLabel("需先运行 python -m system.inference_service serve，服务不可用时自动使用本地模型。")
+        service_explain.setStyleSheet("color: #888888; font-size: 12px;")
+        service_explain.setWordWrap(True)
+        accel_layout.addWidget(service_explain)
+
+        # 4. CPU多进程推理开关 (仅在无CUDA时生效)
+        from system.cpu_worker_pool import auto_tune_workers
+        workers, threads = auto_tune_workers()
+        self.cpu_workers_switch_row = SwitchRow(f"CPU多进程推理 (自动: {workers} 进程 x {threads} 线程)",
+                                                checked=self.use_cpu_workers_var)
+        self.cpu_workers_switch_row.toggled.connect(self._on_cpu_workers_changed)
+        self.components_to_update.append(self.cpu_workers_switch_row)
+        accel_layout.addWidget(self.cpu_workers_switch_row)
+
+        # 5. 推理后端
+        backend_label_widget = QLabel("推理后端:")
+        backend_label_widget.setFont(QFont("Segoe UI", 10, QFont.Weight.DemiBold))
+        accel_layout.addWidget(backend_label_widget)
+
+        self.backend_combo = ModernComboBox()
+        self.backend_combo.addItems(list(BACKEND_LABELS.keys()))
+        self.backend_combo.currentTextChanged.connect(self._on_backend_changed)
+        self.components_to_update.append(self.backend_combo)
+        accel_layout.addWidget(self.backend_combo)
+
+        self.backend_status_label = QLabel("首次切换到 ONNX Runtime / OpenVINO 时会导出模型并缓存到模型目录。")
+        self.backend_status_label.setStyleSheet("color: #888888; font-size: 12px;")
+        self.backend_status_label.setWordWrap(True)
+        accel_layout.addWidget(self.backend_status_label)
+
+        # 6. INT8 量化分类模型
+        self.int8_cls_switch_row = SwitchRow("分类模型INT8量化 (适合CPU)", checked=self.use_int8_cls_var)
+        self.int8_cls_switch_row.toggled.connect(self._on_int8_cls_changed)
+        self.components_to_update.append(self.int8_cls_switch_row)
+        accel_layout.addWidget(self.int8_cls_switch_row)
+
+        self.int8_cls_status_label = QLabel("首次启用时使用当前文件夹已有的检测结果校准，无检测结果时使用动态量化。")
+        self.int8_cls_status_label.setStyleSheet("color: #888888; font-size: 12px;")
+        self.int8_cls_status_label.setWordWrap(True)
+        accel_layout.addWidget(self.int8_cls_status_label)
+
+        # 7. 分类门控
+        self.cls_gate_switch_row = SwitchRow("分类门控 (检测结果确定时跳过分类)", checked=self.use_cls_gate_var)
+        self.cls_gate_switch_row.toggled.connect(self._on_cls_gate_changed)
+        self.components_to_update.append(self.cls_gate_switch_row)
+        accel_layout.addWidget(self.cls_gate_switch_row)
+
+        self.cls_gate_status_label = QLabel("启用时根据已处理文件夹的检测结果，按类别学习可以跳过分类的检测置信度阈值。")
+        self.cls_gate_status_label.setStyleSheet("color: #888888; font-size: 12px;")
+        self.cls_gate_status_label.setWordWrap(True)
+        accel_layout.addWidget(self.cls_gate_status_label)
+
+        self.relearn_gate_button = RoundedButton("重新学习门控阈值")
+        self.relearn_gate_button.setMinimumWidth(120)
+        self.relearn_gate_button.setEnabled(self.use_cls_gate_var)
+        self.relearn_gate_button.clicked.connect(lambda: self._start_cls_gate_worker(True, relearn=True))
+        accel_layout.addWidget(self.relearn_gate_button)
+
+        # 8. 预处理帧缓存
+        self.frame_cache_switch_row = SwitchRow("预处理帧缓存 (换模型/参数重新处理时跳过解码与增强)",
+                                                checked=self.use_frame_cache_var)
+        self.frame_cache_switch_row.toggled.connect(self._on_frame_cache_changed)
+        self.components_to_update.append(self.frame_cache_switch_row)
+        accel_layout.addWidget(self.frame_cache_switch_row)
+
+        from system.config import FRAME_CACHE_QUOTA_MB
+        frame_cache_explain = QLabel(f"增强后的帧按检测分辨率保存在 temp/frame_cache，最多占用 {FRAME_CACHE_QUOTA_MB}MB。"
+                                     "缓存只用于检测，分类裁剪仍取自原分辨率的图像，适合模型对比与参数调整。")
+        frame_cache_explain.setStyleSheet("color: #888888; font-size: 12px;")
+        frame_cache_explain.setWordWrap(True)
+        accel_layout.addWidget(frame_cache_explain)
+
+        # 9. 推理图编译
+        self.compile_models_switch_row = SwitchRow("编译推理图 (torch.compile，需要CUDA，实验性)",
+                                                   checked=self.compile_models_var)
+        self.compile_models_switch_row.switch().setEnabled(
+            self.controller.cuda_available if hasattr(self.controller, 'cuda_available') else False)
+        self.compile_models_switch_row.toggled.connect(self._on_compile_models_changed)
+        self.components_to_update.append(self.compile_models_switch_row)
+        accel_layout.addWidget(self.compile_models_switch_row)
+
         self.accel_panel.add_content_widget(accel_widget)
         content_layout.addWidget(self.accel_panel)
 
@@ -428,6 +640,177 @@ class AdvancedPage(QWidget):
         self.batch_size_var = value
         self.batch_size_label.setText(str(value))
 
+    def _on_auto_tune_changed(self, checked):
+        """自动调优开关改变"""
+        self.auto_tune_var = checked
+        self.batch_slider.setEnabled(not checked)
+        self._update_auto_tune_status()
+        self._on_setting_changed()
+
+    def _update_auto_tune_status(self):
+        """显示调优说明及已保存的调优结果数量"""
+        text = "开启后首次处理时会在前几批图片上标定 (约1分钟)，结果按设备和模型保存；内存不足时会自动重新调优。"
+        if self.autotune_profiles:
+            text += f" 已保存 {len(self.autotune_profiles)} 组调优结果。"
+        self.auto_tune_status_label.setText(text)
+
+    def _clear_autotune_profiles(self):
+        """清除所有已保存的调优结果，下次处理时重新标定"""
+        self.autotune_profiles.clear()
+        self._update_auto_tune_status()
+        self._on_setting_changed()
+
+    def _on_inference_service_changed(self, checked):
+        """本地推理服务开关改变"""
+        self.use_inference_service_var = checked
+        self._on_setting_changed()
+
+    def _on_compile_models_changed(self, checked):
+        """推理图编译开关改变：在后台重新准备模型"""
+        self.compile_models_var = checked
+        self._on_setting_changed()
+        if checked:
+            self.start_model_preparation()
+
+    def _on_export_analytics_changed(self, checked):
+        """分析表导出开关改变"""
+        self.export_analytics_var = checked
+        self._on_setting_changed()
+
+    def _on_incremental_export_changed(self, checked):
+        """增量导出开关改变"""
+        self.incremental_export_var = checked
+        self._on_setting_changed()
+
+    def _on_frame_cache_changed(self, checked):
+        """预处理帧缓存开关改变"""
+        self.use_frame_cache_var = checked
+        self._on_setting_changed()
+
+    def _on_cpu_workers_changed(self, checked):
+        """CPU多进程推理开关改变"""
+        self.use_cpu_workers_var = checked
+        self._on_setting_changed()
+
+    def _on_backend_changed(self, label):
+        """推理后端改变：在后台线程中导出/加载模型"""
+        backend = BACKEND_LABELS.get(label, BACKEND_PYTORCH)
+        if backend == self.inference_backend_var:
+            return
+        self.inference_backend_var = backend
+
+        if not hasattr(self.controller, 'image_processor') or not self.controller.image_processor:
+            self._on_setting_changed()
+            return
+
+        self.backend_status_label.setText(f"正在切换到 {label}...")
+        self.backend_combo.setEnabled(False)
+        if hasattr(self.controller, 'start_page'):
+            self.controller.start_page.set_processing_enabled(False)
+
+        self.backend_thread = QThread()
+        self.backend_worker = BackendSwitchWorker(self.controller, backend)
+        self.backend_worker.moveToThread(self.backend_thread)
+
+        self.backend_thread.started.connect(self.backend_worker.run)
+        self.backend_worker.finished.connect(self._on_backend_switched)
+        self.backend_worker.finished.connect(self.backend_thread.quit)
+        self.backend_worker.finished.connect(self.backend_worker.deleteLater)
+        self.backend_thread.finished.connect(self.backend_thread.deleteLater)
+
+        self.backend_thread.start()
+
+    def _on_backend_switched(self, backend, error_string):
+        """处理推理后端切换完成的结果"""
+        if error_string:
+            self.backend_status_label.setText(f"切换失败: {error_string}")
+        else:
+            self.backend_status_label.setText(f"已应用: {backend_label(backend)}")
+            self._on_setting_changed()
+
+        self.backend_combo.setEnabled(True)
+        if hasattr(self.controller, 'start_page'):
+            self.controller.start_page.set_processing_enabled(True)
+
+    def _on_int8_cls_changed(self, checked):
+        """INT8分类模型开关改变：在后台线程中量化/加载分类模型"""
+        if checked == self.use_int8_cls_var:
+            return
+        self.use_int8_cls_var = checked
+
+        if not hasattr(self.controller, 'image_processor') or not self.controller.image_processor:
+            self._on_setting_changed()
+            return
+
+        self.int8_cls_status_label.setText("正在量化分类模型..." if checked else "正在恢复原分类模型...")
+        self.int8_cls_switch_row.setEnabled(False)
+        if hasattr(self.controller, 'start_page'):
+            self.controller.start_page.set_processing_enabled(False)
+
+        self.int8_thread = QThread()
+        self.int8_worker = ClsInt8Worker(self.controller, checked)
+        self.int8_worker.moveToThread(self.int8_thread)
+
+        self.int8_thread.started.connect(self.int8_worker.run)
+        self.int8_worker.finished.connect(self._on_int8_cls_switched)
+        self.int8_worker.finished.connect(self.int8_thread.quit)
+        self.int8_worker.finished.connect(self.int8_worker.deleteLater)
+        self.int8_thread.finished.connect(self.int8_thread.deleteLater)
+
+        self.int8_thread.start()
+
+    def _on_int8_cls_switched(self, enabled, error_string):
+        """处理INT8分类模型切换完成的结果"""
+        if error_string:
+            self.int8_cls_status_label.setText(f"切换失败: {error_string}")
+        else:
+            self.int8_cls_status_label.setText("已启用INT8分类模型" if enabled else "已使用原分类模型")
+            self._on_setting_changed()
+
+        self.int8_cls_switch_row.setEnabled(True)
+        if hasattr(self.controller, 'start_page'):
+            self.controller.start_page.set_processing_enabled(True)
+
+    def _on_cls_gate_changed(self, checked):
+        """分类门控开关改变：在后台线程中加载/学习门控阈值"""
+        if checked == self.use_cls_gate_var:
+            return
+        self.use_cls_gate_var = checked
+        self.relearn_gate_button.setEnabled(checked)
+
+        if not hasattr(self.controller, 'image_processor') or not self.controller.image_processor:
+            self._on_setting_changed()
+            return
+        self._start_cls_gate_worker(checked)
+
+    def _start_cls_gate_worker(self, enabled, relearn=False):
+        self.cls_gate_status_label.setText("正在学习门控阈值..." if enabled else "正在关闭分类门控...")
+        self.cls_gate_switch_row.setEnabled(False)
+        self.relearn_gate_button.setEnabled(False)
+
+        self.gate_thread = QThread()
+        self.gate_worker = ClsGateWorker(self.controller, enabled, relearn)
+        self.gate_worker.moveToThread(self.gate_thread)
+
+        self.gate_thread.started.connect(self.gate_worker.run)
+        self.gate_worker.finished.connect(self._on_cls_gate_switched)
+        self.gate_worker.finished.connect(self.gate_thread.quit)
+        self.gate_worker.finished.connect(self.gate_worker.deleteLater)
+        self.gate_thread.finished.connect(self.gate_thread.deleteLater)
+
+        self.gate_thread.start()
+
+    def _on_cls_gate_switched(self, enabled, report, error_string):
+        """处理分类门控切换完成的结果"""
+        if error_string:
+            self.cls_gate_status_label.setText(f"切换失败: {error_string}")
+        else:
+            self.cls_gate_status_label.setText(report if enabled else "已关闭分类门控，所有检测框均进行分类")
+            self._on_setting_changed()
+
+        self.cls_gate_switch_row.setEnabled(True)
+        self.relearn_gate_button.setEnabled(self.use_cls_gate_var)
+
     def _create_video_settings_content(self):
         """创建视频检测设置内容"""
         content_widget = QWidget()
@@ -813,7 +1196,7 @@ class AdvancedPage(QWidget):
         export_layout.addWidget(self.select_all_checkbox, 0, 0, 1, -1)
 
         self.all_export_columns = [
-                '文件名', '格式', '拍摄日期', '拍摄时间', '工作天数',
+                '文件名', '格式', '拍摄日期', '拍摄时间', '工作天数', '相机编号',
                 '物种名称', '学名', '目名', '目拉丁名', '科名', '科拉丁名', '属名', '属拉丁名',
                 '物种类型', '物种数量', '最低置信度', '独立探测首只', '备注']
 
@@ -829,6 +1212,19 @@ class AdvancedPage(QWidget):
             col = i % columns_per_row
             export_layout.addWidget(checkbox, row, col)
 
+        # 分析表开关：导出时附加相对丰富度、活动节律、占域矩阵与活动重叠
+        self.export_analytics_switch_row = SwitchRow("同时导出分析表 (相对丰富度/活动节律/占域矩阵/活动重叠)",
+                                                     checked=self.export_analytics_var)
+        self.export_analytics_switch_row.toggled.connect(self._on_export_analytics_changed)
+        self.components_to_update.append(self.export_analytics_switch_row)
+        export_layout.addWidget(self.export_analytics_switch_row, export_layout.rowCount(), 0, 1, -1)
+
+        self.incremental_export_switch_row = SwitchRow("增量导出 (再次导出到同一文件时只更新变化的记录)",
+                                                       checked=self.incremental_export_var)
+        self.incremental_export_switch_row.toggled.connect(self._on_incremental_export_changed)
+        self.components_to_update.append(self.incremental_export_switch_row)
+        export_layout.addWidget(self.incremental_export_switch_row, export_layout.rowCount(), 0, 1, -1)
+
         self.export_settings_panel.add_content_widget(export_widget)
         content_layout.addWidget(self.export_settings_panel)
 
@@ -1012,7 +1408,7 @@ class AdvancedPage(QWidget):
 
         # 使用QThread和Worker模式
         self.thread = QThread()
-        self.worker = ModelLoadWorker(self.controller, model_path, model_name)
+        self.worker = ModelLoadWorker(self.controller, model_path, model_name, self.get_prepare_kwargs())
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.run)
@@ -1023,6 +1419,49 @@ class AdvancedPage(QWidget):
 
         self.thread.start()
 
+    def get_prepare_kwargs(self) -> dict:
+        """模型预热使用的处理参数 (与实际处理保持一致)"""
+        return {
+            'batch_size': self.batch_size_var,
+            'use_fp16': self.get_use_fp16(),
+            'augment': self.use_augment_var,
+            'compile_graph': self.compile_models_var,
+        }
+
+    def start_model_preparation(self):
+        """在后台线程中预热当前模型 (不重新加载)，期间禁用开始处理"""
+        if not getattr(getattr(self.controller, 'image_processor', None), 'model', None):
+            return
+        thread = getattr(self, 'thread', None)
+        try:
+            if thread is not None and thread.isRunning():
+                return
+        except RuntimeError:
+            pass  # 上一个线程对象已被删除
+
+        self.model_status_label.setText("正在预热模型...")
+        if hasattr(self.controller, 'start_page'):
+            self.controller.start_page.set_processing_enabled(False)
+
+        current_model = os.path.basename(self.controller.image_processor.model_path or "")
+        self.thread = QThread()
+        self.worker = ModelLoadWorker(self.controller, None, current_model, self.get_prepare_kwargs())
+        self.worker.moveToThread(self.thread)
+
+        self.thread.started.connect(self.worker.run)
+        self.worker.finished.connect(self.on_model_prepared)
+        self.worker.finished.connect(self.thread.quit)
+        self.worker.finished.connect(self.worker.deleteLater)
+        self.thread.finished.connect(self.thread.deleteLater)
+
+        self.thread.start()
+
+    def on_model_prepared(self, model_name, error_string):
+        """模型预热完成"""
+        self.model_status_label.setText(f"当前使用: {model_name}")
+        if hasattr(self.controller, 'start_page'):
+            self.controller.start_page.set_processing_enabled(True)
+
     def on_model_loaded(self, model_name, error_string):
         """处理模型加载完成的结果。"""
         if error_string:
@@ -1337,6 +1776,7 @@ class AdvancedPage(QWidget):
             self.controller.cls_model_var = model_name
             self.cls_model_status_label.setText(f"{model_name}")
             self._on_setting_changed()
+            self.start_model_preparation()
 
     def _install_python_package(self):
         """安装Python包"""
@@ -1787,6 +2227,15 @@ class AdvancedPage(QWidget):
             "batch_size": self.batch_size_var,
             "use_augment": self.augment_switch_row.isChecked(),
             "use_agnostic_nms": self.agnostic_switch_row.isChecked(),
+            "use_inference_service": self.use_inference_service_var,
+            "use_cpu_workers": self.use_cpu_workers_var,
+            "inference_backend": self.inference_backend_var,
+            "use_int8_classifier": self.use_int8_cls_var,
+            "use_cls_gate": self.use_cls_gate_var,
+            "use_frame_cache": self.use_frame_cache_var,
+            "compile_models": self.compile_models_var,
+            "auto_tune": self.auto_tune_var,
+            "autotune_profiles": self.autotune_profiles,
             "vid_stride": self.vid_stride_var,
             "video_mode": self.video_mode_combo.currentText(),
             "min_frame_ratio": self.min_frame_ratio_var,
@@ -1800,6 +2249,8 @@ class AdvancedPage(QWidget):
             "selected_model": selected_model,
             "selected_cls_model": self.cls_model_combo.currentText(),
             "export_columns": [name for name, cb in self.export_checkboxes.items() if cb.isChecked()],
+            "export_analytics": self.export_analytics_var,
+            "incremental_export": self.incremental_export_var,
         }
 
     def load_settings(self, settings):
@@ -1832,6 +2283,58 @@ class AdvancedPage(QWidget):
             self.use_agnostic_nms_var = settings["use_agnostic_nms"]
             self.agnostic_switch_row.setChecked(self.use_agnostic_nms_var)
 
+        if "use_inference_service" in settings:
+            self.use_inference_service_var = bool(settings["use_inference_service"])
+            self.inference_service_switch_row.setChecked(self.use_inference_service_var)
+
+        if "use_cpu_workers" in settings:
+            self.use_cpu_workers_var = bool(settings["use_cpu_workers"])
+            self.cpu_workers_switch_row.setChecked(self.use_cpu_workers_var)
+
+        if "inference_backend" in settings:
+            # 启动时模型已按该后端加载，这里只同步界面
+            self.inference_backend_var = settings["inference_backend"] or BACKEND_PYTORCH
+            self.backend_combo.blockSignals(True)
+            self.backend_combo.setCurrentText(backend_label(self.inference_backend_var))
+            self.backend_combo.blockSignals(False)
+
+        if "autotune_profiles" in settings and isinstance(settings["autotune_profiles"], dict):
+            self.autotune_profiles = dict(settings["autotune_profiles"])
+            self._update_auto_tune_status()
+
+        if "auto_tune" in settings:
+            self.auto_tune_var = bool(settings["auto_tune"])
+            self.auto_tune_switch_row.setChecked(self.auto_tune_var)
+            self.batch_slider.setEnabled(not self.auto_tune_var)
+
+        if "use_int8_classifier" in settings:
+            # 启动时分类模型已按该设置加载，这里只同步界面
+            self.use_int8_cls_var = bool(settings["use_int8_classifier"])
+            self.int8_cls_switch_row.blockSignals(True)
+            self.int8_cls_switch_row.setChecked(self.use_int8_cls_var)
+            self.int8_cls_switch_row.blockSignals(False)
+
+        if "use_cls_gate" in settings:
+            # 启动时门控阈值已按该设置加载，这里只同步界面
+            self.use_cls_gate_var = bool(settings["use_cls_gate"])
+            self.cls_gate_switch_row.blockSignals(True)
+            self.cls_gate_switch_row.setChecked(self.use_cls_gate_var)
+            self.cls_gate_switch_row.blockSignals(False)
+            self.relearn_gate_button.setEnabled(self.use_cls_gate_var)
+            gate = getattr(getattr(self.controller, 'image_processor', None), 'cls_gate', None)
+            if self.use_cls_gate_var and gate is not None:
+                self.cls_gate_status_label.setText(gate.describe_report())
+
+        if "compile_models" in settings:
+            self.compile_models_var = bool(settings["compile_models"])
+            self.compile_models_switch_row.blockSignals(True)
+            self.compile_models_switch_row.setChecked(self.compile_models_var)
+            self.compile_models_switch_row.blockSignals(False)
+
+        if "use_frame_cache" in settings:
+            self.use_frame_cache_var = bool(settings["use_frame_cache"])
+            self.frame_cache_switch_row.setChecked(self.use_frame_cache_var)
+
         if "vid_stride" in settings:
             self.vid_stride_var = int(settings["vid_stride"])
             self.stride_slider.setValue(self.vid_stride_var)
@@ -1892,6 +2395,14 @@ class AdvancedPage(QWidget):
                                            if self.cls_model_combo.findText(cls_model) >= 0
                                            else None)
 
+        if "export_analytics" in settings:
+            self.export_analytics_var = bool(settings["export_analytics"])
+            self.export_analytics_switch_row.setChecked(self.export_analytics_var)
+
+        if "incremental_export" in settings:
+            self.incremental_export_var = bool(settings["incremental_export"])
+            self.incremental_export_switch_row.setChecked(self.incremental_export_var)
+
         if "export_columns" in settings:
             selected_columns = settings["export_columns"]
             for name, cb in self.export_checkboxes.items():
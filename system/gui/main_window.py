@@ -23,8 +23,14 @@ from PySide6.QtGui import QIcon, QPixmap, QPalette, QTextDocument
 from system.config import APP_TITLE, APP_VERSION, SUPPORTED_IMAGE_EXTENSIONS, SUPPORTED_VIDEO_EXTENSIONS
 from system.utils import resource_path
 from system.image_processor import ImageProcessor
+from system.autotune import is_oom_error, release_memory
 from system.metadata_extractor import ImageMetadataExtractor
+from system.batch_planner import probe_image_shapes, build_image_batches, describe_buckets
 from system.data_processor import DataProcessor
+from system.independent_detection import IndependentDetectionEngine
+from system.deployments import camera_resolver
+from system.merge_export import write_source_marker
+from system.species_catalog import configure_species_catalog
 from system.settings_manager import SettingsManager
 from system.update_checker import check_for_updates, get_latest_version_info, compare_versions, start_download_thread, \
     _show_messagebox
@@ -106,6 +112,13 @@ class ProcessingThread(QThread):
 
         start_time = time.time()
         excel_data = [] if self.resume_from == 0 else self.controller.excel_data
+        # 独立探测随结果到达按相机增量计算 (续传时先载入已处理的记录)
+        site = os.path.basename(os.path.normpath(self.file_path))
+        independent_engine = IndependentDetectionEngine(self.controller.confidence_settings,
+                                                        camera_of=camera_resolver(site))
+        if excel_data:
+            independent_engine.rebuild(excel_data)
+        self.controller.independent_engine = independent_engine
 
         # 定义Batch Size
         BATCH_SIZE = getattr(self.controller.advanced_page, 'batch_size_var', 16)
@@ -113,12 +126,24 @@ class ProcessingThread(QThread):
         # 记录已处理的文件数（用于索引文件列表）
         processed_files_count = self.resume_from
         stopped_manually = False
-        earliest_date = None
         temp_photo_dir = self.controller.get_temp_photo_dir()
+        # 记录缓存目录对应的源文件夹，供多项目合并导出发现
+        write_source_marker(temp_photo_dir, self.file_path)
         # 在进入 task_queue 循环之前，初始化预加载器
         preloader_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
         # 用于存储 {queue_index: future_object} 的字典
         preload_futures = {}
+        # CPU多进程推理池及其在途批次 {queue_index: future_object}
+        cpu_pool = None
+        pool_futures = {}
+        # 分类裁剪池：跨批次累积裁剪，凑满后再运行分类模型
+        crop_pool = None
+        # 内存管理：按水位线回收内存，并在内存紧张时缩小批次/预读深度
+        memory_governor = self.controller.image_processor.memory_governor
+        memory_governor.log_fn = lambda msg: self.console_log.emit(f"[INFO] {msg}", "#888888")
+        cls_gate = self.controller.image_processor.cls_gate
+        if cls_gate is not None:
+            cls_gate.reset_stats()
 
         try:
             iou = self.controller.advanced_page.iou_var
@@ -130,6 +155,18 @@ class ProcessingThread(QThread):
             if hasattr(self.controller.start_page, 'video_mode_combo'):
                 video_mode_setting = self.controller.start_page.video_mode_combo.currentText()
 
+            # 可选：连接常驻的本地推理服务，图片批次交由服务推理
+            inference_client = None
+            if getattr(self.controller.advanced_page, 'use_inference_service_var', False):
+                from system.inference_service import InferenceClient
+                client = InferenceClient()
+                if client.is_available():
+                    inference_client = client
+                    self.console_log.emit(f"[INFO] 已连接本地推理服务: {client.base_url}", "#00ff00")
+                else:
+                    self.console_log.emit(f"[WARN] 本地推理服务不可用 ({client.base_url})，将使用本地模型", "#ffaa00")
+                QThread.msleep(10)
+
             from system.config import SUPPORTED_IMAGE_EXTENSIONS, SUPPORTED_VIDEO_EXTENSIONS
             all_extensions = SUPPORTED_IMAGE_EXTENSIONS + SUPPORTED_VIDEO_EXTENSIONS
 
@@ -229,8 +266,29 @@ class ProcessingThread(QThread):
             self.console_log.emit("=" * 118, None)
             QThread.msleep(10)
 
-            # 1. 将待处理图片分批
-            image_batches = [pending_images[i:i + BATCH_SIZE] for i in range(0, len(pending_images), BATCH_SIZE)]
+            # 可选：自动调优 Batch Size 与预读深度 (按设备/模型/推理尺寸保存在 settings.json)
+            PREFETCH_DEPTH = 1
+            local_detect_args = (bool(self.use_fp16), iou, conf, augment, agnostic_nms)
+            auto_tune = bool(getattr(self.controller.advanced_page, 'auto_tune_var', False)
+                             and inference_client is None and pending_images)
+            if auto_tune:
+                profile = self._get_autotune_profile(pending_images, local_detect_args)
+                if profile:
+                    BATCH_SIZE = profile['batch_size']
+                    PREFETCH_DEPTH = profile['prefetch_depth']
+
+            memory_governor.set_limits(BATCH_SIZE, PREFETCH_DEPTH)
+
+            # 1. 将待处理图片按分辨率分组后分批 (同尺寸批次使用矩形推理尺寸，减少填充)
+            image_order = {f: k for k, f in enumerate(pending_images)}
+            image_shapes = probe_image_shapes(self.file_path, pending_images)
+            image_batches = build_image_batches(pending_images, BATCH_SIZE, image_shapes, image_order)
+            bucket_text = describe_buckets(image_shapes)
+            if bucket_text:
+                self.console_log.emit(f"[INFO] 图片分辨率: {bucket_text}", "#aaaaaa")
+            # 结果重排缓冲区 {原始位置: (文件名, 结果, 单张平均耗时ms)}，按原始顺序输出
+            reorder_buffer = {}
+            next_emit_pos = 0
 
             # 2. 构建混合队列：
             task_queue = []
@@ -245,14 +303,54 @@ class ProcessingThread(QThread):
                 current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 self.console_log.emit(f"[INFO] {current_time} 从第 {self.resume_from + 1} 个文件继续处理", "#ffff00")
                 QThread.msleep(10)
-                if excel_data:
-                    valid_dates = [item['拍摄日期对象'] for item in excel_data if item.get('拍摄日期对象')]
-                    if valid_dates:
-                        earliest_date = min(valid_dates)
             else:
                 files_to_process = all_files_list
 
-            if len(task_queue) > 0 and task_queue[0][0] == 'batch':
+            # 可选：无CUDA时启动CPU多进程推理池，每个进程持有独立模型副本
+            detect_params = {'use_fp16': False, 'iou': iou, 'conf': conf,
+                             'augment': augment, 'agnostic_nms': agnostic_nms}
+            if (inference_client is None and image_batches
+                    and getattr(self.controller.advanced_page, 'use_cpu_workers_var', False)
+                    and not getattr(self.controller, 'cuda_available', False)):
+                from system.cpu_worker_pool import CPUWorkerPool
+                processor = self.controller.image_processor
+                cpu_pool = CPUWorkerPool(processor.model_path, processor.cls_model_path,
+                                         preload_fn=processor.preload_batch_data,
+                                         backend=processor.backend, cls_int8=processor.cls_int8,
+                                         cls_gate=processor.cls_gate)
+                if cpu_pool.num_workers > 1:
+                    self.console_log.emit(
+                        f"[INFO] 正在启动CPU推理进程: {cpu_pool.num_workers} 进程 x {cpu_pool.threads_per_worker} 线程...",
+                        "#aaaaaa")
+                    try:
+                        cpu_pool.start()
+                    except Exception as e:
+                        logger.error(f"启动CPU推理池失败: {e}")
+                        self.console_log.emit(f"[WARN] CPU推理池启动失败，将使用单进程推理: {e}", "#ffaa00")
+                        cpu_pool = None
+                else:
+                    cpu_pool = None
+
+            # 可选：预处理帧缓存 (仅本地推理；CPU推理池与推理服务使用各自的输入)
+            frame_cache = None
+            if (inference_client is None and cpu_pool is None and image_batches
+                    and getattr(self.controller.advanced_page, 'use_frame_cache_var', False)):
+                from system.frame_cache import FrameCache, frame_cache_dir
+                try:
+                    frame_cache = FrameCache(frame_cache_dir(self.controller.settings_manager.settings_dir))
+                    self.console_log.emit(f"[INFO] 已启用预处理帧缓存 (当前占用 {frame_cache.size_mb():.0f}MB)",
+                                          "#aaaaaa")
+                except Exception as e:
+                    logger.error(f"初始化预处理帧缓存失败: {e}")
+            self.controller.image_processor.frame_cache = frame_cache
+
+            if inference_client is None and cpu_pool is None and image_batches and self.controller.image_processor.cls_model:
+                from system.crop_pool import CropPool
+                crop_pool = CropPool(self.controller.image_processor,
+                                     {**detect_params, 'use_fp16': bool(self.use_fp16)})
+
+            if (len(task_queue) > 0 and task_queue[0][0] == 'batch' and inference_client is None
+                    and cpu_pool is None and PREFETCH_DEPTH > 0):
                 # 获取第一个任务的文件路径列表
                 first_batch_paths = [os.path.join(self.file_path, f) for f in task_queue[0][1]]
                 preload_futures[0] = preloader_executor.submit(
@@ -281,17 +379,26 @@ class ProcessingThread(QThread):
                     self.console_log.emit(f"[INFO] {current_time} 处理已强制停止", "#ff0000")
                     break
 
-                # 如果下一个任务是 batch，立即提交预加载任务
-                next_task_idx = i + 1
-                if next_task_idx < len(task_queue):
+                # 后续 PREFETCH_DEPTH 个任务中的 batch 立即提交预加载
+                for next_task_idx in range(i + 1, min(len(task_queue), i + 1 + PREFETCH_DEPTH)):
                     next_type, next_data = task_queue[next_task_idx]
-                    if next_type == 'batch' and next_task_idx not in preload_futures:
+                    if (next_type == 'batch' and next_task_idx not in preload_futures
+                            and inference_client is None and cpu_pool is None):
                         next_batch_paths = [os.path.join(self.file_path, f) for f in next_data]
                         preload_futures[next_task_idx] = preloader_executor.submit(
                             self.controller.image_processor.preload_batch_data,
                             next_batch_paths
                         )
 
+                # CPU推理池：保持每个工作进程都有在途批次
+                if cpu_pool is not None:
+                    for ahead_idx in range(i, min(len(task_queue), i + cpu_pool.num_workers + 1)):
+                        ahead_type, ahead_data = task_queue[ahead_idx]
+                        if ahead_type == 'batch' and ahead_idx not in pool_futures:
+                            pool_futures[ahead_idx] = cpu_pool.submit(
+                                [os.path.join(self.file_path, f) for f in ahead_data], detect_params
+                            )
+
                 filename = ""
                 img_path = ""
                 is_video = (task_type == 'video')
@@ -407,16 +514,14 @@ class ProcessingThread(QThread):
                                 current_frame_detection_count = 0
 
                                 if results:
-                                    for result in results:
-                                        if hasattr(result, 'boxes') and result.boxes is not None:
-                                            for box in result.boxes:
-                                                current_frame_detection_count += 1
-                                                cls_id = int(box.cls.item())
-                                                english_name = result.names.get(cls_id, 'Unknown')
-                                                translated_name = translation_dict.get(english_name, english_name)
+                                    for record in results:
+                                        for b_idx in range(len(record)):
+                                            current_frame_detection_count += 1
+                                            english_name = record.class_name(b_idx)
+                                            translated_name = translation_dict.get(english_name, english_name)
 
-                                                sampled_species_list.append(translated_name)
-                                                frame_counts[translated_name] = frame_counts.get(translated_name, 0) + 1
+                                            sampled_species_list.append(translated_name)
+                                            frame_counts[translated_name] = frame_counts.get(translated_name, 0) + 1
 
                                 # 构造检测结果字符串 (例如 "1 赤狐, 2 马")
                                 if frame_counts:
@@ -604,6 +709,7 @@ class ProcessingThread(QThread):
                             QThread.msleep(5)
 
                             excel_data.append(image_info)
+                            independent_engine.upsert(image_info)
 
                             # [修改] 视频处理完成后，累加该视频的总帧数到已完成工作量
                             processed_work_units += file_unit_map.get(filename, 1)
@@ -629,25 +735,116 @@ class ProcessingThread(QThread):
                                     logger.error(f"获取预加载数据失败: {e}")
 
                             # 1. 调用批量检测 (传入 preloaded_data)
+                            # ready_batches: 本轮已得到完整结果、可以写入的批次 [(文件名列表, 结果列表, 单张平均耗时ms)]
+                            # 使用裁剪池时，本批次可能要等后续批次凑满分类输入后才返回
+                            ready_batches = []
                             batch_start_time = time.time()
+                            batch_results = None
 
-                            # 注意：这里调用 detect_batch_species 时传入了 preloaded_data
-                            batch_results = self.controller.image_processor.detect_batch_species(
-                                batch_paths, bool(self.use_fp16), iou, conf, augment, agnostic_nms,
-                                preloaded_data=preloaded_data
-                            )
-
-                            batch_time = (time.time() - batch_start_time) * 1000
-                            avg_time = batch_time / len(batch_filenames) if batch_filenames else 0
+                            if inference_client is not None:
+                                # 由本地推理服务完成检测 (服务端会与其他客户端的请求合并成批)
+                                batch_results = inference_client.detect_batch(
+                                    batch_paths, bool(self.use_fp16), iou, conf, augment, agnostic_nms
+                                )
+                            elif cpu_pool is not None:
+                                pool_future = pool_futures.pop(i, None) or cpu_pool.submit(batch_paths, detect_params)
+                                batch_results = pool_future.result()
+                            else:
+                                try:
+                                    if crop_pool is not None:
+                                        completed = crop_pool.submit(batch_filenames, batch_paths, preloaded_data)
+                                        # 后面没有图片批次或即将停止时，立即清空裁剪池
+                                        next_is_batch = i + 1 < len(task_queue) and task_queue[i + 1][0] == 'batch'
+                                        if not next_is_batch or self.stop_flag:
+                                            completed.extend(crop_pool.flush())
+                                        ready_batches.extend(
+                                            (names, results, busy * 1000 / len(names) if names else 0)
+                                            for names, results, busy in completed)
+                                    else:
+                                        # 注意：这里调用 detect_batch_species 时传入了 preloaded_data
+                                        batch_results = self.controller.image_processor.detect_batch_species(
+                                            batch_paths, *local_detect_args, preloaded_data=preloaded_data
+                                        )
+                                except Exception as e:
+                                    if not is_oom_error(e):
+                                        raise
+                                    preloaded_data = None
+                                    release_memory()
+                                    if crop_pool is not None:
+                                        # 先让池中更早的批次完成，保持写入顺序
+                                        ready_batches.extend(
+                                            (names, results, busy * 1000 / len(names) if names else 0)
+                                            for names, results, busy in crop_pool.flush())
+                                        batch_start_time = time.time()
+                                    new_batch_size = max(1, len(batch_paths) // 2)
+                                    self.console_log.emit(
+                                        f"[WARN] 内存/显存不足 (Batch Size {len(batch_paths)})，正在缩小批次...", "#ffaa00")
+                                    if auto_tune:
+                                        # 以更小的上限重新调优，并覆盖已保存的结果
+                                        profile = self._get_autotune_profile(
+                                            pending_images, local_detect_args, max_batch=new_batch_size, force=True)
+                                        if profile:
+                                            new_batch_size = profile['batch_size']
+                                            PREFETCH_DEPTH = profile['prefetch_depth']
+                                    BATCH_SIZE = new_batch_size
+                                    memory_governor.set_limits(BATCH_SIZE, PREFETCH_DEPTH)
+                                    batch_results = self._detect_in_chunks(batch_paths, BATCH_SIZE, local_detect_args)
+                                    self._rechunk_remaining_batches(task_queue, i, BATCH_SIZE, preload_futures,
+                                                                    image_shapes, image_order)
+
+                            if batch_results is not None:
+                                batch_time = (time.time() - batch_start_time) * 1000
+                                avg_time = batch_time / len(batch_filenames) if batch_filenames else 0
+                                ready_batches.append((batch_filenames, batch_results, avg_time))
+
+                            # 2. 结果放入重排缓冲区 (按分辨率分组后同一批次的文件在原始顺序中不连续)
+                            for ready_filenames, batch_results, avg_time in ready_batches:
+                                for b_idx, f_name in enumerate(ready_filenames):
+                                    pos = image_order[f_name]
+                                    if pos >= next_emit_pos:
+                                        # 检测失败的批次返回空列表，以 None 占位
+                                        species_info = batch_results[b_idx] if b_idx < len(batch_results) else None
+                                        reorder_buffer[pos] = (f_name, species_info, avg_time)
+
+                            # 内存清理：由内存管理器按水位线决定是否回收/缩小批次
+                            del ready_batches, batch_results
+                            if inference_client is None and cpu_pool is None:
+                                new_batch_size, PREFETCH_DEPTH = memory_governor.check(BATCH_SIZE, PREFETCH_DEPTH)
+                                if new_batch_size != BATCH_SIZE:
+                                    BATCH_SIZE = new_batch_size
+                                    self._rechunk_remaining_batches(task_queue, i, BATCH_SIZE, preload_futures,
+                                                                    image_shapes, image_order)
+                            else:
+                                memory_governor.relieve()
 
-                            # 2. 遍历结果并保存
-                            for b_idx, f_name in enumerate(batch_filenames):
-                                if self.force_stop_flag: raise ForceStopError("用户强制停止")
+                        except Exception as e:
+                            logger.error(f"Batch处理内部错误: {e}")
+                            # 出错的批次以空结果占位，保证后续结果仍能按顺序输出、进度继续推进
+                            for f_name in batch_filenames:
+                                pos = image_order[f_name]
+                                if pos >= next_emit_pos:
+                                    reorder_buffer.setdefault(pos, (f_name, None, 0))
+
+                        # 3. 按原始顺序输出结果 (JSON、控制台、进度)
+                        while next_emit_pos in reorder_buffer:
+                            f_name, species_info, avg_time = reorder_buffer.pop(next_emit_pos)
+                            next_emit_pos += 1
+                            if self.force_stop_flag: raise ForceStopError("用户强制停止")
+
+                            # 这里的变量用于异常捕获时的日志显示
+                            filename = f_name
+                            img_path = os.path.join(self.file_path, f_name)
+                            if species_info is None:
+                                # 检测失败 (已记录日志)，跳过但推进进度，防止死循环
+                                processed_files_count += 1
+                                continue
 
-                                # 这里的变量用于异常捕获时的日志显示
-                                filename = f_name
-                                img_path = batch_paths[b_idx]
-                                species_info = batch_results[b_idx]
+                            try:
+                                remote_info = None
+                                if 'detection_info' in species_info:
+                                    # 推理服务返回的结果已是JSON结构
+                                    remote_info = species_info.pop('detection_info')
+                                    species_info['detect_results'] = remote_info
                                 detect_results = species_info.get('detect_results')
 
                                 # 提取元数据
@@ -664,9 +861,14 @@ class ProcessingThread(QThread):
                                 image_meta['检测时间'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
                                 # 保存临时 JSON
-                                self.controller.image_processor.save_detection_info_json(
-                                    detect_results, f_name, species_info, temp_photo_dir
-                                )
+                                if remote_info is not None:
+                                    self.controller.image_processor.write_detection_info_json(
+                                        remote_info, f_name, temp_photo_dir
+                                    )
+                                else:
+                                    self.controller.image_processor.save_detection_info_json(
+                                        detect_results, f_name, species_info, temp_photo_dir
+                                    )
 
                                 # 发射 UI 信号
                                 self.file_processed.emit(img_path, detect_results, f_name)
@@ -674,6 +876,7 @@ class ProcessingThread(QThread):
                                 self.current_file_preview.emit(img_path, full_info)
                                 if 'detect_results' in image_meta: del image_meta['detect_results']
                                 excel_data.append(image_meta)
+                                independent_engine.upsert(image_meta)
 
                                 # 单张日志
                                 current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -710,14 +913,9 @@ class ProcessingThread(QThread):
                                 self.progress_updated.emit(processed_work_units, total_work_units, elapsed_time,
                                                            remaining_time, speed)
 
-                            # 内存清理
-                            del batch_results
-                            gc.collect()
-
-                        except Exception as e:
-                            logger.error(f"Batch处理内部错误: {e}")
-                            # 即使出错也要推进 processed_files_count，防止死循环
-                            processed_files_count += len(batch_filenames)
+                            except Exception as e:
+                                logger.error(f"保存处理结果失败 {f_name}: {e}")
+                                processed_files_count += 1
 
                 except ForceStopError:
                     stopped_manually = True
@@ -765,7 +963,8 @@ class ProcessingThread(QThread):
                     del img_path, image_info, img, species_info, detect_results
                 except NameError:
                     pass
-                gc.collect()
+                if task_type == 'video':
+                    memory_governor.relieve()
 
             if not stopped_manually:
                 current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -786,6 +985,16 @@ class ProcessingThread(QThread):
                 )
                 QThread.msleep(10)
 
+                if cls_gate is not None and cls_gate.stats['boxes']:
+                    self.console_log.emit(f"[INFO] {current_time} 分类门控: {cls_gate.describe_stats()}", "#aaaaaa")
+                    QThread.msleep(10)
+
+                if self.controller.image_processor.frame_cache is not None:
+                    self.console_log.emit(
+                        f"[INFO] {current_time} 预处理帧缓存: {self.controller.image_processor.frame_cache.describe_stats()}",
+                        "#aaaaaa")
+                    QThread.msleep(10)
+
                 self.progress_updated.emit(total_work_units, total_work_units, total_time, 0, avg_speed)
                 self.controller.excel_data = excel_data
 
@@ -804,10 +1013,11 @@ class ProcessingThread(QThread):
                         elif not isinstance(date_obj, datetime):
                             item['拍摄日期对象'] = None
 
-                excel_data = DataProcessor.process_independent_detection(excel_data,
-                                                                         self.controller.confidence_settings)
-                if earliest_date:
-                    excel_data = DataProcessor.calculate_working_days(excel_data, earliest_date)
+                # 独立探测已在处理过程中增量计算；阈值在处理期间被修改时整体重算
+                independent_engine.set_thresholds(self.controller.confidence_settings)
+                independent_engine.sync(excel_data)
+                # 按相机计算工作天数 (源文件夹中的 deployments.csv 可指定布设日期)
+                DataProcessor.apply_deployments(excel_data, site, self.file_path)
                 self._delete_processing_cache()
                 self.status_message.emit("处理完成！")
                 QTimer.singleShot(0, lambda: QMessageBox.information(None, "成功", "图像处理完成！"))
@@ -822,8 +1032,82 @@ class ProcessingThread(QThread):
             QTimer.singleShot(0, lambda: QMessageBox.critical(None, "错误", f"处理过程中发生错误: {e}"))
             self.processing_complete.emit(False)
         finally:
+            if cpu_pool is not None:
+                cpu_pool.close()
+            self.controller.image_processor.frame_cache = None
+            memory_governor.log_fn = None
             gc.collect()
 
+    def _get_autotune_profile(self, pending_images, detect_args, max_batch=None, force=False):
+        """获取当前设备/模型的调优结果，没有保存过 (或 force=True) 时在前若干张图片上标定"""
+        from system.autotune import AutoTuner, device_key, profile_key, save_profile
+        from system.config import DETECT_IMGSZ
+
+        processor = self.controller.image_processor
+        advanced_page = self.controller.advanced_page
+        key = profile_key(device_key(bool(self.use_fp16)), processor.model_path, DETECT_IMGSZ)
+        profiles = getattr(advanced_page, 'autotune_profiles', {})
+
+        if not force and key in profiles:
+            profile = profiles[key]
+            self.console_log.emit(
+                f"[INFO] 使用已保存的调优结果: Batch Size={profile['batch_size']}, 预读深度={profile['prefetch_depth']}",
+                "#aaaaaa")
+            return profile
+
+        self.console_log.emit("[INFO] 正在自动调优 Batch Size 与预读深度...", "#aaaaaa")
+        use_fp16, iou, conf, augment, agnostic_nms = detect_args
+        tuner = AutoTuner(
+            processor,
+            [os.path.join(self.file_path, f) for f in pending_images[:64]],
+            {'use_fp16': use_fp16, 'iou': iou, 'conf': conf, 'augment': augment, 'agnostic_nms': agnostic_nms},
+            log_fn=lambda msg: self.console_log.emit(f"[INFO] 调优 {msg}", "#aaaaaa"),
+            stop_fn=lambda: self.force_stop_flag
+        )
+        try:
+            profile = tuner.run(max_batch=max_batch)
+        except Exception as e:
+            logger.error(f"自动调优失败: {e}")
+            self.console_log.emit(f"[WARN] 自动调优失败，使用当前设置: {e}", "#ffaa00")
+            return None
+
+        if profile:
+            profiles[key] = profile
+            save_profile(self.controller.settings_manager, key, profile)
+            self.console_log.emit(
+                f"[INFO] 调优完成: Batch Size={profile['batch_size']}, 预读深度={profile['prefetch_depth']}, "
+                f"{profile['images_per_s']:.2f} 张/秒", "#00ff00")
+        return profile
+
+    @staticmethod
+    def _rechunk_remaining_batches(task_queue, current_idx, batch_size, preload_futures,
+                                   image_shapes=None, image_order=None):
+        """按新的 Batch Size 重新切分剩余图片批次 (仍按分辨率分组)，并丢弃旧批次的预加载"""
+        remaining_images = [f for t_type, t_data in task_queue[current_idx + 1:]
+                            if t_type == 'batch' for f in t_data]
+        remaining_others = [task for task in task_queue[current_idx + 1:] if task[0] != 'batch']
+        if image_order:
+            remaining_images.sort(key=lambda f: image_order.get(f, 0))
+        task_queue[current_idx + 1:] = [('batch', chunk) for chunk in
+                                        build_image_batches(remaining_images, batch_size, image_shapes, image_order)]
+        task_queue.extend(remaining_others)
+        for stale_idx in [k for k in preload_futures if k > current_idx]:
+            preload_futures.pop(stale_idx).cancel()
+
+    def _detect_in_chunks(self, batch_paths, chunk_size, detect_args):
+        """按较小的批次检测，仍然内存不足时继续减半 (单张仍失败则抛出)"""
+        results = []
+        for start in range(0, len(batch_paths), chunk_size):
+            chunk = batch_paths[start:start + chunk_size]
+            try:
+                results.extend(self.controller.image_processor.detect_batch_species(chunk, *detect_args))
+            except Exception as e:
+                if not is_oom_error(e) or len(chunk) == 1:
+                    raise
+                release_memory()
+                results.extend(self._detect_in_chunks(chunk, max(1, len(chunk) // 2), detect_args))
+        return results
+
     def _save_processing_cache(self, excel_data, processed_files, total_files):
         """保存处理缓存"""
         try:
@@ -870,6 +1154,8 @@ class ObjectDetectionGUI(QMainWindow):
         super().__init__()
         self.settings_manager = settings_manager
         self.settings = settings
+        # 物种名录索引缓存在设置目录，导出、验证页面共享同一实例
+        self.species_catalog = configure_species_catalog(settings_manager.settings_dir)
         self.resume_processing = resume_processing
         self.cache_data = cache_data
         self.current_temp_photo_dir = None
@@ -886,6 +1172,7 @@ class ObjectDetectionGUI(QMainWindow):
         self.is_processing = False
         self.processing_thread = None
         self.excel_data = []
+        self.independent_engine = None  # 处理过程中增量计算独立探测的引擎
         self.current_page = "settings"
         self.update_channel_var = "稳定版 (Release)"
         self.model_var = ""
@@ -975,8 +1262,10 @@ class ObjectDetectionGUI(QMainWindow):
             if model_path:
                 logger.info(f"加载找到的第一个模型: {os.path.basename(model_path)}")
 
-        # 初始化 ImageProcessor
-        self.image_processor = ImageProcessor(model_path)
+        # 初始化 ImageProcessor (按设置选择推理后端)
+        backend = settings.get("inference_backend", "pytorch") if settings else "pytorch"
+        cls_int8 = bool(settings.get("use_int8_classifier", False)) if settings else False
+        self.image_processor = ImageProcessor(model_path, backend=backend, cls_int8=cls_int8)
         if model_path:
             self.image_processor.model_path = model_path
             self.model_var = os.path.basename(model_path)
@@ -991,6 +1280,11 @@ class ObjectDetectionGUI(QMainWindow):
         if saved_cls_model:
             self._load_cls_model_by_name(saved_cls_model)
 
+        # 分类门控阈值 (只对学习时的检测/分类模型组合生效)
+        if settings and settings.get("use_cls_gate"):
+            from system.classifier_gate import ClassifierGate, gate_file_path
+            self.image_processor.cls_gate = ClassifierGate.load(gate_file_path(self.settings_manager.settings_dir))
+
     def _find_model_file(self) -> str:
         """查找模型文件"""
         try:
@@ -1177,6 +1471,9 @@ class ObjectDetectionGUI(QMainWindow):
         # 设置主题监控
         self.setup_theme_monitoring()
 
+        # 后台加载物种名录 (首次运行或名录更新时编译 XLSX)，导出时无需再解析
+        threading.Thread(target=self.species_catalog.info_map, daemon=True).start()
+
         # 加载验证数据
         if hasattr(self.preview_page, '_load_validation_data'):
             self.preview_page._load_validation_data()
@@ -1186,6 +1483,9 @@ class ObjectDetectionGUI(QMainWindow):
         # 恢复处理
         if self.resume_processing and self.cache_data:
             QTimer.singleShot(1000, self._resume_processing)
+        elif self.image_processor.model and hasattr(self.advanced_page, 'start_model_preparation'):
+            # 后台预热模型，第一个批次即以稳定速度运行
+            self.advanced_page.start_model_preparation()
 
     def _create_default_settings(self):
         """创建默认设置"""
@@ -1462,6 +1762,8 @@ class ObjectDetectionGUI(QMainWindow):
             self.current_temp_photo_dir = temp_dir
 
         os.makedirs(temp_dir, exist_ok=True)
+        if update:
+            write_source_marker(temp_dir, source_path)
         return temp_dir
 
     def clear_image_cache(self):
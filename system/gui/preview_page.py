@@ -26,6 +26,7 @@ from PIL import Image, ImageDraw, ImageFont
 
 # 原有的导入保持不变
 from system.data_processor import DataProcessor
+from system.threshold_engine import first_accepted, threshold_for
 from system.metadata_extractor import ImageMetadataExtractor
 from system.config import NORMAL_FONT, SUPPORTED_IMAGE_EXTENSIONS, get_species_color
 from system.utils import resource_path
@@ -346,7 +347,7 @@ class VideoPlayerThread(QThread):
             conf = box.get('confidence', 0)
 
             # 如果 conf_map 中有该物种，使用该物种的阈值；否则使用 global；如果没有 global，默认 0.25
-            threshold = self.conf_map.get(species, self.conf_map.get("global", 0.25))
+            threshold = threshold_for(self.conf_map, species)
 
             if conf < threshold:
                 continue
@@ -939,9 +940,11 @@ class PreviewPage(QWidget):
                 # 临时结果直接显示
                 image_to_show = Image.open(file_path)
             elif show_detection and detection_results:
-                # 如果需要显示检测结果，则在原图上绘制
-                result_img_array = detection_results[0].plot()
-                image_to_show = Image.fromarray(cv2.cvtColor(result_img_array, cv2.COLOR_BGR2RGB))
+                # 检测记录不含原图：转换为与临时JSON相同的结构后在原图上绘制
+                detection_info = self.controller.image_processor.build_detection_info(detection_results, {})
+                self._draw_detection_boxes(self.image_label, self.original_image, detection_info,
+                                           self.species_conf_map)
+                return
 
             # 使用统一的辅助函数来设置和显示图片
             self._update_pixmap_for_label(image_to_show)
@@ -1143,7 +1146,7 @@ class PreviewPage(QWidget):
                             c_name = cand.get('name')
                             c_conf = float(cand.get('conf', 0))
                             # 获取该候选项的阈值
-                            c_thresh = self.species_conf_map.get(c_name, self.species_conf_map.get("global", 0.25))
+                            c_thresh = threshold_for(self.species_conf_map, c_name)
 
                             if c_conf >= c_thresh:
                                 final_name = c_name
@@ -1156,7 +1159,7 @@ class PreviewPage(QWidget):
 
                     # 3. 如果没有匹配的候选项，检查主物种是否满足阈值
                     if not is_valid:
-                        thresh = self.species_conf_map.get(species_name, self.species_conf_map.get("global", 0.25))
+                        thresh = threshold_for(self.species_conf_map, species_name)
                         if confidence >= thresh:
                             is_valid = True
                             final_name = species_name
@@ -1283,7 +1286,7 @@ class PreviewPage(QWidget):
                             continue  # 去重
 
                         # 获取该物种的特定阈值 (优先取特定设置，否则取全局)
-                        thresh = conf_map.get(name, conf_map.get("global", 0.25))
+                        thresh = threshold_for(conf_map, name)
 
                         if conf >= thresh:
                             valid_display_texts.append(f"{name} {conf:.2f}")
@@ -1421,9 +1424,6 @@ class PreviewPage(QWidget):
         best_absolute_species_name = None
         max_absolute_confidence = -1.0
 
-        # 获取全局默认阈值
-        global_thresh = self.species_conf_map.get("global", 0.25)
-
         # 从当前 JSON 数据中提取所有物种
         if self.current_preview_info:
             # --- 情况 A: 处理图片 JSON 结构 ---
@@ -1446,17 +1446,11 @@ class PreviewPage(QWidget):
                 # 2. 处理候选项逻辑 (确定该框最终判定为什么物种)
                 is_candidate_match = False
                 if "候选项" in box and box["候选项"]:
-                    candidates = box["候选项"]
-                    for cand in candidates:
-                        c_name = cand.get('name')
-                        c_conf = float(cand.get('conf', 0.0))
-                        c_thresh = self.species_conf_map.get(c_name, global_thresh)
-
-                        if c_conf >= c_thresh:
-                            final_name = c_name
-                            final_conf = c_conf
-                            is_candidate_match = True
-                            break
+                    accepted = first_accepted(((c.get('name'), float(c.get('conf', 0.0))) for c in box["候选项"]),
+                                              self.species_conf_map)
+                    if accepted:
+                        final_name, final_conf = accepted
+                        is_candidate_match = True
 
                 # 3. 将所有出现过的名字加入下拉列表 (增加 0.05 过滤)
                 if final_conf >= MIN_DROPDOWN_CONF:
@@ -1477,8 +1471,7 @@ class PreviewPage(QWidget):
                 if is_candidate_match:
                     is_valid = True
                 else:
-                    thresh = self.species_conf_map.get(final_name, global_thresh)
-                    if final_conf >= thresh:
+                    if final_conf >= threshold_for(self.species_conf_map, final_name):
                         is_valid = True
 
                 if is_valid:
@@ -1516,8 +1509,7 @@ class PreviewPage(QWidget):
                         best_absolute_species_name = dominant_species
 
                     # === 更新有效最大值 ===
-                    sp_thresh = self.species_conf_map.get(dominant_species, global_thresh)
-                    if track_max_conf >= sp_thresh:
+                    if track_max_conf >= threshold_for(self.species_conf_map, dominant_species):
                         if track_max_conf > max_valid_confidence:
                             max_valid_confidence = track_max_conf
                             best_valid_species_name = dominant_species
@@ -1562,7 +1554,7 @@ class PreviewPage(QWidget):
             current_species = "global"
 
         # 从字典中获取该物种的保存值，如果没有，获取 global，如果还没有，默认 0.25
-        saved_val = self.species_conf_map.get(current_species, self.species_conf_map.get("global", 0.25))
+        saved_val = threshold_for(self.species_conf_map, current_species)
 
         # 阻断滑块信号，防止滑块移动反过来触发 _on_preview_confidence_slider_changed 重复保存
         self.preview_conf_slider.blockSignals(True)
@@ -2417,7 +2409,7 @@ class PreviewPage(QWidget):
 
                     # === C. 新增：置信度过滤 ===
                     # 获取该物种的当前阈值
-                    thresh = self.species_conf_map.get(sp, self.species_conf_map.get("global", 0.25))
+                    thresh = threshold_for(self.species_conf_map, sp)
 
                     # 检查该轨迹中是否至少有一帧（或平均值）超过了阈值？
                     # 通常策略：如果整个轨迹的最高置信度都低于阈值，则视为误检
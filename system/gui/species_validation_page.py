@@ -3,9 +3,9 @@ from PySide6.QtWidgets import (
     QListWidget, QLabel, QPushButton, QFrame, QGroupBox,
     QMessageBox, QFileDialog, QInputDialog, QComboBox,
     QSizePolicy, QApplication, QDialog, QLineEdit, QFormLayout,
-    QScrollArea
+    QScrollArea, QListWidgetItem
 )
-from PySide6.QtCore import Qt, Signal, QTimer, QThread, QEvent, QRectF, QPoint, QUrl
+from PySide6.QtCore import Qt, Signal, QTimer, QThread, QObject, QEvent, QRectF, QPoint, QUrl
 from PySide6.QtGui import (
     QFont, QPalette, QPixmap, QImage, QPainter, QColor,
     QKeySequence, QShortcut, QPainterPath, QDesktopServices
@@ -24,13 +24,200 @@ import csv
 import shutil
 from collections import defaultdict, Counter
 
-from system.config import SUPPORTED_IMAGE_EXTENSIONS, get_species_color
+from system.config import SUPPORTED_IMAGE_EXTENSIONS, EXPORT_MAX_ROWS_PER_PART, get_species_color
 from system.gui.ui_components import Win11Colors, ModernSlider, ModernGroupBox, ModernComboBox
 from system.data_processor import DataProcessor
+from system.independent_detection import IndependentDetectionEngine
+from system.threshold_engine import ThresholdEngine, first_accepted, label_priority, threshold_for
+from system.incremental_export import ExportChangeTracker
+from system import merge_export
+from system.deployments import (DEPLOYMENT_SHEET_NAME, DEPLOYMENT_TABLE_NAME, camera_resolver,
+                                parquet_deployment_table)
+from system.analytics import parquet_tables as analytics_parquet_tables
+from system.species_catalog import get_species_catalog
 from system.metadata_extractor import ImageMetadataExtractor
 
 logger = logging.getLogger(__name__)
 
+
+class TableExportWorker(QObject):
+    """在后台线程中分块写入导出表格 (或 Parquet 数据集)，并报告写入进度"""
+    progress = Signal(int, int)  # 已写行数, 总行数 (Parquet 为已写表数, 总表数)
+    finished = Signal(bool)
+
+    def __init__(self, processed_data, output_path, confidence_settings, file_format, columns_to_export,
+                 min_frame_ratio):
+        super().__init__()
+        self.processed_data = processed_data
+        self.output_path = output_path
+        self.confidence_settings = confidence_settings
+        self.file_format = file_format
+        self.columns_to_export = columns_to_export
+        self.min_frame_ratio = min_frame_ratio
+        self.site = ""
+        self.validation_data = {}
+        self.deployments = None  # 相机布设表，作为附加工作表/表导出
+        self.include_analytics = False  # 是否同时导出分析表
+        self.incremental = False  # 是否增量导出 (只更新变化的记录)
+        self.source_versions = None  # {文件名: 源状态版本}
+
+    def run(self):
+        success = False
+        try:
+            extra_sheets = {}
+            if self.deployments is not None:
+                extra_sheets[DEPLOYMENT_SHEET_NAME] = self.deployments
+                if self.include_analytics:
+                    extra_sheets.update(DataProcessor.build_analytics(
+                        self.processed_data, self.deployments, self.confidence_settings,
+                        self.min_frame_ratio, self.site))
+            if self.file_format == 'parquet':
+                extra_tables = None
+                if self.deployments is not None:
+                    extra_tables = {DEPLOYMENT_TABLE_NAME: parquet_deployment_table(self.deployments)}
+                    extra_tables.update(analytics_parquet_tables(
+                        {name: table for name, table in extra_sheets.items() if name != DEPLOYMENT_SHEET_NAME}))
+                success = DataProcessor.export_to_parquet(
+                    self.processed_data,
+                    self.output_path,
+                    self.confidence_settings,
+                    site=self.site,
+                    validation_data=self.validation_data,
+                    min_frame_ratio=self.min_frame_ratio,
+                    progress_callback=self.progress.emit,
+                    extra_tables=extra_tables,
+                    incremental=self.incremental,
+                    source_versions=self.source_versions
+                )
+                return
+            success = DataProcessor.export_to_excel(
+                self.processed_data,
+                self.output_path,
+                self.confidence_settings,
+                file_format=self.file_format,
+                columns_to_export=self.columns_to_export,
+                min_frame_ratio=self.min_frame_ratio,
+                progress_callback=self.progress.emit,
+                extra_sheets=extra_sheets or None,
+                incremental=self.incremental,
+                source_versions=self.source_versions
+            )
+        except Exception as e:
+            logger.error(f"导出表格失败: {e}", exc_info=True)
+        finally:
+            self.finished.emit(success)
+
+
+class MergeExportWorker(QObject):
+    """在后台线程中读取并合并多个项目的记录后导出"""
+    progress = Signal(int, int)  # 已读取项目数/已写行数, 总数
+    finished = Signal(bool)
+
+    def __init__(self, projects, output_path, confidence_settings, file_format, columns_to_export,
+                 min_frame_ratio, include_analytics=False):
+        super().__init__()
+        self.projects = projects
+        self.output_path = output_path
+        self.confidence_settings = confidence_settings
+        self.file_format = file_format
+        self.columns_to_export = columns_to_export
+        self.min_frame_ratio = min_frame_ratio
+        self.include_analytics = include_analytics
+        self.stats = {}  # 导出统计 (由页面持有，工作对象删除后仍可读取)
+
+    def run(self):
+        success = False
+        try:
+            self.stats.update(merge_export.export_merged(
+                self.projects,
+                self.output_path,
+                self.confidence_settings,
+                file_format=self.file_format,
+                columns=self.columns_to_export,
+                min_frame_ratio=self.min_frame_ratio,
+                include_analytics=self.include_analytics,
+                load_callback=self.progress.emit,
+                progress_callback=self.progress.emit
+            ))
+            success = self.stats.get('success', False)
+        except Exception as e:
+            logger.error(f"合并导出失败: {e}", exc_info=True)
+        finally:
+            self.finished.emit(success)
+
+
+class MergeProjectsDialog(QDialog):
+    """选择参与合并导出的项目 (已处理的文件夹)"""
+
+    def __init__(self, parent, photo_root):
+        super().__init__(parent)
+        self.setWindowTitle("合并导出")
+        self.setWindowModality(Qt.ApplicationModal)
+        self.resize(560, 420)
+        self.photo_root = photo_root
+        self.extra_sources = []
+        self.projects = []
+
+        layout = QVBoxLayout(self)
+        layout.setSpacing(12)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.addWidget(QLabel("选择要合并导出的已处理文件夹 (同一照片出现在多个文件夹时只保留一条):"))
+
+        self.project_list = QListWidget()
+        layout.addWidget(self.project_list, 1)
+
+        button_layout = QHBoxLayout()
+        add_button = QPushButton("添加文件夹...")
+        add_button.clicked.connect(self._add_source_dir)
+        button_layout.addWidget(add_button)
+        button_layout.addStretch()
+
+        ok_button = QPushButton("确定")
+        ok_button.clicked.connect(self.accept)
+        ok_button.setDefault(True)
+        cancel_button = QPushButton("取消")
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(ok_button)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+
+        self._refresh()
+
+    def _refresh(self):
+        """重新发现项目并刷新列表 (保持已取消勾选的项目)"""
+        unchecked = {self.project_list.item(i).data(Qt.ItemDataRole.UserRole)
+                     for i in range(self.project_list.count())
+                     if self.project_list.item(i).checkState() != Qt.CheckState.Checked}
+        self.projects = merge_export.discover_projects(self.photo_root, self.extra_sources)
+        self.project_list.clear()
+        for project in self.projects:
+            item = QListWidgetItem(f"{project['site']}    ({project['source_dir']})")
+            item.setData(Qt.ItemDataRole.UserRole, project['temp_dir'])
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Unchecked if project['temp_dir'] in unchecked
+                               else Qt.CheckState.Checked)
+            self.project_list.addItem(item)
+
+    def _add_source_dir(self):
+        """加入没有源文件夹标记的旧缓存：选择其源文件夹"""
+        folder = QFileDialog.getExistingDirectory(self, "选择已处理的源文件夹")
+        if not folder:
+            return
+        temp_dir = merge_export.cache_dir_for(folder, self.photo_root)
+        if not os.path.isdir(temp_dir):
+            QMessageBox.warning(self, "提示", "该文件夹尚未处理，没有可合并的检测结果。")
+            return
+        merge_export.write_source_marker(temp_dir, folder)
+        self.extra_sources.append(folder)
+        self._refresh()
+
+    def selected_projects(self):
+        checked = {self.project_list.item(i).data(Qt.ItemDataRole.UserRole)
+                   for i in range(self.project_list.count())
+                   if self.project_list.item(i).checkState() == Qt.CheckState.Checked}
+        return [project for project in self.projects if project['temp_dir'] in checked]
+
+
 class CorrectionDialog(QDialog):
     """用于修正物种信息的弹窗"""
 
@@ -471,6 +658,16 @@ class SpeciesValidationPage(QWidget):
 
         # 从preview_page继承的validation_data
         self.validation_data = getattr(controller.preview_page, 'validation_data', {})
+        # 导出时使用的增量独立探测引擎 (人工校验只重算受影响的记录)
+        self._independent_engine = None
+        self._independent_engine_dir = None
+        self._threshold_engine = None  # 物种列表的阈值归类引擎 (_load_species_data 时载入)
+        self._species_items = {}  # 归类 -> 物种列表中的条目
+        self._species_label_of = {}  # 文件名 -> 当前列表中的归类，增量刷新时据此找到旧归类
+        # 增量导出：JSON 修改记录，以及按源状态版本缓存的导出记录 (未变化的文件不再重新读取 JSON/EXIF)
+        self._export_change_tracker = None
+        self._export_record_cache = {}
+        self._merge_export_stats = {}  # 最近一次合并导出的统计
 
         # 标记相关变量
         self._species_marked = None
@@ -1183,14 +1380,19 @@ class SpeciesValidationPage(QWidget):
         export_layout = QHBoxLayout(export_options_group)
 
         self.format_combo = ModernComboBox()
-        self.format_combo.addItems(["CSV", "Excel", "错误照片"])
+        self.format_combo.addItems(["CSV", "Excel", "Parquet", "错误照片"])
         self.format_combo.setCurrentText(self.export_format_var)
         self.format_combo.currentTextChanged.connect(self._on_export_format_changed)
         export_layout.addWidget(self.format_combo)
 
-        export_button = QPushButton("导出")
-        export_button.clicked.connect(self._dispatch_export)
-        export_layout.addWidget(export_button)
+        self.export_button = QPushButton("导出")
+        self.export_button.clicked.connect(self._dispatch_export)
+        export_layout.addWidget(self.export_button)
+
+        self.merge_export_button = QPushButton("合并导出")
+        self.merge_export_button.setToolTip("把多个已处理文件夹合并导出为一份表格/数据集")
+        self.merge_export_button.clicked.connect(self._export_merged_projects)
+        export_layout.addWidget(self.merge_export_button)
 
         bottom_layout.addWidget(export_options_group)
         parent_layout.addWidget(bottom_area_frame)
@@ -1240,6 +1442,8 @@ class SpeciesValidationPage(QWidget):
         if not photo_dir or not os.path.exists(photo_dir) or not source_dir:
             self.species_listbox.clear()
             self.species_image_map.clear()
+            self._species_items, self._species_label_of = {}, {}
+            self._threshold_engine = None
             return
 
         # 暂时阻断信号，防止清空时触发不必要的事件
@@ -1248,10 +1452,7 @@ class SpeciesValidationPage(QWidget):
         self.species_listbox.blockSignals(False)
 
         self.species_image_map.clear()
-
-        # 获取最新的置信度配置
-        confidence_settings = self.controller.confidence_settings
-        global_conf = confidence_settings.get("global", 0.25)
+        self._species_items, self._species_label_of = {}, {}
 
         try:
             # 获取源文件映射
@@ -1267,9 +1468,8 @@ class SpeciesValidationPage(QWidget):
             logger.error(f"读取目录失败: {e}")
             return
 
-        all_species_keys = set()
-
-        # === 循环处理所有文件 ===
+        # 一次性读取所有检测结果，之后调整阈值时由阈值引擎增量归类，不再重新扫描 JSON
+        entries = []
         for json_file in json_files:
             base_name = os.path.splitext(json_file)[0]
             image_filename = image_basename_map.get(base_name)
@@ -1279,124 +1479,81 @@ class SpeciesValidationPage(QWidget):
             json_path = os.path.join(photo_dir, json_file)
             try:
                 with open(json_path, 'r', encoding='utf-8') as f:
-                    detection_info = json.load(f)
-
-                final_species_name = "标记为空"  # 默认归宿
-
-                # ==================== 1. 人工校验 (最高优先级) ====================
-                if detection_info.get('最低置信度') == '人工校验':
-                    final_species_name = detection_info.get('物种名称', '标记为空')
-                    if final_species_name in ["", "未知", None]:
-                        final_species_name = "标记为空"
-
-                # ==================== 2. 视频文件处理逻辑 ====================
-                elif 'tracks' in detection_info:
-                    tracks = detection_info.get('tracks', {})
-                    min_frame_ratio = 0.0
-                    if hasattr(self.controller, 'advanced_page'):
-                        min_frame_ratio = self.controller.advanced_page.min_frame_ratio_var
-                    total_frames = detection_info.get('total_frames_processed', 1)
-                    threshold = total_frames * min_frame_ratio
-
-                    valid_votes = []
-                    for track_id, points in tracks.items():
-                        if len(points) < threshold: continue
-                        valid_points = []
-                        for p in points:
-                            sp = p.get('species', 'Unknown')
-                            conf = p.get('confidence', 0)
-                            thresh = confidence_settings.get(sp, global_conf)
-                            if conf >= thresh:
-                                valid_points.append(sp)
-                        if valid_points:
-                            track_species = Counter(valid_points).most_common(1)[0][0]
-                            valid_votes.append(track_species)
-
-                    if valid_votes:
-                        unique_species = sorted(list(set(valid_votes)))
-                        final_species_name = ",".join(unique_species)
-                    else:
-                        final_species_name = "标记为空"
-
-                # ==================== 3. 图片文件处理逻辑 ====================
-                else:
-                    boxes = detection_info.get('检测框', [])
-                    if not boxes:
-                        boxes = detection_info.get('detect_results', detection_info.get('objects', []))
-
-                    valid_species_list = []
-                    is_ambiguous_image = False
-                    AMBIGUITY_THRESHOLD = 0.15
-
-                    for box in boxes:
-                        candidates_pool = []
-                        if "候选项" in box and box["候选项"]:
-                            for c in box["候选项"]:
-                                candidates_pool.append({
-                                    "name": c.get('name'),
-                                    "conf": float(c.get('conf', 0))
-                                })
-                        else:
-                            raw_name = box.get("物种", box.get("species", "未知"))
-                            raw_conf = float(box.get("置信度", box.get("confidence", 0)))
-                            if raw_name and raw_name != "未知":
-                                candidates_pool.append({"name": raw_name, "conf": raw_conf})
-
-                        valid_candidates = []
-                        for c in candidates_pool:
-                            thresh = confidence_settings.get(c['name'], global_conf)
-                            if c['conf'] >= thresh:
-                                valid_candidates.append(c)
-
-                        valid_candidates.sort(key=lambda x: x['conf'], reverse=True)
-
-                        if not valid_candidates:
-                            continue
-
-                        # 差值检查
-                        if len(valid_candidates) >= 2:
-                            diff = valid_candidates[0]['conf'] - valid_candidates[1]['conf']
-                            if diff < AMBIGUITY_THRESHOLD:
-                                is_ambiguous_image = True
-                                break
-
-                        valid_species_list.append(valid_candidates[0]['name'])
-
-                    if is_ambiguous_image:
-                        final_species_name = "需人工检验"
-                    elif valid_species_list:
-                        unique_species = sorted(list(set(valid_species_list)))
-                        final_species_name = ",".join(unique_species)
-                    else:
-                        final_species_name = "标记为空"
-
-                # 将文件添加到对应的 Map (在循环内收集数据)
-                all_species_keys.add(final_species_name)
-                self.species_image_map[final_species_name].append(image_filename)
-
+                    entries.append((image_filename, json.load(f)))
             except Exception as e:
                 logger.error(f"重载处理文件 {json_file} 时出错: {e}")
                 continue
 
-        # ==================== 排序逻辑 ====================
-        def sort_priority(name):
-            if name == "需人工检验":
-                return 0  # 优先级最高
-            if name in ["标记为空", "空"]:
-                return 2  # 优先级最低
-            return 1  # 普通物种
-
-        # 先按优先级排序，同优先级的按名称字母排序
-        sorted_species = sorted(list(all_species_keys), key=lambda x: (sort_priority(x), x))
+        min_frame_ratio = 0.0
+        if hasattr(self.controller, 'advanced_page'):
+            min_frame_ratio = self.controller.advanced_page.min_frame_ratio_var
+        self._threshold_engine = ThresholdEngine(self.controller.confidence_settings, min_frame_ratio)
+        self._threshold_engine.load(entries)
 
-        for species in sorted_species:
-            count = len(self.species_image_map[species])
-            display_text = f"{species} ({count})"
-            self.species_listbox.addItem(display_text)
+        self._refresh_species_list_counts(keep_selection=False)
 
         # 更新下拉框候选项
         self._update_species_selector_items()
 
+    def _refresh_species_list_counts(self, keep_selection=True):
+        """按阈值引擎当前的归类结果重建物种列表与数量 (默认保持当前选中的物种，不触发选择事件)"""
+        if self._threshold_engine is None:
+            return
+        self.species_image_map.clear()
+        self.species_image_map.update(self._threshold_engine.groups())
+        self._species_items = {}
+        self._species_label_of = {file_name: species for species, image_files in self.species_image_map.items()
+                                  for file_name in image_files}
+
+        self.species_listbox.blockSignals(True)
+        self.species_listbox.clear()
+        for species, image_files in self.species_image_map.items():
+            item = QListWidgetItem(f"{species} ({len(image_files)})")
+            self.species_listbox.addItem(item)
+            self._species_items[species] = item
+            if keep_selection and species == self.current_selected_species:
+                item.setSelected(True)
+        self.species_listbox.blockSignals(False)
+
+    def _update_species_list_counts(self, changed_keys):
+        """只更新归类发生变化的记录所涉及的物种条目 (新旧归类)，其余条目保持不变"""
+        if self._threshold_engine is None or not changed_keys:
+            return
+        touched = set()
+        for file_name in changed_keys:
+            old_label = self._species_label_of.get(file_name)
+            new_label = self._threshold_engine.label_of(file_name)
+            if old_label is not None:
+                touched.add(old_label)
+            if new_label is not None:
+                touched.add(new_label)
+                self._species_label_of[file_name] = new_label
+
+        self.species_listbox.blockSignals(True)
+        for label in touched:
+            image_files = self._threshold_engine.keys_of(label)
+            item = self._species_items.get(label)
+            if not image_files:
+                self.species_image_map.pop(label, None)
+                if item is not None:
+                    self.species_listbox.takeItem(self.species_listbox.row(item))
+                    del self._species_items[label]
+                continue
+            self.species_image_map[label] = image_files
+            text = f"{label} ({len(image_files)})"
+            if item is not None:
+                item.setText(text)
+                continue
+            # 新出现的归类按物种列表的显示顺序插入
+            row = self.species_listbox.count()
+            for other, other_item in self._species_items.items():
+                if label_priority(other) > label_priority(label):
+                    row = min(row, self.species_listbox.row(other_item))
+            item = QListWidgetItem(text)
+            self.species_listbox.insertItem(row, item)
+            self._species_items[label] = item
+        self.species_listbox.blockSignals(False)
+
     def _update_species_selector_items(self):
         """
         根据当前的检测结果更新下拉框内容。
@@ -1439,8 +1596,6 @@ class SpeciesValidationPage(QWidget):
         if hasattr(self.controller, 'confidence_settings'):
             conf_settings = self.controller.confidence_settings
 
-        global_thresh = conf_settings.get("global", 0.25)
-
         # 从当前 JSON 数据中提取所有物种
         if self.current_species_info:
             # --- 情况 A: 处理图片 JSON 结构 ---
@@ -1462,17 +1617,11 @@ class SpeciesValidationPage(QWidget):
                 # 2. 处理候选项逻辑
                 is_candidate_match = False
                 if "候选项" in box and box["候选项"]:
-                    candidates = box["候选项"]
-                    for cand in candidates:
-                        c_name = cand.get('name')
-                        c_conf = float(cand.get('conf', 0.0))
-                        c_thresh = conf_settings.get(c_name, global_thresh)
-
-                        if c_conf >= c_thresh:
-                            final_name = c_name
-                            final_conf = c_conf
-                            is_candidate_match = True
-                            break
+                    accepted = first_accepted(((c.get('name'), float(c.get('conf', 0.0))) for c in box["候选项"]),
+                                              conf_settings)
+                    if accepted:
+                        final_name, final_conf = accepted
+                        is_candidate_match = True
 
                 # 3. 将所有出现过的名字加入下拉列表 (增加 0.05 过滤)
                 if final_conf >= MIN_DROPDOWN_CONF:
@@ -1493,8 +1642,7 @@ class SpeciesValidationPage(QWidget):
                 if is_candidate_match:
                     is_valid = True
                 else:
-                    thresh = conf_settings.get(final_name, global_thresh)
-                    if final_conf >= thresh:
+                    if final_conf >= threshold_for(conf_settings, final_name):
                         is_valid = True
 
                 if is_valid:
@@ -1530,8 +1678,7 @@ class SpeciesValidationPage(QWidget):
                         max_absolute_confidence = track_max_conf
                         best_absolute_species_name = dominant_species
 
-                    sp_thresh = conf_settings.get(dominant_species, global_thresh)
-                    if track_max_conf >= sp_thresh:
+                    if track_max_conf >= threshold_for(conf_settings, dominant_species):
                         if track_max_conf > max_valid_confidence:
                             max_valid_confidence = track_max_conf
                             best_valid_species_name = dominant_species
@@ -1587,7 +1734,7 @@ class SpeciesValidationPage(QWidget):
             conf_settings = self.controller.confidence_settings
 
         # 获取值：特定物种 -> 全局 -> 默认0.25
-        saved_val = conf_settings.get(current_species, conf_settings.get("global", 0.25))
+        saved_val = threshold_for(conf_settings, current_species)
 
         # 更新滑块（阻断信号防止循环调用）
         self.species_conf_slider.blockSignals(True)
@@ -1889,8 +2036,13 @@ class SpeciesValidationPage(QWidget):
             species_to_display = quick_marks_data.get("list", [])
 
         # 6. 为列表中的每个物种创建按钮
+        species_catalog = get_species_catalog()
         for species in species_to_display:
             btn = QPushButton(species)
+            # 悬停显示名录中的学名与目/科
+            description = species_catalog.describe(species)
+            if description:
+                btn.setToolTip(description)
             btn.setMaximumWidth(80)  # 使用最大宽度
             btn.setMinimumWidth(60)  # 设置最小宽度
 
@@ -2039,7 +2191,12 @@ class SpeciesValidationPage(QWidget):
         if hasattr(self.controller, 'confidence_settings'):
             self.controller.confidence_settings[current_species_key] = new_conf
 
-        # 3. 启动/重置定时器，准备刷新左侧列表
+        # 3. 阈值引擎只重新归类置信度跨过新旧阈值的记录，实时更新左侧列表的数量
+        if self._threshold_engine is not None:
+            self._update_species_list_counts(
+                self._threshold_engine.set_thresholds(self.controller.confidence_settings))
+
+        # 4. 启动/重置定时器，延迟保存配置
         self._list_refresh_timer.start()
 
     def _export_validation_data(self):
@@ -2064,18 +2221,28 @@ class SpeciesValidationPage(QWidget):
         elif file_format == 'csv':
             file_types = "CSV 文件 (*.csv);;所有文件 (*.*)"
             file_extension = ".csv"
+        elif file_format == 'parquet':
+            file_types = file_extension = None
         else:
             return  # 如果格式未知则不执行操作
 
-        default_filename = f"validation_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}{file_extension}"
-
-        # 弹出文件保存对话框
-        output_path, _ = QFileDialog.getSaveFileName(
-            self,
-            "选择表格保存位置",
-            default_filename,
-            file_types
-        )
+        if file_format == 'parquet':
+            from system.parquet_export import is_parquet_available
+            if not is_parquet_available():
+                QMessageBox.critical(self, "错误", "导出 Parquet 需要安装 pyarrow (pip install pyarrow)。")
+                return
+            # Parquet 数据集写入目录，同一目录可累积多个样地的导出
+            output_path = QFileDialog.getExistingDirectory(self, "选择 Parquet 数据集目录")
+        else:
+            default_filename = f"validation_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}{file_extension}"
+
+            # 弹出文件保存对话框
+            output_path, _ = QFileDialog.getSaveFileName(
+                self,
+                "选择表格保存位置",
+                default_filename,
+                file_types
+            )
 
         if not output_path:
             return
@@ -2086,13 +2253,25 @@ class SpeciesValidationPage(QWidget):
             confidence_settings = {}
 
         all_image_data = []
-        earliest_date = None
+        source_versions = {}
+        # 样地名取源文件夹名 (没有 EXIF 序列号时作为相机编号，也是 Parquet 数据集的分区键)
+        site = os.path.basename(os.path.normpath(source_dir))
+        tracker = self._get_export_change_tracker(temp_dir)
 
         # === 修复开始：同时支持图片和视频文件的查找与元数据提取 ===
         for json_file in json_files:
             json_path = os.path.join(temp_dir, json_file)
             image_filename_base = os.path.splitext(json_file)[0]
 
+            # 源状态未变化的文件直接使用上次读取的记录 (复制一份，后续计算会写入记录)
+            version = tracker.version(image_filename_base)
+            cached = self._export_record_cache.get(json_file)
+            if cached is not None and cached[0] == version:
+                record = dict(cached[1])
+                all_image_data.append(record)
+                source_versions[record.get('文件名', '')] = version
+                continue
+
             found_path = None
             is_video = False
 
@@ -2139,12 +2318,9 @@ class SpeciesValidationPage(QWidget):
                     json_data = json.load(f)
 
                 metadata.update(json_data)
+                self._export_record_cache[json_file] = (version, dict(metadata))
                 all_image_data.append(metadata)
-
-                date_taken = metadata.get('拍摄日期对象')
-                if date_taken:
-                    if earliest_date is None or date_taken < earliest_date:
-                        earliest_date = date_taken
+                source_versions[metadata.get('文件名', '')] = version
             except Exception as e:
                 logger.error(f"处理文件 {json_file} 时出错: {e}")
         # === 修复结束 ===
@@ -2158,31 +2334,167 @@ class SpeciesValidationPage(QWidget):
         if hasattr(self.controller, 'advanced_page'):
             min_frame_ratio = self.controller.advanced_page.min_frame_ratio_var
 
-        # 处理数据 (传递 min_frame_ratio)
-        processed_data = DataProcessor.process_independent_detection(
-            all_image_data,
-            confidence_settings,
-            min_frame_ratio=min_frame_ratio
-        )
+        # 处理数据 (传递 min_frame_ratio)：首次导出时整体计算，之后只重算发生变化的记录及其相邻记录
+        engine = self._get_independent_engine(temp_dir, confidence_settings, min_frame_ratio, site)
+        if len(engine) == 0:
+            engine.rebuild(all_image_data)
+        else:
+            engine.sync(all_image_data, prune=True)
+        processed_data = all_image_data
 
-        if earliest_date:
-            processed_data = DataProcessor.calculate_working_days(processed_data, earliest_date)
+        # 按相机计算工作天数并生成布设表
+        deployment_table = DataProcessor.apply_deployments(processed_data, site, source_dir)
 
         # 从高级设置页面获取用户选择的导出列
         columns_to_export = self.controller.advanced_page.get_selected_export_columns()
 
-        # 导出文件 (传递 min_frame_ratio)
-        success = DataProcessor.export_to_excel(
-            processed_data,
-            output_path,
-            confidence_settings,
-            file_format=file_format,
-            columns_to_export=columns_to_export,
-            min_frame_ratio=min_frame_ratio
-        )
+        # 导出文件 (传递 min_frame_ratio)：后台线程分块写入，状态栏显示进度
+        self.export_button.setEnabled(False)
+        self._export_started_at = time.time()
+        self._export_output_path = output_path
+        self._export_file_format = file_format
+        self._export_row_count = len(processed_data)
+        self._export_uses_progress_bar = not getattr(self.controller, 'is_processing', False)
+        if self._export_uses_progress_bar and hasattr(self.controller, 'status_bar'):
+            self.controller.status_bar.status_label.setText("正在导出表格...")
+            self.controller.status_bar.show_progress()
+
+        self.export_thread = QThread()
+        self.export_worker = TableExportWorker(processed_data, output_path, confidence_settings,
+                                               file_format, columns_to_export, min_frame_ratio)
+        self.export_worker.deployments = deployment_table
+        self.export_worker.site = site
+        self.export_worker.include_analytics = getattr(self.controller.advanced_page, 'export_analytics_var', False)
+        self.export_worker.incremental = getattr(self.controller.advanced_page, 'incremental_export_var', False)
+        self.export_worker.source_versions = source_versions
+        if file_format == 'parquet':
+            self.export_worker.validation_data = dict(self.validation_data)
+        self.export_worker.moveToThread(self.export_thread)
+
+        self.export_thread.started.connect(self.export_worker.run)
+        self.export_worker.progress.connect(self._on_export_progress)
+        self.export_worker.finished.connect(self._on_export_finished)
+        self.export_worker.finished.connect(self.export_thread.quit)
+        self.export_worker.finished.connect(self.export_worker.deleteLater)
+        self.export_thread.finished.connect(self.export_thread.deleteLater)
+
+        self.export_thread.start()
+
+    def _export_merged_projects(self):
+        """多项目合并导出：选择已处理的文件夹，合并为一份导出 (独立探测与工作天数按样地分别计算)"""
+        file_format = self.export_format_var.lower()
+        if file_format not in ('excel', 'csv', 'parquet'):
+            QMessageBox.information(self, "提示", "合并导出支持 CSV、Excel 与 Parquet 格式，请先选择导出格式。")
+            return
 
+        photo_root = os.path.join(self.controller.settings_manager.base_dir, "temp", "photo")
+        dialog = MergeProjectsDialog(self, photo_root)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+        projects = dialog.selected_projects()
+        if not projects:
+            QMessageBox.information(self, "提示", "没有选择任何已处理的文件夹。")
+            return
+
+        if file_format == 'parquet':
+            from system.parquet_export import is_parquet_available
+            if not is_parquet_available():
+                QMessageBox.critical(self, "错误", "导出 Parquet 需要安装 pyarrow (pip install pyarrow)。")
+                return
+            output_path = QFileDialog.getExistingDirectory(self, "选择 Parquet 数据集目录")
+        else:
+            file_extension = ".xlsx" if file_format == 'excel' else ".csv"
+            file_types = "Excel 文件 (*.xlsx);;所有文件 (*.*)" if file_format == 'excel' \
+                else "CSV 文件 (*.csv);;所有文件 (*.*)"
+            default_filename = f"merged_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}{file_extension}"
+            output_path, _ = QFileDialog.getSaveFileName(self, "选择表格保存位置", default_filename, file_types)
+        if not output_path:
+            return
+
+        confidence_settings = self.controller.settings_manager.load_confidence_settings() or {}
+        min_frame_ratio = 0.0
+        if hasattr(self.controller, 'advanced_page'):
+            min_frame_ratio = self.controller.advanced_page.min_frame_ratio_var
+        columns_to_export = self.controller.advanced_page.get_selected_export_columns()
+
+        self.export_button.setEnabled(False)
+        self.merge_export_button.setEnabled(False)
+        self._export_started_at = time.time()
+        self._export_output_path = output_path
+        self._export_file_format = file_format
+        self._export_row_count = 0
+        self._export_uses_progress_bar = not getattr(self.controller, 'is_processing', False)
+        if self._export_uses_progress_bar and hasattr(self.controller, 'status_bar'):
+            self.controller.status_bar.status_label.setText(f"正在合并导出 {len(projects)} 个文件夹...")
+            self.controller.status_bar.show_progress()
+
+        self.export_thread = QThread()
+        self.export_worker = MergeExportWorker(
+            projects, output_path, confidence_settings, file_format, columns_to_export, min_frame_ratio,
+            include_analytics=getattr(self.controller.advanced_page, 'export_analytics_var', False))
+        self._merge_export_stats = self.export_worker.stats
+        self.export_worker.moveToThread(self.export_thread)
+
+        self.export_thread.started.connect(self.export_worker.run)
+        self.export_worker.progress.connect(self._on_export_progress)
+        self.export_worker.finished.connect(self._on_merge_export_finished)
+        self.export_worker.finished.connect(self.export_thread.quit)
+        self.export_worker.finished.connect(self.export_worker.deleteLater)
+        self.export_thread.finished.connect(self.export_thread.deleteLater)
+
+        self.export_thread.start()
+
+    def _on_merge_export_finished(self, success):
+        """合并导出完成：记录导出行数并提示去重结果"""
+        stats = self._merge_export_stats
+        self._export_row_count = stats.get('records', 0)
+        self.merge_export_button.setEnabled(True)
+        if stats.get('duplicates'):
+            logger.info(f"合并导出 {stats.get('projects', 0)} 个文件夹，共 {stats['records']} 条记录，"
+                        f"去除重复 {stats['duplicates']} 条")
+        self._on_export_finished(success)
+
+    def _get_export_change_tracker(self, temp_dir):
+        """当前文件夹的 JSON 修改记录；切换文件夹时重新载入并清空导出记录缓存"""
+        if self._export_change_tracker is None or self._export_change_tracker.temp_dir != temp_dir:
+            self._export_change_tracker = ExportChangeTracker(temp_dir)
+            self._export_record_cache = {}
+        return self._export_change_tracker
+
+    def _get_independent_engine(self, temp_dir, confidence_settings, min_frame_ratio, site=''):
+        """当前文件夹的独立探测引擎 (按相机分组)；切换文件夹时重建，阈值变化时整体重算"""
+        if self._independent_engine is None or self._independent_engine_dir != temp_dir:
+            self._independent_engine = IndependentDetectionEngine(confidence_settings, min_frame_ratio,
+                                                                  camera_of=camera_resolver(site))
+            self._independent_engine_dir = temp_dir
+        else:
+            self._independent_engine.set_thresholds(confidence_settings, min_frame_ratio)
+        return self._independent_engine
+
+    def _on_export_progress(self, written, total):
+        """更新导出进度"""
+        if not self._export_uses_progress_bar or not hasattr(self.controller, 'status_bar'):
+            return
+        elapsed = time.time() - self._export_started_at
+        speed = written / elapsed if elapsed > 0 else 0
+        remaining = (total - written) / speed if speed > 0 else float('inf')
+        self.controller.status_bar.update_progress(written, total, elapsed, remaining, speed)
+
+    def _on_export_finished(self, success):
+        """导出完成后恢复界面并提示结果"""
+        self.export_button.setEnabled(True)
+        if self._export_uses_progress_bar and hasattr(self.controller, 'status_bar'):
+            self.controller.status_bar.hide_progress()
+            self.controller.status_bar.status_label.setText("导出完成" if success else "导出失败")
+
+        output_path = self._export_output_path
         if success:
-            reply = QMessageBox.question(self, "成功", f"数据已成功导出到:\n{output_path}\n\n是否立即打开文件？",
+            message = f"数据已成功导出到:\n{output_path}"
+            part_count = -(-self._export_row_count // EXPORT_MAX_ROWS_PER_PART)
+            if self._export_file_format != 'parquet' and part_count > 1:
+                unit = "个工作表" if self._export_file_format == 'excel' else "个文件"
+                message += f"\n\n行数超过 {EXPORT_MAX_ROWS_PER_PART}，已拆分为 {part_count} {unit}。"
+            reply = QMessageBox.question(self, "成功", f"{message}\n\n是否立即打开文件？",
                                          QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
             if reply == QMessageBox.StandardButton.Yes:
                 try:
@@ -2259,7 +2571,7 @@ class SpeciesValidationPage(QWidget):
         export_type = self.export_format_var
         if export_type == "错误照片":
             self._export_error_images()
-        elif export_type in ["Excel", "CSV"]:
+        elif export_type in ["Excel", "CSV", "Parquet"]:
             self._export_validation_data()
         else:
             QMessageBox.warning(self, "错误", f"未知的导出格式: {export_type}")
@@ -2347,6 +2659,15 @@ class SpeciesValidationPage(QWidget):
 
             # 更新当前信息
             self.current_species_info = detection_info
+            # 记录修改，增量导出时据此判断记录是否变化
+            self._get_export_change_tracker(temp_photo_dir).mark(base_name)
+
+            # 只重算该记录及其前后相邻记录的独立探测标记
+            if self._independent_engine is not None and self._independent_engine_dir == temp_photo_dir:
+                self._independent_engine.update_detection(file_name, detection_info)
+            if self._threshold_engine is not None and file_name in self._threshold_engine:
+                if self._threshold_engine.upsert(file_name, detection_info):
+                    self._update_species_list_counts({file_name})
 
             # 更新显示
             self._update_detection_info_display()
@@ -2414,7 +2735,7 @@ class SpeciesValidationPage(QWidget):
                         sp = p.get('species', 'Unknown')
                         conf = p.get('confidence', 0)
                         # 获取该特定物种的阈值
-                        thresh = conf_map.get(sp, conf_map.get("global", 0.25))
+                        thresh = threshold_for(conf_map, sp)
 
                         if conf >= thresh:
                             valid_points.append(p)
@@ -2466,7 +2787,7 @@ class SpeciesValidationPage(QWidget):
                                 c_name = cand.get('name')
                                 c_conf = float(cand.get('conf', 0))
                                 # 关键修复：使用 map 获取该候选物种的特定阈值
-                                c_thresh = conf_map.get(c_name, conf_map.get("global", 0.25))
+                                c_thresh = threshold_for(conf_map, c_name)
 
                                 if c_conf >= c_thresh:
                                     species_found = c_name
@@ -2478,7 +2799,7 @@ class SpeciesValidationPage(QWidget):
                             raw_name = box.get("物种", box.get("species", "未知"))
                             raw_conf = float(box.get("置信度", box.get("confidence", 0)))
                             # 关键修复：使用 map 获取该主物种的特定阈值
-                            thresh = conf_map.get(raw_name, conf_map.get("global", 0.25))
+                            thresh = threshold_for(conf_map, raw_name)
 
                             if raw_conf >= thresh:
                                 species_found = raw_name
@@ -2705,7 +3026,7 @@ class SpeciesValidationPage(QWidget):
                             continue  # 去重
 
                         # 获取该物种的特定阈值 (优先取特定设置，否则取全局)
-                        thresh = conf_map.get(name, conf_map.get("global", 0.25))
+                        thresh = threshold_for(conf_map, name)
 
                         if conf >= thresh:
                             valid_display_texts.append(f"{name} {conf:.2f}")
@@ -3074,6 +3395,14 @@ class SpeciesValidationPage(QWidget):
         # 从 controller.confidence_settings 中取出最新值并更新滑块和 self.species_conf_var
         self._on_species_selector_changed()
 
+        # 按新配置增量更新物种列表的数量
+        if self._threshold_engine is not None:
+            min_frame_ratio = None
+            if hasattr(self.controller, 'advanced_page'):
+                min_frame_ratio = self.controller.advanced_page.min_frame_ratio_var
+            self._update_species_list_counts(
+                self._threshold_engine.set_thresholds(self.controller.confidence_settings, min_frame_ratio))
+
         # 3. 如果当前有加载图片/视频，立即重绘检测框和信息
         if self.current_species_info:
             # 更新文本信息
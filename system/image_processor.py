@@ -3,7 +3,6 @@
 import os
 import logging
 import concurrent.futures
-import gc
 from typing import Dict, Any, Optional, List, Union, Tuple
 from collections import Counter, defaultdict
 from ultralytics import YOLO
@@ -11,6 +10,13 @@ import json
 import torch
 import numpy as np
 from system.utils import resource_path
+from system.config import DETECT_IMGSZ
+from system.inference_backend import BACKEND_PYTORCH, load_backend_model, default_imgsz, supports_tta, backend_label
+from system.autotune import is_oom_error
+from system.memory_governor import MemoryGovernor
+from system.detection_record import DetectionRecord
+from system.classifier_gate import GATED_FIELD
+from system import preprocessing
 import cv2
 
 logger = logging.getLogger(__name__)
@@ -19,17 +25,29 @@ logger = logging.getLogger(__name__)
 class ImageProcessor:
     """处理图像、检测物种及视频追踪的核心类"""
 
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, backend: str = BACKEND_PYTORCH, cls_int8: bool = False):
         """初始化图像处理器"""
+        self.backend = backend or BACKEND_PYTORCH
+        self.cls_int8 = cls_int8
+        self.model_path = model_path
         self.model = self._load_model(model_path)
         self.translation_dict = self._load_translation_file()
         self.cls_model = None
+        self.cls_model_path = None
+        self.cls_imgsz = None
+        self.device_crops = True  # 在推理设备上用 ROI-Align 直接提取分类输入 (失败后自动回退到 CPU 裁剪)
+        self.cls_gate = None  # 分类门控 (ClassifierGate)，检测结果足够确定的框跳过分类
+        self.frame_cache = None  # 预处理帧缓存 (FrameCache)，启用时读取/写入检测分辨率的增强帧
+        self.prepared_key = None  # 最近一次 prepare_models 的参数，模型重新加载后清空
+        self._tta_notice_logged = False
+        self.memory_governor = MemoryGovernor()
+        self._names_cache = {}  # id(模型名称字典) -> (名称字典, 中文映射, 中文名数组)
 
     def _load_model(self, model_path: str) -> Optional[YOLO]:
-        """加载YOLO模型"""
+        """加载YOLO模型 (按当前推理后端)"""
         try:
             logger.info(f"正在加载模型: {model_path}")
-            return YOLO(model_path)
+            return load_backend_model(model_path, self.backend, DETECT_IMGSZ, task="detect")
         except Exception as e:
             logger.error(f"加载模型失败: {e}")
             return None
@@ -37,9 +55,10 @@ class ImageProcessor:
     def load_model(self, model_path: str) -> None:
         """加载新的模型"""
         try:
-            from ultralytics import YOLO
-            self.model = YOLO(model_path)
+            self.model = load_backend_model(model_path, self.backend, DETECT_IMGSZ, task="detect")
             self.model_path = model_path
+            self.prepared_key = None
+            self._tta_notice_logged = False
             logger.info(f"模型已加载: {model_path}")
 
         except Exception as e:
@@ -51,13 +70,149 @@ class ImageProcessor:
         try:
             if not model_path:
                 self.cls_model = None
+                self.cls_model_path = None
+                self.cls_imgsz = None
                 logger.info("分类模型已卸载")
                 return
             logger.info(f"正在加载分类模型: {model_path}")
-            self.cls_model = YOLO(model_path)
+            self.prepared_key = None
+            cls_imgsz = default_imgsz(model_path, 224)
+            self.cls_model = None
+            if self.cls_int8:
+                try:
+                    from system.cls_quantization import load_quantized_classifier
+                    self.cls_model = load_quantized_classifier(model_path, cls_imgsz)
+                except Exception as e:
+                    logger.error(f"加载INT8分类模型失败，使用原模型: {e}")
+            if self.cls_model is None:
+                self.cls_model = load_backend_model(model_path, self.backend, cls_imgsz, task="classify")
+            self.cls_model_path = model_path
+            self.cls_imgsz = cls_imgsz
         except Exception as e:
             logger.error(f"加载分类模型失败: {e}")
             self.cls_model = None
+            self.cls_model_path = None
+            self.cls_imgsz = None
+
+    def set_backend(self, backend: str) -> None:
+        """切换推理后端并重新加载检测/分类模型 (首次切换时会导出并缓存模型)"""
+        backend = backend or BACKEND_PYTORCH
+        if backend == self.backend:
+            return
+        self.backend = backend
+        if self.model_path:
+            self.load_model(self.model_path)
+        if self.cls_model_path:
+            self.load_cls_model(self.cls_model_path)
+
+    def set_cls_int8(self, enabled: bool) -> None:
+        """切换是否使用INT8量化分类模型并重新加载分类模型"""
+        enabled = bool(enabled)
+        if enabled == self.cls_int8:
+            return
+        self.cls_int8 = enabled
+        if self.cls_model_path:
+            self.load_cls_model(self.cls_model_path)
+
+    def _detector_augment(self, augment: bool) -> bool:
+        """当前检测模型实际使用的 augment：导出后端不支持TTA，显式关闭并记录一次日志"""
+        if not augment or supports_tta(self.model):
+            return bool(augment)
+        if not self._tta_notice_logged:
+            logger.info(f"{backend_label(self.backend)} 后端不支持数据增强 (TTA)，已关闭 augment")
+            self._tta_notice_logged = True
+        return False
+
+    def prepare_models(self, batch_size: int = 16, use_fp16: bool = False, augment: bool = True,
+                       compile_graph: bool = False, warmup_runs: int = 2) -> Dict[str, Any]:
+        """
+        模型准备：在处理开始前完成层融合、(可选) 图编译与预热，使第一个真实批次即以稳定速度运行。
+
+        ultralytics 在首次推理时才创建预测器、融合 Conv+BN 并按 FP16/FP32 转换模型，
+        随后的几个批次还要经历显存分配器扩容与 cuDNN 算法选择。这里用与实际处理相同的
+        imgsz、Batch Size、FP16 与 TTA 设置推理几次灰色占位图，把这些开销提前到后台完成。
+
+        compile_graph: 仅 PyTorch 后端 + CUDA 时生效，用 torch.compile 编译预测器内的网络，
+                       编译或预热失败时自动恢复为未编译的模型。
+        返回各阶段耗时等信息；参数与上次相同且模型未重新加载时直接跳过。
+        """
+        use_fp16 = self._check_cuda(use_fp16)
+        augment = self._detector_augment(augment)
+        batch_size = max(1, int(batch_size))
+        compile_graph = bool(compile_graph) and self.backend == BACKEND_PYTORCH and torch.cuda.is_available()
+        key = (self.model_path, self.cls_model_path, self.backend, self.cls_int8,
+               batch_size, use_fp16, bool(augment), compile_graph)
+        report = {'skipped': key == self.prepared_key, 'compiled': False}
+        if report['skipped'] or not self.model:
+            return report
+
+        import time
+        warmup_runs = max(1, int(warmup_runs))
+        # 常见 4:3 相机画面按检测尺寸缩放后的大小
+        dummy = np.full((DETECT_IMGSZ * 3 // 4, DETECT_IMGSZ, 3), 114, dtype=np.uint8)
+        frames = [dummy] * batch_size
+
+        start = time.perf_counter()
+        try:
+            def run_detector():
+                self.model(frames, augment=augment, agnostic_nms=True, imgsz=DETECT_IMGSZ,
+                           half=use_fp16, max_det=20, verbose=False)
+
+            run_detector()  # 首次调用创建预测器并完成层融合
+            if compile_graph:
+                report['compiled'] = self._compile_predictor(self.model, run_detector)
+            for _ in range(warmup_runs):
+                run_detector()
+        except Exception as e:
+            if is_oom_error(e):
+                self.memory_governor.relieve()
+            logger.warning(f"检测模型预热失败 (不影响处理): {e}")
+            return report
+        report['detector_s'] = round(time.perf_counter() - start, 3)
+
+        if self.cls_model:
+            start = time.perf_counter()
+            try:
+                from system.config import CLS_POOL_TARGET_BATCH
+                size = int(self.cls_imgsz or 224)
+                if self.device_crops:
+                    crops = torch.full((CLS_POOL_TARGET_BATCH, 3, size, size), 114 / 255.0, device=self._crop_device())
+                else:
+                    crops = [np.full((size, size, 3), 114, dtype=np.uint8)] * CLS_POOL_TARGET_BATCH
+
+                def run_classifier():
+                    self.cls_model(crops, half=use_fp16, verbose=False)
+
+                run_classifier()
+                if compile_graph:
+                    report['compiled'] = self._compile_predictor(self.cls_model, run_classifier) and report['compiled']
+                for _ in range(warmup_runs):
+                    run_classifier()
+                report['classifier_s'] = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                if is_oom_error(e):
+                    self.memory_governor.relieve()
+                logger.warning(f"分类模型预热失败 (不影响处理): {e}")
+
+        self.prepared_key = key
+        logger.info(f"模型预热完成: {report}")
+        return report
+
+    @staticmethod
+    def _compile_predictor(model: YOLO, run_fn) -> bool:
+        """用 torch.compile 编译预测器中的网络并立即运行一次；失败时恢复原模型"""
+        backend = getattr(getattr(model, 'predictor', None), 'model', None)
+        network = getattr(backend, 'model', None)
+        if network is None or not hasattr(torch, 'compile') or not isinstance(network, torch.nn.Module):
+            return False
+        try:
+            backend.model = torch.compile(network)
+            run_fn()
+            return True
+        except Exception as e:
+            backend.model = network
+            logger.warning(f"torch.compile 编译失败，使用未编译的模型: {e}")
+            return False
 
     def _load_translation_file(self) -> Dict[str, str]:
         """加载翻译文件"""
@@ -85,49 +240,276 @@ class ImageProcessor:
         except Exception:
             return False
 
-    def _preprocess_image(self, img: Any) -> Any:
+    @staticmethod
+    def _preprocess_image(img: Any) -> Any:
         """
         图像预处理：LAB色彩空间增强 (L通道 CLAHE)
-        适用于 BGR 彩色图像和 灰度图像
+        适用于 BGR 彩色图像和 灰度图像，实现见 system.preprocessing (复用 CLAHE、红外灰度帧单平面快速路径)
         """
-        if img is None or img.size == 0:
+        return preprocessing.enhance(img)
+
+    @staticmethod
+    def _expand_boxes(xyxy: np.ndarray, w: int, h: int, expand_ratio: float = 0.1) -> np.ndarray:
+        """批量外扩检测框 (各边外扩宽/高的 expand_ratio) 并裁剪到图像范围，返回 (N, 4) 整数数组"""
+        boxes = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4).astype(np.int64)
+        pad = ((boxes[:, 2:] - boxes[:, :2]) * expand_ratio).astype(np.int64)
+        expanded = np.empty_like(boxes)
+        expanded[:, :2] = np.maximum(0, boxes[:, :2] - pad)
+        expanded[:, 2] = np.minimum(w, boxes[:, 2] + pad[:, 0])
+        expanded[:, 3] = np.minimum(h, boxes[:, 3] + pad[:, 1])
+        return expanded
+
+    @staticmethod
+    def _square_crop(orig_img_rgb: np.ndarray, xyxy, expand_ratio: float = 0.1) -> Optional[np.ndarray]:
+        """按检测框外扩裁剪，并用灰色(114)补成正方形，作为分类模型输入"""
+        h, w = orig_img_rgb.shape[:2]
+        box = ImageProcessor._expand_boxes(xyxy, w, h, expand_ratio)[0]
+        return ImageProcessor._crop_expanded(orig_img_rgb, box)
+
+    @staticmethod
+    def _crop_expanded(orig_img_rgb: np.ndarray, box: np.ndarray) -> Optional[np.ndarray]:
+        """按已外扩的框裁剪，并用灰色(114)补成正方形"""
+        x1, y1, x2, y2 = (int(v) for v in box)
+        if x2 <= x1 or y2 <= y1:
             return None
 
-        try:
-            # [新增] 确保图像是 uint8 类型且内存连续，防止 YOLO 报错 Unsupported image type
-            if img.dtype != np.uint8:
-                img = img.astype(np.uint8)
+        crop = orig_img_rgb[y1:y2, x1:x2]
+
+        # Padding Square (Gray 114)
+        ch, cw = crop.shape[:2]
+        if ch != cw:
+            max_dim = max(ch, cw)
+            top = (max_dim - ch) // 2
+            bottom = max_dim - ch - top
+            left = (max_dim - cw) // 2
+            right = max_dim - cw - left
+            crop = cv2.copyMakeBorder(
+                crop, top, bottom, left, right,
+                cv2.BORDER_CONSTANT, value=[114, 114, 114]
+            )
+        return crop
 
-            # 1. 灰度图处理 (2维数组)
-            if len(img.shape) == 2:
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-                enhanced = clahe.apply(img)
-                return np.ascontiguousarray(enhanced)
+    @staticmethod
+    def _crop_device() -> torch.device:
+        """分类裁剪所在的设备，与 ultralytics 默认选择的推理设备一致"""
+        return torch.device('cuda:0' if torch.cuda.is_available() else 'cpu')
 
-            # 2. 彩色图处理 (3维数组 BGR)
-            elif len(img.shape) == 3:
-                # BGR -> LAB
-                lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
-                l, a, b = cv2.split(lab)
+    def _extract_crops_roi_align(self, processed_imgs: List[np.ndarray], det_records: List[DetectionRecord],
+                                 select: Optional[List[np.ndarray]] = None
+                                 ) -> Tuple[Optional[torch.Tensor], List[Tuple[int, int]]]:
+        """
+        在推理设备上用 ROI-Align 一次性提取整批图片全部检测框的分类输入，直接输出分类模型尺寸，
+        省去逐框的 NumPy 切片、copyMakeBorder 补边以及分类模型内部的二次缩放。
 
-                # 只对 L 通道 (亮度) 进行 CLAHE 增强
-                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-                l_enhanced = clahe.apply(l)
+        语义与 _crop_expanded 一致：外扩10%后的矩形居中放入边长为 max(宽, 高) 的正方形，
+        矩形以外的区域填充灰色(114)。sampling_ratio 取自适应值，每个输出像素是源区域内多点双线性采样的平均，
+        效果接近分类预处理中带抗锯齿的缩放。
 
-                # 合并通道并转回 BGR
-                merged = cv2.merge((l_enhanced, a, b))
-                bgr_enhanced = cv2.cvtColor(merged, cv2.COLOR_LAB2BGR)
+        输入为 BGR 图像 (processed_imgs)：原流程把 RGB 裁剪交给 ultralytics 时会被当作 BGR 再翻转一次，
+        分类模型实际看到的通道顺序即为 BGR，这里保持不变。
 
-                # [重要] 返回连续数组
-                return np.ascontiguousarray(bgr_enhanced)
+        Args:
+            select: (可选) 每张图片一个布尔数组，只提取为 True 的检测框 (分类门控)
 
-        except Exception as e:
-            logger.warning(f"图像预处理失败，将使用原图: {e}")
-            return np.ascontiguousarray(img) if img is not None else None
+        Returns:
+            (N, 3, S, S) 取值 0~1 的张量 (无框时为 None)，以及与之对应的 (图片索引, 框索引) 列表
+        """
+        from torchvision.ops import roi_align
+
+        size = int(self.cls_imgsz or 224)
+        device = self._crop_device()
+        steps = (torch.arange(size, device=device, dtype=torch.float32) + 0.5) / size
+
+        regions, rois, locals_, sides, crop_map_info = [], [], [], [], []
+        for r_idx, record in enumerate(det_records):
+            if not record:
+                continue
+            img = processed_imgs[r_idx]
+            h, w = img.shape[:2]
+            rects = self._expand_boxes(record.xyxy, w, h)
+            valid = (rects[:, 2] > rects[:, 0]) & (rects[:, 3] > rects[:, 1])
+            if select is not None:
+                valid &= select[r_idx]
+            if not valid.any():
+                continue
+            box_indices = np.nonzero(valid)[0]
+            rects = rects[valid]
+
+            # 只把包含全部框的区域传到设备上，避免整张大图的拷贝与浮点转换
+            ux1, uy1 = int(rects[:, 0].min()), int(rects[:, 1].min())
+            ux2, uy2 = int(rects[:, 2].max()), int(rects[:, 3].max())
+            region = img[uy1:uy2, ux1:ux2]
+            if region.ndim == 2:
+                region = np.repeat(region[:, :, None], 3, axis=2)
+
+            # 正方形ROI (与 copyMakeBorder 的上/左补边方式一致)，坐标相对于上传区域
+            local = (rects - np.array([ux1, uy1, ux1, uy1], dtype=rects.dtype)).astype(np.float32)
+            cw = local[:, 2] - local[:, 0]
+            ch = local[:, 3] - local[:, 1]
+            side = np.maximum(cw, ch)
+            sx = local[:, 0] - np.floor((side - cw) / 2)
+            sy = local[:, 1] - np.floor((side - ch) / 2)
+            batch_idx = np.full_like(sx, len(regions))
+            rois.append(np.stack([batch_idx, sx, sy, sx + side, sy + side], axis=1))
+            locals_.append(local)
+            sides.append(side)
+            regions.append(region)
+            crop_map_info.extend((r_idx, int(b_idx)) for b_idx in box_indices)
+
+        if not regions:
+            return None, []
+
+        # 各图的区域按最大尺寸拼成一个批次 (右/下边缘复制填充)，整批只做一次上传与一次 ROI-Align；
+        # 区域内的采样不受填充影响，越过区域右/下边缘的采样点取边缘像素 (接近 CPU 裁剪缩放时的边缘处理)
+        max_h = max(region.shape[0] for region in regions)
+        max_w = max(region.shape[1] for region in regions)
+        stacked = np.empty((len(regions), max_h, max_w, 3), dtype=regions[0].dtype)
+        for k, region in enumerate(regions):
+            h, w = region.shape[:2]
+            stacked[k, :h, :w] = region
+            stacked[k, :h, w:] = region[:, -1:]
+            stacked[k, h:] = stacked[k, h - 1:h]
+        del regions
+        regions_t = torch.from_numpy(stacked).to(device, non_blocking=True).permute(0, 3, 1, 2).float()
+        rois = np.concatenate(rois)
+        local = np.concatenate(locals_)
+        side = np.concatenate(sides)
+
+        crops = roi_align(regions_t, torch.from_numpy(rois).to(device), output_size=size,
+                          spatial_scale=1.0, sampling_ratio=-1, aligned=True)
+        del regions_t
+
+        # 输出像素中心落在外扩矩形以外的部分填充灰色(114)
+        local_t = torch.from_numpy(local).to(device)
+        sx_t = torch.from_numpy(np.ascontiguousarray(rois[:, 1])).to(device)[:, None]
+        sy_t = torch.from_numpy(np.ascontiguousarray(rois[:, 2])).to(device)[:, None]
+        side_t = torch.from_numpy(side).to(device)[:, None]
+        xs = sx_t + steps[None, :] * side_t
+        ys = sy_t + steps[None, :] * side_t
+        inside_x = (xs >= local_t[:, 0:1]) & (xs < local_t[:, 2:3])
+        inside_y = (ys >= local_t[:, 1:2]) & (ys < local_t[:, 3:4])
+        inside = inside_y[:, :, None] & inside_x[:, None, :]
+        crops.masked_fill_(~inside[:, None], 114.0)
+
+        # 与 uint8 图像经 ToTensor 后的取值保持一致
+        batch = crops.round_().clamp_(0, 255).div_(255.0)
+        return batch, crop_map_info
+
+    def _extract_crops_numpy(self, original_imgs_rgb: List[np.ndarray], det_records: List[DetectionRecord],
+                             select: Optional[List[np.ndarray]] = None) -> Tuple[List[np.ndarray], List[Tuple[int, int]]]:
+        """CPU 裁剪 (回退路径)：逐框切片并补成正方形，由分类模型自行缩放"""
+        all_crops = []
+        # 映射: list index -> (result_index_in_batch, box_index)
+        crop_map_info = []
+        for r_idx, record in enumerate(det_records):
+            if not record:
+                continue
+            orig_img_rgb = original_imgs_rgb[r_idx]
+            h, w = orig_img_rgb.shape[:2]
+
+            # === 裁剪逻辑 (保持与单张一致)：整张图的框一次性外扩 ===
+            expanded_boxes = self._expand_boxes(record.xyxy, w, h)
+            for b_idx, box in enumerate(expanded_boxes):
+                if select is not None and not select[r_idx][b_idx]:
+                    continue
+                crop = self._crop_expanded(orig_img_rgb, box)
+                if crop is not None:
+                    all_crops.append(crop)
+                    crop_map_info.append((r_idx, b_idx))
+        return all_crops, crop_map_info
+
+    def _extract_cls_inputs(self, processed_imgs: List[np.ndarray], original_imgs_rgb: List[np.ndarray],
+                            det_records: List[DetectionRecord]) -> Tuple[Any, List[Tuple[int, int]]]:
+        """提取需要分类的检测框的分类输入 (设备端裁剪失败时回退到 CPU 裁剪)，返回 (分类输入, 裁剪映射)"""
+        select = self._gate_select(det_records)
+        if self.device_crops:
+            try:
+                return self._extract_crops_roi_align(processed_imgs, det_records, select)
+            except Exception as e:
+                if is_oom_error(e):
+                    raise
+                logger.warning(f"设备端裁剪不可用，改用CPU裁剪: {e}")
+                self.device_crops = False
+        return self._extract_crops_numpy(original_imgs_rgb, det_records, select)
+
+    def _source_resolution_frames(self, processed_imgs: List[np.ndarray], original_imgs_rgb: List[np.ndarray],
+                                  det_records: List[DetectionRecord]) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """
+        缓存帧 (CachedFrame) 是缩小到检测分辨率的帧，分类裁剪必须取自原分辨率的增强图，否则分类结果会变化。
+        这里为有检测框的缓存帧取回原分辨率的增强图 (写入缓存时保留的 source_frame，命中缓存时重新读取原图)，
+        并把检测框映射回原图坐标；返回用于裁剪的 (BGR 图像列表, RGB 图像列表)，未使用缓存时原样返回。
+        """
+        bgr_imgs, rgb_imgs = processed_imgs, original_imgs_rgb
+        for i, (img, record) in enumerate(zip(processed_imgs, det_records)):
+            source_shape = getattr(img, 'source_shape', None)
+            if not record or source_shape is None or tuple(img.shape[:2]) == tuple(source_shape):
+                continue
+            source = img.source_frame
+            if source is None:
+                raw = cv2.imread(img.source_path) if img.source_path else None
+                source = self._preprocess_image(raw) if raw is not None else None
+            if source is None:
+                logger.warning(f"读取原图失败，分类裁剪改用缓存帧: {img.source_path}")
+                continue
+            if bgr_imgs is processed_imgs:
+                bgr_imgs, rgb_imgs = list(processed_imgs), list(original_imgs_rgb)
+            bgr_imgs[i] = source
+            rgb_imgs[i] = cv2.cvtColor(source, cv2.COLOR_BGR2RGB)
+            record.restore_source_coords()
+        return bgr_imgs, rgb_imgs
+
+    def _gate_select(self, det_records: List[DetectionRecord]) -> Optional[List[np.ndarray]]:
+        """分类门控：返回每张图片中需要分类的检测框掩码；未启用或阈值与当前模型不匹配时返回 None (全部分类)"""
+        gate = self.cls_gate
+        if gate is None or not gate.matches(self.model_path, self.cls_model_path):
+            return None
+        select = []
+        for record in det_records:
+            if not record:
+                select.append(np.zeros(0, dtype=bool))
+                continue
+            if record.gated is None:
+                _, det_name_table = self._names_lookup(record.names)
+                record.gated = ~gate.select(det_name_table[record.cls.astype(np.int64)], record.conf)
+            select.append(~record.gated)
+        return select
+
+    def classify_inputs(self, cls_inputs: Any, use_fp16: bool) -> Tuple[torch.Tensor, np.ndarray]:
+        """批量运行分类模型，返回 (N, C) 概率矩阵与类别中文名数组"""
+        # 这里的 batch size 可以根据显存调整，YOLO通常自动处理
+        cls_results_list = self.cls_model(cls_inputs, half=use_fp16)
+        prob_matrix = torch.stack([cls_res.probs.data for cls_res in cls_results_list])
+        _, cls_name_table = self._names_lookup(cls_results_list[0].names)
+        return prob_matrix, cls_name_table
+
+    def apply_cls_probs(self, det_records: List[DetectionRecord], crop_map_info: List[Tuple[int, int]],
+                        prob_matrix: torch.Tensor, cls_name_table: np.ndarray) -> None:
+        """把分类概率映射回检测框：整批概率矩阵一次完成温度缩放、TopK与加权，结果写入 record.candidates"""
+        w_det = 0.4
+        w_cls = 0.6
 
-        return img
+        smoothed_probs = self._apply_temperature_scaling(prob_matrix, temperature=3.0)
+        topk_confs, topk_indices = torch.topk(smoothed_probs, min(3, smoothed_probs.shape[-1]), dim=-1)
+        cls_confs = topk_confs.float().cpu().numpy().astype(np.float64)
+        top_names = cls_name_table[topk_indices.cpu().numpy()]
+
+        # 原始检测置信度 (按裁剪顺序排列)
+        det_confs = np.array([det_records[r_idx].conf[b_idx] for r_idx, b_idx in crop_map_info],
+                             dtype=np.float64)
+        # 加权置信度；检测置信度对同一框的候选相同，TopK 顺序即加权后的降序
+        weighted_confs = det_confs[:, None] * w_det + cls_confs * w_cls
+
+        for i, (r_idx, b_idx) in enumerate(crop_map_info):
+            det_conf = float(det_confs[i])
+            det_records[r_idx].candidates[b_idx] = [
+                {"name": name, "conf": weighted, "raw_cls_conf": cls_conf, "raw_det_conf": det_conf}
+                for name, weighted, cls_conf in zip(
+                    top_names[i].tolist(), weighted_confs[i].tolist(), cls_confs[i].tolist()
+                )
+            ]
 
-    def _apply_temperature_scaling(self, probs: torch.Tensor, temperature: float = 3.0) -> torch.Tensor:
+    @staticmethod
+    def _apply_temperature_scaling(probs: torch.Tensor, temperature: float = 3.0) -> torch.Tensor:
         """
         标准温度缩放 (Temperature Scaling)：
         直接利用 Softmax 的性质平滑概率分布。
@@ -152,8 +534,8 @@ class ImageProcessor:
             # T 越大，logits 之间的差异越小
             scaled_logits = logits / temperature
 
-            # 3. 重新计算 Softmax
-            return torch.nn.functional.softmax(scaled_logits, dim=0)
+            # 3. 重新计算 Softmax (沿最后一维，可同时处理单个向量或 [N, C] 概率矩阵)
+            return torch.nn.functional.softmax(scaled_logits, dim=-1)
 
         except Exception as e:
             logger.warning(f"温度缩放失败: {e}")
@@ -163,12 +545,17 @@ class ImageProcessor:
         """辅助方法：处理单张图片的线程任务"""
         idx, path = args
         try:
-            # 这里的 self._preprocess_image 需要确保能被访问
-            img = cv2.imread(path)
-            if img is None:
-                return None
-            # 预处理 (LAB增强等)
-            proc_img = self._preprocess_image(img)
+            frame_cache = self.frame_cache
+            proc_img = frame_cache.get(path) if frame_cache is not None else None
+            if proc_img is None:
+                # 这里的 self._preprocess_image 需要确保能被访问
+                img = cv2.imread(path)
+                if img is None:
+                    return None
+                # 预处理 (LAB增强等)
+                proc_img = self._preprocess_image(img)
+                if frame_cache is not None and proc_img is not None:
+                    proc_img = frame_cache.put(path, proc_img)
             # 转换副本用于后续裁剪 (RGB)
             orig_rgb = cv2.cvtColor(proc_img, cv2.COLOR_BGR2RGB)
             return (idx, proc_img, orig_rgb)
@@ -210,233 +597,167 @@ class ImageProcessor:
             logger.error(f"预加载数据失败: {e}")
             return None
 
+    @staticmethod
+    def _empty_batch_results(count: int) -> List[Dict[str, Any]]:
+        return [{'物种名称': "", '物种数量': "", 'detect_results': None, '最低置信度': None}
+                for _ in range(count)]
+
+    def _load_batch_images(self, img_paths: List[str], preloaded_data: Optional[Tuple] = None) -> Tuple:
+        """返回 (valid_indices, processed_imgs, original_imgs_rgb)，优先使用预加载的数据"""
+        if preloaded_data:
+            return preloaded_data
+        # 如果没有预加载数据，则现场读取并预处理
+        return self.preload_batch_data(img_paths) or ([], [], [])
+
+    def detect_stage(self, img_paths: List[str], use_fp16: bool = False, iou: float = 0.3,
+                     conf: float = 0.25, augment: bool = True, agnostic_nms: bool = True,
+                     preloaded_data: Optional[Tuple] = None) -> Optional[Tuple]:
+        """
+        第一阶段：运行检测模型并提取分类输入 (不运行分类模型)，供跨批次的裁剪池使用。
+        返回 (valid_indices, det_records, cls_inputs, crop_map_info)；没有可读取的图片时返回 None。
+        返回后原图即可释放，分类输入只保留裁剪后的小图。
+        """
+        use_fp16 = self._check_cuda(use_fp16)
+        valid_indices, processed_imgs, original_imgs_rgb = self._load_batch_images(img_paths, preloaded_data)
+        if not processed_imgs:
+            return None
+        det_records = self._run_detector(processed_imgs, use_fp16, iou, conf, augment, agnostic_nms)
+        cls_inputs, crop_map_info = None, []
+        if self.cls_model:
+            processed_imgs, original_imgs_rgb = self._source_resolution_frames(
+                processed_imgs, original_imgs_rgb, det_records)
+            cls_inputs, crop_map_info = self._extract_cls_inputs(processed_imgs, original_imgs_rgb, det_records)
+        return valid_indices, det_records, cls_inputs, crop_map_info
+
+    def _run_detector(self, processed_imgs: List[np.ndarray], use_fp16: bool, iou: float, conf: float,
+                      augment: bool, agnostic_nms: bool) -> List[DetectionRecord]:
+        """批量运行检测模型，并立即转换为轻量记录"""
+        # stream=False 确保返回完整列表
+        det_results = self.model(
+            processed_imgs,
+            augment=self._detector_augment(augment),
+            agnostic_nms=agnostic_nms,
+            imgsz=DETECT_IMGSZ,
+            half=use_fp16,
+            iou=iou,
+            conf=conf,
+            max_det=20,
+        )
+        # 立即转换为轻量记录，释放 Results 持有的原图与张量
+        records = [DetectionRecord.from_result(r) for r in det_results]
+        for img, record in zip(processed_imgs, records):
+            # 缓存帧的检测框在汇总前映射回原图坐标
+            record.source_shape = getattr(img, 'source_shape', None)
+        return records
+
+    def summarize_batch(self, img_count: int, valid_indices: List[int],
+                        det_records: List[DetectionRecord]) -> List[Dict[str, Any]]:
+        """
+        结果整合与统计：det_records 的长度等于成功读取的图片数，
+        这里映射回原始 img_paths 的长度 (读取失败的图片返回空结果)
+        """
+        batch_results_info = []
+        det_iter = iter(det_records)
+        valid_set = set(valid_indices)
+
+        for idx in range(img_count):
+            if idx not in valid_set:
+                batch_results_info.append({
+                    '物种名称': "", '物种数量': "",
+                    'detect_results': None, '最低置信度': None
+                })
+                continue
+
+            record = next(det_iter)
+            record.restore_source_coords()
+            min_conf = None
+            detected_species_counts = {}
+
+            if record:
+                min_conf = "%.3f" % float(record.conf.min())
+
+                # 检测类别名通过预先构建的名称数组批量查找，再用分类修正结果覆盖
+                _, det_name_table = self._names_lookup(record.names)
+                final_names = det_name_table[record.cls.astype(np.int64)].tolist()
+                for i, candidates in record.candidates.items():
+                    if candidates:
+                        final_names[i] = candidates[0]['name']
+                # Counter 保留首次出现的顺序
+                detected_species_counts = Counter(final_names)
+
+            species_str = ",".join(list(detected_species_counts.keys()))
+            counts_str = ",".join(list(map(str, detected_species_counts.values())))
+
+            batch_results_info.append({
+                '物种名称': species_str if species_str else "空",
+                '物种数量': counts_str if counts_str else "空",
+                'detect_results': [record],  # 保持列表格式以便兼容 save_detection_info_json
+                '最低置信度': min_conf
+            })
+        return batch_results_info
+
     def detect_batch_species(self, img_paths: List[str], use_fp16: bool = False, iou: float = 0.3,
                              conf: float = 0.25, augment: bool = True,
                              agnostic_nms: bool = True, timeout: float = 60.0,
                              preloaded_data: Optional[Tuple] = None) -> List[Dict[str, Any]]:
         """
-        批量检测图像中的物种
+        批量检测图像中的物种 (检测 -> 裁剪 -> 分类 -> 汇总，一次完成)
         :param preloaded_data: (可选) 由 preload_batch_data 返回的预处理数据 (valid_indices, processed_imgs, original_imgs_rgb)
         """
         use_fp16 = self._check_cuda(use_fp16)
-        w_det = 0.4
-        w_cls = 0.6
         batch_results_info = []
+        oom_error = None
 
         if not self.model:
-            for _ in img_paths:
-                batch_results_info.append({
-                    '物种名称': "", '物种数量': "",
-                    'detect_results': None, '最低置信度': None
-                })
-            return batch_results_info
+            return self._empty_batch_results(len(img_paths))
 
-        def run_batch_process():
-            nonlocal batch_results_info
-            try:
-                # [修改] 1. 优先使用预加载的数据，否则现场处理
-                if preloaded_data:
-                    valid_indices, processed_imgs, original_imgs_rgb = preloaded_data
-                else:
-                    # 如果没有预加载数据，则执行原有的加载逻辑 (调用新提取的 _process_single_image_task)
-                    processed_imgs = []
-                    valid_indices = []
-                    original_imgs_rgb = []
-                    max_workers = min(len(img_paths), 8)
-
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                        futures = [
-                            executor.submit(self._process_single_image_task, (idx, path))
-                            for idx, path in enumerate(img_paths)
-                        ]
-                        for future in futures:
-                            result = future.result()
-                            if result is not None:
-                                idx, proc_img, orig_rgb = result
-                                valid_indices.append(idx)
-                                processed_imgs.append(proc_img)
-                                original_imgs_rgb.append(orig_rgb)
-
-                if not processed_imgs:
-                    return
+        try:
+            # 1. 读取/预处理图片 (优先使用预加载的数据)
+            valid_indices, processed_imgs, original_imgs_rgb = self._load_batch_images(img_paths, preloaded_data)
 
+            if processed_imgs:
                 # 2. 批量运行检测模型
-                # stream=False 确保返回完整列表
-                det_results = self.model(
-                    processed_imgs,
-                    augment=augment,
-                    agnostic_nms=agnostic_nms,
-                    imgsz=1024,
-                    half=use_fp16,
-                    iou=iou,
-                    conf=conf,
-                    max_det=20,
-                )
-
-                # 3. 准备分类裁剪 (Collection Phase)
-                all_crops = []
-                # 映射: list index -> (result_index_in_batch, box_index)
-                crop_map_info = []
-
-                # 初始化每个结果的 candidates_map
-                batch_candidates_maps = [{} for _ in det_results]
+                det_records = self._run_detector(processed_imgs, use_fp16, iou, conf, augment, agnostic_nms)
 
+                # 3-5. 提取分类裁剪、批量分类并映射回检测框
                 if self.cls_model:
-                    for r_idx, r in enumerate(det_results):
-                        if r.boxes is None: continue
-
-                        orig_img_rgb = original_imgs_rgb[r_idx]
-                        h, w, _ = orig_img_rgb.shape
-
-                        for b_idx, box in enumerate(r.boxes):
-                            x1, y1, x2, y2 = map(int, box.xyxy[0].tolist())
-
-                            # === 裁剪逻辑 (保持与单张一致) ===
-                            expand_ratio = 0.1
-                            box_width = x2 - x1
-                            box_height = y2 - y1
-                            pad_w = int(box_width * expand_ratio)
-                            pad_h = int(box_height * expand_ratio)
-
-                            x1 = max(0, x1 - pad_w)
-                            y1 = max(0, y1 - pad_h)
-                            x2 = min(w, x2 + pad_w)
-                            y2 = min(h, y2 + pad_h)
-
-                            if x2 > x1 and y2 > y1:
-                                crop = orig_img_rgb[y1:y2, x1:x2]
-
-                                # Padding Square (Gray 114)
-                                ch, cw = crop.shape[:2]
-                                if ch != cw:
-                                    max_dim = max(ch, cw)
-                                    top = (max_dim - ch) // 2
-                                    bottom = max_dim - ch - top
-                                    left = (max_dim - cw) // 2
-                                    right = max_dim - cw - left
-                                    crop = cv2.copyMakeBorder(
-                                        crop, top, bottom, left, right,
-                                        cv2.BORDER_CONSTANT, value=[114, 114, 114]
-                                    )
-
-                                all_crops.append(crop)
-                                crop_map_info.append((r_idx, b_idx))
-
-                    # 4. 批量运行分类模型 (Batch Inference)
-                    if all_crops:
-                        # 这里的 batch size 可以根据显存调整，YOLO通常自动处理
-                        cls_results_list = self.cls_model(all_crops, half=use_fp16)
-
-                        # 5. 映射回原结果 (Map Back)
-                        for i, cls_res in enumerate(cls_results_list):
-                            r_idx, b_idx = crop_map_info[i]
-
-                            # 获取原始检测置信度
-                            det_conf = float(det_results[r_idx].boxes[b_idx].conf.item())
-
-                            # 温度缩放 & TopK
-                            original_probs = cls_res.probs.data
-                            smoothed_probs = self._apply_temperature_scaling(original_probs, temperature=3.0)
-                            topk_confs, topk_indices = torch.topk(smoothed_probs, 3)
-
-                            candidates = []
-                            for c_idx, c_conf in zip(topk_indices.tolist(), topk_confs.tolist()):
-                                raw_name = cls_res.names[int(c_idx)]
-                                trans_name = self.translation_dict.get(raw_name, raw_name)
-                                cls_conf_val = float(c_conf)
-
-                                # 加权置信度
-                                weighted_conf = (det_conf * w_det) + (cls_conf_val * w_cls)
-
-                                candidates.append({
-                                    "name": trans_name,
-                                    "conf": weighted_conf,
-                                    "raw_cls_conf": cls_conf_val,
-                                    "raw_det_conf": det_conf
-                                })
-
-                            candidates.sort(key=lambda x: x["conf"], reverse=True)
-                            batch_candidates_maps[r_idx][b_idx] = candidates
+                    processed_imgs, original_imgs_rgb = self._source_resolution_frames(
+                        processed_imgs, original_imgs_rgb, det_records)
+                    cls_inputs, crop_map_info = self._extract_cls_inputs(processed_imgs, original_imgs_rgb,
+                                                                         det_records)
+                    if crop_map_info:
+                        try:
+                            prob_matrix, cls_name_table = self.classify_inputs(cls_inputs, use_fp16)
+                        except Exception as e:
+                            if is_oom_error(e) or not isinstance(cls_inputs, torch.Tensor):
+                                raise
+                            # 分类模型不接受张量输入时回退到 CPU 裁剪
+                            logger.warning(f"分类模型不支持设备端裁剪输入，改用CPU裁剪: {e}")
+                            self.device_crops = False
+                            cls_inputs, crop_map_info = self._extract_crops_numpy(
+                                original_imgs_rgb, det_records, self._gate_select(det_records))
+                            prob_matrix, cls_name_table = self.classify_inputs(cls_inputs, use_fp16)
+                        del cls_inputs
+                        self.apply_cls_probs(det_records, crop_map_info, prob_matrix, cls_name_table)
 
                 # 6. 结果整合与统计
-                # 此时 det_results 的长度等于 processed_imgs 的长度
-                # 我们需要将其映射回原始 img_paths 的长度（处理读取失败的情况）
-
-                det_iter = iter(det_results)
-                cand_map_iter = iter(batch_candidates_maps)
-
-                for idx in range(len(img_paths)):
-                    if idx not in valid_indices:
-                        # 读取失败的图片返回空
-                        batch_results_info.append({
-                            '物种名称': "", '物种数量': "",
-                            'detect_results': None, '最低置信度': None
-                        })
-                        continue
-
-                    r = next(det_iter)
-                    candidates_map = next(cand_map_iter)
-
-                    min_conf = None
-                    detected_species_counts = {}
-
-                    if r.boxes:
-                        confs = r.boxes.conf.tolist()
-                        if confs:
-                            current_min = min(confs)
-                            min_conf = "%.3f" % current_min
-
-                        for i, box in enumerate(r.boxes):
-                            final_name = ""
-                            # 优先使用分类修正结果
-                            if i in candidates_map and candidates_map[i]:
-                                final_name = candidates_map[i][0]['name']
-                            else:
-                                cls_id = int(box.cls.item())
-                                raw_name = r.names[cls_id]
-                                final_name = self.translation_dict.get(raw_name, raw_name)
-
-                            detected_species_counts[final_name] = detected_species_counts.get(final_name, 0) + 1
-
-                            # 注入数据用于JSON保存
-                            if not hasattr(r, 'candidates_data'):
-                                r.candidates_data = {}
-                            if i in candidates_map:
-                                r.candidates_data[i] = candidates_map[i]
-
-                    species_str = ",".join(list(detected_species_counts.keys()))
-                    counts_str = ",".join(list(map(str, detected_species_counts.values())))
-
-                    batch_results_info.append({
-                        '物种名称': species_str if species_str else "空",
-                        '物种数量': counts_str if counts_str else "空",
-                        'detect_results': [r],  # 保持列表格式以便兼容 save_detection_info_json
-                        '最低置信度': min_conf
-                    })
-
-                return True
-
-            except Exception as e:
-                logger.error(f"批量检测失败: {e}")
-                return False
-
-            finally:
-                pass
+                batch_results_info = self.summarize_batch(len(img_paths), valid_indices, det_records)
 
-        run_batch_process()
+        except Exception as e:
+            if is_oom_error(e):
+                # 内存/显存不足需交给调用方处理 (缩小批次或重新调优)
+                oom_error = e
+            logger.error(f"批量检测失败: {e}")
 
         try:
-            # 1. 强制进行 Python 垃圾回收，断开未使用的 Tensor 引用
-            gc.collect()
-
-            # 2. 如果使用 GPU，强制清空 PyTorch 的显存缓存
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                # 可选：整理碎片（PyTorch 某些版本支持）
-                # torch.cuda.ipc_collect()
+            # 仅在内存/显存超过水位线时才回收，避免每批都做全量GC和显存重新分配
+            self.memory_governor.relieve()
         except Exception as e:
             logger.warning(f"显存清理过程中发生错误 (不影响结果): {e}")
 
+        if oom_error is not None:
+            raise oom_error
+
         return batch_results_info
 
     def _create_temp_enhanced_video(self, source_path: str, temp_path: str, stride: int) -> int:
@@ -550,14 +871,14 @@ class ImageProcessor:
 
             # === 第二步：运行 YOLO 追踪 ===
             # source 直接传入临时视频路径
-            # imgsz=1024 仍保留作为推理尺寸，YOLO 会自动 resize 输入网络，不影响结果
+            # imgsz=DETECT_IMGSZ 仍保留作为推理尺寸，YOLO 会自动 resize 输入网络，不影响结果
             # vid_stride=1 必须为1，因为我们在第一步已经物理删除了不需要的帧
             results = self.model.track(
                 source=temp_enhanced_video_path,
                 tracker=tracker_config,
-                augment=augment,
+                augment=self._detector_augment(augment),
                 agnostic_nms=agnostic_nms,
-                imgsz=1024,
+                imgsz=DETECT_IMGSZ,
                 half=use_fp16,
                 iou=iou,
                 conf=conf,
@@ -665,15 +986,15 @@ class ImageProcessor:
     def _get_first_detected_species(self, results: Any) -> str:
         """从检测结果中获取第一个物种的名称"""
         try:
-            for r in results:
-                if r.boxes and len(r.boxes.cls) > 0:
-                    return r.names[int(r.boxes.cls[0].item())]
+            for record in results:
+                if record:
+                    return record.class_name(0)
         except Exception as e:
             logger.error(f"获取物种名称失败: {e}")
         return "unknown"
 
     def save_detection_temp(self, results: Any, image_name: str, temp_photo_dir: str) -> str:
-        """保存探测结果图片到指定的临时目录"""
+        """保存探测结果图片到指定的临时目录 (需传入 ultralytics Results，检测记录不含原图)"""
         if not results or not temp_photo_dir:
             return ""
 
@@ -690,61 +1011,78 @@ class ImageProcessor:
             logger.error(f"保存临时检测结果图片失败: {e}")
             return ""
 
-    def save_detection_info_json(self, results, image_name: str, species_info: dict, temp_photo_dir: str) -> str:
-        """保存探测结果信息到指定的临时目录 (用于单张图片)"""
-        if not results or not temp_photo_dir:
+    def _names_lookup(self, names: Dict[int, str]) -> Tuple[Dict[int, str], np.ndarray]:
+        """返回 (类别ID->中文名 字典, 按类别ID索引的中文名数组)，按模型名称字典对象缓存
+
+        检测模型与分类模型各自的名称字典在加载后不会变化，因此每个模型只构建一次。
+        """
+        cached = self._names_cache.get(id(names))
+        if cached is None or cached[0] is not names:
+            translated = {
+                class_id: self.translation_dict.get(english_name, english_name)
+                for class_id, english_name in names.items()
+            }
+            table = np.empty(max(names) + 1 if names else 0, dtype=object)
+            for class_id, name in translated.items():
+                table[class_id] = name
+            cached = (names, translated, table)
+            self._names_cache[id(names)] = cached
+        return cached[1], cached[2]
+
+    def build_detection_info(self, results, species_info: dict) -> Dict[str, Any]:
+        """将检测结果整理为与临时JSON一致的字典结构 (可直接序列化)"""
+        data_to_save = {
+            "物种名称": species_info.get('物种名称', ''),
+            "物种数量": species_info.get('物种数量', ''),
+            "最低置信度": species_info.get('最低置信度', ''),
+            "检测时间": species_info.get('检测时间', '')
+        }
+        boxes_info = []
+        all_confidences = []
+        all_classes = []
+        names_map = {}
+        gated = False
+
+        if results:
+            for record in results:
+                gated = gated or record.gated is not None
+                names_map, name_table = self._names_lookup(record.names)
+                bboxes = record.xyxy.tolist()
+                confs = record.conf.tolist()
+                translated_names = name_table[record.cls.astype(np.int64)].tolist()
+                for i in range(len(record)):
+                    box_info = {"物种": translated_names[i], "置信度": confs[i], "边界框": bboxes[i]}
+
+                    if i in record.candidates:
+                        box_info["候选项"] = record.candidates[i]
+                        # 如果有分类结果，将"物种"字段更新为分类置信度最高的那一个
+                        if record.candidates[i]:
+                            box_info["物种"] = record.candidates[i][0]['name']
+                            box_info["置信度"] = record.candidates[i][0]['conf']
+                    elif record.gated is not None and record.gated[i]:
+                        box_info["跳过分类"] = True
+
+                    boxes_info.append(box_info)
+                all_confidences = confs
+                all_classes = record.cls.tolist()
+
+        data_to_save["检测框"] = boxes_info
+        data_to_save["all_confidences"] = all_confidences
+        data_to_save["all_classes"] = all_classes
+        data_to_save["names_map"] = names_map
+        if gated:
+            # 启用门控时处理的记录不用于重新学习门控阈值 (被跳过的高置信度框没有分类结果)
+            data_to_save[GATED_FIELD] = True
+        return data_to_save
+
+    @staticmethod
+    def write_detection_info_json(data_to_save: Dict[str, Any], image_name: str, temp_photo_dir: str) -> str:
+        """将已整理好的检测信息字典写入临时目录下的JSON文件"""
+        if not data_to_save or not temp_photo_dir:
             return ""
 
         try:
-            import json
             os.makedirs(temp_photo_dir, exist_ok=True)
-            data_to_save = {
-                "物种名称": species_info.get('物种名称', ''),
-                "物种数量": species_info.get('物种数量', ''),
-                "最低置信度": species_info.get('最低置信度', ''),
-                "检测时间": species_info.get('检测时间', '')
-            }
-            boxes_info = []
-            all_confidences = []
-            all_classes = []
-            names_map = {}
-
-            if results:
-                for r in results:
-                    original_names_map = r.names
-                    translated_names_map = {
-                        class_id: self.translation_dict.get(english_name, english_name)
-                        for class_id, english_name in original_names_map.items()
-                    }
-                    names_map = translated_names_map
-                    if r.boxes is not None:
-                        for i, box in enumerate(r.boxes):
-                            cls_id = int(box.cls.item())
-                            species_name = r.names[cls_id]
-
-                            translated_name = self.translation_dict.get(species_name, species_name)
-
-                            confidence = float(box.conf.item())
-                            bbox = [float(x) for x in box.xyxy.tolist()[0]]
-
-                            box_info = {"物种": translated_name, "置信度": confidence, "边界框": bbox}
-
-                            if hasattr(r, 'candidates_data') and i in r.candidates_data:
-                                box_info["候选项"] = r.candidates_data[i]
-                                # 如果有分类结果，将"物种"字段更新为分类置信度最高的那一个
-                                if r.candidates_data[i]:
-                                    box_info["物种"] = r.candidates_data[i][0]['name']
-                                    box_info["置信度"] = r.candidates_data[i][0]['conf']
-
-                            boxes_info.append(box_info)
-                        all_confidences = r.boxes.conf.tolist()
-                        all_classes = r.boxes.cls.tolist()
-
-            data_to_save["检测框"] = boxes_info
-            data_to_save["all_confidences"] = all_confidences
-            data_to_save["all_classes"] = all_classes
-            data_to_save["names_map"] = names_map
-
             base_name, _ = os.path.splitext(image_name)
             json_path = os.path.join(temp_photo_dir, f"{base_name}.json")
 
@@ -756,4 +1094,17 @@ class ImageProcessor:
             logger.error(f"保存检测结果JSON失败: {e}")
             return ""
 
+    def save_detection_info_json(self, results, image_name: str, species_info: dict, temp_photo_dir: str) -> str:
+        """保存探测结果信息到指定的临时目录 (用于单张图片)"""
+        if not results or not temp_photo_dir:
+            return ""
+
+        try:
+            data_to_save = self.build_detection_info(results, species_info)
+        except Exception as e:
+            logger.error(f"保存检测结果JSON失败: {e}")
+            return ""
+
+        return self.write_detection_info_json(data_to_save, image_name, temp_photo_dir)
+
 
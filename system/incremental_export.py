@@ -0,0 +1,425 @@
+# system/incremental_export.py
+"""
+增量导出模块 - 重新导出到同一个输出时，只更新自上次导出以来发生变化的记录。
+
+    1. 每个文件的源状态版本 = JSON 的修改时间-大小-人工校验次数 (ExportChangeTracker 记录校验页面
+       _update_json_file 的每次修改，修改时间精度不足时也能识别)；
+    2. 输出旁保存清单 (表格为 <输出文件>.manifest.json，Parquet 为数据集目录中的 _manifest_<样地>.json)，
+       按输出顺序记录每个文件的版本与导出行的哈希；
+    3. 再次导出时分块计算导出行的哈希 (不在内存中保留整张表)，与清单比较：
+       CSV 只重写包含变化行的分片文件，只有新增记录时直接追加到最后一个文件末尾；
+       Parquet 只重写包含变化记录的 (样地, 拍摄年月) 分区；
+       Excel 工作簿无法只替换其中的工作表，有变化时整体重写，没有变化时跳过写入；
+    4. 没有清单、清单与本次的列/格式/分片行数不一致或输出文件缺失时，退回完整导出并生成清单。
+
+已有记录保持原来的行位置，新增记录追加在末尾，删除的记录之后的行依次前移。
+"""
+
+import os
+import json
+import shutil
+import logging
+import threading
+from urllib.parse import unquote
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+import pandas as pd
+
+from system.config import EXPORT_CHUNK_ROWS, EXPORT_MAX_ROWS_PER_PART
+from system.deployments import CAMERA_FIELD
+from system.export_engine import DEFAULT_EXPORT_COLUMNS
+from system.streaming_export import (extra_table_path, iter_export_chunks, part_path, write_csv_streaming,
+                                     write_excel_streaming, ProgressCallback)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+CHANGES_FILE_NAME = 'export_changes.state'  # 不以 .json 结尾，避免被当作检测结果读取
+
+
+def source_version(json_path: str, edits: int = 0) -> str:
+    """文件的源状态版本"""
+    try:
+        st = os.stat(json_path)
+    except OSError:
+        return f"missing-{edits}"
+    return f"{st.st_mtime_ns}-{st.st_size}-{edits}"
+
+
+class ExportChangeTracker:
+    """记录临时目录中每个 JSON 的人工修改次数 (保存在 export_changes.state)"""
+
+    def __init__(self, temp_dir: str):
+        self.temp_dir = temp_dir
+        self.path = os.path.join(temp_dir, CHANGES_FILE_NAME)
+        self._lock = threading.Lock()
+        self._edits: Dict[str, int] = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._edits = {str(k): int(v) for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"读取导出变更记录失败: {e}")
+
+    def mark(self, base_name: str) -> None:
+        """记录一次修改 (base_name 为不含扩展名的文件名)"""
+        with self._lock:
+            self._edits[base_name] = self._edits.get(base_name, 0) + 1
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(self._edits, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.warning(f"保存导出变更记录失败: {e}")
+
+    def version(self, base_name: str) -> str:
+        json_path = os.path.join(self.temp_dir, f"{base_name}.json")
+        return source_version(json_path, self._edits.get(base_name, 0))
+
+
+# ---------------- 清单 ----------------
+
+def _read_manifest(path: str) -> Optional[dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        return manifest if manifest.get('version') == MANIFEST_VERSION else None
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"读取导出清单失败，将完整导出: {e}")
+        return None
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    manifest['version'] = MANIFEST_VERSION
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def table_manifest_path(output_path: str) -> str:
+    return f"{output_path}.manifest.json"
+
+
+def _chunk_hashes(chunk: pd.DataFrame) -> List[str]:
+    return [format(int(h), '016x') for h in pd.util.hash_pandas_object(chunk.astype(str), index=False)]
+
+
+def _row_hashes(chunks: Iterable[pd.DataFrame]) -> List[str]:
+    """逐块计算导出行的哈希"""
+    return [h for chunk in chunks for h in _chunk_hashes(chunk)]
+
+
+def _hashing(chunks: Iterable[pd.DataFrame], hashes: List[str]) -> Iterator[pd.DataFrame]:
+    """写入数据块的同时记录行哈希，完整导出时不必再生成一遍表格"""
+    for chunk in chunks:
+        hashes.extend(_chunk_hashes(chunk))
+        yield chunk
+
+
+def _tables_hash(tables: Optional[Dict[str, pd.DataFrame]]) -> str:
+    """附加表的哈希 (附加表变化时 Excel 工作簿也需要重写)"""
+    parts = []
+    for name, table in (tables or {}).items():
+        values = pd.util.hash_pandas_object(table.astype(str), index=False).to_numpy()
+        parts.append(f"{name}:{list(table.columns)}:{int(values.sum()) if len(values) else 0:x}:{len(values)}")
+    return '|'.join(parts)
+
+
+def _file_names(image_info_list: List[Dict[str, Any]]) -> Optional[List[str]]:
+    """记录的文件名 (重复时返回 None，无法按文件名对应行)"""
+    names = [str(info.get('文件名', '')) for info in image_info_list]
+    return names if len(set(names)) == len(names) else None
+
+
+def _plan_order(old_files: List[str], names: List[str]) -> List[str]:
+    """新的输出顺序：保留仍存在的文件的原有顺序，新文件按记录顺序追加在末尾"""
+    current = set(names)
+    kept = [name for name in old_files if name in current]
+    kept_set = set(kept)
+    return kept + [name for name in names if name not in kept_set]
+
+
+# ---------------- 表格 (Excel / CSV) ----------------
+
+def _source_keys(image_info_list: List[Dict[str, Any]], source_versions: Dict[str, str]) -> List[str]:
+    """
+    每条记录的源状态键：源状态版本 + 导出前计算写入记录的字段 (工作天数、独立探测、相机编号)。
+    键与上次导出相同且阈值未变时导出行不变，直接沿用清单中的行哈希；没有版本的记录键为空，总是重新计算。
+    """
+    keys = []
+    for info in image_info_list:
+        version = source_versions.get(str(info.get('文件名', '')))
+        keys.append(f"{version}|{info.get('工作天数')}|{info.get('独立探测首只')}|{info.get(CAMERA_FIELD)}"
+                    if version else '')
+    return keys
+
+
+def _thresholds_key(confidence_settings: Optional[Dict[str, float]], min_frame_ratio: float) -> str:
+    return json.dumps([confidence_settings or {}, min_frame_ratio], sort_keys=True, ensure_ascii=False)
+
+
+def export_table_incremental(image_info_list: List[Dict[str, Any]], output_path: str,
+                             confidence_settings: Optional[Dict[str, float]],
+                             species_info_map: Dict[str, Dict[str, str]], file_format: str = 'excel',
+                             columns: Optional[List[str]] = None, min_frame_ratio: float = 0.0,
+                             source_versions: Optional[Dict[str, str]] = None,
+                             chunk_rows: int = EXPORT_CHUNK_ROWS, rows_per_part: int = EXPORT_MAX_ROWS_PER_PART,
+                             progress_callback: Optional[ProgressCallback] = None,
+                             extra_sheets: Optional[Dict[str, pd.DataFrame]] = None) -> Dict[str, Any]:
+    """增量导出表格，返回统计信息 (mode: full/incremental/unchanged, changed_rows, written_parts)"""
+    file_format = file_format.lower()
+    if file_format not in ('excel', 'csv'):
+        raise ValueError(f"不支持的导出格式: {file_format}")
+    columns = columns if columns else DEFAULT_EXPORT_COLUMNS
+    rows_per_part = max(1, int(rows_per_part))
+    source_versions = source_versions or {}
+    manifest_path = table_manifest_path(output_path)
+    full_args = (image_info_list, output_path, confidence_settings, species_info_map, file_format, columns,
+                 min_frame_ratio, chunk_rows, rows_per_part, progress_callback, extra_sheets, source_versions)
+
+    names = _file_names(image_info_list)
+    if names is None:
+        logger.warning("存在重复的文件名，无法增量导出，将完整导出")
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        return _export_table_full(*full_args, manifest=False)
+
+    manifest = _read_manifest(manifest_path)
+    layout = {'format': file_format, 'columns': columns, 'rows_per_part': rows_per_part}
+    old_parts = -(-len(manifest['files']) // rows_per_part) if manifest else 0
+    if (manifest is None or manifest.get('settings') != layout
+            or any(not os.path.exists(p) for p in _table_outputs(output_path, file_format, old_parts))):
+        return _export_table_full(*full_args)
+
+    position = {name: i for i, name in enumerate(names)}
+    order = _plan_order(manifest['files'], names)
+    ordered = [image_info_list[position[name]] for name in order]
+    keys = _source_keys(ordered, source_versions)
+    thresholds = _thresholds_key(confidence_settings, min_frame_ratio)
+
+    # 源状态未变化的记录沿用上次的行哈希，只为其余记录生成导出行
+    old_files, old_hashes = manifest['files'], manifest['hashes']
+    hashes: List[Optional[str]] = [None] * len(order)
+    if manifest.get('thresholds') == thresholds:
+        old_position = {name: i for i, name in enumerate(old_files)}
+        old_keys = manifest.get('sources', [])
+        for p, name in enumerate(order):
+            i = old_position.get(name)
+            if keys[p] and i is not None and i < len(old_keys) and old_keys[i] == keys[p]:
+                hashes[p] = old_hashes[i]
+    stale = [p for p, h in enumerate(hashes) if h is None]
+    fresh = _row_hashes(iter_export_chunks([ordered[p] for p in stale], confidence_settings, species_info_map,
+                                           columns, min_frame_ratio, chunk_rows))
+    for p, h in zip(stale, fresh):
+        hashes[p] = h
+    extra_hash = _tables_hash(extra_sheets)
+
+    changed = [p for p in range(len(order))
+               if p >= len(old_files) or old_files[p] != order[p] or old_hashes[p] != hashes[p]]
+    truncated = len(order) < len(old_files)
+    stats = {'mode': 'unchanged', 'rows': len(order), 'changed_rows': len(changed), 'rebuilt_rows': len(stale),
+             'written_parts': []}
+
+    if changed or truncated or (file_format == 'excel' and manifest.get('extra') != extra_hash):
+        stats['mode'] = 'incremental'
+        if file_format == 'excel':
+            chunks = iter_export_chunks(ordered, confidence_settings, species_info_map, columns,
+                                        min_frame_ratio, chunk_rows)
+            stats['written_parts'] = write_excel_streaming(chunks, output_path, columns, len(ordered),
+                                                           rows_per_part=rows_per_part,
+                                                           progress_callback=progress_callback,
+                                                           extra_sheets=extra_sheets)
+        else:
+            stats['written_parts'] = _update_csv_parts(
+                ordered, changed, len(old_files), output_path, confidence_settings, species_info_map, columns,
+                min_frame_ratio, chunk_rows, rows_per_part, progress_callback)
+    if file_format == 'csv':
+        for name, table in (extra_sheets or {}).items():
+            table.to_csv(extra_table_path(output_path, name), index=False, encoding='utf-8-sig')
+
+    _write_manifest(manifest_path, {'settings': layout, 'thresholds': thresholds, 'files': order,
+                                    'hashes': hashes, 'sources': keys, 'extra': extra_hash})
+    logger.info(f"增量导出: {stats['changed_rows']}/{stats['rows']} 行发生变化，"
+                f"重写 {len(stats['written_parts'])} 个部分")
+    return stats
+
+
+def _table_outputs(output_path: str, file_format: str, parts: int) -> List[str]:
+    """清单对应的输出文件 (Excel 为单个工作簿，CSV 为各分片文件)"""
+    if file_format == 'excel':
+        return [output_path]
+    return [part_path(output_path, part) for part in range(1, max(parts, 1) + 1)]
+
+
+def _export_table_full(image_info_list, output_path, confidence_settings, species_info_map, file_format,
+                       columns, min_frame_ratio, chunk_rows, rows_per_part, progress_callback, extra_sheets,
+                       source_versions=None, manifest: bool = True) -> Dict[str, Any]:
+    """完整导出，写入的同时计算行哈希并记录清单"""
+    hashes: List[str] = []
+    chunks = _hashing(iter_export_chunks(image_info_list, confidence_settings, species_info_map, columns,
+                                         min_frame_ratio, chunk_rows), hashes)
+    writer = write_excel_streaming if file_format == 'excel' else write_csv_streaming
+    parts = writer(chunks, output_path, columns, len(image_info_list), rows_per_part=rows_per_part,
+                   progress_callback=progress_callback, extra_sheets=extra_sheets)
+    if manifest:
+        _write_manifest(table_manifest_path(output_path), {
+            'settings': {'format': file_format, 'columns': columns, 'rows_per_part': rows_per_part},
+            'thresholds': _thresholds_key(confidence_settings, min_frame_ratio),
+            'files': [str(info.get('文件名', '')) for info in image_info_list], 'hashes': hashes,
+            'sources': _source_keys(image_info_list, source_versions or {}), 'extra': _tables_hash(extra_sheets),
+        })
+    return {'mode': 'full', 'rows': len(image_info_list), 'changed_rows': len(image_info_list),
+            'rebuilt_rows': len(image_info_list), 'written_parts': parts}
+
+
+def _update_csv_parts(ordered, changed, old_rows, output_path, confidence_settings, species_info_map, columns,
+                      min_frame_ratio, chunk_rows, rows_per_part, progress_callback) -> List[str]:
+    """只重写包含变化行的 CSV 分片；某个分片只在末尾新增行时直接追加"""
+    total = len(ordered)
+    new_parts = -(-total // rows_per_part) if total else 1
+    old_parts = -(-old_rows // rows_per_part) if old_rows else 1
+    changed_parts: Dict[int, bool] = {}  # 分片序号 (从 0 开始) -> 是否只有追加
+    for p in changed:
+        part = p // rows_per_part
+        append_only = p >= old_rows
+        changed_parts[part] = changed_parts.get(part, True) and append_only
+    if total < old_rows:
+        # 删除记录后，行数减少的分片需要重写
+        for part in range(total // rows_per_part, new_parts):
+            changed_parts[part] = False
+
+    written, done = [], 0
+    for part in sorted(changed_parts):
+        start, end = part * rows_per_part, min(total, (part + 1) * rows_per_part)
+        path = part_path(output_path, part + 1)
+        append_from = max(start, old_rows) if changed_parts[part] and part < old_parts else None
+        if append_from is not None:
+            with open(path, 'a', encoding='utf-8', newline='') as handle:
+                for chunk in iter_export_chunks(ordered[append_from:end], confidence_settings, species_info_map,
+                                                columns, min_frame_ratio, chunk_rows):
+                    chunk.to_csv(handle, index=False, header=False)
+        else:
+            with open(path, 'w', encoding='utf-8-sig', newline='') as handle:
+                pd.DataFrame(columns=columns).to_csv(handle, index=False)
+                for chunk in iter_export_chunks(ordered[start:end], confidence_settings, species_info_map,
+                                                columns, min_frame_ratio, chunk_rows):
+                    chunk.to_csv(handle, index=False, header=False)
+        written.append(path)
+        done += end - (append_from if append_from is not None else start)
+        if progress_callback:
+            progress_callback(done, total)
+
+    # 删除多余的分片文件
+    for part in range(new_parts + 1, old_parts + 1):
+        path = part_path(output_path, part)
+        if os.path.exists(path):
+            os.remove(path)
+    return written
+
+
+# ---------------- Parquet ----------------
+
+def parquet_manifest_path(output_dir: str, site: str) -> str:
+    return os.path.join(output_dir, f"_manifest_{site}.json")
+
+
+def _partition_dirs(table_dir: str, site: str, months: Set[str]) -> List[str]:
+    """表中属于 (site, months) 的分区目录 (目录名按 hive 方式编码，解码后比较)"""
+    result = []
+    if not os.path.isdir(table_dir):
+        return result
+    for site_dir in os.listdir(table_dir):
+        if unquote(site_dir) != f"site={site}":
+            continue
+        site_path = os.path.join(table_dir, site_dir)
+        for month_dir in os.listdir(site_path):
+            name = unquote(month_dir)
+            if name.startswith('capture_month=') and name.split('=', 1)[1] in months:
+                result.append(os.path.join(site_path, month_dir))
+    return result
+
+
+def _remove_partitions(output_dir: str, site: str, months: Set[str]) -> None:
+    """删除四个记录表中 (site, months) 的分区"""
+    from system.parquet_export import PARQUET_TABLES
+
+    if not months:
+        return
+    for table in PARQUET_TABLES:
+        for path in _partition_dirs(os.path.join(output_dir, table), site, months):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def export_parquet_incremental(image_info_list: List[Dict[str, Any]], output_dir: str,
+                               confidence_settings: Optional[Dict[str, float]],
+                               species_info_map: Dict[str, Dict[str, str]], site: str,
+                               validation_data: Optional[Dict[str, bool]] = None, min_frame_ratio: float = 0.0,
+                               source_versions: Optional[Dict[str, str]] = None,
+                               progress_callback: Optional[Callable[[int, int], None]] = None,
+                               extra_tables: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """增量导出 Parquet 数据集：只重写包含变化记录的 (样地, 拍摄年月) 分区，附加表总是重写"""
+    from system.parquet_export import IMAGE_EXPORT_COLUMNS, UNKNOWN_PARTITION, capture_month_of, export_parquet_dataset
+
+    site = site or UNKNOWN_PARTITION
+    validation_data = validation_data or {}
+    source_versions = source_versions or {}
+    manifest_path = parquet_manifest_path(output_dir, site)
+
+    names = [str(info.get('文件名', '')) for info in image_info_list]
+    months = [capture_month_of(info) for info in image_info_list]
+    keys = _source_keys(image_info_list, source_versions)
+    # detections 表的 accepted_species 取决于全部阈值，阈值变化时所有分区都需要重写
+    settings_key = _thresholds_key(confidence_settings, min_frame_ratio)
+    manifest = _read_manifest(manifest_path)
+    if manifest is not None and manifest.get('settings') != settings_key:
+        _remove_partitions(output_dir, site, {entry[1] for entry in manifest['files'].values()} - set(months))
+        manifest = None
+
+    # 行哈希包含 images 表的导出行与校验状态 (检测框/轨迹表直接取自 JSON，由源状态键覆盖)；
+    # 源状态键未变化的记录沿用清单中的哈希
+    old = manifest['files'] if manifest else {}
+    row_hashes: List[Optional[str]] = [None] * len(names)
+    for i, (name, key) in enumerate(zip(names, keys)):
+        entry = old.get(name)
+        if key and entry and entry[2] == key:
+            row_hashes[i] = entry[0].rsplit(':', 1)[0]
+    stale = [i for i, h in enumerate(row_hashes) if h is None]
+    fresh = _row_hashes(iter_export_chunks([image_info_list[i] for i in stale], confidence_settings,
+                                           species_info_map, IMAGE_EXPORT_COLUMNS, min_frame_ratio))
+    for i, h in zip(stale, fresh):
+        row_hashes[i] = f"{h}|{keys[i]}"
+    state = {n: [f"{h}:{validation_data.get(n)}", m, k] for n, h, m, k in zip(names, row_hashes, months, keys)}
+
+    if manifest is None or len(state) != len(names):
+        counts = export_parquet_dataset(image_info_list, output_dir, confidence_settings, species_info_map, site,
+                                        validation_data=validation_data, min_frame_ratio=min_frame_ratio,
+                                        progress_callback=progress_callback, extra_tables=extra_tables)
+        if len(state) == len(names):
+            _write_manifest(manifest_path, {'settings': settings_key, 'files': state})
+        elif os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        return {'mode': 'full', 'rows': len(names), 'changed_rows': len(names), 'partitions': None,
+                'counts': counts}
+
+    changed = [n for n, entry in state.items() if old.get(n, [None, None])[:2] != entry[:2]]
+    dirty = {state[n][1] for n in changed}
+    dirty |= {entry[1] for n, entry in old.items() if n not in state}
+    dirty |= {old[n][1] for n in changed if n in old}
+    changed_rows = len(changed)
+
+    _remove_partitions(output_dir, site, dirty)
+    subset = [info for info, month in zip(image_info_list, months) if month in dirty]
+    subset_names = {str(info.get('文件名', '')) for info in subset}
+    counts = export_parquet_dataset(subset, output_dir, confidence_settings, species_info_map, site,
+                                    validation_data={k: v for k, v in validation_data.items() if k in subset_names},
+                                    min_frame_ratio=min_frame_ratio, progress_callback=progress_callback,
+                                    extra_tables=extra_tables)
+    _write_manifest(manifest_path, {'settings': settings_key, 'files': state})
+    logger.info(f"Parquet 增量导出: {changed_rows}/{len(names)} 条记录发生变化，重写 {len(dirty)} 个分区")
+    return {'mode': 'incremental' if dirty else 'unchanged', 'rows': len(names), 'changed_rows': changed_rows,
+            'partitions': sorted(dirty), 'counts': counts}
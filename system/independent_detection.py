@@ -0,0 +1,269 @@
+# system/independent_detection.py
+"""
+独立探测计算模块 - 增量维护"独立探测首只"标记，处理过程中随结果到达实时更新。
+
+    1. 每个 (相机, 物种) 维护一个按 (拍摄时间, 到达序号) 排序的有序索引；
+       一条记录为独立探测，当且仅当它的某个物种在同一相机上没有更早的记录，或与紧邻的上一条记录间隔超过阈值；
+    2. 新记录 (包括拍摄时间早于已有记录的乱序到达) 插入索引后，只需重新判定它本身与各物种索引中紧随其后的记录；
+       人工校验修改物种时同样只移除/插入该记录并重新判定前后相邻的记录，不再整体重算；
+    3. 物种的判定规则 (人工校验、视频轨迹投票、按阈值过滤检测结果) 与原 process_independent_detection 一致，
+       拍摄时间相同的记录按到达顺序排列 (与原实现按列表顺序的稳定排序一致)。
+
+camera_of 用于按相机分别计算 (返回 None 时所有记录视为同一相机)；提供 observe/reset 时
+(deployments.CameraResolver)，记录的相机归属随新记录改变后整体重新分组。
+"""
+
+import bisect
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from system.config import INDEPENDENT_DETECTION_THRESHOLD
+from system.threshold_engine import threshold_for
+
+logger = logging.getLogger(__name__)
+
+INDEPENDENT_FLAG = '是'
+
+
+def capture_time(info: Dict[str, Any]) -> Optional[datetime]:
+    """记录的拍摄时间 (兼容处理缓存中保存为字符串的时间)"""
+    value = info.get('拍摄日期对象')
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            try:
+                return datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+            except ValueError:
+                return None
+    return None
+
+
+def detected_species(info: Dict[str, Any], confidence_settings: Dict[str, float],
+                     min_frame_ratio: float = 0.0) -> Tuple[str, ...]:
+    """按阈值得到记录中的物种 (去重，保持出现顺序)；空拍或没有检测结果时返回空元组"""
+    def threshold(name):
+        return threshold_for(confidence_settings, name)
+
+    if info.get('最低置信度') == '人工校验':
+        names_str = info.get('物种名称', '')
+        names = [s.strip() for s in names_str.split(',')] if names_str and names_str != '空' else []
+    elif 'tracks' in info:
+        min_points = info.get('total_frames_processed', 1) * min_frame_ratio
+        names = []
+        for points in info.get('tracks', {}).values():
+            if len(points) < min_points:
+                continue
+            votes = [p.get('species', 'Unknown') for p in points
+                     if p.get('confidence', 0) >= threshold(p.get('species', 'Unknown'))]
+            if votes:
+                names.append(Counter(votes).most_common(1)[0][0])
+    else:
+        confidences = info.get('all_confidences', [])
+        classes = info.get('all_classes', [])
+        names_map = info.get('names_map', {})
+        if not confidences or not classes or not names_map:
+            return ()
+        names = []
+        for cls, conf in zip(classes, confidences):
+            name = names_map.get(str(int(cls)))
+            if name and conf >= threshold(name):
+                names.append(name)
+    return tuple(n for n in dict.fromkeys(names) if n and n != '空')
+
+
+class _Entry:
+    __slots__ = ('info', 'seq', 'time', 'camera', 'species')
+
+    def __init__(self, info, seq, time, camera, species):
+        self.info = info
+        self.seq = seq
+        self.time = time
+        self.camera = camera
+        self.species = species
+
+    @property
+    def indexed(self) -> bool:
+        return self.time is not None and bool(self.species)
+
+
+class IndependentDetectionEngine:
+    """增量独立探测计算；记录以文件名为键，标记直接写入记录的 '独立探测首只' 字段"""
+
+    def __init__(self, confidence_settings: Optional[Dict[str, float]] = None, min_frame_ratio: float = 0.0,
+                 threshold_seconds: float = INDEPENDENT_DETECTION_THRESHOLD,
+                 camera_of: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.confidence_settings = dict(confidence_settings or {})
+        self.min_frame_ratio = min_frame_ratio
+        self.threshold_seconds = threshold_seconds
+        self.camera_of = camera_of
+        self._entries: Dict[Any, _Entry] = {}
+        self._index: Dict[Tuple[Any, str], List[Tuple[datetime, int, Any]]] = {}
+        self._next_seq = 0
+        self.stats = {'evaluations': 0, 'rebuilds': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    @staticmethod
+    def key_of(info: Dict[str, Any]) -> Any:
+        return info.get('文件名') or id(info)
+
+    def _describe(self, info: Dict[str, Any]) -> Tuple[Optional[datetime], Any, Tuple[str, ...]]:
+        time = capture_time(info)
+        if time is None:
+            return None, None, ()
+        camera = self.camera_of(info) if self.camera_of else None
+        return time, camera, detected_species(info, self.confidence_settings, self.min_frame_ratio)
+
+    # --- 索引维护 ---
+
+    def _insert(self, key, entry: _Entry, affected: Set) -> None:
+        if not entry.indexed:
+            return
+        item = (entry.time, entry.seq, key)
+        for species in entry.species:
+            bucket = self._index.setdefault((entry.camera, species), [])
+            pos = bisect.bisect_left(bucket, item)
+            bucket.insert(pos, item)
+            if pos + 1 < len(bucket):
+                affected.add(bucket[pos + 1][2])
+
+    def _remove(self, key, entry: _Entry, affected: Set) -> None:
+        if not entry.indexed:
+            return
+        item = (entry.time, entry.seq, key)
+        for species in entry.species:
+            bucket = self._index.get((entry.camera, species))
+            if not bucket:
+                continue
+            pos = bisect.bisect_left(bucket, item)
+            if pos < len(bucket) and bucket[pos] == item:
+                del bucket[pos]
+                if pos < len(bucket):
+                    affected.add(bucket[pos][2])
+            if not bucket:
+                del self._index[(entry.camera, species)]
+
+    def _evaluate(self, key) -> None:
+        entry = self._entries.get(key)
+        if entry is None or entry.time is None:
+            return  # 没有拍摄时间的记录不参与计算 (与原实现一致，保留原有标记)
+        self.stats['evaluations'] += 1
+        independent = False
+        if entry.species:
+            item = (entry.time, entry.seq, key)
+            for species in entry.species:
+                bucket = self._index[(entry.camera, species)]
+                pos = bisect.bisect_left(bucket, item)
+                if pos == 0 or (entry.time - bucket[pos - 1][0]).total_seconds() > self.threshold_seconds:
+                    independent = True
+                    break
+        entry.info['独立探测首只'] = INDEPENDENT_FLAG if independent else ''
+
+    # --- 对外接口 ---
+
+    def upsert(self, info: Dict[str, Any], key: Any = None) -> Set:
+        """加入或更新一条记录，只重新判定受影响的记录；返回受影响记录的键"""
+        key = self.key_of(info) if key is None else key
+        observe = getattr(self.camera_of, 'observe', None)
+        if observe is not None and observe(info):
+            # 没有序列号的记录所属的相机改变 (出现第一台/第二台有序列号的相机)，整体重新分组
+            ordered = sorted(self._entries.items(), key=lambda kv: kv[1].seq)
+            self.rebuild([entry.info for _, entry in ordered] + [info])
+            return set(self._entries)
+        time, camera, species = self._describe(info)
+        affected = {key}
+        entry = self._entries.get(key)
+        if entry is not None and (entry.time, entry.camera, entry.species) == (time, camera, species):
+            entry.info = info
+        else:
+            if entry is not None:
+                self._remove(key, entry, affected)
+                seq = entry.seq
+            else:
+                seq, self._next_seq = self._next_seq, self._next_seq + 1
+            entry = _Entry(info, seq, time, camera, species)
+            self._entries[key] = entry
+            self._insert(key, entry, affected)
+        for k in affected:
+            self._evaluate(k)
+        return affected
+
+    def update_detection(self, key: Any, changes: Dict[str, Any]) -> Set:
+        """人工校验等修改了记录的检测结果：合并修改的字段 (保留拍摄时间等元数据) 后局部重算"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return set()
+        info = entry.info
+        info.update({k: v for k, v in changes.items() if k != '拍摄日期对象'})
+        return self.upsert(info, key)
+
+    def remove(self, key: Any) -> Set:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return set()
+        affected = set()
+        self._remove(key, entry, affected)
+        for k in affected:
+            self._evaluate(k)
+        return affected
+
+    def sync(self, records: Iterable[Dict[str, Any]], prune: bool = False) -> None:
+        """按当前记录集合更新：未变化的记录不重新判定；prune 时移除集合中不存在的记录"""
+        seen = set()
+        for info in records:
+            key = self.key_of(info)
+            seen.add(key)
+            self.upsert(info, key)  # 未变化的记录只把已有标记写入新的记录字典
+        if prune:
+            for key in [k for k in self._entries if k not in seen]:
+                self.remove(key)
+
+    def set_thresholds(self, confidence_settings: Optional[Dict[str, float]], min_frame_ratio: float = None) -> bool:
+        """阈值变化时物种判定随之变化，需要整体重建；返回是否重建"""
+        confidence_settings = dict(confidence_settings or {})
+        min_frame_ratio = self.min_frame_ratio if min_frame_ratio is None else min_frame_ratio
+        if confidence_settings == self.confidence_settings and min_frame_ratio == self.min_frame_ratio:
+            return False
+        self.confidence_settings = confidence_settings
+        self.min_frame_ratio = min_frame_ratio
+        ordered = sorted(self._entries.items(), key=lambda kv: kv[1].seq)
+        self.rebuild([entry.info for _, entry in ordered])
+        return True
+
+    def rebuild(self, records: List[Dict[str, Any]]) -> None:
+        """整体重建 (一次排序后顺序判定)，用于首次加载全部记录"""
+        self.stats['rebuilds'] += 1
+        records = list(records)
+        reset = getattr(self.camera_of, 'reset', None)
+        if reset is not None:
+            reset(records)
+        self._entries.clear()
+        self._index.clear()
+        self._next_seq = 0
+        for info in records:
+            key = self.key_of(info)
+            time, camera, species = self._describe(info)
+            old = self._entries.get(key)
+            seq = old.seq if old is not None else self._next_seq
+            if old is None:
+                self._next_seq += 1
+            self._entries[key] = _Entry(info, seq, time, camera, species)
+
+        for key, entry in self._entries.items():
+            if entry.indexed:
+                for species in entry.species:
+                    self._index.setdefault((entry.camera, species), []).append((entry.time, entry.seq, key))
+        for bucket in self._index.values():
+            bucket.sort()
+        for key in self._entries:
+            self._evaluate(key)
+
@@ -0,0 +1,315 @@
+# system/inference_backend.py
+"""
+推理后端模块 - 将 .pt 模型一次性导出为 ONNX Runtime / OpenVINO 格式并缓存，
+导出文件与 .pt 放在同一目录 (res/model、res/model_cls)，以权重哈希和输入尺寸区分。
+
+导出后的模型仍通过 ultralytics YOLO 接口加载，推理调用方式与 PyTorch 路径完全一致。
+"""
+
+import os
+import pickle
+import shutil
+import hashlib
+import logging
+import zipfile
+import importlib.util
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKEND_PYTORCH = "pytorch"
+BACKEND_ONNX = "onnx"
+BACKEND_OPENVINO = "openvino"
+
+# 界面显示名称 -> 后端标识
+BACKEND_LABELS = {
+    "PyTorch": BACKEND_PYTORCH,
+    "ONNX Runtime": BACKEND_ONNX,
+    "OpenVINO": BACKEND_OPENVINO,
+}
+
+# 后端所需的运行时包
+_BACKEND_RUNTIME = {
+    BACKEND_ONNX: "onnxruntime",
+    BACKEND_OPENVINO: "openvino",
+}
+
+_hash_cache: Dict[str, tuple] = {}
+_imgsz_cache: Dict[tuple, int] = {}
+
+
+def backend_label(backend: str) -> str:
+    """获取后端的界面显示名称"""
+    for label, key in BACKEND_LABELS.items():
+        if key == backend:
+            return label
+    return "PyTorch"
+
+
+def is_backend_available(backend: str) -> bool:
+    """检查后端对应的运行时是否已安装"""
+    if backend == BACKEND_PYTORCH:
+        return True
+    runtime = _BACKEND_RUNTIME.get(backend)
+    return bool(runtime and importlib.util.find_spec(runtime) is not None)
+
+
+def weights_hash(model_path: str, length: int = 12) -> str:
+    """计算权重文件的SHA1摘要 (按 mtime/size 缓存，避免重复读取大文件)"""
+    stat = os.stat(model_path)
+    cache_key = os.path.abspath(model_path)
+    cached = _hash_cache.get(cache_key)
+    if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+        return cached[1][:length]
+
+    sha1 = hashlib.sha1()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha1.update(chunk)
+    digest = sha1.hexdigest()
+    _hash_cache[cache_key] = ((stat.st_mtime_ns, stat.st_size), digest)
+    return digest[:length]
+
+
+def exported_model_path(model_path: str, backend: str, imgsz: int, suffix: str = "") -> str:
+    """导出文件的缓存路径：<stem>.<hash>.<imgsz>[suffix].onnx 或 <stem>.<hash>.<imgsz>[suffix]_openvino_model"""
+    model_dir = os.path.dirname(os.path.abspath(model_path))
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    base_name = f"{stem}.{weights_hash(model_path)}.{int(imgsz)}{suffix}"
+    if backend == BACKEND_ONNX:
+        return os.path.join(model_dir, f"{base_name}.onnx")
+    if backend == BACKEND_OPENVINO:
+        return os.path.join(model_dir, f"{base_name}_openvino_model")
+    return model_path
+
+
+class _StubObject:
+    """读取检查点元数据时代替模型中的类 (不构造模型、不读取权重)"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        pass
+
+
+class _MetadataUnpickler(pickle.Unpickler):
+    _SAFE_MODULES = {'builtins', 'collections'}
+
+    def find_class(self, module, name):
+        if module in self._SAFE_MODULES:
+            return super().find_class(module, name)
+        return _StubObject
+
+    def persistent_load(self, pid):
+        return None  # 张量存储
+
+
+def _checkpoint_imgsz(model_path: str) -> Optional[int]:
+    """从 ultralytics 检查点 (torch zip 格式) 的 train_args 读取输入尺寸，只解析 data.pkl"""
+    if not zipfile.is_zipfile(model_path):
+        return None
+    with zipfile.ZipFile(model_path) as archive:
+        name = next((n for n in archive.namelist() if n.endswith('data.pkl')), None)
+        if name is None:
+            return None
+        with archive.open(name) as f:
+            ckpt = _MetadataUnpickler(f).load()
+    args = ckpt.get('train_args') if isinstance(ckpt, dict) else None
+    imgsz = args.get('imgsz') if isinstance(args, dict) else None
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = max(imgsz) if imgsz else None
+    return int(imgsz) if isinstance(imgsz, (int, float)) and imgsz > 0 else None
+
+
+def model_imgsz(model, fallback: int) -> int:
+    """已加载模型的训练输入尺寸"""
+    args = getattr(getattr(model, 'model', None), 'args', None) or {}
+    imgsz = args.get('imgsz', fallback) if isinstance(args, dict) else fallback
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = max(imgsz)
+    return int(imgsz)
+
+
+def default_imgsz(model_path: str, fallback: int) -> int:
+    """
+    读取模型训练时的输入尺寸 (分类模型通常为224)。
+    优先读取检查点元数据，读取不到时才加载整个模型；结果按文件修改时间/大小缓存。
+    """
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return fallback
+    cache_key = (os.path.abspath(model_path), stat.st_mtime_ns, stat.st_size, fallback)
+    if cache_key in _imgsz_cache:
+        return _imgsz_cache[cache_key]
+    try:
+        imgsz = _checkpoint_imgsz(model_path)
+    except Exception as e:
+        logger.debug(f"读取检查点元数据失败 {model_path}: {e}")
+        imgsz = None
+    if imgsz is None:
+        try:
+            from ultralytics import YOLO
+            imgsz = model_imgsz(YOLO(model_path), fallback)
+        except Exception:
+            imgsz = fallback
+    _imgsz_cache[cache_key] = imgsz
+    return imgsz
+
+
+def export_model(model_path: str, backend: str, imgsz: int, half: bool = False) -> str:
+    """导出模型到指定后端格式，已存在缓存时直接返回缓存路径"""
+    if backend == BACKEND_PYTORCH:
+        return model_path
+
+    target_path = exported_model_path(model_path, backend, imgsz)
+    if os.path.exists(target_path):
+        return target_path
+
+    if not is_backend_available(backend):
+        raise RuntimeError(f"未安装 {_BACKEND_RUNTIME.get(backend, backend)}，无法使用 {backend_label(backend)} 后端")
+
+    from ultralytics import YOLO
+
+    logger.info(f"正在导出模型 {os.path.basename(model_path)} -> {backend_label(backend)} (imgsz={imgsz})")
+    exported = YOLO(model_path).export(format=backend, imgsz=imgsz, dynamic=True, half=half, verbose=False)
+    if not exported or not os.path.exists(exported):
+        raise RuntimeError(f"模型导出失败: {model_path}")
+
+    # ultralytics 默认导出到 <stem>.onnx / <stem>_openvino_model，重命名为带哈希与尺寸的缓存名
+    try:
+        if os.path.isdir(target_path):
+            shutil.rmtree(target_path)
+        shutil.move(str(exported), target_path)
+    except Exception:
+        if os.path.isdir(str(exported)):
+            shutil.rmtree(str(exported), ignore_errors=True)
+        elif os.path.exists(str(exported)):
+            os.remove(str(exported))
+        raise
+
+    logger.info(f"模型导出完成: {target_path}")
+    return target_path
+
+
+def load_backend_model(model_path: str, backend: str, imgsz: int, task: str):
+    """按指定后端加载模型，导出失败时回退到 PyTorch"""
+    from ultralytics import YOLO
+
+    if backend and backend != BACKEND_PYTORCH:
+        try:
+            return YOLO(export_model(model_path, backend, imgsz), task=task)
+        except Exception as e:
+            logger.error(f"{backend_label(backend)} 后端加载失败，回退到 PyTorch: {e}")
+    return YOLO(model_path)
+
+
+def supports_tta(model) -> bool:
+    """模型是否支持数据增强 (TTA)
+
+    只有 PyTorch 模型能执行 TTA；导出的 ONNX/OpenVINO 模型以文件路径加载 (model.model 为路径)，
+    ultralytics 会静默忽略 augment 参数，导致结果与 PyTorch + TTA 不一致。
+    """
+    inner = getattr(model, 'model', None)
+    return inner is not None and not isinstance(inner, (str, os.PathLike))
+
+
+def clear_exported_models(model_path: str) -> int:
+    """删除某个 .pt 模型对应的所有导出缓存，返回删除的数量"""
+    model_dir = os.path.dirname(os.path.abspath(model_path))
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    removed = 0
+    for name in os.listdir(model_dir):
+        if not name.startswith(f"{stem}.") or name.lower().endswith('.pt'):
+            continue
+        if name.endswith('.onnx') or name.endswith('_openvino_model'):
+            path = os.path.join(model_dir, name)
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                removed += 1
+            except Exception as e:
+                logger.warning(f"删除导出缓存失败 {path}: {e}")
+    return removed
+
+
+def _match_boxes(ref_boxes, test_boxes, iou_threshold: float):
+    """按IoU贪心匹配两组检测框，返回 [(ref_idx, test_idx, iou)]"""
+    import numpy as np
+
+    if len(ref_boxes) == 0 or len(test_boxes) == 0:
+        return []
+    ref = np.asarray(ref_boxes, dtype=np.float64)
+    test = np.asarray(test_boxes, dtype=np.float64)
+    x1 = np.maximum(ref[:, None, 0], test[None, :, 0])
+    y1 = np.maximum(ref[:, None, 1], test[None, :, 1])
+    x2 = np.minimum(ref[:, None, 2], test[None, :, 2])
+    y2 = np.minimum(ref[:, None, 3], test[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_ref = (ref[:, 2] - ref[:, 0]) * (ref[:, 3] - ref[:, 1])
+    area_test = (test[:, 2] - test[:, 0]) * (test[:, 3] - test[:, 1])
+    ious = inter / np.maximum(area_ref[:, None] + area_test[None, :] - inter, 1e-9)
+
+    matches = []
+    while ious.size and ious.max() >= iou_threshold:
+        r, t = np.unravel_index(np.argmax(ious), ious.shape)
+        matches.append((int(r), int(t), float(ious[r, t])))
+        ious[r, :] = -1
+        ious[:, t] = -1
+    return matches
+
+
+def verify_backend_parity(model_path: str, backend: str, sources: List[Any], imgsz: int,
+                          task: str = "detect", conf: float = 0.25, iou_threshold: float = 0.9,
+                          conf_tolerance: float = 0.02) -> Dict[str, Any]:
+    """比较 PyTorch 与导出后端在同一批输入上的输出，返回一致性报告
+
+    检测任务：逐图按IoU匹配检测框，统计漏检/多检、类别不一致与置信度最大偏差；
+    分类任务：比较Top1类别以及概率向量的最大绝对误差。
+    两侧均不使用TTA：导出后端不支持TTA，处理时会自动关闭 (见 supports_tta)。
+    """
+    from ultralytics import YOLO
+
+    reference = YOLO(model_path)
+    exported = YOLO(export_model(model_path, backend, imgsz), task=task)
+
+    report = {'backend': backend, 'task': task, 'images': len(sources), 'mismatched_images': 0,
+              'max_conf_diff': 0.0, 'unmatched_boxes': 0, 'class_mismatches': 0, 'passed': True}
+
+    for source in sources:
+        if task == "classify":
+            ref_r = reference(source, imgsz=imgsz, verbose=False)[0]
+            test_r = exported(source, imgsz=imgsz, verbose=False)[0]
+            ref_probs = ref_r.probs.data.float().cpu().numpy()
+            test_probs = test_r.probs.data.float().cpu().numpy()
+            diff = float(abs(ref_probs - test_probs).max())
+            report['max_conf_diff'] = max(report['max_conf_diff'], diff)
+            if int(ref_r.probs.top1) != int(test_r.probs.top1):
+                report['class_mismatches'] += 1
+                report['mismatched_images'] += 1
+            continue
+
+        ref_r = reference(source, imgsz=imgsz, conf=conf, augment=False, verbose=False)[0]
+        test_r = exported(source, imgsz=imgsz, conf=conf, augment=False, verbose=False)[0]
+        ref_boxes = ref_r.boxes.xyxy.cpu().tolist() if ref_r.boxes is not None else []
+        test_boxes = test_r.boxes.xyxy.cpu().tolist() if test_r.boxes is not None else []
+        matches = _match_boxes(ref_boxes, test_boxes, iou_threshold)
+
+        unmatched = (len(ref_boxes) - len(matches)) + (len(test_boxes) - len(matches))
+        class_mismatch = 0
+        for r_idx, t_idx, _ in matches:
+            if int(ref_r.boxes.cls[r_idx]) != int(test_r.boxes.cls[t_idx]):
+                class_mismatch += 1
+            diff = abs(float(ref_r.boxes.conf[r_idx]) - float(test_r.boxes.conf[t_idx]))
+            report['max_conf_diff'] = max(report['max_conf_diff'], diff)
+
+        report['unmatched_boxes'] += unmatched
+        report['class_mismatches'] += class_mismatch
+        if unmatched or class_mismatch:
+            report['mismatched_images'] += 1
+
+    report['passed'] = (report['mismatched_images'] == 0 and report['max_conf_diff'] <= conf_tolerance)
+    return report
@@ -0,0 +1,396 @@
+# system/inference_service.py
+"""
+本地推理服务模块 - 常驻进程持有已加载并预热的检测/分类模型，
+通过 localhost HTTP 接收来自 GUI、命令行和脚本的批量检测请求。
+
+用法示例:
+    python -m system.inference_service serve --model res/model/xxx.pt --cls-model res/model_cls/yyy.pt
+    python -m system.inference_service detect a.jpg b.jpg
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional, Tuple
+
+from system.config import INFERENCE_SERVICE_HOST, INFERENCE_SERVICE_PORT, INFERENCE_SERVICE_MAX_WAIT, DETECT_IMGSZ
+from system.utils import resource_path
+
+logger = logging.getLogger(__name__)
+
+# 客户端可传入的推理参数及其默认值 (与 detect_batch_species 的参数一致)
+DEFAULT_DETECT_PARAMS = {
+    'use_fp16': False,
+    'iou': 0.3,
+    'conf': 0.25,
+    'augment': True,
+    'agnostic_nms': True,
+}
+
+
+def normalize_detect_params(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """补全并规范化推理参数，保证相同参数的请求可以被合并"""
+    normalized = dict(DEFAULT_DETECT_PARAMS)
+    if params:
+        for key in DEFAULT_DETECT_PARAMS:
+            if key in params and params[key] is not None:
+                normalized[key] = params[key]
+    normalized['use_fp16'] = bool(normalized['use_fp16'])
+    normalized['augment'] = bool(normalized['augment'])
+    normalized['agnostic_nms'] = bool(normalized['agnostic_nms'])
+    normalized['iou'] = round(float(normalized['iou']), 4)
+    normalized['conf'] = round(float(normalized['conf']), 4)
+    return normalized
+
+
+def serialize_batch_results(processor, batch_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """将 detect_batch_species 的返回值转换为可JSON序列化的结构"""
+    serialized = []
+    for info in batch_results:
+        detect_results = info.get('detect_results')
+        serialized.append({
+            '物种名称': info.get('物种名称', ''),
+            '物种数量': info.get('物种数量', ''),
+            '最低置信度': info.get('最低置信度'),
+            'detection_info': processor.build_detection_info(detect_results, info) if detect_results else None,
+        })
+    return serialized
+
+
+class _PendingRequest:
+    """等待合并推理的单个客户端请求"""
+
+    def __init__(self, paths: List[str], params: Dict[str, Any]):
+        self.paths = paths
+        self.params = params
+        self.params_key = tuple(sorted(params.items()))
+        self.results: Optional[List[Dict[str, Any]]] = None
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+
+class BatchCoalescer:
+    """请求合并队列：将多个客户端的请求按推理参数分组，凑满批次或超时后统一推理"""
+
+    def __init__(self, processor, batch_size: int = 16, max_wait: float = INFERENCE_SERVICE_MAX_WAIT):
+        self.processor = processor
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._queue: "queue.Queue[_PendingRequest]" = queue.Queue()
+        self._stop_event = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="InferenceCoalescer", daemon=True)
+        self.stats = {'requests': 0, 'images': 0, 'batches': 0}
+
+    def start(self) -> None:
+        self._worker.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def submit(self, paths: List[str], params: Optional[Dict[str, Any]] = None,
+               timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """提交一批图片路径并阻塞等待结果"""
+        request = _PendingRequest(list(paths), normalize_detect_params(params))
+        if not request.paths:
+            return []
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("推理服务处理超时")
+        if request.error:
+            raise RuntimeError(request.error)
+        return request.results or []
+
+    def _collect_group(self, first: _PendingRequest) -> List[_PendingRequest]:
+        """以第一个请求为基准，在等待窗口内收集参数相同的其他请求"""
+        group = [first]
+        total = len(first.paths)
+        deferred = []
+        deadline = time.monotonic() + self.max_wait
+
+        while total < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request.params_key == first.params_key:
+                group.append(request)
+                total += len(request.paths)
+            else:
+                deferred.append(request)
+
+        # 参数不同的请求放回队列，留给下一轮
+        for request in deferred:
+            self._queue.put(request)
+        return group
+
+    def _process_group(self, group: List[_PendingRequest]) -> None:
+        """对合并后的请求执行推理，并把结果按原请求拆分回去"""
+        all_paths = []
+        for request in group:
+            all_paths.extend(request.paths)
+
+        params = group[0].params
+        merged_results: List[Dict[str, Any]] = []
+        try:
+            for start in range(0, len(all_paths), self.batch_size):
+                chunk = all_paths[start:start + self.batch_size]
+                batch_results = self.processor.detect_batch_species(chunk, **params)
+                merged_results.extend(serialize_batch_results(self.processor, batch_results))
+                self.stats['batches'] += 1
+        except Exception as e:
+            logger.error(f"推理服务批量检测失败: {e}")
+            for request in group:
+                request.error = str(e)
+                request.done.set()
+            return
+
+        offset = 0
+        for request in group:
+            request.results = merged_results[offset:offset + len(request.paths)]
+            offset += len(request.paths)
+            request.done.set()
+
+        self.stats['requests'] += len(group)
+        self.stats['images'] += len(all_paths)
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._process_group(self._collect_group(first))
+
+
+class _ServiceRequestHandler(BaseHTTPRequestHandler):
+    """推理服务的 HTTP 请求处理器"""
+
+    server_version = "NeriInference/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/health":
+            self._send_json(200, service.describe())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path != "/detect":
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length).decode('utf-8')) if length else {}
+            paths = payload.get('paths', [])
+            if not isinstance(paths, list):
+                raise ValueError("paths 必须是列表")
+            results = service.coalescer.submit(paths, payload.get('params'))
+            self._send_json(200, {'results': results})
+        except Exception as e:
+            logger.error(f"处理推理请求失败: {e}")
+            self._send_json(500, {'error': str(e)})
+
+
+class InferenceService:
+    """常驻推理服务：加载并预热模型，监听 localhost 端口"""
+
+    def __init__(self, model_path: str, cls_model_path: Optional[str] = None,
+                 host: str = INFERENCE_SERVICE_HOST, port: int = INFERENCE_SERVICE_PORT,
+                 batch_size: int = 16, max_wait: float = INFERENCE_SERVICE_MAX_WAIT,
+                 use_fp16: bool = False, backend: str = "pytorch", cls_int8: bool = False):
+        from system.image_processor import ImageProcessor
+
+        self.model_path = model_path
+        self.cls_model_path = cls_model_path
+        self.host = host
+        self.port = port
+        self.started_at = None
+
+        self.processor = ImageProcessor(model_path, backend=backend, cls_int8=cls_int8)
+        if not self.processor.model:
+            raise RuntimeError(f"加载检测模型失败: {model_path}")
+        if cls_model_path:
+            self.processor.load_cls_model(cls_model_path)
+
+        self._warmup(use_fp16)
+
+        self.coalescer = BatchCoalescer(self.processor, batch_size=batch_size, max_wait=max_wait)
+        self.httpd = ThreadingHTTPServer((host, port), _ServiceRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self
+
+    def _warmup(self, use_fp16: bool) -> None:
+        """用空白图像跑一次推理，完成模型融合与显存分配"""
+        try:
+            import numpy as np
+            dummy = np.full((640, 640, 3), 114, dtype=np.uint8)
+            half = self.processor._check_cuda(use_fp16)
+            self.processor.model(dummy, imgsz=DETECT_IMGSZ, half=half, verbose=False)
+            if self.processor.cls_model:
+                self.processor.cls_model(dummy, half=half, verbose=False)
+            logger.info("推理服务模型预热完成")
+        except Exception as e:
+            logger.warning(f"推理服务模型预热失败 (不影响使用): {e}")
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'status': 'ok',
+            'model': os.path.basename(self.model_path) if self.model_path else '',
+            'cls_model': os.path.basename(self.cls_model_path) if self.cls_model_path else '',
+            'batch_size': self.coalescer.batch_size,
+            'uptime': time.time() - self.started_at if self.started_at else 0.0,
+            'stats': dict(self.coalescer.stats),
+        }
+
+    def serve_forever(self) -> None:
+        self.started_at = time.time()
+        self.coalescer.start()
+        logger.info(f"推理服务已启动: http://{self.host}:{self.port}")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.coalescer.stop()
+            self.httpd.server_close()
+
+    def shutdown(self) -> None:
+        self.httpd.shutdown()
+
+
+class InferenceClient:
+    """推理服务客户端，供 GUI 与脚本调用"""
+
+    def __init__(self, host: str = INFERENCE_SERVICE_HOST, port: int = INFERENCE_SERVICE_PORT,
+                 timeout: float = 600.0):
+        self.base_url = f"http://{host}:{port}"
+        self.timeout = timeout
+
+    def _request(self, path: str, payload: Optional[Dict[str, Any]] = None,
+                 timeout: Optional[float] = None) -> Dict[str, Any]:
+        data = None
+        headers = {}
+        if payload is not None:
+            data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            headers["Content-Type"] = "application/json; charset=utf-8"
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=timeout or self.timeout) as resp:
+                return json.loads(resp.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            try:
+                detail = json.loads(e.read().decode('utf-8')).get('error', str(e))
+            except Exception:
+                detail = str(e)
+            raise RuntimeError(f"推理服务返回错误: {detail}")
+
+    def health(self) -> Optional[Dict[str, Any]]:
+        """获取服务状态，服务不可用时返回None"""
+        try:
+            return self._request("/health", timeout=1.0)
+        except Exception:
+            return None
+
+    def is_available(self) -> bool:
+        info = self.health()
+        return bool(info and info.get('status') == 'ok')
+
+    def detect_batch(self, img_paths: List[str], use_fp16: bool = False, iou: float = 0.3,
+                     conf: float = 0.25, augment: bool = True,
+                     agnostic_nms: bool = True) -> List[Dict[str, Any]]:
+        """批量检测，返回与 serialize_batch_results 相同结构的结果列表"""
+        payload = {
+            'paths': [os.path.abspath(p) for p in img_paths],
+            'params': {
+                'use_fp16': use_fp16, 'iou': iou, 'conf': conf,
+                'augment': augment, 'agnostic_nms': agnostic_nms,
+            }
+        }
+        response = self._request("/detect", payload)
+        results = response.get('results', [])
+        if len(results) != len(img_paths):
+            raise RuntimeError("推理服务返回的结果数量与请求不一致")
+        return results
+
+
+def _find_default_model(sub_dir: str) -> Optional[str]:
+    model_dir = resource_path(os.path.join("res", sub_dir))
+    if not os.path.isdir(model_dir):
+        return None
+    model_files = sorted(f for f in os.listdir(model_dir) if f.lower().endswith('.pt'))
+    return os.path.join(model_dir, model_files[0]) if model_files else None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Neri 本地推理服务")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="启动常驻推理服务")
+    serve.add_argument("--model", help="检测模型路径 (默认 res/model 下的第一个 .pt)")
+    serve.add_argument("--cls-model", help="分类模型路径 (可选)")
+    serve.add_argument("--host", default=INFERENCE_SERVICE_HOST)
+    serve.add_argument("--port", type=int, default=INFERENCE_SERVICE_PORT)
+    serve.add_argument("--batch-size", type=int, default=16)
+    serve.add_argument("--max-wait", type=float, default=INFERENCE_SERVICE_MAX_WAIT)
+    serve.add_argument("--fp16", action="store_true")
+    serve.add_argument("--backend", choices=["pytorch", "onnx", "openvino"], default="pytorch")
+    serve.add_argument("--cls-int8", action="store_true", help="使用INT8量化分类模型")
+
+    detect = sub.add_parser("detect", help="通过服务检测图片并输出JSON")
+    detect.add_argument("paths", nargs="+")
+    detect.add_argument("--host", default=INFERENCE_SERVICE_HOST)
+    detect.add_argument("--port", type=int, default=INFERENCE_SERVICE_PORT)
+    detect.add_argument("--iou", type=float, default=0.3)
+    detect.add_argument("--conf", type=float, default=0.25)
+    detect.add_argument("--fp16", action="store_true")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.command == "serve":
+        model_path = args.model or _find_default_model("model")
+        if not model_path:
+            print("未找到检测模型，请通过 --model 指定")
+            return 1
+        service = InferenceService(model_path, args.cls_model, host=args.host, port=args.port,
+                                   batch_size=args.batch_size, max_wait=args.max_wait, use_fp16=args.fp16,
+                                   backend=args.backend, cls_int8=args.cls_int8)
+        try:
+            service.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    client = InferenceClient(args.host, args.port)
+    if not client.is_available():
+        print(f"推理服务不可用: {client.base_url}")
+        return 1
+    results = client.detect_batch(args.paths, use_fp16=args.fp16, iou=args.iou, conf=args.conf)
+    for path, result in zip(args.paths, results):
+        print(json.dumps({'path': path, **result}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
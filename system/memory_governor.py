@@ -0,0 +1,161 @@
+# system/memory_governor.py
+"""
+内存管理模块 - 跟踪进程内存 (RSS)、系统内存占用与显存占用，
+仅在超过水位线时才执行 gc.collect() / torch.cuda.empty_cache()，
+内存紧张时逐步减小预读深度和 Batch Size，压力解除后再逐步恢复。
+"""
+
+import gc
+import logging
+from typing import Callable, Optional, Tuple
+
+from system.config import (
+    MEMORY_RAM_HIGH_WATERMARK, MEMORY_RAM_CRITICAL_WATERMARK,
+    MEMORY_VRAM_HIGH_WATERMARK, MEMORY_VRAM_CRITICAL_WATERMARK
+)
+
+logger = logging.getLogger(__name__)
+
+# 连续多少次检查处于低水位后尝试恢复一级
+RECOVERY_CHECKS = 20
+# 低水位 = 高水位减去该差值，避免在阈值附近来回调整
+RECOVERY_MARGIN = 0.15
+
+
+class MemorySnapshot:
+    """一次内存采样结果"""
+
+    __slots__ = ('rss_mb', 'ram_ratio', 'vram_mb', 'vram_ratio')
+
+    def __init__(self, rss_mb: float = 0.0, ram_ratio: float = 0.0, vram_mb: float = 0.0, vram_ratio: float = 0.0):
+        self.rss_mb = rss_mb
+        self.ram_ratio = ram_ratio
+        self.vram_mb = vram_mb
+        self.vram_ratio = vram_ratio
+
+    def describe(self) -> str:
+        text = f"内存 {self.ram_ratio:.0%} (进程 {self.rss_mb:.0f}MB)"
+        if self.vram_mb:
+            text += f", 显存 {self.vram_ratio:.0%} (缓存 {self.vram_mb:.0f}MB)"
+        return text
+
+
+class MemoryGovernor:
+    """按水位线回收内存，并在内存紧张时给出更小的 Batch Size / 预读深度"""
+
+    def __init__(self, ram_high: float = MEMORY_RAM_HIGH_WATERMARK,
+                 ram_critical: float = MEMORY_RAM_CRITICAL_WATERMARK,
+                 vram_high: float = MEMORY_VRAM_HIGH_WATERMARK,
+                 vram_critical: float = MEMORY_VRAM_CRITICAL_WATERMARK,
+                 log_fn: Optional[Callable[[str], None]] = None):
+        self.ram_high = ram_high
+        self.ram_critical = ram_critical
+        self.vram_high = vram_high
+        self.vram_critical = vram_critical
+        self.log_fn = log_fn
+        self.stats = {'gc_collects': 0, 'cache_releases': 0, 'shrinks': 0, 'recoveries': 0}
+        self._calm_checks = 0
+        self._limits: Optional[Tuple[int, int]] = None  # 用户/调优给出的上限 (batch_size, prefetch_depth)
+
+        try:
+            import psutil
+            self._process = psutil.Process()
+            self._psutil = psutil
+        except ImportError:
+            self._process = None
+            self._psutil = None
+
+        try:
+            import torch
+            self._torch = torch if torch.cuda.is_available() else None
+        except ImportError:
+            self._torch = None
+
+    def _log(self, message: str) -> None:
+        logger.info(message)
+        if self.log_fn:
+            self.log_fn(message)
+
+    def sample(self) -> MemorySnapshot:
+        """采样当前内存状态"""
+        snapshot = MemorySnapshot()
+        if self._psutil is not None:
+            try:
+                snapshot.rss_mb = self._process.memory_info().rss / 1024 / 1024
+                snapshot.ram_ratio = self._psutil.virtual_memory().percent / 100.0
+            except Exception:
+                pass
+        if self._torch is not None:
+            try:
+                free, total = self._torch.cuda.mem_get_info()
+                snapshot.vram_ratio = 1.0 - free / total if total else 0.0
+                snapshot.vram_mb = self._torch.cuda.memory_reserved() / 1024 / 1024
+            except Exception:
+                pass
+        return snapshot
+
+    def relieve(self) -> MemorySnapshot:
+        """超过高水位时才回收：内存高 -> gc.collect()，显存高 -> 释放显存缓存。返回回收后的状态"""
+        snapshot = self.sample()
+        actions = []
+        if snapshot.ram_ratio >= self.ram_high:
+            gc.collect()
+            self.stats['gc_collects'] += 1
+            actions.append("gc.collect()")
+        if self._torch is not None and snapshot.vram_ratio >= self.vram_high:
+            self._torch.cuda.empty_cache()
+            self.stats['cache_releases'] += 1
+            actions.append("释放显存缓存")
+
+        if actions:
+            before = snapshot.describe()
+            snapshot = self.sample()
+            self._log(f"[内存] {before} 超过水位线，已执行 {' + '.join(actions)} -> {snapshot.describe()}")
+        return snapshot
+
+    def check(self, batch_size: int, prefetch_depth: int) -> Tuple[int, int]:
+        """每个批次后调用：按需回收，并返回建议的 (batch_size, prefetch_depth)
+
+        回收后仍处于临界水位时先减小预读深度，再把 Batch Size 减半；
+        连续 RECOVERY_CHECKS 次处于低水位时逐级恢复到最初的设置。
+        """
+        if self._limits is None:
+            self._limits = (batch_size, prefetch_depth)
+        max_batch, max_prefetch = self._limits
+
+        snapshot = self.relieve()
+        critical = (snapshot.ram_ratio >= self.ram_critical or
+                    (self._torch is not None and snapshot.vram_ratio >= self.vram_critical))
+
+        if critical:
+            self._calm_checks = 0
+            if prefetch_depth > 0:
+                self.stats['shrinks'] += 1
+                self._log(f"[内存] {snapshot.describe()} 处于临界水位，预读深度 {prefetch_depth} -> {prefetch_depth - 1}")
+                return batch_size, prefetch_depth - 1
+            if batch_size > 1:
+                new_batch = max(1, batch_size // 2)
+                self.stats['shrinks'] += 1
+                self._log(f"[内存] {snapshot.describe()} 处于临界水位，Batch Size {batch_size} -> {new_batch}")
+                return new_batch, prefetch_depth
+            return batch_size, prefetch_depth
+
+        calm = (snapshot.ram_ratio < self.ram_high - RECOVERY_MARGIN and
+                (self._torch is None or snapshot.vram_ratio < self.vram_high - RECOVERY_MARGIN))
+        self._calm_checks = self._calm_checks + 1 if calm else 0
+        if self._calm_checks >= RECOVERY_CHECKS and (batch_size < max_batch or prefetch_depth < max_prefetch):
+            self._calm_checks = 0
+            self.stats['recoveries'] += 1
+            if batch_size < max_batch:
+                new_batch = min(max_batch, batch_size * 2)
+                self._log(f"[内存] {snapshot.describe()} 压力已解除，Batch Size {batch_size} -> {new_batch}")
+                return new_batch, prefetch_depth
+            self._log(f"[内存] {snapshot.describe()} 压力已解除，预读深度 {prefetch_depth} -> {prefetch_depth + 1}")
+            return batch_size, prefetch_depth + 1
+
+        return batch_size, prefetch_depth
+
+    def set_limits(self, batch_size: int, prefetch_depth: int) -> None:
+        """更新可恢复到的上限 (例如重新调优之后)"""
+        self._limits = (batch_size, prefetch_depth)
+        self._calm_checks = 0
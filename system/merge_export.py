@@ -0,0 +1,331 @@
+# system/merge_export.py
+"""
+多项目合并导出模块 - 把多个已处理文件夹 (temp/photo/<md5> 缓存) 的记录合并为一份导出。
+
+    1. 处理时在缓存目录写入 source_dir.txt 记录源文件夹，合并时据此发现所有已处理的项目；
+       没有标记的旧缓存可以通过选择源文件夹加入 (缓存目录名为源路径的 md5)；
+    2. 依次读取各项目的记录 (JSON 检测结果 + EXIF 元数据)，每条记录写入样地列
+       (解析 JSON 与 EXIF 受 GIL 限制，线程池并行读取反而比串行慢)；
+    3. 按源文件的内容指纹 (文件大小 + 开头/结尾各 MERGE_FINGERPRINT_BYTES 字节的 sha1) 去重，
+       同一张照片被复制到多个文件夹时只保留一条 (优先保留人工校验过的记录)；
+    4. 独立探测、工作天数与相机布设表按样地分别计算，结果与逐个文件夹导出一致；
+    5. Excel/CSV 写为一份表格 (第一列为样地)，布设表与分析表合并为附加表；
+       Parquet 按样地分别写入同一个数据集目录 (样地即分区)。
+"""
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+
+from system.config import MERGE_FINGERPRINT_BYTES, SUPPORTED_IMAGE_EXTENSIONS, SUPPORTED_VIDEO_EXTENSIONS
+from system.data_processor import DataProcessor
+from system.deployments import DEPLOYMENT_SHEET_NAME, DEPLOYMENT_TABLE_NAME, parquet_deployment_table
+from system.export_engine import DEFAULT_EXPORT_COLUMNS
+from system.analytics import parquet_tables as analytics_parquet_tables
+
+logger = logging.getLogger(__name__)
+
+SOURCE_MARKER_FILE = 'source_dir.txt'
+SITE_FIELD = '样地'
+FINGERPRINT_FIELD = '内容指纹'
+VALIDATION_FILE_NAME = 'validation.json'
+
+
+# ---------------- 项目发现 ----------------
+
+def cache_dir_for(source_dir: str, photo_root: str) -> str:
+    """源文件夹对应的缓存目录 (与主窗口 get_temp_photo_dir 的规则一致)"""
+    return os.path.join(photo_root, hashlib.md5(source_dir.encode()).hexdigest())
+
+
+def write_source_marker(temp_dir: str, source_dir: str) -> None:
+    """在缓存目录记录源文件夹路径 (已记录相同路径时不重写)"""
+    if not temp_dir or not source_dir:
+        return
+    path = os.path.join(temp_dir, SOURCE_MARKER_FILE)
+    try:
+        if read_source_marker(temp_dir) == source_dir:
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(source_dir)
+    except Exception as e:
+        logger.warning(f"写入源文件夹标记失败: {e}")
+
+
+def read_source_marker(temp_dir: str) -> Optional[str]:
+    try:
+        with open(os.path.join(temp_dir, SOURCE_MARKER_FILE), 'r', encoding='utf-8') as f:
+            return f.read().strip() or None
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _assign_sites(projects: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """样地名取源文件夹名；不同路径的文件夹同名时加上上级文件夹名区分"""
+    names: Dict[str, int] = {}
+    for project in projects:
+        base = os.path.basename(os.path.normpath(project['source_dir']))
+        names[base] = names.get(base, 0) + 1
+    for project in projects:
+        path = os.path.normpath(project['source_dir'])
+        base = os.path.basename(path)
+        project['site'] = base if names[base] == 1 else f"{os.path.basename(os.path.dirname(path))}_{base}"
+    return sorted(projects, key=lambda p: p['site'])
+
+
+def make_project(source_dir: str, photo_root: str) -> Dict[str, str]:
+    """由源文件夹构造项目 (用于没有源文件夹标记的旧缓存)"""
+    return {'source_dir': source_dir, 'temp_dir': cache_dir_for(source_dir, photo_root)}
+
+
+def discover_projects(photo_root: str, extra_sources: Optional[List[str]] = None) -> List[Dict[str, str]]:
+    """
+    发现所有已处理的项目，返回 [{'source_dir', 'temp_dir', 'site'}]。
+    只包含带源文件夹标记、源文件夹仍然存在且含有检测结果的缓存；extra_sources 为另外选择的源文件夹。
+    """
+    projects: Dict[str, Dict[str, str]] = {}
+    unmarked = 0
+    if os.path.isdir(photo_root):
+        for name in sorted(os.listdir(photo_root)):
+            temp_dir = os.path.join(photo_root, name)
+            if not os.path.isdir(temp_dir):
+                continue
+            source_dir = read_source_marker(temp_dir)
+            if source_dir is None:
+                unmarked += 1
+                continue
+            projects[temp_dir] = {'source_dir': source_dir, 'temp_dir': temp_dir}
+    for source_dir in extra_sources or []:
+        project = make_project(source_dir, photo_root)
+        projects[project['temp_dir']] = project
+    if unmarked:
+        logger.info(f"{unmarked} 个缓存目录没有源文件夹标记，可通过选择源文件夹加入合并")
+
+    result = []
+    for project in projects.values():
+        if not os.path.isdir(project['source_dir']) or not os.path.isdir(project['temp_dir']):
+            continue
+        if not any(_is_record_file(f) for f in os.listdir(project['temp_dir'])):
+            continue
+        result.append(project)
+    return _assign_sites(result)
+
+
+# ---------------- 读取记录 ----------------
+
+def _is_record_file(name: str) -> bool:
+    return name.lower().endswith('.json') and name != VALIDATION_FILE_NAME
+
+
+def content_fingerprint(path: str, sample_bytes: int = MERGE_FINGERPRINT_BYTES) -> str:
+    """源文件的内容指纹：文件大小 + 开头与结尾各 sample_bytes 字节的 sha1 (不必读取整个文件)"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_bytes))
+        if size > sample_bytes:
+            f.seek(max(sample_bytes, size - sample_bytes))
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+
+def _source_files(source_dir: str) -> Dict[str, str]:
+    """{不含扩展名的文件名: 文件名}，同名时图片优先于视频"""
+    files: Dict[str, str] = {}
+    for name in sorted(os.listdir(source_dir)):
+        stem, ext = os.path.splitext(name)
+        ext = ext.lower()
+        if ext in SUPPORTED_IMAGE_EXTENSIONS:
+            files[stem] = name
+        elif ext in SUPPORTED_VIDEO_EXTENSIONS:
+            files.setdefault(stem, name)
+    return files
+
+
+def _video_metadata(path: str) -> Dict[str, Any]:
+    """视频没有 EXIF，使用文件修改时间作为拍摄时间 (与校验页面导出一致)"""
+    dt_obj = datetime.fromtimestamp(os.path.getmtime(path))
+    return {
+        '文件名': os.path.basename(path),
+        '格式': os.path.splitext(path)[1].replace('.', '').upper(),
+        '拍摄日期': dt_obj.strftime("%Y-%m-%d"),
+        '拍摄时间': dt_obj.strftime("%H:%M:%S"),
+        '拍摄日期对象': dt_obj,
+    }
+
+
+def load_project_records(project: Dict[str, str]) -> List[Dict[str, Any]]:
+    """读取一个项目的全部记录 (元数据 + JSON 检测结果)，写入样地与内容指纹"""
+    source_dir, temp_dir, site = project['source_dir'], project['temp_dir'], project['site']
+    files = _source_files(source_dir)
+    records = []
+    for json_file in sorted(f for f in os.listdir(temp_dir) if _is_record_file(f)):
+        stem = os.path.splitext(json_file)[0]
+        file_name = files.get(stem)
+        if file_name is None:
+            logger.warning(f"找不到原始文件: {os.path.join(source_dir, stem)}")
+            continue
+        path = os.path.join(source_dir, file_name)
+        try:
+            if os.path.splitext(file_name)[1].lower() in SUPPORTED_VIDEO_EXTENSIONS:
+                metadata = _video_metadata(path)
+            else:
+                from system.metadata_extractor import ImageMetadataExtractor
+                metadata, _ = ImageMetadataExtractor.extract_metadata(path, file_name)
+            with open(os.path.join(temp_dir, json_file), 'r', encoding='utf-8') as f:
+                metadata.update(json.load(f))
+            metadata[SITE_FIELD] = site
+            metadata[FINGERPRINT_FIELD] = content_fingerprint(path)
+            records.append(metadata)
+        except Exception as e:
+            logger.error(f"处理文件 {os.path.join(temp_dir, json_file)} 时出错: {e}")
+    return records
+
+
+def load_validation_data(temp_dir: str) -> Dict[str, bool]:
+    try:
+        with open(os.path.join(temp_dir, VALIDATION_FILE_NAME), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning(f"读取校验数据失败: {e}")
+        return {}
+
+
+def load_projects(projects: List[Dict[str, str]],
+                  progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """读取各项目的记录，返回 {样地: 记录列表} (按样地排序)"""
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    for done, project in enumerate(projects, 1):
+        try:
+            results[project['site']] = load_project_records(project)
+        except Exception as e:
+            logger.error(f"读取项目 {project['source_dir']} 失败: {e}")
+            results[project['site']] = []
+        if progress_callback:
+            progress_callback(done, len(projects))
+    return {site: results[site] for site in sorted(results)}
+
+
+def deduplicate(records_by_site: Dict[str, List[Dict[str, Any]]]) -> int:
+    """
+    按内容指纹去重 (原地修改)，返回删除的记录数。
+    保留按样地顺序最先出现的记录；之后出现的重复记录经过人工校验而保留的记录没有时，改为保留人工校验的记录。
+    """
+    kept: Dict[str, tuple] = {}  # 指纹 -> (样地, 记录)
+    dropped = set()
+    for site, records in records_by_site.items():
+        for info in records:
+            fingerprint = info.get(FINGERPRINT_FIELD)
+            if not fingerprint:
+                continue
+            if fingerprint not in kept:
+                kept[fingerprint] = (site, info)
+                continue
+            first_site, first = kept[fingerprint]
+            if info.get('最低置信度') == '人工校验' and first.get('最低置信度') != '人工校验':
+                dropped.add(id(first))
+                kept[fingerprint] = (site, info)
+            else:
+                dropped.add(id(info))
+    if not dropped:
+        return 0
+    for site, records in records_by_site.items():
+        records_by_site[site] = [info for info in records if id(info) not in dropped]
+    logger.info(f"按内容指纹去除 {len(dropped)} 条重复记录")
+    return len(dropped)
+
+
+# ---------------- 按样地计算与导出 ----------------
+
+def prepare_site(records: List[Dict[str, Any]], site: str, source_dir: Optional[str],
+                 confidence_settings: Dict[str, float], min_frame_ratio: float = 0.0,
+                 include_analytics: bool = False) -> Dict[str, Any]:
+    """计算一个样地的独立探测、工作天数与布设表 (及分析表)"""
+    DataProcessor.process_independent_detection(records, confidence_settings, min_frame_ratio, site)
+    deployment_table = DataProcessor.apply_deployments(records, site, source_dir)
+    analytics_tables = {}
+    if include_analytics and deployment_table is not None:
+        analytics_tables = DataProcessor.build_analytics(records, deployment_table, confidence_settings,
+                                                         min_frame_ratio, site)
+    return {'deployments': deployment_table, 'analytics': analytics_tables}
+
+
+def _with_site(table: pd.DataFrame, site: str) -> pd.DataFrame:
+    """附加表加上样地列 (放在第一列)"""
+    if SITE_FIELD in table.columns:
+        return table
+    table = table.copy()
+    table.insert(0, SITE_FIELD, site)
+    return table
+
+
+def _combine_extra_sheets(prepared: Dict[str, Dict[str, Any]]) -> Dict[str, pd.DataFrame]:
+    """合并各样地的布设表与分析表"""
+    frames: Dict[str, List[pd.DataFrame]] = {}
+    for site, result in prepared.items():
+        if result['deployments'] is not None:
+            frames.setdefault(DEPLOYMENT_SHEET_NAME, []).append(result['deployments'])
+        for name, table in result['analytics'].items():
+            frames.setdefault(name, []).append(_with_site(table, site))
+    return {name: pd.concat(tables, ignore_index=True) for name, tables in frames.items()}
+
+
+def export_merged(projects: List[Dict[str, str]], output_path: str, confidence_settings: Dict[str, float],
+                  file_format: str = 'excel', columns: Optional[List[str]] = None, min_frame_ratio: float = 0.0,
+                  include_analytics: bool = False,
+                  load_callback: Optional[Callable[[int, int], None]] = None,
+                  progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+    """
+    合并导出多个项目，返回统计信息 (success, projects, records, duplicates)。
+    load_callback(已读取项目数, 项目数) 在读取阶段调用，progress_callback 在写入阶段调用。
+    """
+    file_format = file_format.lower()
+    confidence_settings = confidence_settings if confidence_settings is not None else {}
+    records_by_site = load_projects(projects, load_callback)
+    duplicates = deduplicate(records_by_site)
+    source_dirs = {project['site']: project['source_dir'] for project in projects}
+
+    prepared = {site: prepare_site(records, site, source_dirs.get(site), confidence_settings, min_frame_ratio,
+                                   include_analytics)
+                for site, records in records_by_site.items() if records}
+    stats = {'success': False, 'projects': len(prepared), 'records': sum(len(r) for r in records_by_site.values()),
+             'duplicates': duplicates}
+    if not prepared:
+        logger.warning("没有数据可导出")
+        return stats
+
+    if file_format == 'parquet':
+        # 每个样地写入同一数据集目录下各自的分区
+        success, total = True, len(prepared)
+        for done, (site, result) in enumerate(prepared.items(), 1):
+            extra_tables = None
+            if result['deployments'] is not None:
+                extra_tables = {DEPLOYMENT_TABLE_NAME: parquet_deployment_table(result['deployments'])}
+                extra_tables.update(analytics_parquet_tables(result['analytics']))
+            project = next(p for p in projects if p['site'] == site)
+            success = DataProcessor.export_to_parquet(
+                records_by_site[site], output_path, confidence_settings, site=site,
+                validation_data=load_validation_data(project['temp_dir']), min_frame_ratio=min_frame_ratio,
+                extra_tables=extra_tables) and success
+            if progress_callback:
+                progress_callback(done, total)
+        stats['success'] = success
+        return stats
+
+    columns = list(columns) if columns else list(DEFAULT_EXPORT_COLUMNS)
+    columns = [SITE_FIELD] + [c for c in columns if c != SITE_FIELD]
+    all_records = [info for site in prepared for info in records_by_site[site]]
+    stats['success'] = DataProcessor.export_to_excel(all_records, output_path, confidence_settings,
+                                                     file_format=file_format, columns_to_export=columns,
+                                                     min_frame_ratio=min_frame_ratio,
+                                                     progress_callback=progress_callback,
+                                                     extra_sheets=_combine_extra_sheets(prepared) or None)
+    return stats
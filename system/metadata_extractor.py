@@ -52,6 +52,7 @@ class ImageMetadataExtractor:
                     image_info['拍摄日期'] = date_taken.strftime('%Y-%m-%d')
                     image_info['拍摄时间'] = date_taken.strftime('%H:%M')
                     image_info['拍摄日期对象'] = date_taken
+                image_info.update(ImageMetadataExtractor._get_camera_from_exif(exif))
 
             return image_info, img
         except Exception as e:
@@ -61,6 +62,28 @@ class ImageMetadataExtractor:
                 '格式': filename.split('.')[-1].lower(),
             }, None
 
+    @staticmethod
+    def get_image_shape(img_path: str) -> Optional[Tuple[int, int]]:
+        """只读取文件头获取图像尺寸 (高, 宽)，按EXIF方向校正，与 cv2.imread 读出的尺寸一致
+
+        Args:
+            img_path: 图像文件路径
+
+        Returns:
+            (高, 宽)，读取失败时返回 None
+        """
+        try:
+            with Image.open(img_path) as img:
+                width, height = img.size
+                # EXIF 方向 5~8 表示图像需要旋转90度，cv2.imread 会自动应用
+                orientation = img.getexif().get(0x0112, 1)
+            if orientation in (5, 6, 7, 8):
+                width, height = height, width
+            return height, width
+        except Exception as e:
+            logger.debug(f"读取图像尺寸失败 ({img_path}): {e}")
+            return None
+
     @staticmethod
     def _get_date_from_exif(exif: Dict, filename: str) -> Optional[datetime]:
         """从EXIF数据中提取拍摄日期
@@ -85,4 +108,27 @@ class ImageMetadataExtractor:
                 continue
 
         logger.warning(f"无法解析图片 '{filename}' 的日期格式: '{date_str}'")
-        return None
\ No newline at end of file
+        return None
+
+    @staticmethod
+    def _get_camera_from_exif(exif: Dict) -> Dict[str, str]:
+        """从EXIF数据中提取相机型号与序列号 (用于区分同一文件夹中的多台相机)
+
+        Args:
+            exif: EXIF数据字典
+
+        Returns:
+            包含 '相机型号'、'相机序列号' 的字典 (缺失的字段不包含)
+        """
+        camera = {}
+        make = str(exif.get(271) or '').strip('\x00 ')
+        model = str(exif.get(272) or '').strip('\x00 ')
+        if model and make and not model.lower().startswith(make.lower()):
+            model = f"{make} {model}"
+        if model or make:
+            camera['相机型号'] = model or make
+        # BodySerialNumber，部分相机写在 CameraSerialNumber (0xC62F)
+        serial = str(exif.get(42033) or exif.get(50735) or '').strip('\x00 ')
+        if serial:
+            camera['相机序列号'] = serial
+        return camera
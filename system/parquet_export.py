@@ -0,0 +1,292 @@
+# system/parquet_export.py
+"""
+Parquet 数据集导出模块 - 把检测结果写为规范化的列式表，供 R / Python 直接读取，无需再拆分逗号拼接的物种字符串。
+
+    images      每个图片/视频一行：拍摄时间、工作天数、物种与数量 (列表列)、最低置信度、独立探测等
+    detections  每个检测框一行：原始物种与置信度、按当前阈值接受的物种、边界框、全部分类候选项 (列表列)
+    tracks      视频每个轨迹点一行：轨迹编号、帧序号、物种、置信度、边界框
+    validation  校验状态：每个已校验文件一行
+
+各表按 site (源文件夹名) 与 capture_month (拍摄年月) 以 hive 方式分区 (images/site=.../capture_month=.../)，
+同一数据集目录可累积多个样地的导出；重新导出同一样地时只替换被写入的分区。
+四个表并行写入，使用 zstd 压缩。需要安装 pyarrow。
+附加表 (如 deployments 相机布设表) 由调用方以 DataFrame 传入，只按 site 分区。
+"""
+
+import os
+import logging
+import importlib.util
+import concurrent.futures
+from typing import Any, Callable, Dict, List, Optional
+
+from system.export_engine import build_export_frame
+from system.threshold_engine import first_accepted
+
+logger = logging.getLogger(__name__)
+
+PARQUET_TABLES = ('images', 'detections', 'tracks', 'validation')
+PARTITION_COLUMNS = ['site', 'capture_month']
+PARQUET_COMPRESSION = 'zstd'
+UNKNOWN_PARTITION = 'unknown'
+
+# images 表需要的导出列 (与 Excel/CSV 导出的计算方式一致)
+IMAGE_EXPORT_COLUMNS = ['文件名', '格式', '拍摄日期', '拍摄时间', '工作天数', '物种名称', '物种数量',
+                         '最低置信度', '物种类型', '独立探测首只', '备注']
+
+
+def is_parquet_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def capture_month_of(info: Dict[str, Any]) -> str:
+    date_taken = info.get('拍摄日期对象')
+    if date_taken:
+        return date_taken.strftime('%Y-%m')
+    date_str = str(info.get('拍摄日期') or '')
+    return date_str[:7] if len(date_str) >= 7 else UNKNOWN_PARTITION
+
+
+def _split_names(value: Any) -> List[str]:
+    if value is None or value != value or value in ('', '空'):
+        return []
+    return [s.strip() for s in str(value).split(',') if s.strip()]
+
+
+def _split_counts(value: Any) -> List[Optional[int]]:
+    counts = []
+    for s in _split_names(value):
+        try:
+            counts.append(int(float(s)))
+        except ValueError:
+            counts.append(None)
+    return counts
+
+
+def _to_float(value: Any) -> Optional[float]:
+    try:
+        result = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if result != result else result
+
+
+def _to_int(value: Any) -> Optional[int]:
+    result = _to_float(value)
+    return int(result) if result is not None else None
+
+
+def _bbox_columns(rows: Dict[str, list], bbox: Any) -> None:
+    values = list(bbox) if isinstance(bbox, (list, tuple)) and len(bbox) == 4 else [None] * 4
+    for key, value in zip(('x1', 'y1', 'x2', 'y2'), values):
+        rows[key].append(_to_float(value))
+
+
+def _new_rows(columns: List[str]) -> Dict[str, list]:
+    return {c: [] for c in columns}
+
+
+def build_image_rows(image_info_list: List[Dict[str, Any]], confidence_settings: Dict[str, float],
+                     species_info_map: Dict[str, Dict[str, str]], site: str,
+                     min_frame_ratio: float = 0.0) -> Dict[str, list]:
+    """images 表：物种与数量由导出引擎计算 (与表格导出一致)，再拆为列表列"""
+    df = build_export_frame(image_info_list, confidence_settings, species_info_map,
+                            IMAGE_EXPORT_COLUMNS, min_frame_ratio)
+    rows = _new_rows(['site', 'capture_month', 'file_name', 'format', 'capture_datetime', 'capture_date',
+                      'capture_time', 'working_day', 'species', 'species_count', 'species_type',
+                      'min_confidence', 'manually_validated', 'independent', 'remark'])
+    for info, row in zip(image_info_list, df.itertuples(index=False, name=None)):
+        file_name, fmt, date_str, time_str, working_day, names, counts, min_conf, species_type, independent, \
+            remark = row
+        rows['site'].append(site)
+        rows['capture_month'].append(capture_month_of(info))
+        rows['file_name'].append(str(file_name))
+        rows['format'].append(None if fmt != fmt else str(fmt))
+        rows['capture_datetime'].append(info.get('拍摄日期对象'))
+        rows['capture_date'].append(None if date_str != date_str else str(date_str))
+        rows['capture_time'].append(None if time_str != time_str else str(time_str))
+        rows['working_day'].append(_to_int(working_day))
+        rows['species'].append(_split_names(names))
+        rows['species_count'].append(_split_counts(counts))
+        rows['species_type'].append(species_type or None)
+        rows['min_confidence'].append(_to_float(min_conf))
+        rows['manually_validated'].append(info.get('最低置信度') == '人工校验')
+        rows['independent'].append(independent == '是')
+        rows['remark'].append(None if remark != remark or remark == '' else str(remark))
+    return rows
+
+
+def build_detection_rows(image_info_list: List[Dict[str, Any]], confidence_settings: Dict[str, float],
+                         site: str) -> Dict[str, list]:
+    """detections 表：每个检测框一行，accepted_species 为第一个达到物种阈值的候选项"""
+    rows = _new_rows(['site', 'capture_month', 'file_name', 'box_index', 'species', 'confidence',
+                      'accepted_species', 'x1', 'y1', 'x2', 'y2', 'candidates'])
+    for info in image_info_list:
+        if 'tracks' in info:
+            continue
+        file_name, month = info.get('文件名'), capture_month_of(info)
+        boxes = info.get('检测框') or []
+        if boxes:
+            entries = []
+            for box in boxes:
+                candidates = [{'name': c.get('name'), 'conf': _to_float(c.get('conf'))}
+                              for c in (box.get('候选项') or [])]
+                entries.append((box.get('物种'), _to_float(box.get('置信度')), box.get('边界框'), candidates))
+        else:
+            names_map = info.get('names_map') or {}
+            entries = [(names_map.get(str(int(cls))), _to_float(conf), None, [])
+                       for cls, conf in zip(info.get('all_classes') or [], info.get('all_confidences') or [])]
+
+        for b, (species, conf, bbox, candidates) in enumerate(entries):
+            options = candidates or [{'name': species, 'conf': conf}]
+            accepted = first_accepted(((c['name'], c['conf']) for c in options
+                                       if c['name'] and c['conf'] is not None), confidence_settings)
+            accepted = accepted[0] if accepted else None
+            rows['site'].append(site)
+            rows['capture_month'].append(month)
+            rows['file_name'].append(file_name)
+            rows['box_index'].append(b)
+            rows['species'].append(species)
+            rows['confidence'].append(conf)
+            rows['accepted_species'].append(accepted)
+            _bbox_columns(rows, bbox)
+            rows['candidates'].append(candidates)
+    return rows
+
+
+def build_track_rows(image_info_list: List[Dict[str, Any]], site: str) -> Dict[str, list]:
+    """tracks 表：视频每个轨迹点一行"""
+    rows = _new_rows(['site', 'capture_month', 'file_name', 'track_id', 'frame_index', 'species',
+                      'original_species', 'confidence', 'x1', 'y1', 'x2', 'y2'])
+    for info in image_info_list:
+        tracks = info.get('tracks')
+        if not tracks:
+            continue
+        file_name, month = info.get('文件名'), capture_month_of(info)
+        for track_id, points in tracks.items():
+            for point in points:
+                rows['site'].append(site)
+                rows['capture_month'].append(month)
+                rows['file_name'].append(file_name)
+                rows['track_id'].append(str(track_id))
+                rows['frame_index'].append(_to_int(point.get('frame_index')))
+                rows['species'].append(point.get('species'))
+                rows['original_species'].append(point.get('original_species'))
+                rows['confidence'].append(_to_float(point.get('confidence')))
+                _bbox_columns(rows, point.get('bbox'))
+    return rows
+
+
+def build_validation_rows(image_info_list: List[Dict[str, Any]], validation_data: Dict[str, bool],
+                          site: str) -> Dict[str, list]:
+    """validation 表：每个已校验文件一行 (is_correct=False 表示被标记为错误)"""
+    months = {info.get('文件名'): capture_month_of(info) for info in image_info_list}
+    rows = _new_rows(['site', 'capture_month', 'file_name', 'is_correct'])
+    for file_name, is_correct in (validation_data or {}).items():
+        rows['site'].append(site)
+        rows['capture_month'].append(months.get(file_name, UNKNOWN_PARTITION))
+        rows['file_name'].append(file_name)
+        rows['is_correct'].append(bool(is_correct))
+    return rows
+
+
+def _schemas():
+    import pyarrow as pa
+
+    bbox = [('x1', pa.float64()), ('y1', pa.float64()), ('x2', pa.float64()), ('y2', pa.float64())]
+    partition = [('site', pa.string()), ('capture_month', pa.string()), ('file_name', pa.string())]
+    return {
+        'images': pa.schema(partition + [
+            ('format', pa.string()), ('capture_datetime', pa.timestamp('us')), ('capture_date', pa.string()),
+            ('capture_time', pa.string()), ('working_day', pa.int32()), ('species', pa.list_(pa.string())),
+            ('species_count', pa.list_(pa.int32())), ('species_type', pa.string()),
+            ('min_confidence', pa.float64()), ('manually_validated', pa.bool_()), ('independent', pa.bool_()),
+            ('remark', pa.string())]),
+        'detections': pa.schema(partition + [
+            ('box_index', pa.int32()), ('species', pa.string()), ('confidence', pa.float64()),
+            ('accepted_species', pa.string())] + bbox + [
+            ('candidates', pa.list_(pa.struct([('name', pa.string()), ('conf', pa.float64())])))]),
+        'tracks': pa.schema(partition + [
+            ('track_id', pa.string()), ('frame_index', pa.int64()), ('species', pa.string()),
+            ('original_species', pa.string()), ('confidence', pa.float64())] + bbox),
+        'validation': pa.schema(partition + [('is_correct', pa.bool_())]),
+    }
+
+
+def _write_table(rows: Dict[str, list], schema, target_dir: str) -> int:
+    """按分区写入一个表，只替换本次写入的分区目录"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    table = pa.Table.from_pydict(rows, schema=schema)
+    if table.num_rows == 0:
+        return 0
+    ds.write_dataset(
+        table, target_dir, format='parquet',
+        partitioning=PARTITION_COLUMNS, partitioning_flavor='hive',
+        basename_template='part-{i}.parquet',
+        existing_data_behavior='delete_matching',
+        file_options=ds.ParquetFileFormat().make_write_options(compression=PARQUET_COMPRESSION),
+        use_threads=True,
+    )
+    return table.num_rows
+
+
+def _write_extra_table(frame, site: str, target_dir: str) -> int:
+    """写入附加表 (DataFrame)，按 site 分区"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    frame = frame.copy()
+    frame['site'] = site
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    if table.num_rows == 0:
+        return 0
+    ds.write_dataset(
+        table, target_dir, format='parquet',
+        partitioning=['site'], partitioning_flavor='hive',
+        basename_template='part-{i}.parquet',
+        existing_data_behavior='delete_matching',
+        file_options=ds.ParquetFileFormat().make_write_options(compression=PARQUET_COMPRESSION),
+    )
+    return table.num_rows
+
+
+def export_parquet_dataset(image_info_list: List[Dict[str, Any]], output_dir: str,
+                           confidence_settings: Optional[Dict[str, float]],
+                           species_info_map: Dict[str, Dict[str, str]], site: str,
+                           validation_data: Optional[Dict[str, bool]] = None, min_frame_ratio: float = 0.0,
+                           progress_callback: Optional[Callable[[int, int], None]] = None,
+                           extra_tables: Optional[Dict[str, Any]] = None) -> Dict[str, int]:
+    """写入 images/detections/tracks/validation 四个表及附加表，返回各表写入的行数"""
+    if not is_parquet_available():
+        raise RuntimeError("未安装 pyarrow，无法导出 Parquet 数据集")
+    confidence_settings = confidence_settings if confidence_settings is not None else {}
+    site = site or UNKNOWN_PARTITION
+    schemas = _schemas()
+    builders = {
+        'images': lambda: build_image_rows(image_info_list, confidence_settings, species_info_map, site,
+                                           min_frame_ratio),
+        'detections': lambda: build_detection_rows(image_info_list, confidence_settings, site),
+        'tracks': lambda: build_track_rows(image_info_list, site),
+        'validation': lambda: build_validation_rows(image_info_list, validation_data, site),
+    }
+
+    extra_tables = extra_tables or {}
+    total = len(PARQUET_TABLES) + len(extra_tables)
+
+    os.makedirs(output_dir, exist_ok=True)
+    counts, done = {}, 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(PARQUET_TABLES)) as executor:
+        futures = {executor.submit(lambda name=name: _write_table(builders[name](), schemas[name],
+                                                                  os.path.join(output_dir, name))): name
+                   for name in PARQUET_TABLES}
+        futures.update({executor.submit(_write_extra_table, frame, site, os.path.join(output_dir, name)): name
+                        for name, frame in extra_tables.items()})
+        for future in concurrent.futures.as_completed(futures):
+            name = futures[future]
+            counts[name] = future.result()
+            done += 1
+            logger.info(f"Parquet 表 {name} 已写入 {counts[name]} 行")
+            if progress_callback:
+                progress_callback(done, total)
+    return counts
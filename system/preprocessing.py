@@ -0,0 +1,154 @@
+# system/preprocessing.py
+"""
+图像预处理模块 - LAB色彩空间增强 (L通道 CLAHE) 的快速实现，输出与原实现逐像素一致。
+
+    1. CLAHE 对象按线程缓存 (cv2 的 CLAHE 对象不能跨线程共享)，不再每帧创建；
+    2. 夜间红外帧通常是三通道灰度图 (B==G==R)，先用稀疏采样快速排除彩色帧，再做完整校验；
+       对这类帧，BGR->LAB 与 LAB->BGR 都退化为按像素值的查找表，只需对单个平面做 CLAHE，
+       省去两次色彩空间转换与通道拆分/合并。
+
+查找表在首次使用时用 OpenCV 自身的转换结果生成；若当前 OpenCV 的转换不满足灰度像素 a=b=128
+(查找表不成立)，自动退回完整的 LAB 流程。
+"""
+
+import logging
+import threading
+from typing import Any, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CLAHE_CLIP_LIMIT = 2.0
+CLAHE_TILE_GRID = (8, 8)
+# 快速排除彩色帧时的采样步长 (像素)
+GRAY_SAMPLE_STRIDE = 16
+
+_local = threading.local()
+_lut_lock = threading.Lock()
+_gray_luts = None  # (L查找表, B/G/R查找表 或 None 表示不可用)
+
+
+def get_clahe():
+    """当前线程的 CLAHE 对象"""
+    clahe = getattr(_local, 'clahe', None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+        _local.clahe = clahe
+    return clahe
+
+
+def _build_gray_luts() -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """用 OpenCV 的转换结果生成灰度像素的查找表：v -> L，以及 L' (a=b=128) -> B/G/R"""
+    # 每个灰度值重复多列，同时覆盖 OpenCV 的向量化与标量两条路径
+    ramp = np.repeat(np.arange(256, dtype=np.uint8)[:, None], 67, axis=1)
+    gray_bgr = cv2.merge((ramp, ramp, ramp))
+    lab = cv2.cvtColor(gray_bgr, cv2.COLOR_BGR2LAB)
+    if not (np.all(lab[:, :, 1] == 128) and np.all(lab[:, :, 2] == 128)):
+        return None
+    l_values = lab[:, :, 0]
+    if not np.all(l_values == l_values[:, :1]):
+        return None
+    l_lut = np.ascontiguousarray(l_values[:, 0])
+
+    neutral = np.full_like(ramp, 128)
+    bgr = cv2.cvtColor(cv2.merge((ramp, neutral, neutral)), cv2.COLOR_LAB2BGR)
+    if not np.all(bgr == bgr[:, :1]):
+        return None
+    bgr_lut = np.ascontiguousarray(bgr[:, 0, :])  # (256, 3)
+    return l_lut, bgr_lut
+
+
+def gray_luts() -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    global _gray_luts
+    if _gray_luts is None:
+        with _lut_lock:
+            if _gray_luts is None:
+                try:
+                    _gray_luts = _build_gray_luts() or (None, None)
+                except Exception as e:
+                    logger.warning(f"生成灰度查找表失败，使用完整LAB流程: {e}")
+                    _gray_luts = (None, None)
+                if _gray_luts[0] is None:
+                    logger.info("当前 OpenCV 不满足灰度查找表条件，红外帧使用完整LAB流程")
+    return _gray_luts if _gray_luts[0] is not None else None
+
+
+def is_pseudo_gray(img: np.ndarray) -> bool:
+    """判断三通道图像是否为灰度图 (B==G==R)：先稀疏采样排除彩色帧，再完整校验"""
+    if img is None or img.ndim != 3 or img.shape[2] != 3:
+        return False
+    sample = img[::GRAY_SAMPLE_STRIDE, ::GRAY_SAMPLE_STRIDE]
+    if not (np.array_equal(sample[:, :, 0], sample[:, :, 1]) and np.array_equal(sample[:, :, 0], sample[:, :, 2])):
+        return False
+    b, g, r = cv2.split(img)
+    return cv2.countNonZero(cv2.absdiff(b, g)) == 0 and cv2.countNonZero(cv2.absdiff(b, r)) == 0
+
+
+def _enhance_gray_bgr(img: np.ndarray, luts: Tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+    """三通道灰度图：单平面查找表 + CLAHE，结果与完整LAB流程一致"""
+    l_lut, bgr_lut = luts
+    l_plane = cv2.LUT(np.ascontiguousarray(img[:, :, 0]), l_lut)
+    l_enhanced = get_clahe().apply(l_plane)
+    if np.array_equal(bgr_lut[:, 0], bgr_lut[:, 1]) and np.array_equal(bgr_lut[:, 0], bgr_lut[:, 2]):
+        return cv2.cvtColor(cv2.LUT(l_enhanced, np.ascontiguousarray(bgr_lut[:, 0])), cv2.COLOR_GRAY2BGR)
+    return cv2.merge([cv2.LUT(l_enhanced, np.ascontiguousarray(bgr_lut[:, c])) for c in range(3)])
+
+
+def _enhance_color(img: np.ndarray) -> np.ndarray:
+    """彩色图：BGR -> LAB，只对 L 通道 (亮度) 做 CLAHE，再转回 BGR"""
+    lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+    l, a, b = cv2.split(lab)
+    l_enhanced = get_clahe().apply(l)
+    return cv2.cvtColor(cv2.merge((l_enhanced, a, b)), cv2.COLOR_LAB2BGR)
+
+
+def enhance(img: Any) -> Any:
+    """
+    图像预处理：LAB色彩空间增强 (L通道 CLAHE)
+    适用于 BGR 彩色图像、三通道灰度 (红外) 图像和单通道灰度图像
+    """
+    if img is None or img.size == 0:
+        return None
+
+    try:
+        # 确保图像是 uint8 类型，防止 YOLO 报错 Unsupported image type
+        if img.dtype != np.uint8:
+            img = img.astype(np.uint8)
+
+        # 1. 单通道灰度图
+        if img.ndim == 2:
+            return np.ascontiguousarray(get_clahe().apply(img))
+
+        # 2. 三通道图像 (BGR)：红外灰度帧走查找表快速路径
+        if img.ndim == 3:
+            if is_pseudo_gray(img):
+                luts = gray_luts()
+                if luts is not None:
+                    return np.ascontiguousarray(_enhance_gray_bgr(img, luts))
+            return np.ascontiguousarray(_enhance_color(img))
+
+    except Exception as e:
+        logger.warning(f"图像预处理失败，将使用原图: {e}")
+        return np.ascontiguousarray(img) if img is not None else None
+
+    return img
+
+
+def enhance_reference(img: Any) -> Any:
+    """原实现 (每帧新建 CLAHE、始终走 LAB 流程)，仅用于一致性校验与基准测试"""
+    if img is None or img.size == 0:
+        return None
+    if img.dtype != np.uint8:
+        img = img.astype(np.uint8)
+    if img.ndim == 2:
+        clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+        return np.ascontiguousarray(clahe.apply(img))
+    if img.ndim == 3:
+        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
+        l, a, b = cv2.split(lab)
+        clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+        merged = cv2.merge((clahe.apply(l), a, b))
+        return np.ascontiguousarray(cv2.cvtColor(merged, cv2.COLOR_LAB2BGR))
+    return img
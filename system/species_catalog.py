@@ -0,0 +1,262 @@
+# system/species_catalog.py
+"""
+物种名录模块 - 把《中国生物物种名录》XLSX 编译为紧凑的 JSON 索引并缓存在设置目录 (temp)，
+之后按需加载 (毫秒级)，整个程序共享同一个内存实例。
+主窗口启动时通过 configure_species_catalog 指定缓存目录；未指定时只在内存中编译，不写入任何文件。
+
+    1. 索引记录名录文件的大小、修改时间与 SHA1：大小/修改时间未变直接使用缓存；
+       只有修改时间变化时再比较 SHA1，内容未变则不重新编译；
+    2. info_map 与原导出逻辑一致：{中文名: 学名/纲/目/科/属}，同一中文名出现多行 (亚种) 时以最后一行为准；
+    3. 另外提供学名查询 (物种级学名，不含亚种) 与同物异名解析：拉丁名 (含亚种名，不区分大小写，
+       下划线视为空格，兼容模型类别名如 Capra_sibirica)、模型英文类别名 (res/translate.json) 均可解析为名录中文名。
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+from system.utils import resource_path
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FILE_NAME = "《中国生物物种名录》-鸟纲哺乳纲-2025.xlsx"
+INDEX_FILE_NAME = "species_catalog.json"
+# 索引格式版本，编译逻辑变化时递增
+INDEX_VERSION = 1
+
+# 列字母 -> 字段名 (与原导出逻辑相同的列位置)
+_FIELD_COLUMNS = {
+    '学名': 'A', '纲': 'H', '目名': 'J', '目拉丁名': 'I',
+    '科名': 'L', '科拉丁名': 'K', '属名': 'N', '属拉丁名': 'M',
+}
+_SUBSPECIES_PATTERN = re.compile(r"\s+(subsp|ssp|var)\.\s+.*$", re.IGNORECASE)
+
+
+def catalog_source_path() -> str:
+    return resource_path(os.path.join("res", CATALOG_FILE_NAME))
+
+
+def _normalize_latin(name: str) -> str:
+    return " ".join(str(name).replace('_', ' ').split()).lower()
+
+
+def _file_sha1(path: str) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SpeciesCatalog:
+    """物种名录索引 (线程安全的延迟加载)"""
+
+    def __init__(self, source_path: Optional[str] = None, cache_dir: Optional[str] = None):
+        self.source_path = source_path or catalog_source_path()
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._info_map: Optional[Dict[str, Dict[str, str]]] = None
+        self._scientific: Dict[str, str] = {}
+        self._latin_index: Dict[str, str] = {}
+        self._aliases: Dict[str, str] = {}
+
+    @property
+    def index_path(self) -> Optional[str]:
+        return os.path.join(self.cache_dir, INDEX_FILE_NAME) if self.cache_dir else None
+
+    def _ensure_loaded(self) -> None:
+        if self._info_map is not None:
+            return
+        with self._lock:
+            if self._info_map is not None:
+                return
+            index = self._load_or_compile()
+            self._scientific = index.get('scientific', {})
+            self._latin_index = index.get('latin_index', {})
+            self._aliases = self._load_aliases(index.get('info_map', {}))
+            self._info_map = index.get('info_map', {})
+
+    def _load_or_compile(self) -> dict:
+        if not os.path.exists(self.source_path):
+            logger.warning(f"未找到物种名录文件: {self.source_path}，分类信息将为空。")
+            return {}
+        st = os.stat(self.source_path)
+        cached = self._read_index()
+        if cached and cached.get('size') == st.st_size:
+            if cached.get('mtime_ns') == st.st_mtime_ns:
+                return cached
+            try:
+                if cached.get('sha1') == _file_sha1(self.source_path):
+                    cached['mtime_ns'] = st.st_mtime_ns
+                    self._write_index(cached)
+                    return cached
+            except OSError as e:
+                logger.warning(f"校验物种名录失败: {e}")
+
+        try:
+            index = self._compile(st)
+        except Exception as e:
+            logger.error(f"加载或处理物种名录失败: {e}", exc_info=True)
+            return {}
+        self._write_index(index)
+        return index
+
+    def _read_index(self) -> Optional[dict]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if index.get('version') == INDEX_VERSION and index.get('source') == os.path.basename(self.source_path):
+                return index
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"读取物种名录索引失败，将重新编译: {e}")
+        return None
+
+    def _write_index(self, index: dict) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.index_path)
+        except Exception as e:
+            logger.warning(f"保存物种名录索引失败: {e}")
+
+    def _compile(self, st: os.stat_result) -> dict:
+        """读取 XLSX 并生成索引"""
+        import pandas as pd
+
+        logger.info(f"正在从 {self.source_path} 编译物种名录索引...")
+        df = pd.read_excel(self.source_path)
+        df.columns = [chr(65 + i) for i in range(len(df.columns))]
+
+        def column(letter: str) -> list:
+            if letter not in df.columns:
+                return [''] * len(df)
+            return [str(v).strip() for v in df[letter].astype(object).tolist()]
+
+        chinese_raw = df['B'].astype(object).tolist() if 'B' in df.columns else [None] * len(df)
+        fields = {field: column(letter) for field, letter in _FIELD_COLUMNS.items()}
+
+        info_map, scientific, latin_index = {}, {}, {}
+        for row, chinese in enumerate(chinese_raw):
+            if chinese is None or pd.isna(chinese) or not str(chinese).strip():
+                continue
+            name = str(chinese).strip()
+            # 同一中文名出现多行时以最后一行为准 (与原导出逻辑一致)
+            info_map[name] = {field: values[row] for field, values in fields.items()}
+            latin = fields['学名'][row]
+            if latin and latin != 'nan':
+                latin_index.setdefault(_normalize_latin(latin), name)
+                if not _SUBSPECIES_PATTERN.search(latin):
+                    scientific.setdefault(name, latin)
+
+        if info_map:
+            logger.info(f"成功加载 {len(info_map)} 条物种信息。")
+        else:
+            logger.warning("物种名录已加载，但未能提取任何物种信息，请检查Excel文件内容和格式。")
+        return {
+            'version': INDEX_VERSION,
+            'source': os.path.basename(self.source_path),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+            'sha1': _file_sha1(self.source_path),
+            'info_map': info_map,
+            'scientific': scientific,
+            'latin_index': latin_index,
+        }
+
+    @staticmethod
+    def _load_aliases(info_map: Dict[str, Dict[str, str]]) -> Dict[str, str]:
+        """模型英文类别名 -> 名录中文名 (来自 res/translate.json)"""
+        try:
+            path = resource_path(os.path.join("res", "translate.json"))
+            if not os.path.exists(path):
+                return {}
+            with open(path, 'r', encoding='utf-8') as f:
+                translate = json.load(f)
+            return {str(k).lower(): v for k, v in translate.items() if v in info_map}
+        except Exception as e:
+            logger.warning(f"读取物种别名失败: {e}")
+            return {}
+
+    def info_map(self) -> Dict[str, Dict[str, str]]:
+        """{中文名: 分类信息}，调用方只读使用 (共享实例)"""
+        self._ensure_loaded()
+        return self._info_map
+
+    def get(self, chinese_name: str) -> Optional[Dict[str, str]]:
+        self._ensure_loaded()
+        return self._info_map.get(chinese_name)
+
+    def __contains__(self, chinese_name: str) -> bool:
+        self._ensure_loaded()
+        return chinese_name in self._info_map
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._info_map)
+
+    def scientific_name(self, chinese_name: str) -> str:
+        """物种级学名 (不含亚种)，名录中没有时返回空字符串"""
+        self._ensure_loaded()
+        if chinese_name in self._scientific:
+            return self._scientific[chinese_name]
+        info = self._info_map.get(chinese_name)
+        return info.get('学名', '') if info else ''
+
+    def resolve(self, name: str) -> Optional[str]:
+        """把中文名、拉丁名 (含亚种名) 或模型英文类别名解析为名录中文名，无法解析时返回 None"""
+        self._ensure_loaded()
+        if not name:
+            return None
+        name = str(name).strip()
+        if name in self._info_map:
+            return name
+        key = _normalize_latin(name)
+        if key in self._latin_index:
+            return self._latin_index[key]
+        species_key = _normalize_latin(_SUBSPECIES_PATTERN.sub('', name))
+        if species_key in self._latin_index:
+            return self._latin_index[species_key]
+        return self._aliases.get(key)
+
+    def describe(self, chinese_name: str) -> str:
+        """简短的分类描述，例如 "Accipiter badius · 鹰形目 鹰科" """
+        info = self.get(chinese_name)
+        if not info:
+            return ""
+        parts = [p for p in (info.get('目名', ''), info.get('科名', '')) if p and p != 'nan']
+        latin = self.scientific_name(chinese_name)
+        return " · ".join(p for p in (latin, " ".join(parts)) if p)
+
+
+_catalog: Optional[SpeciesCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_species_catalog() -> SpeciesCatalog:
+    """程序共享的名录实例 (索引缓存目录由 configure_species_catalog 指定)"""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = SpeciesCatalog()
+    return _catalog
+
+
+def configure_species_catalog(cache_dir: Optional[str]) -> SpeciesCatalog:
+    """指定共享实例的索引缓存目录 (设置目录)；已在内存中加载的名录不受影响，之后的编译结果写入该目录"""
+    catalog = get_species_catalog()
+    with _catalog_lock:
+        catalog.cache_dir = cache_dir
+    return catalog
@@ -0,0 +1,174 @@
+# system/streaming_export.py
+"""
+流式表格导出模块 - 分块生成导出表格并逐块写入，内存占用与总行数无关。
+
+    1. 记录按 EXPORT_CHUNK_ROWS 分块交给列式导出引擎 (每条记录的导出行只取决于记录本身，分块结果与整体生成一致)；
+    2. Excel 使用 openpyxl 的只写模式 (行写入后即落盘)，CSV 逐块追加写入；
+    3. 超过 EXPORT_MAX_ROWS_PER_PART 行时自动拆分：Excel 拆为多个工作表，CSV 拆为多个文件
+       (物种检测信息.csv, 物种检测信息_2.csv, ...)，每个部分都带表头；
+    4. 每写完一块通过回调报告 (已写行数, 总行数)，供界面显示进度；
+    5. 附加表 (如相机布设表) 在 Excel 中写为额外工作表，在 CSV 中写为 <文件名>_<表名>.csv。
+"""
+
+import os
+import logging
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+from system.config import EXPORT_CHUNK_ROWS, EXPORT_MAX_ROWS_PER_PART
+from system.export_engine import DEFAULT_EXPORT_COLUMNS, build_export_frame
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHEET_NAME = "物种检测信息"
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def iter_export_chunks(image_info_list: List[Dict[str, Any]], confidence_settings: Optional[Dict[str, float]],
+                       species_info_map: Dict[str, Dict[str, str]], columns: Optional[List[str]] = None,
+                       min_frame_ratio: float = 0.0, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """分块生成导出表格"""
+    chunk_rows = max(1, int(chunk_rows))
+    for start in range(0, len(image_info_list), chunk_rows):
+        yield build_export_frame(image_info_list[start:start + chunk_rows], confidence_settings,
+                                 species_info_map, columns, min_frame_ratio)
+
+
+def part_path(output_path: str, part: int) -> str:
+    """第 part 个输出文件的路径 (第 1 个为原路径)"""
+    if part <= 1:
+        return output_path
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}_{part}{ext}"
+
+
+def _split_by_part(chunks: Iterator[pd.DataFrame], rows_per_part: int) -> Iterator[tuple]:
+    """把数据块按行数阈值切分，产出 (部分序号, 数据块)；序号从 1 开始"""
+    part, rows_in_part = 1, 0
+    for chunk in chunks:
+        offset = 0
+        while offset < len(chunk):
+            if rows_in_part >= rows_per_part:
+                part, rows_in_part = part + 1, 0
+            take = min(len(chunk) - offset, rows_per_part - rows_in_part)
+            yield part, chunk.iloc[offset:offset + take]
+            offset += take
+            rows_in_part += take
+
+
+def _excel_rows(chunk: pd.DataFrame) -> Iterator[tuple]:
+    """把数据块转换为 openpyxl 可写入的行 (缺失值写为空单元格，与 DataFrame.to_excel 一致)"""
+    values = chunk.astype(object).where(chunk.notna(), None)
+    return values.itertuples(index=False, name=None)
+
+
+def extra_table_path(output_path: str, name: str) -> str:
+    """CSV 附加表的路径：<文件名>_<表名>.csv"""
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}_{name}{ext}"
+
+
+def write_excel_streaming(chunks: Iterator[pd.DataFrame], output_path: str, columns: List[str],
+                          total_rows: int = 0, sheet_name: str = DEFAULT_SHEET_NAME,
+                          rows_per_part: int = EXPORT_MAX_ROWS_PER_PART,
+                          progress_callback: Optional[ProgressCallback] = None,
+                          extra_sheets: Optional[Dict[str, pd.DataFrame]] = None) -> List[str]:
+    """以只写模式写入 Excel，超过行数阈值时新建工作表，返回工作表名称列表"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    workbook = Workbook(write_only=True)
+    sheets, current_part, sheet, written = [], 0, None, 0
+    header_font = Font(bold=True)
+
+    def new_sheet(part: int, name: Optional[str] = None, header_columns: Optional[List[str]] = None):
+        if name is None:
+            name = sheet_name if part == 1 else f"{sheet_name}_{part}"
+        ws = workbook.create_sheet(title=name[:31])
+        header = []
+        for col in (columns if header_columns is None else header_columns):
+            cell = WriteOnlyCell(ws, value=col)
+            cell.font = header_font
+            header.append(cell)
+        ws.append(header)
+        sheets.append(ws.title)
+        return ws
+
+    for part, chunk in _split_by_part(chunks, max(1, int(rows_per_part))):
+        if part != current_part:
+            sheet, current_part = new_sheet(part), part
+        for row in _excel_rows(chunk):
+            sheet.append(row)
+        written += len(chunk)
+        if progress_callback:
+            progress_callback(written, total_rows)
+
+    if sheet is None:
+        new_sheet(1)
+    for name, table in (extra_sheets or {}).items():
+        ws = new_sheet(0, name, [str(c) for c in table.columns])
+        for row in _excel_rows(table):
+            ws.append(row)
+    workbook.save(output_path)
+    return sheets
+
+
+def write_csv_streaming(chunks: Iterator[pd.DataFrame], output_path: str, columns: List[str],
+                        total_rows: int = 0, rows_per_part: int = EXPORT_MAX_ROWS_PER_PART,
+                        progress_callback: Optional[ProgressCallback] = None,
+                        extra_sheets: Optional[Dict[str, pd.DataFrame]] = None) -> List[str]:
+    """逐块追加写入 CSV (UTF-8 BOM)，超过行数阈值时写入新文件，返回文件路径列表"""
+    paths, current_part, handle, written = [], 0, None, 0
+    try:
+        for part, chunk in _split_by_part(chunks, max(1, int(rows_per_part))):
+            if part != current_part:
+                if handle is not None:
+                    handle.close()
+                path = part_path(output_path, part)
+                handle = open(path, 'w', encoding='utf-8-sig', newline='')
+                paths.append(path)
+                current_part = part
+                chunk.to_csv(handle, index=False)
+            else:
+                chunk.to_csv(handle, index=False, header=False)
+            written += len(chunk)
+            if progress_callback:
+                progress_callback(written, total_rows)
+
+        if handle is None:
+            handle = open(output_path, 'w', encoding='utf-8-sig', newline='')
+            paths.append(output_path)
+            pd.DataFrame(columns=columns).to_csv(handle, index=False)
+    finally:
+        if handle is not None:
+            handle.close()
+    for name, table in (extra_sheets or {}).items():
+        path = extra_table_path(output_path, name)
+        table.to_csv(path, index=False, encoding='utf-8-sig')
+        paths.append(path)
+    return paths
+
+
+def export_streaming(image_info_list: List[Dict[str, Any]], output_path: str,
+                     confidence_settings: Optional[Dict[str, float]], species_info_map: Dict[str, Dict[str, str]],
+                     file_format: str = 'excel', columns: Optional[List[str]] = None, min_frame_ratio: float = 0.0,
+                     chunk_rows: int = EXPORT_CHUNK_ROWS, rows_per_part: int = EXPORT_MAX_ROWS_PER_PART,
+                     progress_callback: Optional[ProgressCallback] = None,
+                     extra_sheets: Optional[Dict[str, pd.DataFrame]] = None) -> List[str]:
+    """分块生成并写入导出表格，返回写入的工作表名称 (Excel) 或文件路径 (CSV)"""
+    columns = columns if columns else DEFAULT_EXPORT_COLUMNS
+    total_rows = len(image_info_list)
+    chunks = iter_export_chunks(image_info_list, confidence_settings, species_info_map,
+                                columns, min_frame_ratio, chunk_rows)
+    if file_format.lower() == 'excel':
+        return write_excel_streaming(chunks, output_path, columns, total_rows,
+                                     rows_per_part=rows_per_part, progress_callback=progress_callback,
+                                     extra_sheets=extra_sheets)
+    if file_format.lower() == 'csv':
+        return write_csv_streaming(chunks, output_path, columns, total_rows,
+                                   rows_per_part=rows_per_part, progress_callback=progress_callback,
+                                   extra_sheets=extra_sheets)
+    raise ValueError(f"不支持的导出格式: {file_format}")
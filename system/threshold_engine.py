@@ -0,0 +1,286 @@
+# system/threshold_engine.py
+"""
+阈值评估引擎 - 物种阈值的统一实现，以及校验页面 "按置信度阈值归类照片" 的增量计算。
+
+    1. threshold_for / first_accepted 为各处共用的阈值规则：物种有单独阈值时用该阈值，否则用全局阈值
+       (默认 0.25)；检测框取第一个达到其物种阈值的候选项；
+    2. ThresholdEngine 一次性载入所有检测结果，把候选项 (视频为轨迹点) 的置信度按物种排序存为数组；
+       阈值从 a 变为 b 时，只有该物种置信度落在 [min(a, b), max(a, b)) 内的候选项通过状态改变，
+       用二分查找即可得到受影响的记录，只重新归类这些记录，拖动滑块时物种列表与数量可以实时更新；
+    3. 单条记录的归类规则与原校验页面一致 (classify)：人工校验 > 视频轨迹投票 > 图片检测框，
+       检测框中有效候选项的前两名置信度差小于 AMBIGUITY_THRESHOLD 时归为 "需人工检验"。
+"""
+
+import logging
+from collections import Counter
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.25
+AMBIGUITY_THRESHOLD = 0.15
+EMPTY_LABEL = "标记为空"
+AMBIGUOUS_LABEL = "需人工检验"
+
+_MANUAL, _VIDEO, _BOXES = range(3)
+
+
+def threshold_for(confidence_settings: Optional[Dict[str, float]], name: Any) -> float:
+    """物种阈值：单独设置的阈值，否则为全局阈值"""
+    if not confidence_settings:
+        return DEFAULT_THRESHOLD
+    return confidence_settings.get(name, confidence_settings.get("global", DEFAULT_THRESHOLD))
+
+
+def first_accepted(candidates: Iterable[Tuple[Any, float]],
+                   confidence_settings: Optional[Dict[str, float]]) -> Optional[Tuple[Any, float]]:
+    """第一个达到物种阈值的候选项 (名称, 置信度)，没有时返回 None"""
+    for name, conf in candidates:
+        if conf >= threshold_for(confidence_settings, name):
+            return name, conf
+    return None
+
+
+def _box_candidates(box: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """检测框的候选项；没有候选项时为检测框本身的物种 (未知物种被忽略)"""
+    if box.get("候选项"):
+        return [(c.get('name'), float(c.get('conf', 0))) for c in box["候选项"]]
+    raw_name = box.get("物种", box.get("species", "未知"))
+    raw_conf = float(box.get("置信度", box.get("confidence", 0)))
+    return [(raw_name, raw_conf)] if raw_name and raw_name != "未知" else []
+
+
+def parse_record(info: Dict[str, Any]) -> tuple:
+    """把检测结果解析为归类所需的紧凑结构"""
+    if info.get('最低置信度') == '人工校验':
+        name = info.get('物种名称', EMPTY_LABEL)
+        return _MANUAL, EMPTY_LABEL if name in ["", "未知", None] else name
+    if 'tracks' in info:
+        tracks = [[(p.get('species', 'Unknown'), p.get('confidence', 0)) for p in points]
+                  for points in info.get('tracks', {}).values()]
+        return _VIDEO, tracks, info.get('total_frames_processed', 1)
+    boxes = info.get('检测框', [])
+    if not boxes:
+        boxes = info.get('detect_results', info.get('objects', []))
+    return _BOXES, [_box_candidates(box) for box in boxes]
+
+
+def _classify_parsed(record: tuple, confidence_settings: Dict[str, float], min_frame_ratio: float) -> str:
+    kind = record[0]
+    if kind == _MANUAL:
+        return record[1]
+
+    if kind == _VIDEO:
+        _, tracks, total_frames = record
+        min_points = total_frames * min_frame_ratio
+        votes = []
+        for points in tracks:
+            if len(points) < min_points:
+                continue
+            valid = [sp for sp, conf in points if conf >= threshold_for(confidence_settings, sp)]
+            if valid:
+                votes.append(Counter(valid).most_common(1)[0][0])
+        return ",".join(sorted(set(votes))) if votes else EMPTY_LABEL
+
+    species = []
+    for candidates in record[1]:
+        valid = sorted((c for c in candidates if c[1] >= threshold_for(confidence_settings, c[0])),
+                       key=lambda c: c[1], reverse=True)
+        if not valid:
+            continue
+        if len(valid) >= 2 and valid[0][1] - valid[1][1] < AMBIGUITY_THRESHOLD:
+            return AMBIGUOUS_LABEL
+        species.append(valid[0][0])
+    return ",".join(sorted(set(species))) if species else EMPTY_LABEL
+
+
+def classify(info: Dict[str, Any], confidence_settings: Dict[str, float], min_frame_ratio: float = 0.0) -> str:
+    """按当前阈值归类一条记录，返回物种名 (多个物种以逗号连接)、"标记为空" 或 "需人工检验" """
+    return _classify_parsed(parse_record(info), confidence_settings, min_frame_ratio)
+
+
+def label_priority(label: str) -> tuple:
+    """物种列表的排序键："需人工检验" 在前，"标记为空"/"空" 在后，其余按名称排序"""
+    if label == AMBIGUOUS_LABEL:
+        return 0, label
+    if label in [EMPTY_LABEL, "空"]:
+        return 2, label
+    return 1, label
+
+
+class ThresholdEngine:
+    """按物种阈值归类记录，阈值变化时只重新归类受影响的记录"""
+
+    def __init__(self, confidence_settings: Optional[Dict[str, float]] = None, min_frame_ratio: float = 0.0):
+        self.confidence_settings = dict(confidence_settings or {})
+        self.min_frame_ratio = min_frame_ratio
+        self._keys: List[Hashable] = []
+        self._positions: Dict[Hashable, int] = {}
+        self._records: List[tuple] = []
+        self._labels: List[str] = []
+        self._groups: Dict[str, Set[int]] = {}
+        # 物种 -> (升序置信度数组, 对应的记录位置数组)
+        self._conf_index: Dict[Any, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: List[Tuple[Any, float, int]] = []
+        self.stats = {'reclassified': 0}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key) -> bool:
+        return key in self._positions
+
+    # ---- 载入与更新 ----
+
+    def load(self, items: Iterable[Tuple[Hashable, Dict[str, Any]]]) -> None:
+        """一次性载入 (键, 检测结果)，建立按物种排序的置信度索引并完成归类"""
+        self._keys, self._positions, self._records, self._labels = [], {}, [], []
+        self._groups, self._conf_index, self._pending = {}, {}, []
+        for key, info in items:
+            self._append(key, parse_record(info))
+        self._build_index()
+
+    def _append(self, key: Hashable, record: tuple) -> None:
+        pos = len(self._keys)
+        self._keys.append(key)
+        self._positions[key] = pos
+        self._records.append(record)
+        self._pending.extend((name, conf, pos) for name, conf in self._entries(record))
+        label = _classify_parsed(record, self.confidence_settings, self.min_frame_ratio)
+        self._labels.append(label)
+        self._groups.setdefault(label, set()).add(pos)
+
+    @staticmethod
+    def _entries(record: tuple) -> Iterable[Tuple[Any, float]]:
+        if record[0] == _VIDEO:
+            return (point for points in record[1] for point in points)
+        if record[0] == _BOXES:
+            return (candidate for candidates in record[1] for candidate in candidates)
+        return ()
+
+    def _build_index(self) -> None:
+        """把新增的候选项合并进按物种排序的置信度数组"""
+        if not self._pending:
+            return
+        names = np.array([e[0] for e in self._pending], dtype=object)
+        confs = np.array([e[1] for e in self._pending], dtype=np.float64)
+        positions = np.array([e[2] for e in self._pending], dtype=np.int64)
+        self._pending = []
+
+        order = np.lexsort((confs, names.astype(str)))
+        names, confs, positions = names[order], confs[order], positions[order]
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+        ends = np.r_[starts[1:], len(names)]
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            name = names[start]
+            new_confs, new_positions = confs[start:end], positions[start:end]
+            if name in self._conf_index:
+                old_confs, old_positions = self._conf_index[name]
+                merged = np.concatenate([old_confs, new_confs])
+                merged_positions = np.concatenate([old_positions, new_positions])
+                merge_order = np.argsort(merged, kind='stable')
+                new_confs, new_positions = merged[merge_order], merged_positions[merge_order]
+            self._conf_index[name] = (new_confs, new_positions)
+
+    def upsert(self, key: Hashable, info: Dict[str, Any]) -> bool:
+        """新增或替换一条记录 (如人工校验后)，返回归类是否改变"""
+        if key not in self._positions:
+            self._append(key, parse_record(info))
+            self._build_index()
+            return True
+        pos = self._positions[key]
+        record = parse_record(info)
+        # 先移除旧记录的候选项，避免索引随修改不断增长、阈值变化时重复归类该记录
+        self._remove_from_index(self._records[pos], pos)
+        self._records[pos] = record
+        self._pending.extend((name, conf, pos) for name, conf in self._entries(record))
+        self._build_index()
+        return pos in self._reclassify([pos])
+
+    def _remove_from_index(self, record: tuple, pos: int) -> None:
+        """从置信度索引中移除某个位置的记录的全部候选项"""
+        for name in {name for name, _ in self._entries(record)}:
+            entry = self._conf_index.get(name)
+            if entry is None:
+                continue
+            confs, positions = entry
+            keep = positions != pos
+            if keep.all():
+                continue
+            if keep.any():
+                self._conf_index[name] = (confs[keep], positions[keep])
+            else:
+                del self._conf_index[name]
+
+    # ---- 阈值变化 ----
+
+    def set_thresholds(self, confidence_settings: Optional[Dict[str, float]],
+                       min_frame_ratio: Optional[float] = None) -> Set[Hashable]:
+        """更新阈值，只重新归类受影响的记录，返回归类发生变化的键"""
+        new_settings = dict(confidence_settings or {})
+        affected: Set[int] = set()
+        for name, (confs, positions) in self._conf_index.items():
+            old = threshold_for(self.confidence_settings, name)
+            new = threshold_for(new_settings, name)
+            if old == new:
+                continue
+            lo, hi = (old, new) if old < new else (new, old)
+            i, j = np.searchsorted(confs, [lo, hi], side='left')
+            affected.update(positions[i:j].tolist())
+        self.confidence_settings = new_settings
+
+        if min_frame_ratio is not None and min_frame_ratio != self.min_frame_ratio:
+            self.min_frame_ratio = min_frame_ratio
+            affected.update(pos for pos, record in enumerate(self._records) if record[0] == _VIDEO)
+        return {self._keys[pos] for pos in self._reclassify(affected)}
+
+    def _reclassify(self, positions: Iterable[int]) -> Set[int]:
+        changed = set()
+        for pos in positions:
+            self.stats['reclassified'] += 1
+            label = _classify_parsed(self._records[pos], self.confidence_settings, self.min_frame_ratio)
+            old = self._labels[pos]
+            if label == old:
+                continue
+            group = self._groups[old]
+            group.discard(pos)
+            if not group:
+                del self._groups[old]
+            self._groups.setdefault(label, set()).add(pos)
+            self._labels[pos] = label
+            changed.add(pos)
+        return changed
+
+    # ---- 查询 ----
+
+    def label_of(self, key: Hashable) -> Optional[str]:
+        pos = self._positions.get(key)
+        return None if pos is None else self._labels[pos]
+
+    def counts(self) -> Dict[str, int]:
+        """{归类: 记录数}，按物种列表的显示顺序排列"""
+        return {label: len(self._groups[label]) for label in sorted(self._groups, key=label_priority)}
+
+    def groups(self) -> Dict[str, List[Hashable]]:
+        """{归类: 键列表 (保持载入顺序)}，按物种列表的显示顺序排列"""
+        return {label: [self._keys[pos] for pos in sorted(self._groups[label])]
+                for label in sorted(self._groups, key=label_priority)}
+
+    def keys_of(self, label: str) -> List[Hashable]:
+        return [self._keys[pos] for pos in sorted(self._groups.get(label, ()))]
+
+    def species_counts(self) -> Dict[str, int]:
+        """单个物种的记录数 (多物种记录分别计入各物种)"""
+        totals = Counter()
+        for label, positions in self._groups.items():
+            if label in (EMPTY_LABEL, AMBIGUOUS_LABEL, "空"):
+                continue
+            for name in label.split(','):
+                totals[name.strip()] += len(positions)
+        return dict(totals)
+
+    def species_names(self) -> Sequence[str]:
+        """索引中出现过的物种名"""
+        return sorted(str(name) for name in self._conf_index if name)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 以仓库根目录为导入路径，直接运行 pytest 时也能导入 system 包
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,120 @@
+import random
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from system.analytics import (
+    ACTIVITY_SHEET_NAME, ALL_CAMERAS, OCCUPANCY_SHEET_NAME, OVERLAP_SHEET_NAME, RAI_SHEET_NAME,
+    _bessel_i, build_analytics_tables, build_overlap_table, circular_density, overlap_coefficient,
+)
+from system.benchmark import make_synthetic_records
+from system.deployments import apply_deployments, independent_events, independent_flags
+
+START = datetime(2025, 5, 1)
+SETTINGS = {'global': 0.3}
+
+
+def _manual(serial, day, hour, minute, species):
+    taken = START + timedelta(days=day, hours=hour, minutes=minute)
+    return {'文件名': f"{serial}_{day}_{hour}_{minute}.JPG", '拍摄日期对象': taken, '物种名称': species,
+            '最低置信度': '人工校验', '相机型号': 'CAM', '相机序列号': serial}
+
+
+def _tables(records, **kwargs):
+    for info, flag in zip(records, independent_flags(records, SETTINGS, site='site')):
+        if flag is not None:
+            info['独立探测首只'] = flag
+    deployments = apply_deployments(records, 'site')
+    return build_analytics_tables(records, deployments, SETTINGS, site='site', **kwargs)
+
+
+@pytest.fixture
+def tables():
+    records = [
+        _manual('1', 0, 6, 0, '狍'), _manual('1', 0, 6, 10, '狍'), _manual('1', 0, 7, 0, '狍'),
+        _manual('1', 9, 20, 0, '野猪'), _manual('1', 9, 12, 0, '空'),
+        _manual('2', 3, 6, 0, '狍'), _manual('2', 3, 6, 5, '狍'),
+    ]
+    return _tables(records, occasion_days=7)
+
+
+def test_rai_per_camera_and_site_total(tables):
+    rai = tables[RAI_SHEET_NAME]
+    rows = {(cam, sp): (n, nights, value) for cam, sp, n, nights, value in rai.itertuples(index=False)}
+    assert rows == {
+        ('CAM-1', '狍'): (2, 10, 20.0),
+        ('CAM-1', '野猪'): (1, 10, 10.0),
+        ('CAM-2', '狍'): (1, 1, 100.0),
+        (ALL_CAMERAS, '狍'): (3, 11, round(3 / 11 * 100, 4)),
+        (ALL_CAMERAS, '野猪'): (1, 11, round(1 / 11 * 100, 4)),
+    }
+
+
+def test_occupancy_marks_detections_and_inactive_occasions(tables):
+    occupancy = tables[OCCUPANCY_SHEET_NAME]
+    cells = {(sp, cam, k): (None if pd.isna(v) else int(v))
+             for sp, cam, k, _, v in occupancy.itertuples(index=False)}
+    assert cells == {
+        ('狍', 'CAM-1', 1): 1, ('狍', 'CAM-1', 2): 0,
+        ('狍', 'CAM-2', 1): 1, ('狍', 'CAM-2', 2): None,
+        ('野猪', 'CAM-1', 1): 0, ('野猪', 'CAM-1', 2): 1,
+        ('野猪', 'CAM-2', 1): 0, ('野猪', 'CAM-2', 2): None,
+    }
+    assert occupancy.loc[occupancy['调查周期'] == 2, '周期开始日期'].unique().tolist() == ['2025-05-08']
+
+
+def test_activity_counts_and_density(tables):
+    activity = tables[ACTIVITY_SHEET_NAME]
+    roe = activity[activity['物种名称'] == '狍'].set_index('小时')
+    assert len(roe) == 24
+    assert roe.loc[6, '独立探测数'] == 2 and roe.loc[7, '独立探测数'] == 1
+    assert roe['独立探测数'].sum() == 3
+    assert roe['比例'].sum() == pytest.approx(1.0, abs=1e-3)
+    for _, group in activity.groupby('物种名称'):
+        assert group['核密度'].sum() == pytest.approx(1.0, abs=1e-4)
+    # 样本量不足时不计算活动重叠
+    assert tables[OVERLAP_SHEET_NAME].empty
+
+
+def test_bessel_i_matches_known_values():
+    assert _bessel_i(0, np.array([1.0]))[0] == pytest.approx(1.2660658777520082, rel=1e-9)
+    assert _bessel_i(2, np.array([2.0]))[0] == pytest.approx(0.6889484476987382, rel=1e-9)
+    assert _bessel_i(0, np.array([3.0]))[0] == pytest.approx(float(np.i0(3.0)), rel=1e-9)
+
+
+def test_overlap_coefficient_bounds():
+    rng = np.random.default_rng(0)
+    dawn = rng.vonmises(np.pi / 2, 4, 200) % (2 * np.pi)
+    dawn_too = rng.vonmises(np.pi / 2, 4, 200) % (2 * np.pi)
+    dusk = rng.vonmises(3 * np.pi / 2, 4, 200) % (2 * np.pi)
+    densities = {name: circular_density(values)
+                 for name, values in (('a', dawn), ('b', dawn_too), ('c', dusk))}
+
+    same, method = overlap_coefficient(densities['a'], densities['b'], dawn, dawn_too)
+    opposite, _ = overlap_coefficient(densities['a'], densities['c'], dawn, dusk)
+    assert method == 'Dhat4'
+    assert same > 0.85 and opposite < 0.15
+
+    few, method = overlap_coefficient(densities['a'], densities['b'], dawn[:20], dawn_too[:20])
+    assert method == 'Dhat1' and 0.0 <= few <= 1.0
+
+    table = build_overlap_table({'a': dawn, 'b': dawn_too, 'c': dusk[:5]}, densities, min_events=10)
+    assert table[['物种A', '物种B']].values.tolist() == [['a', 'b']]
+
+
+def test_rai_matches_event_loop_on_synthetic_records():
+    rng = random.Random(0)
+    records = make_synthetic_records(5000, seed=0)
+    for info in records:
+        info['相机型号'], info['相机序列号'] = 'CAM', f"{rng.randrange(6):04d}"
+    tables = _tables(records)
+
+    events = independent_events(records, SETTINGS, site='site')
+    independent = events[events['independent']]
+    expected = Counter(zip(independent['camera'], independent['species']))
+    rai = tables[RAI_SHEET_NAME]
+    per_camera = rai[rai['相机编号'] != ALL_CAMERAS]
+    assert dict(zip(zip(per_camera['相机编号'], per_camera['物种名称']), per_camera['独立探测数'])) == dict(expected)
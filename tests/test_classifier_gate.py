@@ -0,0 +1,63 @@
+import json
+import random
+
+import pytest
+
+from system.classifier_gate import GATED_FIELD, ClassifierGate, fit_thresholds, load_samples
+
+NAMES_MAP = {'0': '狍', '1': '野猪'}
+
+
+def _write_history(directory, count, seed, gate=None):
+    """生成历史检测结果；传入 gate 时模拟启用门控处理：高置信度的框跳过分类"""
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        cls_id = rng.randrange(2)
+        conf = round(rng.uniform(0.3, 1.0), 4)
+        name = NAMES_MAP[str(cls_id)]
+        # 置信度越高，分类结果与检测结果越一致
+        agree = rng.random() < (0.995 if conf > 0.7 else 0.7)
+        box = {'物种': name, '置信度': conf, '边界框': [0, 0, 10, 10]}
+        data = {'检测框': [box], 'all_classes': [cls_id], 'all_confidences': [conf], 'names_map': NAMES_MAP}
+        if gate is not None:
+            data[GATED_FIELD] = True
+        if gate is not None and conf >= gate.thresholds.get(name, float('inf')):
+            box['跳过分类'] = True
+        else:
+            box['候选项'] = [{'name': name if agree else '其他', 'conf': conf}]
+        path = directory / f"{seed}_{i:05d}.json"
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding='utf-8')
+        paths.append(str(path))
+    return paths
+
+
+def test_load_samples_skips_gated_records(tmp_path):
+    path = _write_history(tmp_path, 1, seed=0)[0]
+    assert len(load_samples(path)) == 1
+    data = json.loads(open(path, encoding='utf-8').read())
+    data[GATED_FIELD] = True
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    assert load_samples(path) == []
+
+
+def test_relearning_from_gated_history_is_stable(tmp_path):
+    history = _write_history(tmp_path, 3000, seed=1)
+    gate = ClassifierGate.learn(history, 'det.pt', 'cls.pt')
+    assert gate.thresholds
+
+    # 启用门控处理新的数据后重新学习，阈值不因缺少被跳过的高置信度样本而偏移
+    history += _write_history(tmp_path, 3000, seed=2, gate=gate)
+    relearned = ClassifierGate.learn(history, 'det.pt', 'cls.pt')
+    assert relearned.thresholds == gate.thresholds
+
+    gated_only = _write_history(tmp_path, 100, seed=3, gate=gate)
+    with pytest.raises(RuntimeError):
+        ClassifierGate.learn(gated_only, 'det.pt', 'cls.pt')
+
+
+def test_fit_thresholds_requires_min_samples():
+    samples = [('狍', 0.9, True)] * 10
+    assert fit_thresholds(samples, min_samples=30) == {}
+    assert fit_thresholds(samples * 10, min_samples=30) == {'狍': 0.9}
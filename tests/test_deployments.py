@@ -0,0 +1,59 @@
+from datetime import datetime
+
+from system.deployments import (
+    CAMERA_FIELD, apply_deployments, build_deployment_table, camera_resolver, independent_flags,
+)
+from system.independent_detection import INDEPENDENT_FLAG, IndependentDetectionEngine
+
+SETTINGS = {'global': 0.3}
+
+
+def _photo(name, day, species, serial='S1', hour=6, minute=0):
+    return {'文件名': name, '拍摄日期对象': datetime(2025, 1, day, hour, minute), '物种名称': species,
+            '最低置信度': '人工校验', '相机型号': 'X', '相机序列号': serial}
+
+
+def _video(name, day, species, hour=6, minute=0):
+    """视频没有 EXIF 序列号"""
+    return {'文件名': name, '拍摄日期对象': datetime(2025, 1, day, hour, minute), '物种名称': species,
+            '最低置信度': '人工校验'}
+
+
+def test_videos_join_the_only_serial_camera():
+    records = [_photo('a.JPG', 1, '狍'), _video('b.MP4', 5, '狍')]
+    table = apply_deployments(records, 'site1')
+    assert table[CAMERA_FIELD].tolist() == ['X-S1']
+    assert table['相机工作日'].tolist() == [5]
+    assert [info[CAMERA_FIELD] for info in records] == ['X-S1', 'X-S1']
+    assert [info['工作天数'] for info in records] == [1, 5]
+
+
+def test_videos_share_independent_detections_with_photos():
+    records = [_photo('a.JPG', 1, '狍', minute=0), _video('b.MP4', 1, '狍', minute=10),
+               _photo('c.JPG', 1, '狍', minute=20)]
+    assert independent_flags(records, SETTINGS, site='site1').tolist() == [INDEPENDENT_FLAG, '', '']
+
+
+def test_videos_fall_back_to_site_with_several_cameras():
+    records = [_photo('a.JPG', 1, '狍', 'S1'), _photo('b.JPG', 2, '狍', 'S2'), _video('c.MP4', 3, '狍')]
+    table = build_deployment_table(records, 'site1')
+    assert sorted(table[CAMERA_FIELD]) == ['X-S1', 'X-S2', 'site1']
+
+
+def test_engine_regroups_when_first_serial_arrives():
+    records = [_video('v1.MP4', 1, '狍', minute=0), _video('v2.MP4', 1, '狍', minute=40),
+               _photo('p1.JPG', 1, '狍', minute=10), _photo('p2.JPG', 1, '狍', minute=50),
+               _photo('q1.JPG', 1, '狍', 'S2', minute=45)]
+    engine = IndependentDetectionEngine(SETTINGS, camera_of=camera_resolver('site1'))
+    for info in records:
+        engine.upsert(info)
+    expected = [dict(info) for info in records]
+    flags = independent_flags(expected, SETTINGS, site='site1')
+    assert [info['独立探测首只'] for info in records] == flags.tolist()
+
+    # 只有一台有序列号的相机时，先到达的视频在照片到达后并入该相机 (分开计算时 p1 与 v2 均为独立探测)
+    single = [dict(info) for info in records[:4]]
+    engine = IndependentDetectionEngine(SETTINGS, camera_of=camera_resolver('site1'))
+    for info in single:
+        engine.upsert(info)
+    assert [info['独立探测首只'] for info in single] == [INDEPENDENT_FLAG, '', '', '']
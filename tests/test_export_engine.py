@@ -0,0 +1,81 @@
+import copy
+
+import pandas as pd
+import pytest
+
+from system.benchmark import make_synthetic_records
+from system.export_engine import (
+    DEFAULT_EXPORT_COLUMNS, TAXONOMY_FIELDS, _build_frame_columnar, _build_frame_rows,
+)
+
+
+def _taxonomy(name, klass):
+    info = {field: f"{name}-{field}" for field in TAXONOMY_FIELDS}
+    info['纲'] = klass
+    return info
+
+
+SPECIES_INFO_MAP = {'狍': _taxonomy('狍', '哺乳纲'), '喜鹊': _taxonomy('喜鹊', '鸟纲'), '牦牛': _taxonomy('牦牛', '家畜')}
+# 名录中没有的物种 (分类信息为空) 与人员
+SPECIES = ['狍', '喜鹊', '牦牛', '人', '未知兽'] + [f"物种{i}" for i in range(10)]
+SETTINGS = {'global': 0.25, '狍': 0.6, '喜鹊': 0.4}
+
+
+def _both(records, settings=SETTINGS, min_frame_ratio=0.1):
+    before = copy.deepcopy(records)
+    rows = _build_frame_rows(records, dict(settings), SPECIES_INFO_MAP, DEFAULT_EXPORT_COLUMNS, min_frame_ratio)
+    columnar = _build_frame_columnar(records, dict(settings), SPECIES_INFO_MAP, DEFAULT_EXPORT_COLUMNS,
+                                     min_frame_ratio)
+    assert records == before  # 两条路径都不修改输入记录
+    return rows, columnar
+
+
+def test_paths_identical_on_synthetic_records():
+    records = make_synthetic_records(5000, SPECIES, seed=0)
+    kinds = {'manual': 0, 'video': 0, 'candidates': 0}
+    for info in records:
+        kinds['manual'] += info.get('最低置信度') == '人工校验'
+        kinds['video'] += 'tracks' in info
+        kinds['candidates'] += any('候选项' in box for box in info.get('检测框', []))
+    assert all(kinds.values())
+    rows, columnar = _both(records)
+    pd.testing.assert_frame_equal(rows, columnar)
+
+
+def test_paths_identical_on_edge_cases():
+    box = {'物种': '狍', '置信度': 0.7, '边界框': [0, 0, 10, 10]}
+    records = [
+        # 人工校验：保留原有物种名称/数量/置信度，名录中没有的物种分类信息为空
+        {'文件名': 'm1.JPG', '物种名称': '狍,未知兽', '物种数量': '1,2', '最低置信度': '人工校验', '备注': '人工校验'},
+        {'文件名': 'm2.JPG', '物种名称': '空', '物种数量': '空', '最低置信度': '人工校验'},
+        {'文件名': 'm3.JPG', '物种名称': '人', '物种数量': '1', '最低置信度': '人工校验'},
+        # 候选项：第一候选未达到物种阈值时取第二候选；都不达标时丢弃该检测框
+        {'文件名': 'c1.JPG', '检测框': [dict(box, 候选项=[{'name': '狍', 'conf': 0.55}, {'name': '喜鹊', 'conf': 0.45}])]},
+        {'文件名': 'c2.JPG', '检测框': [dict(box, 候选项=[{'name': '狍', 'conf': 0.5}, {'name': '喜鹊', 'conf': 0.3}])]},
+        {'文件名': 'c3.JPG', '检测框': [box, dict(box, 物种='牦牛', 置信度=0.3), dict(box, 置信度=0.2)]},
+        # 旧版记录
+        {'文件名': 'o1.JPG', 'all_classes': [0, 1, 1], 'all_confidences': [0.9, 0.5, 0.1],
+         'names_map': {'0': '喜鹊', '1': '未知兽'}},
+        # 视频：帧数不足的轨迹不计入
+        {'文件名': 'v1.MP4', 'total_frames_processed': 40, 'tracks': {
+            '1': [{'species': '狍', 'confidence': 0.9}] * 5,
+            '2': [{'species': '喜鹊', 'confidence': 0.9}] * 2,
+            '3': [{'species': '未知兽', 'confidence': 0.1}] * 8}},
+        {'文件名': 'e1.JPG', '检测框': []},
+    ]
+    rows, columnar = _both(records)
+    pd.testing.assert_frame_equal(rows, columnar)
+    by_name = rows.set_index('文件名')
+    assert by_name.loc['m1.JPG', '学名'] == '狍-学名,'
+    assert by_name.loc['m3.JPG', '物种类型'] == '人员'
+    assert by_name.loc['c1.JPG', '物种名称'] == '喜鹊'
+    assert by_name.loc['c2.JPG', '物种名称'] == '空'
+    assert by_name.loc['c3.JPG', '物种数量'] == '1,1'
+    assert by_name.loc['v1.MP4', '物种名称'] == '狍'
+
+
+@pytest.mark.parametrize('min_frame_ratio', [0.0, 0.5])
+def test_paths_identical_across_thresholds(min_frame_ratio):
+    records = make_synthetic_records(2000, SPECIES, seed=1)
+    rows, columnar = _both(records, {'global': 0.5}, min_frame_ratio)
+    pd.testing.assert_frame_equal(rows, columnar)
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from system.benchmark import make_synthetic_records
+from system.data_processor import DataProcessor
+from system.incremental_export import ExportChangeTracker, export_table_incremental, table_manifest_path
+from system.streaming_export import export_streaming, part_path
+
+SETTINGS = {'global': 0.25}
+ROWS_PER_PART = 100
+
+
+@pytest.fixture(scope='module')
+def species_info_map():
+    return DataProcessor.load_species_info_map()
+
+
+def _export(records, path, species_info_map, versions, settings=SETTINGS):
+    return export_table_incremental(records, path, settings, species_info_map, file_format='csv',
+                                    rows_per_part=ROWS_PER_PART, source_versions=versions)
+
+
+def _read_parts(path):
+    parts, part = [], 1
+    while os.path.exists(part_path(path, part)):
+        with open(part_path(path, part), 'rb') as f:
+            parts.append(f.read())
+        part += 1
+    return parts
+
+
+def _assert_matches_full(records, path, tmp_path, species_info_map, settings=SETTINGS):
+    full_path = str(tmp_path / 'full.csv')
+    export_streaming(records, full_path, settings, species_info_map, file_format='csv',
+                     rows_per_part=ROWS_PER_PART)
+    assert _read_parts(path) == _read_parts(full_path)
+
+
+@pytest.fixture
+def exported(tmp_path, species_info_map):
+    records = make_synthetic_records(1000, seed=0)
+    versions = {info['文件名']: '0' for info in records}
+    path = str(tmp_path / 'out.csv')
+    assert _export(records, path, species_info_map, versions)['mode'] == 'full'
+    return records, versions, path
+
+
+def test_unchanged_export_skips_writing(exported, species_info_map):
+    records, versions, path = exported
+    before = [os.stat(part_path(path, p)).st_mtime_ns for p in range(1, 11)]
+    stats = _export(records, path, species_info_map, versions)
+    assert stats['mode'] == 'unchanged'
+    assert stats['changed_rows'] == 0 and stats['rebuilt_rows'] == 0 and stats['written_parts'] == []
+    assert [os.stat(part_path(path, p)).st_mtime_ns for p in range(1, 11)] == before
+
+
+def test_edits_rewrite_only_affected_parts(exported, tmp_path, species_info_map):
+    records, versions, path = exported
+    before = _read_parts(path)
+    for i in (5, 250, 251):
+        records[i].update({'物种名称': '人', '物种数量': '1', '最低置信度': '人工校验', '备注': '人工校验'})
+        versions[records[i]['文件名']] = '1'
+
+    stats = _export(records, path, species_info_map, versions)
+    assert stats['mode'] == 'incremental'
+    assert stats['changed_rows'] == 3 and stats['rebuilt_rows'] == 3
+    assert stats['written_parts'] == [part_path(path, 1), part_path(path, 3)]
+    after = _read_parts(path)
+    assert [p for p in range(10) if after[p] != before[p]] == [0, 2]
+    _assert_matches_full(records, path, tmp_path, species_info_map)
+
+
+def test_appended_records_extend_last_part(tmp_path, species_info_map):
+    records = make_synthetic_records(1080, seed=1)
+    extra, records = records[950:], records[:950]
+    versions = {info['文件名']: '0' for info in records + extra}
+    path = str(tmp_path / 'out.csv')
+    _export(records, path, species_info_map, versions)
+
+    records = records + extra
+    stats = _export(records, path, species_info_map, versions)
+    assert stats['changed_rows'] == len(extra) and stats['rebuilt_rows'] == len(extra)
+    assert stats['written_parts'] == [part_path(path, 10), part_path(path, 11)]
+    _assert_matches_full(records, path, tmp_path, species_info_map)
+
+
+def test_removed_records_shift_following_rows(exported, tmp_path, species_info_map):
+    records, versions, path = exported
+    records = records[:300] + records[301:890]
+    stats = _export(records, path, species_info_map, versions)
+    assert stats['mode'] == 'incremental'
+    assert stats['rebuilt_rows'] == 0
+    # 被删除记录之前的分片不需要重写
+    assert stats['written_parts'] == [part_path(path, p) for p in range(4, 10)]
+    # 行数减少后多余的分片被删除
+    assert os.path.exists(part_path(path, 9)) and not os.path.exists(part_path(path, 10))
+    _assert_matches_full(records, path, tmp_path, species_info_map)
+
+
+def test_threshold_change_recomputes_rows(exported, tmp_path, species_info_map):
+    records, versions, path = exported
+    settings = {'global': 0.6}
+    stats = _export(records, path, species_info_map, versions, settings)
+    assert stats['rebuilt_rows'] == len(records)
+    assert 0 < stats['changed_rows'] < len(records)
+    _assert_matches_full(records, path, tmp_path, species_info_map, settings)
+
+
+def test_missing_output_or_manifest_falls_back_to_full(exported, species_info_map):
+    records, versions, path = exported
+    os.remove(part_path(path, 4))
+    assert _export(records, path, species_info_map, versions)['mode'] == 'full'
+    os.remove(table_manifest_path(path))
+    assert _export(records, path, species_info_map, versions)['mode'] == 'full'
+
+
+def test_change_tracker_persists_edits(tmp_path):
+    json_path = tmp_path / 'IMG_1.json'
+    json_path.write_text('{}', encoding='utf-8')
+    tracker = ExportChangeTracker(str(tmp_path))
+    before = tracker.version('IMG_1')
+    tracker.mark('IMG_1')
+    assert tracker.version('IMG_1') != before
+    assert ExportChangeTracker(str(tmp_path)).version('IMG_1') == tracker.version('IMG_1')
@@ -0,0 +1,104 @@
+import copy
+import random
+from datetime import datetime, timedelta
+
+from system.benchmark import make_synthetic_records, process_independent_reference
+from system.independent_detection import INDEPENDENT_FLAG, IndependentDetectionEngine
+
+START = datetime(2025, 5, 1, 6, 0, 0)
+SETTINGS = {'global': 0.3, '物种1': 0.6}
+
+
+def _manual(name, minutes, species, camera='A'):
+    """人工校验记录：物种直接取自物种名称"""
+    return {'文件名': name, '拍摄日期对象': START + timedelta(minutes=minutes), '物种名称': species,
+            '最低置信度': '人工校验', '相机编号': camera}
+
+
+def _flags(records):
+    return [info.get('独立探测首只') for info in records]
+
+
+def _synthetic(rows, seed=0):
+    """与基准测试相同：检测框记录附带原始检测结果，并制造拍摄时间相同的记录"""
+    rng = random.Random(seed)
+    records = make_synthetic_records(rows, seed=seed)
+    names_map = {str(i): f"物种{i}" for i in range(12)}
+    for info in records:
+        if info.get('检测框'):
+            classes = [rng.randrange(len(names_map)) for _ in info['检测框']]
+            info.update({'all_classes': classes, 'all_confidences': [round(rng.random(), 4) for _ in classes],
+                         'names_map': names_map})
+        if rng.random() < 0.2:
+            info['拍摄日期对象'] = info['拍摄日期对象'].replace(second=0)
+    return records
+
+
+def test_flags_follow_threshold_gap():
+    records = [_manual('a', 0, '狍'), _manual('b', 10, '狍'), _manual('c', 45, '狍'),
+               _manual('d', 50, '狍,野猪'), _manual('e', 55, '空')]
+    engine = IndependentDetectionEngine(SETTINGS)
+    for info in records:
+        engine.upsert(info)
+    assert _flags(records) == [INDEPENDENT_FLAG, '', INDEPENDENT_FLAG, INDEPENDENT_FLAG, '']
+
+
+def test_out_of_order_arrival_matches_reference():
+    records = _synthetic(3000)
+    reference = process_independent_reference(copy.deepcopy(records), SETTINGS)
+
+    shuffled = list(records)
+    random.Random(1).shuffle(shuffled)
+    engine = IndependentDetectionEngine(SETTINGS)
+    for info in shuffled:
+        engine.upsert(info)
+    assert _flags(records) == _flags(reference)
+
+
+def test_manual_correction_updates_only_neighbours():
+    records = _synthetic(3000)
+    engine = IndependentDetectionEngine(SETTINGS)
+    engine.rebuild(records)
+
+    rng = random.Random(2)
+    for i in rng.sample(range(len(records)), 50):
+        key = records[i]['文件名']
+        old_species = engine._entries[key].species
+        affected = engine.update_detection(key, {
+            '物种名称': rng.choice(['物种1', '空', '物种2,物种3']), '最低置信度': '人工校验'})
+        # 只重新判定该记录本身与新旧物种索引中紧随其后的记录
+        assert len(affected) <= 1 + len(old_species) + len(engine._entries[key].species)
+    reference = process_independent_reference(copy.deepcopy(records), SETTINGS)
+    assert _flags(records) == _flags(reference)
+
+
+def test_remove_reevaluates_following_record():
+    records = [_manual('a', 0, '狍'), _manual('b', 20, '狍')]
+    engine = IndependentDetectionEngine(SETTINGS)
+    engine.rebuild(records)
+    assert _flags(records) == [INDEPENDENT_FLAG, '']
+    assert engine.remove('a') == {'b'}
+    assert records[1]['独立探测首只'] == INDEPENDENT_FLAG
+
+
+def test_cameras_are_evaluated_separately():
+    records = [_manual('a', 0, '狍', 'A'), _manual('b', 5, '狍', 'B'), _manual('c', 10, '狍', 'A')]
+    shared = IndependentDetectionEngine(SETTINGS)
+    shared.rebuild(copy.deepcopy(records))
+    assert [e.info['独立探测首只'] for e in shared._entries.values()] == [INDEPENDENT_FLAG, '', '']
+
+    per_camera = IndependentDetectionEngine(SETTINGS, camera_of=lambda info: info.get('相机编号'))
+    per_camera.rebuild(records)
+    assert _flags(records) == [INDEPENDENT_FLAG, INDEPENDENT_FLAG, '']
+
+
+def test_threshold_change_rebuilds_to_reference():
+    records = _synthetic(2000, seed=3)
+    engine = IndependentDetectionEngine(SETTINGS)
+    engine.rebuild(records)
+    assert not engine.set_thresholds(SETTINGS)
+
+    new_settings = {'global': 0.5, '物种2': 0.2}
+    assert engine.set_thresholds(new_settings)
+    reference = process_independent_reference(copy.deepcopy(records), new_settings)
+    assert _flags(records) == _flags(reference)
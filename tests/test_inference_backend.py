@@ -0,0 +1,101 @@
+import io
+import os
+import pickle
+import sys
+import types
+import zipfile
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from system.inference_backend import (
+    BACKEND_ONNX, BACKEND_OPENVINO, BACKEND_PYTORCH,
+    _match_boxes, default_imgsz, exported_model_path, model_imgsz, supports_tta, verify_backend_parity,
+)
+
+
+def test_match_boxes_pairs_by_iou():
+    ref = [[0, 0, 10, 10], [20, 20, 30, 30]]
+    test = [[20, 20, 30, 30.2], [0, 0, 10, 10]]
+    matches = sorted(_match_boxes(ref, test, 0.9))
+    assert [(r, t) for r, t, _ in matches] == [(0, 1), (1, 0)]
+    assert _match_boxes(ref, [[100, 100, 110, 110]], 0.9) == []
+    assert _match_boxes([], test, 0.9) == []
+
+
+def _fake_checkpoint(path, train_args, monkeypatch):
+    """torch zip 格式的检查点：data.pkl 中引用未安装的模型类与张量存储"""
+    module = types.ModuleType('fake_tasks')
+
+    class ClassificationModel:
+        def __init__(self):
+            self.weight = b'w'
+
+    ClassificationModel.__module__ = 'fake_tasks'
+    ClassificationModel.__qualname__ = 'ClassificationModel'
+    module.ClassificationModel = ClassificationModel
+    monkeypatch.setitem(sys.modules, 'fake_tasks', module)
+
+    class _Pickler(pickle.Pickler):
+        def persistent_id(self, obj):
+            return ('storage', 'FloatStorage', '0', 'cpu', 4) if obj == b'w' else None
+
+    buffer = io.BytesIO()
+    _Pickler(buffer, protocol=2).dump({'model': ClassificationModel(), 'train_args': train_args, 'epoch': -1})
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('ckpt/data.pkl', buffer.getvalue())
+        archive.writestr('ckpt/data/0', b'\0' * 16)
+    monkeypatch.delitem(sys.modules, 'fake_tasks')
+
+
+def test_default_imgsz_reads_checkpoint_metadata(tmp_path, monkeypatch):
+    weights = tmp_path / "cls.pt"
+    _fake_checkpoint(weights, {'imgsz': 256, 'task': 'classify'}, monkeypatch)
+    assert default_imgsz(str(weights), 224) == 256
+
+    other = tmp_path / "cls_list.pt"
+    _fake_checkpoint(other, {'imgsz': [320, 288]}, monkeypatch)
+    assert default_imgsz(str(other), 224) == 320
+    assert default_imgsz(str(tmp_path / "missing.pt"), 224) == 224
+
+
+def test_model_imgsz_from_loaded_model():
+    assert model_imgsz(SimpleNamespace(model=SimpleNamespace(args={'imgsz': 384})), 224) == 384
+    assert model_imgsz(SimpleNamespace(model='exported.onnx'), 224) == 224
+
+
+def test_exported_model_path_encodes_hash_and_size(tmp_path):
+    weights = tmp_path / "det.pt"
+    weights.write_bytes(b"weights-v1")
+    onnx_path = exported_model_path(str(weights), BACKEND_ONNX, 1280)
+    ov_path = exported_model_path(str(weights), BACKEND_OPENVINO, 1280)
+    assert onnx_path.endswith(".1280.onnx") and os.path.basename(onnx_path).startswith("det.")
+    assert ov_path.endswith(".1280_openvino_model")
+    assert exported_model_path(str(weights), BACKEND_PYTORCH, 1280) == str(weights)
+
+    weights.write_bytes(b"weights-v2-longer")
+    assert exported_model_path(str(weights), BACKEND_ONNX, 1280) != onnx_path
+
+
+def test_supports_tta_only_for_pytorch_models():
+    assert supports_tta(SimpleNamespace(model=object()))
+    assert not supports_tta(SimpleNamespace(model="det.1280.onnx"))
+    assert not supports_tta(SimpleNamespace(model=None))
+
+
+@pytest.mark.parametrize("task,cfg", [("detect", "yolov8n.yaml"), ("classify", "yolov8n-cls.yaml")])
+def test_onnx_backend_parity(tmp_path, task, cfg):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    ultralytics = pytest.importorskip("ultralytics")
+
+    weights = str(tmp_path / f"{task}.pt")
+    ultralytics.YOLO(cfg).save(weights)
+    rng = np.random.default_rng(0)
+    sources = [rng.integers(0, 256, (240, 320, 3), dtype=np.uint8) for _ in range(3)]
+
+    imgsz = 224 if task == "classify" else 320
+    report = verify_backend_parity(weights, BACKEND_ONNX, sources, imgsz, task=task)
+    assert report['images'] == len(sources)
+    assert report['passed'], report
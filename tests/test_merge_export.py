@@ -0,0 +1,109 @@
+import json
+import os
+import random
+import shutil
+
+import pandas as pd
+import pytest
+
+from system import merge_export
+from system.benchmark import make_synthetic_records
+from system.data_processor import DataProcessor
+from system.export_engine import DEFAULT_EXPORT_COLUMNS, build_export_frame
+
+SETTINGS = {'global': 0.25}
+METADATA_KEYS = {'文件名', '格式', '拍摄日期', '拍摄时间', '拍摄日期对象', '工作天数'}
+
+
+def _make_project(root, photo_root, name, records, seed=0, marker=True):
+    """生成一个已处理的文件夹：源文件以视频扩展名保存 (拍摄时间取修改时间)，缓存中为 JSON 检测结果"""
+    rng = random.Random(seed)
+    source_dir = os.path.join(root, name)
+    temp_dir = merge_export.cache_dir_for(source_dir, photo_root)
+    os.makedirs(source_dir)
+    os.makedirs(temp_dir)
+    if marker:
+        merge_export.write_source_marker(temp_dir, source_dir)
+    for i, info in enumerate(records):
+        stem = f"{name}_{i:05d}"
+        path = os.path.join(source_dir, f"{stem}.mp4")
+        with open(path, 'wb') as f:
+            f.write(rng.randbytes(64))
+        taken = info['拍摄日期对象'].timestamp()
+        os.utime(path, (taken, taken))
+        with open(os.path.join(temp_dir, f"{stem}.json"), 'w', encoding='utf-8') as f:
+            json.dump({k: v for k, v in info.items() if k not in METADATA_KEYS}, f, ensure_ascii=False)
+    return source_dir, temp_dir
+
+
+def _copy_record(src, dst, src_stem, dst_stem):
+    """把一张照片 (源文件与检测结果) 复制到另一个文件夹"""
+    (src_source, src_temp), (dst_source, dst_temp) = src, dst
+    shutil.copy2(os.path.join(src_source, f"{src_stem}.mp4"), os.path.join(dst_source, f"{dst_stem}.mp4"))
+    shutil.copy2(os.path.join(src_temp, f"{src_stem}.json"), os.path.join(dst_temp, f"{dst_stem}.json"))
+
+
+@pytest.fixture
+def photo_root(tmp_path):
+    return str(tmp_path / 'temp' / 'photo')
+
+
+def test_source_marker_roundtrip(tmp_path):
+    assert merge_export.read_source_marker(str(tmp_path)) is None
+    merge_export.write_source_marker(str(tmp_path), '/data/site_a')
+    assert merge_export.read_source_marker(str(tmp_path)) == '/data/site_a'
+    merge_export.write_source_marker(str(tmp_path), '/data/site_b')
+    assert merge_export.read_source_marker(str(tmp_path)) == '/data/site_b'
+
+
+def test_discover_projects(tmp_path, photo_root):
+    records = make_synthetic_records(5, seed=0)
+    _make_project(str(tmp_path / 'a'), photo_root, 'site', records)
+    _make_project(str(tmp_path / 'b'), photo_root, 'site', records)
+    unmarked, _ = _make_project(str(tmp_path), photo_root, 'old', records, marker=False)
+    removed, _ = _make_project(str(tmp_path), photo_root, 'removed', records)
+    shutil.rmtree(removed)
+
+    # 同名文件夹加上上级文件夹名区分；没有标记或源文件夹已删除的缓存不加入
+    assert [p['site'] for p in merge_export.discover_projects(photo_root)] == ['a_site', 'b_site']
+    found = merge_export.discover_projects(photo_root, extra_sources=[unmarked])
+    assert [p['site'] for p in found] == ['a_site', 'b_site', 'old']
+    assert found[2]['temp_dir'] == merge_export.cache_dir_for(unmarked, photo_root)
+
+
+def test_deduplicate_prefers_validated_copy(tmp_path, photo_root):
+    records = make_synthetic_records(20, seed=1)
+    first = _make_project(str(tmp_path), photo_root, 'first', records, seed=1)
+    second = _make_project(str(tmp_path), photo_root, 'second', [], seed=2)
+    _copy_record(first, second, 'first_00003', 'copy_a')
+    _copy_record(first, second, 'first_00007', 'copy_b')
+    with open(os.path.join(second[1], 'copy_b.json'), 'w', encoding='utf-8') as f:
+        json.dump({'物种名称': '狍', '物种数量': '1', '最低置信度': '人工校验'}, f, ensure_ascii=False)
+
+    records_by_site = merge_export.load_projects(merge_export.discover_projects(photo_root))
+    assert merge_export.deduplicate(records_by_site) == 2
+    assert len(records_by_site['first']) == 19
+    assert [info['文件名'] for info in records_by_site['second']] == ['copy_b.mp4']
+    assert 'first_00003.mp4' in {info['文件名'] for info in records_by_site['first']}
+
+
+def test_merged_export_matches_per_site_exports(tmp_path, photo_root):
+    for p in range(3):
+        _make_project(str(tmp_path), photo_root, f"site_{p}", make_synthetic_records(300, seed=p), seed=p)
+    projects = merge_export.discover_projects(photo_root)
+    output_path = str(tmp_path / 'merged.csv')
+    stats = merge_export.export_merged(projects, output_path, dict(SETTINGS), file_format='csv')
+    assert stats['success'] and stats['projects'] == 3 and stats['records'] == 900 and stats['duplicates'] == 0
+
+    # 独立探测、工作天数按样地分别计算，与逐个文件夹导出后拼接的结果一致
+    columns = [merge_export.SITE_FIELD] + list(DEFAULT_EXPORT_COLUMNS)
+    species_info_map = DataProcessor.load_species_info_map()
+    frames = []
+    for project in projects:
+        records = merge_export.load_project_records(project)
+        merge_export.prepare_site(records, project['site'], project['source_dir'], dict(SETTINGS))
+        frames.append(build_export_frame(records, SETTINGS, species_info_map, columns))
+    expected = pd.concat(frames, ignore_index=True).fillna('').astype(str)
+    merged = pd.read_csv(output_path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    assert merged['样地'].unique().tolist() == ['site_0', 'site_1', 'site_2']
+    pd.testing.assert_frame_equal(merged, expected)
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from system import species_catalog
+from system.species_catalog import SpeciesCatalog, catalog_source_path
+
+pytestmark = pytest.mark.skipif(not os.path.exists(catalog_source_path()), reason="缺少物种名录文件")
+
+
+def test_catalog_without_cache_dir_writes_nothing(tmp_path, monkeypatch):
+    source_path = os.path.abspath(catalog_source_path())
+    monkeypatch.chdir(tmp_path)
+    catalog = SpeciesCatalog(source_path)
+    assert len(catalog) > 0 and catalog.index_path is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_index_roundtrip(tmp_path):
+    compiled = SpeciesCatalog(cache_dir=str(tmp_path))
+    info_map = compiled.info_map()
+    assert os.path.exists(compiled.index_path)
+    cached = SpeciesCatalog(cache_dir=str(tmp_path))
+    assert cached.info_map() == info_map
+    name = next(iter(info_map))
+    assert cached.resolve(name) == name
+
+
+def test_configure_shared_catalog(tmp_path, monkeypatch):
+    monkeypatch.setattr(species_catalog, '_catalog', None)
+    shared = species_catalog.configure_species_catalog(str(tmp_path))
+    assert species_catalog.get_species_catalog() is shared
+    shared.info_map()
+    assert os.listdir(tmp_path) == [species_catalog.INDEX_FILE_NAME]
@@ -0,0 +1,109 @@
+import random
+
+from system.benchmark import make_synthetic_records
+from system.threshold_engine import (
+    AMBIGUOUS_LABEL, EMPTY_LABEL, ThresholdEngine, classify, label_priority,
+)
+
+
+def _engine(records, settings, min_frame_ratio=0.0):
+    engine = ThresholdEngine(settings, min_frame_ratio)
+    engine.load((info['文件名'], info) for info in records)
+    return engine
+
+
+def _assert_matches_rescan(engine, records, settings, min_frame_ratio=0.0):
+    expected = {info['文件名']: classify(info, settings, min_frame_ratio) for info in records}
+    assert {key: engine.label_of(key) for key in expected} == expected
+    groups = {}
+    for key, label in expected.items():
+        groups.setdefault(label, []).append(key)
+    assert engine.groups() == {label: groups[label] for label in sorted(groups, key=label_priority)}
+
+
+def _index_size(engine):
+    return sum(len(positions) for _, positions in engine._conf_index.values())
+
+
+def _entry_count(engine):
+    return sum(len(list(engine._entries(record))) for record in engine._records)
+
+
+def test_slider_steps_match_full_rescan():
+    rng = random.Random(0)
+    records = make_synthetic_records(5000, seed=0)
+    settings = {'global': 0.25}
+    engine = _engine(records, settings)
+    species = engine.species_names()
+
+    for _ in range(100):
+        key = 'global' if rng.random() < 0.3 else rng.choice(species)
+        before = {info['文件名']: engine.label_of(info['文件名']) for info in records}
+        settings[key] = round(min(0.95, max(0.05, settings.get(key, settings['global']) + rng.choice((-0.05, 0.05)))), 2)
+        changed = engine.set_thresholds(settings)
+        # 返回的键恰好是归类发生变化的记录
+        assert changed == {k for k, label in before.items() if engine.label_of(k) != label}
+    _assert_matches_rescan(engine, records, settings)
+    assert engine.stats['reclassified'] < 100 * len(records) / 10
+
+
+def test_min_frame_ratio_change_reclassifies_videos():
+    records = make_synthetic_records(3000, seed=1)
+    settings = {'global': 0.3}
+    engine = _engine(records, settings)
+    for ratio in (0.2, 0.5, 0.0):
+        engine.set_thresholds(settings, ratio)
+        _assert_matches_rescan(engine, records, settings, ratio)
+    assert not engine.set_thresholds(settings, 0.0)
+
+
+def test_upsert_replaces_index_entries():
+    rng = random.Random(2)
+    records = make_synthetic_records(2000, seed=2)
+    settings = {'global': 0.25}
+    engine = _engine(records, settings)
+    assert _index_size(engine) == _entry_count(engine)
+
+    boxed = [info for info in records if info.get('检测框')]
+    for info in rng.sample(boxed, 50):
+        for box in info['检测框']:
+            for candidate in box.get('候选项', []):
+                candidate['conf'] = round(rng.random(), 4)
+        engine.upsert(info['文件名'], info)
+    # 多次修改同一条记录，索引中也只保留它当前的候选项
+    info = boxed[0]
+    for _ in range(5):
+        info['检测框'][0]['置信度'] = round(rng.random(), 4)
+        engine.upsert(info['文件名'], info)
+    assert _index_size(engine) == _entry_count(engine)
+
+    settings['global'] = 0.6
+    engine.set_thresholds(settings)
+    _assert_matches_rescan(engine, records, settings)
+
+
+def test_manual_correction_drops_species_from_index():
+    box = {'物种': '狍', '置信度': 0.9, '边界框': [0, 0, 10, 10],
+           '候选项': [{'name': '狍', 'conf': 0.9}, {'name': '野猪', 'conf': 0.2}]}
+    records = [{'文件名': 'a.JPG', '检测框': [box]},
+               {'文件名': 'b.JPG', '检测框': [dict(box, 候选项=[{'name': '狍', 'conf': 0.5}])]}]
+    engine = _engine(records, {'global': 0.25})
+    assert engine.species_names() == ['狍', '野猪']
+    assert engine.label_of('a.JPG') == '狍'
+
+    assert engine.upsert('a.JPG', {'文件名': 'a.JPG', '物种名称': '空', '最低置信度': '人工校验'})
+    assert engine.species_names() == ['狍']
+    assert engine.label_of('a.JPG') == '空'
+    # 人工校验后的记录不再受阈值影响
+    assert engine.set_thresholds({'global': 0.6}) == {'b.JPG'}
+    assert engine.label_of('b.JPG') == EMPTY_LABEL
+    assert engine.counts() == {EMPTY_LABEL: 1, '空': 1}
+
+
+def test_ambiguous_candidates():
+    box = {'物种': '狍', '置信度': 0.6, '边界框': [0, 0, 10, 10],
+           '候选项': [{'name': '狍', 'conf': 0.6}, {'name': '梅花鹿', 'conf': 0.5}]}
+    engine = _engine([{'文件名': 'a.JPG', '检测框': [box]}], {'global': 0.25})
+    assert engine.label_of('a.JPG') == AMBIGUOUS_LABEL
+    assert engine.set_thresholds({'global': 0.25, '梅花鹿': 0.55}) == {'a.JPG'}
+    assert engine.label_of('a.JPG') == '狍'